@@ -17,8 +17,11 @@ bcrypt = Bcrypt()
 jwt = JWTManager()
 socketio = SocketIO()
 
-def create_app():
-    """Create and configure the Flask application"""
+def create_app(check_migration=True):
+    """
+    Create and configure the Flask application
+    check_migration=False lets tools such as app.migrate start on an unmigrated database.
+    """
     
     # Initialize Flask app
     app = Flask(__name__)
@@ -32,6 +35,54 @@ def create_app():
     
     # Database Configuration
     app.config['MONGO_URI'] = os.getenv('MONGO_URI', 'mongodb://localhost:27017/ethiobusdb')
+    # Routes query canonical field types only, so refuse to serve an unmigrated database
+    app.config['REQUIRE_CANONICAL_MIGRATION'] = os.getenv('REQUIRE_CANONICAL_MIGRATION', 'true').lower() == 'true'
+    
+    # Seat Map Cache Configuration
+    app.config['SEAT_MAP_CACHE_ENABLED'] = os.getenv('SEAT_MAP_CACHE_ENABLED', 'true').lower() == 'true'
+    app.config['SEAT_MAP_CACHE_MAX_AGE'] = int(os.getenv('SEAT_MAP_CACHE_MAX_AGE', '30'))
+    
+    # Configuration Cache (settings, tariff rates, loyalty policy)
+    app.config['CONFIG_CACHE_ENABLED'] = os.getenv('CONFIG_CACHE_ENABLED', 'true').lower() == 'true'
+    app.config['CONFIG_CACHE_CHECK_SECONDS'] = float(os.getenv('CONFIG_CACHE_CHECK_SECONDS', '1'))
+    
+    # Authorization user cache
+    app.config['USER_CACHE_ENABLED'] = os.getenv('USER_CACHE_ENABLED', 'true').lower() == 'true'
+    app.config['USER_CACHE_MAX_SIZE'] = int(os.getenv('USER_CACHE_MAX_SIZE', '10000'))
+    app.config['USER_CACHE_TTL_SECONDS'] = float(os.getenv('USER_CACHE_TTL_SECONDS', '60'))
+    
+    # Booking Outbox Configuration
+    app.config['OUTBOX_DISPATCHER_ENABLED'] = os.getenv('OUTBOX_DISPATCHER_ENABLED', 'true').lower() == 'true'
+    app.config['OUTBOX_POLL_SECONDS'] = float(os.getenv('OUTBOX_POLL_SECONDS', '1'))
+    
+    # Socket.IO Configuration
+    # threading (development), eventlet or gevent; run.py patches the standard library to match
+    app.config['SOCKETIO_ASYNC_MODE'] = os.getenv('SOCKETIO_ASYNC_MODE', 'threading').lower()
+    # Redis-protocol URL (redis://host:6379/0) shared by every worker so room broadcasts reach all of them
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = os.getenv('SOCKETIO_MESSAGE_QUEUE') or None
+    app.config['SOCKETIO_CHANNEL'] = os.getenv('SOCKETIO_CHANNEL', 'ethiobus-socketio')
+    app.config['SOCKETIO_LOGGER'] = os.getenv('SOCKETIO_LOGGER', 'true').lower() == 'true'
+    # Seat changes per schedule room are merged into one seat_delta per window (0 = one event per change)
+    app.config['SEAT_BROADCAST_WINDOW_MS'] = int(os.getenv('SEAT_BROADCAST_WINDOW_MS', '50'))
+    # Viewer counts per schedule: seconds between updates (0 = off) and whether workers share them
+    app.config['PRESENCE_INTERVAL_SECONDS'] = float(os.getenv('PRESENCE_INTERVAL_SECONDS', '5'))
+    app.config['PRESENCE_SHARED'] = os.getenv('PRESENCE_SHARED', 'true').lower() == 'true'
+    
+    # Logging: default level with optional per-module levels ("info,app.routes.payments=debug"),
+    # json or text lines, and 1 in N per-item debug lines kept
+    app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'info')
+    app.config['LOG_FORMAT'] = os.getenv('LOG_FORMAT', 'json').lower()
+    app.config['LOG_SAMPLE_EVERY'] = int(os.getenv('LOG_SAMPLE_EVERY', '100'))
+    
+    # Per-endpoint latency / query count histograms served at /metrics (bearer token optional)
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN') or None
+    
+    # Index Configuration
+    app.config['APPLY_INDEXES_ON_STARTUP'] = os.getenv('APPLY_INDEXES_ON_STARTUP', 'true').lower() == 'true'
+    app.config['QUERY_AUDIT_ENABLED'] = os.getenv(
+        'QUERY_AUDIT_ENABLED', str(os.getenv('FLASK_ENV') == 'development')
+    ).lower() == 'true'
     
     # JWT Configuration
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'ethiobus-jwt-secret-key-2024')
@@ -93,23 +144,144 @@ def create_app():
         print(f"🔌 Connecting to MongoDB...")
         print(f"📍 MONGO_URI: {app.config['MONGO_URI'][:50]}...")  # Print first 50 chars only
         
-        mongo.init_app(app)
+        event_listeners = []
+        
+        # Request timing and MongoDB commands per endpoint
+        from app.utils.request_metrics import request_metrics
+        request_metrics.init_app(app, app.config['METRICS_ENABLED'])
+        if app.config['METRICS_ENABLED']:
+            event_listeners.append(request_metrics)
+        
+        # Development: explain request queries and log collection scans
+        if app.config['QUERY_AUDIT_ENABLED']:
+            from app.utils.query_audit import query_plan_auditor
+            event_listeners.append(query_plan_auditor)
+        
+        mongo.init_app(app, event_listeners=event_listeners)
+        if app.config['QUERY_AUDIT_ENABLED']:
+            query_plan_auditor.start(mongo.cx)
+            print("🔍 Query plan audit enabled")
         bcrypt.init_app(app)
         jwt.init_app(app)
         
+        # Queued app.* loggers; levels follow the system settings
+        from app.logging import configure_logging
+        configure_logging(app)
+        
+        # Per-schedule seat map cache
+        from app.utils.seat_map_cache import seat_map_cache
+        seat_map_cache.configure(app.config['SEAT_MAP_CACHE_ENABLED'], app.config['SEAT_MAP_CACHE_MAX_AGE'])
+        
+        # Versioned settings / tariff / loyalty policy cache
+        from app.utils.config_cache import config_cache
+        config_cache.configure(app.config['CONFIG_CACHE_ENABLED'], app.config['CONFIG_CACHE_CHECK_SECONDS'])
+        
+        # Users checked by role_required / the JWT user loader
+        from app.utils.authz import user_cache
+        user_cache.configure(app.config['USER_CACHE_ENABLED'], app.config['USER_CACHE_MAX_SIZE'],
+                             app.config['USER_CACHE_TTL_SECONDS'])
+        
+        # Routes query canonical field types only (see app.utils.schema), so
+        # the migration is checked before anything reads or backfills from
+        # them; empty collections have nothing to convert and are recorded as migrated
+        migration_message = None
+        try:
+            from app.utils.schema import pending_collections
+            from app.migrate import migrate_collection
+            for name in pending_collections():
+                if mongo.db[name].estimated_document_count() == 0:
+                    migrate_collection(name)
+            pending_migration = pending_collections()
+            if pending_migration:
+                migration_message = (f"Canonical field migration not complete for {', '.join(pending_migration)}; "
+                                     "run: python -m app.migrate")
+        except Exception as migration_error:
+            pending_migration = None
+            migration_message = f"Could not check the canonical field migration: {migration_error}"
+        
+        if migration_message:
+            if check_migration and app.config['REQUIRE_CANONICAL_MIGRATION']:
+                raise RuntimeError(migration_message)
+            print(f"⚠️ {migration_message}")
+        
         # Test MongoDB connection
         try:
             mongo.cx.admin.command('ping')
             print("✅ MongoDB connected successfully!")
+            
+            # Secondary indexes declared in app.utils.indexes
+            if app.config['APPLY_INDEXES_ON_STARTUP']:
+                from app.utils.indexes import apply_indexes
+                applied = apply_indexes()
+                print(f"✅ Registry indexes ready: {sum(len(names) for names in applied.values())} indexes")
+
+            # Unique seat claim index + TTL expiry index (replaces cleanup workers)
+            from app.utils.seat_lock import ensure_seat_lock_indexes
+            index_names = ensure_seat_lock_indexes()
+            print(f"✅ Seat lock indexes ready: {index_names}")
+
+            # Denormalized schedule search read model and pre-aggregated
+            # dashboard figures (indexes + first backfill, from migrated data only)
+            from app.utils.schedule_search import ensure_schedule_search, ensure_schedule_search_indexes
+            from app.utils.rollups import ensure_rollup_indexes, ensure_rollups
+            if pending_migration == []:
+                search_indexes = ensure_schedule_search()
+                rollup_index = ensure_rollups()
+            else:
+                search_indexes = ensure_schedule_search_indexes()
+                rollup_index = ensure_rollup_indexes()
+                print("⚠️ Schedule search and rollup backfills skipped until the migration completes")
+            print(f"✅ Schedule search indexes ready: {search_indexes}")
+            print(f"✅ Daily rollups ready: {rollup_index}")
+
+            # Post-booking side effects are applied from the outbox
+            from app.utils.outbox import ensure_outbox_indexes
+            outbox_indexes = ensure_outbox_indexes()
+            print(f"✅ Outbox indexes ready: {outbox_indexes}")
+            from app.utils.booking_commit import ensure_seat_claim_indexes
+            print(f"✅ Seat claim indexes ready: {ensure_seat_claim_indexes()}")
+
+            # Numbered seat events kept for replay
+            from app.utils.seat_events import ensure_seat_event_indexes
+            print(f"✅ Seat event indexes ready: {ensure_seat_event_indexes()}")
+            from app.utils.presence import ensure_presence_indexes
+            print(f"✅ Presence indexes ready: {ensure_presence_indexes()}")
+
+            # Invalidate cached seat maps from the change stream where supported
+            seat_map_cache.start_watcher(app)
+            # Log levels saved in the system settings, then on every settings change
+            from app.logging import logging_setup
+            logging_setup.refresh_from_settings()
+            # Reload configuration sections as soon as another worker bumps them
+            config_cache.start_watcher(app)
         except Exception as db_error:
             print(f"⚠️ MongoDB connection warning: {db_error}")
         
         # Initialize SocketIO with CORS support
         socketio.init_app(app, 
                          cors_allowed_origins=all_origins,
-                         async_mode='threading',
-                         logger=True,
-                         engineio_logger=True)
+                         async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+                         message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'],
+                         channel=app.config['SOCKETIO_CHANNEL'],
+                         logger=app.config['SOCKETIO_LOGGER'],
+                         engineio_logger=app.config['SOCKETIO_LOGGER'])
+        if app.config['SOCKETIO_MESSAGE_QUEUE']:
+            print(f"📡 Socket.IO rooms shared through message queue (channel {app.config['SOCKETIO_CHANNEL']})")
+        
+        # Coalesced seat broadcasts
+        from app.utils.seat_broadcast import seat_broadcaster
+        seat_broadcaster.configure(app, app.config['SEAT_BROADCAST_WINDOW_MS'])
+        
+        # Viewer counts per schedule room
+        from app.utils.presence import presence
+        presence.configure(app.config['PRESENCE_INTERVAL_SECONDS'], app.config['PRESENCE_SHARED'],
+                           bool(app.config['SOCKETIO_MESSAGE_QUEUE']))
+        presence.start(app)
+        
+        # Outbox dispatcher (after SocketIO, its events include broadcasts)
+        from app.utils.outbox import outbox_dispatcher
+        outbox_dispatcher.configure(app.config['OUTBOX_DISPATCHER_ENABLED'], app.config['OUTBOX_POLL_SECONDS'])
+        outbox_dispatcher.start(app)
         
         print("✅ Extensions initialized successfully (including SocketIO)")
     except Exception as e:
@@ -254,6 +426,18 @@ def create_app():
         
         return jsonify(response), 200
     
+    @app.route('/metrics')
+    def prometheus_metrics():
+        """Request and MongoDB metrics of this process in the Prometheus text format"""
+        from flask import request, Response
+        from app.utils.request_metrics import request_metrics
+        if not app.config['METRICS_ENABLED']:
+            return jsonify({'error': 'Metrics are disabled'}), 404
+        token = app.config['METRICS_TOKEN']
+        if token and request.headers.get('Authorization') != f"Bearer {token}":
+            return jsonify({'error': 'Unauthorized'}), 401
+        return Response(request_metrics.prometheus_text(), mimetype='text/plain; version=0.0.4')
+    
     @app.route('/debug/config')
     def debug_config():
         """Debug endpoint to check configuration (remove in production)"""
@@ -295,9 +479,9 @@ def create_app():
     
     @jwt.user_lookup_loader
     def user_lookup_callback(_jwt_header, jwt_data):
-        from bson import ObjectId
-        identity = jwt_data["sub"]
-        return mongo.db.users.find_one({"_id": ObjectId(identity)})
+        # Runs on every protected request: served from the user cache
+        from app.utils.authz import user_cache
+        return user_cache.get(jwt_data["sub"])
     
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_data):
@@ -0,0 +1,172 @@
+"""
+Logging
+Structured, leveled logging for the app.* loggers. Records are put on a queue
+by the request thread and written by a QueueListener thread, so a request
+never waits on stdout. Output is one JSON object per line (LOG_FORMAT=json,
+the default) or plain text (LOG_FORMAT=text).
+
+Levels come from backend_config.log_level in the system settings (the admin
+Settings page), falling back to LOG_LEVEL. Either may name per-module levels
+after the default level, e.g. "info,app.routes.payments=debug,app.socket_events=warning".
+enable_logging=false keeps errors only. A change saved on one worker reaches
+the others through the settings version in the configuration cache, which
+re-applies the levels when that version moves.
+
+Per-item debug lines (one per booking, seat or schedule in a loop) pass
+extra=PER_ITEM and only every LOG_SAMPLE_EVERY-th of them per call site is kept.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from datetime import datetime
+
+APP_LOGGER = 'app'
+
+LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'warn': logging.WARNING,
+    'error': logging.ERROR,
+    'critical': logging.CRITICAL
+}
+
+DEFAULT_SAMPLE_EVERY = 100
+
+# extra= for per-item debug lines, which are sampled
+PER_ITEM = {'sampled': True}
+
+# LogRecord attributes that are not user-supplied extras
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sampled'}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, extras and any traceback"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.utcfromtimestamp(record.created).isoformat(timespec='milliseconds') + 'Z',
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in `every` records marked sampled, counted per call site"""
+
+    def __init__(self, every=DEFAULT_SAMPLE_EVERY):
+        super().__init__()
+        self.every = max(1, every)
+        self._seen = {}
+        self._guard = threading.Lock()
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False) or self.every == 1:
+            return True
+        site = (record.pathname, record.lineno)
+        with self._guard:
+            count = self._seen.get(site, 0)
+            self._seen[site] = count + 1
+        if count % self.every:
+            return False
+        record.sample_every = self.every
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Formats the message on the caller's thread, but leaves the traceback to the listener"""
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def parse_levels(spec, default='info'):
+    """'info,app.routes.payments=debug' -> (INFO, {'app.routes.payments': DEBUG}); unknown names are ignored"""
+    root = LEVELS.get(str(default).lower(), logging.INFO)
+    modules = {}
+    for part in str(spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '=' in part:
+            name, level = (piece.strip() for piece in part.split('=', 1))
+            if level.lower() in LEVELS:
+                modules[name] = LEVELS[level.lower()]
+        elif part.lower() in LEVELS:
+            root = LEVELS[part.lower()]
+    return root, modules
+
+class LoggingSetup:
+    """The queue, listener and level state for the app.* loggers (one per process)"""
+
+    def __init__(self):
+        self.listener = None
+        self.default_spec = 'info'
+        self._module_levels = {}
+        self._settings_version = None
+
+    def configure(self, level_spec='info', log_format='json', sample_every=DEFAULT_SAMPLE_EVERY):
+        """Route app.* records through a queue to stdout; safe to call again (e.g. per create_app)"""
+        self.default_spec = level_spec
+        app_logger = logging.getLogger(APP_LOGGER)
+        if self.listener is None:
+            output = logging.StreamHandler(sys.stdout)
+            self.listener = logging.handlers.QueueListener(queue.SimpleQueue(), output, respect_handler_level=False)
+            self.listener.start()
+            atexit.register(self.listener.stop)
+            handler = _QueueHandler(self.listener.queue)
+            app_logger.addHandler(handler)
+            app_logger.propagate = False
+        output = self.listener.handlers[0]
+        output.setFormatter(JsonFormatter() if log_format == 'json'
+                            else logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        handler = app_logger.handlers[0]
+        handler.filters = [SamplingFilter(sample_every)]
+        self.apply_levels(level_spec)
+
+    def apply_levels(self, spec, enabled=True):
+        root, modules = parse_levels(spec, self.default_spec.split(',')[0])
+        if not enabled:
+            root = max(root, logging.ERROR)
+        logging.getLogger(APP_LOGGER).setLevel(root)
+        # Loggers configured before but no longer named fall back to the app level
+        for name in set(self._module_levels) - set(modules):
+            logging.getLogger(name).setLevel(logging.NOTSET)
+        for name, level in modules.items():
+            logging.getLogger(name).setLevel(level)
+        self._module_levels = modules
+
+    def refresh_from_settings(self):
+        """Apply backend_config.log_level when the system settings changed (cheap otherwise)"""
+        from app.utils.config_cache import config_cache, get_system_settings
+        try:
+            version = config_cache.version('settings')
+            if version == self._settings_version:
+                return
+            self._settings_version = version
+            backend_config = (get_system_settings() or {}).get('backend_config', {})
+            self.apply_levels(
+                backend_config.get('log_level') or self.default_spec,
+                backend_config.get('enable_logging', True) is not False
+            )
+        except Exception as e:
+            logging.getLogger(__name__).warning("Could not read log levels from settings: %s", e)
+
+# Shared instance configured by create_app()
+logging_setup = LoggingSetup()
+
+def configure_logging(app):
+    """Set up app.* logging from the app config and keep levels in step with the settings"""
+    from app.utils.config_cache import config_cache
+    logging_setup.configure(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'], app.config['LOG_SAMPLE_EVERY'])
+    config_cache.on_change('settings', logging_setup.refresh_from_settings)
+    return logging_setup
@@ -0,0 +1,154 @@
+"""
+Canonical Field Migration
+Rewrites bookings, busschedules, payments and seat_locks so every reference and
+date field has one stored type (see app.utils.schema.CANONICAL_FIELDS).
+Documents are walked in _id order in batches; after each batch the last _id is
+checkpointed in schema_migrations, so an interrupted run resumes where it stopped.
+
+Usage:
+    python -m app.migrate                      # migrate everything, resuming checkpoints
+    python -m app.migrate --status             # show progress
+    python -m app.migrate --collections bookings payments --batch-size 500
+    python -m app.migrate --dry-run            # count changes without writing
+    python -m app.migrate --restart            # ignore checkpoints and start over
+    python -m app.migrate --drop-aliases       # also remove camelCase copies (routeId, busId, ...)
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from pymongo import UpdateOne
+from app import create_app, mongo
+from app.utils.schema import (
+    CANONICAL_FIELDS, MIGRATION_NAME, MIGRATIONS_COLLECTION,
+    canonical_changes, migration_status
+)
+
+DEFAULT_BATCH_SIZE = 1000
+
+# _ids of unconvertible documents kept on the checkpoint for fixing by hand
+SKIPPED_IDS_KEPT = 100
+
+def _checkpoint_id(collection):
+    return f"{MIGRATION_NAME}:{collection}"
+
+def _load_checkpoint(collection, restart=False):
+    checkpoints = mongo.db[MIGRATIONS_COLLECTION]
+    if restart:
+        checkpoints.delete_one({'_id': _checkpoint_id(collection)})
+    return checkpoints.find_one({'_id': _checkpoint_id(collection)}) or {
+        '_id': _checkpoint_id(collection),
+        'migration': MIGRATION_NAME,
+        'collection': collection,
+        'last_id': None,
+        'scanned': 0,
+        'modified': 0,
+        'skipped': 0,
+        'skipped_ids': [],
+        'completed': False,
+        'started_at': datetime.utcnow()
+    }
+
+def _save_checkpoint(checkpoint):
+    checkpoint['updated_at'] = datetime.utcnow()
+    mongo.db[MIGRATIONS_COLLECTION].replace_one({'_id': checkpoint['_id']}, checkpoint, upsert=True)
+
+def migrate_collection(collection, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, restart=False, drop_aliases=False):
+    """Migrate one collection from its checkpoint; returns the final checkpoint"""
+    checkpoint = _load_checkpoint(collection, restart)
+    checkpoint.setdefault('skipped', 0)
+    checkpoint.setdefault('skipped_ids', [])
+    if checkpoint.get('completed') and not restart:
+        print(f"⏭️ {collection}: already migrated ({checkpoint['modified']} of {checkpoint['scanned']} documents changed)")
+        return checkpoint
+
+    db_collection = mongo.db[collection]
+    fields = list(CANONICAL_FIELDS[collection])
+    started = time.perf_counter()
+    print(f"🔄 {collection}: migrating {', '.join(fields)}"
+          + (f" from _id > {checkpoint['last_id']}" if checkpoint['last_id'] is not None else ""))
+
+    while True:
+        query = {'_id': {'$gt': checkpoint['last_id']}} if checkpoint['last_id'] is not None else {}
+        batch = list(db_collection.find(query).sort('_id', 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        for document in batch:
+            try:
+                to_set, to_unset = canonical_changes(collection, document, drop_aliases)
+            except (TypeError, ValueError) as e:
+                # e.g. a malformed date; leave the document as it is and carry on
+                checkpoint['skipped'] += 1
+                if len(checkpoint['skipped_ids']) < SKIPPED_IDS_KEPT:
+                    checkpoint['skipped_ids'].append(document['_id'])
+                print(f"⚠️ {collection} {document['_id']}: skipped, {e}")
+                continue
+            if to_set or to_unset:
+                update = {}
+                if to_set:
+                    update['$set'] = to_set
+                if to_unset:
+                    update['$unset'] = to_unset
+                operations.append(UpdateOne({'_id': document['_id']}, update))
+
+        if operations and not dry_run:
+            db_collection.bulk_write(operations, ordered=False)
+
+        checkpoint['last_id'] = batch[-1]['_id']
+        checkpoint['scanned'] += len(batch)
+        checkpoint['modified'] += len(operations)
+        if not dry_run:
+            _save_checkpoint(checkpoint)
+
+        rate = checkpoint['scanned'] / max(time.perf_counter() - started, 1e-9)
+        print(f"   {collection}: {checkpoint['scanned']} scanned, {checkpoint['modified']} changed, "
+              f"{checkpoint['skipped']} skipped ({rate:.0f} docs/s)")
+
+    checkpoint['completed'] = True
+    checkpoint['completed_at'] = datetime.utcnow()
+    if dry_run:
+        print(f"🧪 {collection}: dry run, {checkpoint['modified']} of {checkpoint['scanned']} documents would change")
+    else:
+        _save_checkpoint(checkpoint)
+        print(f"✅ {collection}: {checkpoint['modified']} of {checkpoint['scanned']} documents changed")
+    if checkpoint['skipped']:
+        print(f"⚠️ {collection}: {checkpoint['skipped']} documents could not be converted; "
+              f"their _ids (first {SKIPPED_IDS_KEPT}) are in {MIGRATIONS_COLLECTION} as skipped_ids")
+    return checkpoint
+
+def print_status():
+    status = migration_status()
+    for collection in CANONICAL_FIELDS:
+        checkpoint = status.get(collection)
+        if not checkpoint:
+            print(f"   {collection:<14} not started")
+        else:
+            state = 'completed' if checkpoint.get('completed') else f"in progress (last _id {checkpoint.get('last_id')})"
+            print(f"   {collection:<14} {state}: {checkpoint.get('scanned', 0)} scanned, "
+                  f"{checkpoint.get('modified', 0)} changed, {checkpoint.get('skipped', 0)} skipped")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rewrite stored fields to their canonical types')
+    parser.add_argument('--collections', nargs='+', choices=list(CANONICAL_FIELDS),
+                        default=list(CANONICAL_FIELDS), help='Collections to migrate (default: all)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Documents per batch')
+    parser.add_argument('--dry-run', action='store_true', help='Count changes without writing')
+    parser.add_argument('--restart', action='store_true', help='Discard checkpoints and start over')
+    parser.add_argument('--drop-aliases', action='store_true', help='Remove legacy camelCase fields (routeId, busId, ...) once copied')
+    parser.add_argument('--status', action='store_true', help='Show migration progress and exit')
+    args = parser.parse_args(argv)
+
+    app = create_app(check_migration=False)
+    with app.app_context():
+        if args.status:
+            print_status()
+            return 0
+        for collection in args.collections:
+            migrate_collection(collection, args.batch_size, args.dry_run, args.restart, args.drop_aliases)
+        print_status()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,14 @@
+import logging
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from app import mongo
+from app.logging import PER_ITEM
+from app.utils.authz import is_admin
+from app.utils.request_metrics import request_metrics
+from app.utils.revenue import revenue_expression
+from app.utils.rollups import rollup_series, rollup_totals
+from app.utils.schedule_search import buses_by_ref
+from app.utils.schema import canonical_document, day, user_ref
 from bson import ObjectId
 from bson.errors import InvalidId
 from datetime import datetime, timedelta
@@ -8,6 +16,7 @@ from flask import Blueprint, jsonify, request, make_response
 from app.utils.document_processor import extract_license_info, get_file_info
 
 admin_bp = Blueprint('admin_bp', __name__)
+logger = logging.getLogger(__name__)
 
 # =========================================================================
 # HELPER FUNCTIONS
@@ -23,16 +32,6 @@ def safe_object_id(id_string):
     except (InvalidId, TypeError):
         return id_string
 
-def is_admin():
-    """Check if current user is admin"""
-    try:
-        current_user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
-        return user and user.get('role') == 'admin'
-    except Exception as e:
-        print(f"❌ Admin check error: {e}")
-        return False
-
 def serialize_doc(doc):
     """Serialize MongoDB document for JSON response"""
     if not doc:
@@ -103,7 +102,7 @@ def is_schedule_completed(schedule):
         return departure_datetime < now
         
     except Exception as e:
-        print(f"❌ Error checking schedule completion: {e}")
+        logger.error("❌ Error checking schedule completion: %s", e)
         return True  # Consider error cases as completed for safety
 
 def is_bus_under_maintenance(schedule, bus_data=None):
@@ -132,171 +131,145 @@ def is_bus_under_maintenance(schedule, bus_data=None):
         return False
         
     except Exception as e:
-        print(f"❌ Error checking bus maintenance: {e}")
+        logger.error("❌ Error checking bus maintenance: %s", e)
         return False  # Assume not under maintenance on error
 
 def filter_valid_schedules(schedules):
     """Filter out completed schedules and buses under maintenance"""
     try:
-        db = mongo.db
         valid_schedules = []
         filtered_count = 0
+        # Every schedule's bus in one query
+        buses = buses_by_ref(schedule.get('bus_id') for schedule in schedules)
         
         for schedule in schedules:
             # Check if schedule has departed
             if is_schedule_completed(schedule):
-                print(f"⏰ Schedule {schedule.get('_id')} filtered out: Already departed")
+                logger.debug("⏰ Schedule %s filtered out: Already departed", schedule.get('_id'), extra=PER_ITEM)
                 filtered_count += 1
                 continue
             
             # Check bus maintenance status
-            bus_id = schedule.get('busId')
+            bus_id = schedule.get('bus_id')
             bus_data = None
             
             if bus_id:
-                try:
-                    bus_data = db.buses.find_one({'_id': ObjectId(bus_id)})
-                except:
-                    # If bus_id is not a valid ObjectId, try as string
-                    bus_data = db.buses.find_one({'bus_number': bus_id})
+                bus_data = buses.get(str(bus_id))
             
             if is_bus_under_maintenance(schedule, bus_data):
-                print(f"🔧 Schedule {schedule.get('_id')} filtered out: Bus under maintenance")
+                logger.debug("🔧 Schedule %s filtered out: Bus under maintenance", schedule.get('_id'), extra=PER_ITEM)
                 filtered_count += 1
                 continue
             
             valid_schedules.append(schedule)
         
-        print(f"✅ Filtered {len(valid_schedules)} valid schedules from {len(schedules)} total (filtered out: {filtered_count})")
+        logger.debug("✅ Filtered %s valid schedules from %s total (filtered out: %s)", len(valid_schedules), len(schedules), filtered_count)
         return valid_schedules
         
     except Exception as e:
-        print(f"❌ Error filtering schedules: {e}")
+        logger.error("❌ Error filtering schedules: %s", e)
         return schedules  # Return original list on error
 
 # =========================================================================
 # ENHANCED DASHBOARD & REPORTS WITH MAINTENANCE & DATE FILTERING
 # =========================================================================
 
+def booking_window_stats(windows):
+    """
+    Bookings created in each (start, end) window: count, cancelled count and
+    refund-aware revenue of the paid ones, from one $facet aggregation.
+    created_at falls back to booked_at, and ISO strings written by older code
+    are converted to dates on the server.
+    """
+    earliest = min(start for start, _ in windows.values())
+    created = {'$convert': {
+        'input': {'$ifNull': ['$created_at', '$booked_at']},
+        'to': 'date', 'onError': None, 'onNull': None
+    }}
+    
+    def window_pipeline(start, end):
+        return [
+            {'$match': {'created': {'$gte': start, '$lt': end}}},
+            {'$group': {
+                '_id': None,
+                'bookings': {'$sum': 1},
+                'cancelled': {'$sum': {'$cond': [{'$eq': ['$status', 'cancelled']}, 1, 0]}},
+                'revenue': {'$sum': {'$cond': [{'$eq': ['$payment_status', 'paid']}, revenue_expression(), 0]}}
+            }}
+        ]
+    
+    pipeline = [
+        {'$match': {'$or': [
+            {'created_at': {'$gte': earliest}},
+            {'created_at': {'$type': 'string'}},
+            {'created_at': None, 'booked_at': {'$ne': None}}
+        ]}},
+        {'$project': {
+            'created': created,
+            'status': 1,
+            'payment_status': 1,
+            'cancellation_status': 1,
+            'total_amount': 1,
+            'refund_amount': 1,
+            'expected_refund_percentage': 1
+        }},
+        {'$facet': {name: window_pipeline(start, end) for name, (start, end) in windows.items()}}
+    ]
+    facets = next(mongo.db.bookings.aggregate(pipeline), {})
+    
+    stats = {}
+    for name in windows:
+        rows = facets.get(name) or [{}]
+        stats[name] = {
+            'bookings': rows[0].get('bookings', 0),
+            'cancelled': rows[0].get('cancelled', 0),
+            'revenue': rows[0].get('revenue', 0)
+        }
+    return stats
+
 @admin_bp.route('/dashboard/stats', methods=['GET'])
 @jwt_required()
 def get_admin_dashboard_stats():
     """Get REAL stats with maintenance and schedule filtering"""
     try:
-        print("📊 Fetching ENHANCED REAL dashboard stats from database...")
+        logger.debug("📊 Fetching ENHANCED REAL dashboard stats from database...")
         
         if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         now = datetime.utcnow()
         
-        # Base query for paid bookings
-        base_query = {
-            'payment_status': 'paid',
-            'status': {'$in': ['completed', 'checked_in', 'confirmed', 'pending']}
-        }
-        
-        # Helper function to calculate revenue with refunds accounted
-        def calculate_revenue(bookings_list):
-            revenue = 0
-            print(f"\n💰 Calculating revenue from {len(bookings_list)} bookings:")
-            for booking in bookings_list:
-                pnr = booking.get('pnr_number', 'N/A')
-                total_amount = booking.get('total_amount', 0)
-                status = booking.get('status', 'unknown')
-                cancellation_status = booking.get('cancellation_status', None)
-                
-                if status == 'cancelled' or cancellation_status == 'approved':
-                    # For cancelled bookings, only count cancellation fee
-                    refund_amount = booking.get('refund_amount', 0)
-                    expected_pct = booking.get('expected_refund_percentage', 0)
-                    
-                    if refund_amount == 0 and expected_pct > 0:
-                        refund_amount = total_amount * (expected_pct / 100)
-                    
-                    cancellation_fee = total_amount - refund_amount
-                    revenue += cancellation_fee
-                    
-                    print(f"   📋 {pnr} (CANCELLED): Total={total_amount} ETB, Refund={refund_amount} ETB ({expected_pct}%), Fee={cancellation_fee} ETB")
-                else:
-                    # For non-cancelled bookings, count full amount
-                    revenue += total_amount
-                    cancellation_note = " (PENDING CANCELLATION)" if booking.get('cancellation_requested') else ""
-                    print(f"   📋 {pnr} ({status.upper()}){cancellation_note}: {total_amount} ETB")
-            
-            print(f"   ✅ Total Revenue: {revenue} ETB\n")
-            return revenue
-        
-        # TODAY'S REAL STATS
         today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
         today_end = today_start + timedelta(days=1)
-        
-        print(f"📅 Today range: {today_start} to {today_end}")
-        
-        # Get ALL bookings (not just paid ones) to count all bookings created today
-        all_bookings_list = list(mongo.db.bookings.find({}))
-        
-        print(f"🔍 Total bookings in database: {len(all_bookings_list)}")
-        
-        # Filter bookings created today manually (to handle different date formats)
-        today_bookings = []
-        for booking in all_bookings_list:
-            created_at = booking.get('created_at') or booking.get('booked_at')
-            if created_at:
-                # Handle both datetime objects and strings
-                if isinstance(created_at, str):
-                    try:
-                        created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                    except Exception as e:
-                        print(f"   ⚠️ Could not parse date for booking {booking.get('pnr_number')}: {created_at}")
-                        continue
-                
-                # Check if created today
-                if today_start <= created_at < today_end:
-                    today_bookings.append(booking)
-                    print(f"   ✅ Found booking created today: PNR={booking.get('pnr_number')}, Status={booking.get('status')}, Created={created_at}")
-            else:
-                print(f"   ⚠️ Booking {booking.get('pnr_number')} has no created_at or booked_at field")
-        
-        print(f"📊 Found {len(today_bookings)} bookings created today")
-        
-        # Calculate revenue only from paid bookings created today
-        today_paid_bookings = [b for b in today_bookings if b.get('payment_status') == 'paid']
-        
-        print(f"\n🎯 TODAY'S BOOKINGS ONLY (for revenue calculation):")
-        for b in today_paid_bookings:
-            print(f"   - PNR: {b.get('pnr_number')}, Status: {b.get('status')}, Amount: {b.get('total_amount')} ETB, Created: {b.get('created_at')}")
-        
-        today_revenue = calculate_revenue(today_paid_bookings)
-        
-        print(f"💰 Today's Revenue: {today_revenue} ETB (from {len(today_paid_bookings)} paid bookings created today)")
-        
-        # WEEKLY REAL STATS (last 7 days)
         week_start = now - timedelta(days=7)
-        weekly_bookings = [b for b in all_bookings_list if b.get('created_at') and 
-                          (isinstance(b.get('created_at'), datetime) and week_start <= b.get('created_at') < now)]
-        weekly_paid = [b for b in weekly_bookings if b.get('payment_status') == 'paid']
-        weekly_revenue = calculate_revenue(weekly_paid)
-        
-        # MONTHLY REAL STATS (this month)
         month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_bookings = [b for b in all_bookings_list if b.get('created_at') and 
-                           (isinstance(b.get('created_at'), datetime) and month_start <= b.get('created_at') < now)]
-        monthly_paid = [b for b in monthly_bookings if b.get('payment_status') == 'paid']
-        monthly_revenue = calculate_revenue(monthly_paid)
         
-        # ALL-TIME REAL STATS
-        all_paid_bookings = [b for b in all_bookings_list if b.get('payment_status') == 'paid']
-        total_revenue = calculate_revenue(all_paid_bookings)
+        # Booking counts and refund-aware revenue per window, aggregated in MongoDB
+        windows = booking_window_stats({
+            'today': (today_start, today_end),
+            'week': (week_start, now),
+            'month': (month_start, now)
+        })
+        all_time = next(mongo.db.bookings.aggregate([
+            {'$match': {'payment_status': 'paid'}},
+            {'$group': {'_id': None, 'bookings': {'$sum': 1}, 'revenue': {'$sum': revenue_expression()}}}
+        ]), {'bookings': 0, 'revenue': 0})
+        
+        today_revenue = windows['today']['revenue']
+        weekly_revenue = windows['week']['revenue']
+        monthly_revenue = windows['month']['revenue']
+        total_revenue = all_time['revenue']
         
         # Count ALL bookings created today (including cancelled) - "Bookings Today" means booked today
-        today_bookings_count = len(today_bookings)
-        weekly_bookings_count = len(weekly_bookings)
-        monthly_bookings_count = len(monthly_bookings)
-        total_bookings = len(all_paid_bookings)
+        today_bookings_count = windows['today']['bookings']
+        weekly_bookings_count = windows['week']['bookings']
+        monthly_bookings_count = windows['month']['bookings']
+        total_bookings = all_time['bookings']
         
         # Count cancelled bookings for reference
-        today_cancelled = len([b for b in today_bookings if b.get('status') == 'cancelled'])
+        today_cancelled = windows['today']['cancelled']
+        
+        logger.debug("💰 Revenue today/week/month/all: %s/%s/%s/%s ETB", today_revenue, weekly_revenue, monthly_revenue, total_revenue)
         
         # Other real counts from database
         users_count = mongo.db.users.count_documents({})
@@ -304,61 +277,31 @@ def get_admin_dashboard_stats():
         buses_count = mongo.db.buses.count_documents({'status': 'active'})
         routes_count = mongo.db.routes.count_documents({})
         
-        # Today's new users - users created today (manual filtering for date format compatibility)
-        all_users = list(mongo.db.users.find({}))
-        today_new_users = 0
-        
-        print(f"\n👥 Checking {len(all_users)} users for today's registrations...")
-        
-        for user in all_users:
-            created_at = user.get('created_at')
-            if created_at:
-                original_created_at = created_at
-                if isinstance(created_at, str):
-                    try:
-                        created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                    except Exception as e:
-                        print(f"   ⚠️ Could not parse date for user {user.get('email')}: {original_created_at}")
-                        continue
-                
-                if today_start <= created_at < today_end:
-                    today_new_users += 1
-                    print(f"   ✅ User created today: {user.get('email')} at {created_at}")
+        # Today's new users (created_at stored as datetime, or as an ISO string by older code)
+        today_new_users = mongo.db.users.count_documents({'$or': [
+            {'created_at': {'$gte': today_start, '$lt': today_end}},
+            {'created_at': {'$gte': today_start.strftime('%Y-%m-%d'), '$lt': today_end.strftime('%Y-%m-%d')}}
+        ]})
         
-        print(f"👥 Found {today_new_users} new users created today\n")
+        logger.debug("👥 Found %s new users created today", today_new_users)
         
         # Define today_date_str for use in travel bookings and schedules
         today_date_str = today_start.strftime('%Y-%m-%d')
         
         # Get bookings for TODAY'S TRAVEL (not created today, but traveling today)
         # These are bookings where the schedule's departure_date is today
-        print(f"🔍 Looking for bookings traveling today ({today_date_str})...")
+        logger.debug("🔍 Looking for bookings traveling today (%s)...", today_date_str)
         
-        today_travel_bookings = []
-        for booking in list(mongo.db.bookings.find({'payment_status': 'paid'})):
-            schedule_id = booking.get('schedule_id')
-            if schedule_id:
-                try:
-                    schedule = mongo.db.busschedules.find_one({'_id': ObjectId(schedule_id)})
-                    if schedule:
-                        dep_date = schedule.get('departure_date')
-                        if dep_date:
-                            dep_date_str = None
-                            # Parse departure date
-                            if isinstance(dep_date, str):
-                                dep_date_str = dep_date.split('T')[0]
-                            elif isinstance(dep_date, datetime):
-                                dep_date_str = dep_date.strftime('%Y-%m-%d')
-                            
-                            # Check if departure is today
-                            if dep_date_str == today_date_str:
-                                today_travel_bookings.append(booking)
-                                print(f"   ✅ Booking {booking.get('pnr_number')} travels today (status: {booking.get('status')})")
-                except Exception as e:
-                    print(f"   ⚠️ Error processing booking {booking.get('_id')}: {e}")
-                    continue
+        todays_schedule_ids = [
+            str(schedule['_id'])
+            for schedule in mongo.db.busschedules.find({'departure_date': today_date_str}, {'_id': 1})
+        ]
+        today_travel_bookings = list(mongo.db.bookings.find(
+            {'schedule_id': {'$in': todays_schedule_ids}, 'payment_status': 'paid'},
+            {'status': 1}
+        ))
         
-        print(f"✈️ Found {len(today_travel_bookings)} bookings traveling today")
+        logger.debug("✈️ Found %s bookings traveling today", len(today_travel_bookings))
         
         # Pending Today = bookings with status 'pending' or 'confirmed' traveling today (awaiting check-in)
         today_pending = len([b for b in today_travel_bookings if b.get('status') in ['pending', 'confirmed']])
@@ -366,32 +309,16 @@ def get_admin_dashboard_stats():
         # Confirmed Today = bookings with status 'checked_in' traveling today (ready to go)
         today_confirmed = len([b for b in today_travel_bookings if b.get('status') == 'checked_in'])
         
-        print(f"📊 Today's travel stats: {today_pending} pending, {today_confirmed} checked in")
+        logger.debug("📊 Today's travel stats: %s pending, %s checked in", today_pending, today_confirmed)
         
         # ENHANCED: Get maintenance and schedule statistics
         total_schedules = mongo.db.busschedules.count_documents({})
         active_schedules = mongo.db.busschedules.count_documents({'status': 'scheduled'})
         
         # Today's schedules - schedules with departure_date = today (today_date_str already defined above)
-        today_schedules = 0
-        all_schedules_list = list(mongo.db.busschedules.find({}))
-        
-        print(f"📅 Looking for schedules with departure_date = {today_date_str}")
-        
-        for schedule in all_schedules_list:
-            dep_date = schedule.get('departure_date')
-            if dep_date:
-                dep_date_str = None
-                if isinstance(dep_date, str):
-                    dep_date_str = dep_date.split('T')[0]
-                elif isinstance(dep_date, datetime):
-                    dep_date_str = dep_date.strftime('%Y-%m-%d')
-                
-                if dep_date_str == today_date_str:
-                    today_schedules += 1
-                    print(f"   ✅ Schedule {schedule.get('_id')} departs today")
+        today_schedules = len(todays_schedule_ids)
         
-        print(f"🚌 Found {today_schedules} schedules departing today")
+        logger.debug("🚌 Found %s schedules departing today", today_schedules)
         
         # Get schedules for maintenance analysis
         all_schedules = list(mongo.db.busschedules.find({'status': 'scheduled'}))
@@ -460,15 +387,15 @@ def get_admin_dashboard_stats():
             'last_updated': now.isoformat()
         }
         
-        print(f"✅ ENHANCED REAL DASHBOARD STATS:")
-        print(f"   - Monthly Revenue: ETB {monthly_revenue} (from {len(monthly_bookings)} bookings)")
-        print(f"   - Available Schedules: {len(valid_schedules)}/{active_schedules} ({stats['schedule_stats']['completion_rate']}%)")
-        print(f"   - Bus Availability: {active_buses}/{total_buses} ({stats['maintenance_stats']['availability_rate']}%)")
+        logger.debug("✅ ENHANCED REAL DASHBOARD STATS:")
+        logger.debug("- Monthly Revenue: ETB %s (from %s bookings)", monthly_revenue, monthly_bookings_count)
+        logger.debug("- Available Schedules: %s/%s (%s%%)", len(valid_schedules), active_schedules, stats['schedule_stats']['completion_rate'])
+        logger.debug("- Bus Availability: %s/%s (%s%%)", active_buses, total_buses, stats['maintenance_stats']['availability_rate'])
         
         return jsonify(stats), 200
         
     except Exception as e:
-        print(f"❌ Enhanced dashboard stats error: {e}")
+        logger.error("❌ Enhanced dashboard stats error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/reports', methods=['GET'])
@@ -483,14 +410,9 @@ def get_reports():
         include_maintenance = request.args.get('include_maintenance', 'false').lower() == 'true'
         include_completed = request.args.get('include_completed', 'false').lower() == 'true'
         
-        print(f"🔄 Generating ENHANCED REAL {report_type} report with filtering...")
+        logger.debug("🔄 Generating ENHANCED REAL %s report with filtering...", report_type)
         
         now = datetime.utcnow()
-        base_query = {
-            'payment_status': 'paid',
-            'status': {'$in': ['completed', 'checked_in', 'confirmed', 'pending']}
-        }
-        
         # Define REAL date ranges
         if report_type == 'daily':
             start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -505,44 +427,26 @@ def get_reports():
             start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
             end_date = start_date + timedelta(days=1)
         
-        query = {**base_query, 'created_at': {'$gte': start_date, '$lt': end_date}}
-        
-        # GET REAL BOOKINGS DATA (including cancelled for complete picture)
-        all_period_bookings = list(mongo.db.bookings.find({
-            'payment_status': 'paid',
-            'created_at': {'$gte': start_date, '$lt': end_date}
-        }))
-        
-        # Filter out cancelled bookings for counts
-        bookings = [b for b in all_period_bookings if b.get('status') != 'cancelled']
+        # REAL figures for paid bookings made in the period, from the daily rollups
+        # (cancelled bookings contribute their cancellation fee to revenue only)
+        period_totals = rollup_totals(start_date, end_date)
         
-        print(f"📊 REAL DATA: Found {len(bookings)} active bookings (+ {len(all_period_bookings) - len(bookings)} cancelled) for {report_type} report")
+        logger.debug("📊 REAL DATA: Found %s active bookings (+ %s cancelled) for %s report", period_totals['paid_active_bookings'], period_totals['paid_bookings'] - period_totals['paid_active_bookings'], report_type)
         
-        # Calculate REAL statistics from actual bookings with refunds accounted
-        total_revenue = 0
-        for booking in all_period_bookings:
-            if booking.get('status') == 'cancelled':
-                total_amount = booking.get('total_amount', 0)
-                refund_amount = booking.get('refund_amount', 0)
-                if refund_amount == 0 and booking.get('expected_refund_percentage'):
-                    refund_amount = total_amount * (booking.get('expected_refund_percentage', 60) / 100)
-                cancellation_fee = total_amount - refund_amount
-                total_revenue += cancellation_fee
-            else:
-                total_revenue += booking.get('total_amount', 0)
-        
-        total_bookings = len(bookings)
+        total_revenue = period_totals['paid_revenue']
+        total_bookings = period_totals['paid_active_bookings']
         total_passengers = total_bookings  # Each booking = 1 passenger
-        total_seats = sum(len(booking.get('seat_numbers', [])) for booking in bookings)
+        total_seats = period_totals['paid_passengers']
         
         # Calculate REAL occupancy rate from actual seats
         occupancy_rate = (total_seats / (total_bookings * 50)) * 100 if total_bookings > 0 else 0
         
-        # Get REAL popular routes from actual bookings
-        route_counts = {}
-        for booking in bookings:
-            route = f"{booking.get('departure_city', 'Unknown')} → {booking.get('arrival_city', 'Unknown')}"
-            route_counts[route] = route_counts.get(route, 0) + 1
+        # Get REAL popular routes from the rollups
+        route_counts = {
+            route.replace(' - ', ' → ', 1): totals['paid_active_bookings']
+            for route, totals in rollup_series(start_date, end_date, group_by='route').items()
+            if totals['paid_active_bookings'] > 0
+        }
         
         popular_routes = [
             {'name': route_name, 'bookings': count}
@@ -565,7 +469,7 @@ def get_reports():
                 
                 # Check if we should include maintenance schedules
                 if not include_maintenance:
-                    bus_id = schedule.get('busId')
+                    bus_id = schedule.get('bus_id')
                     bus_data = None
                     if bus_id:
                         try:
@@ -616,16 +520,16 @@ def get_reports():
             'is_enhanced': True
         }
         
-        print(f"✅ ENHANCED REAL {report_type.upper()} REPORT:")
-        print(f"   - Revenue: ETB {total_revenue}")
-        print(f"   - Bookings: {total_bookings}")
-        print(f"   - Available Schedules: {available_schedules}/{total_schedules_count}")
-        print(f"   - Occupancy: {occupancy_rate}%")
+        logger.debug("✅ ENHANCED REAL %s REPORT:", report_type.upper())
+        logger.debug("- Revenue: ETB %s", total_revenue)
+        logger.debug("- Bookings: %s", total_bookings)
+        logger.debug("- Available Schedules: %s/%s", available_schedules, total_schedules_count)
+        logger.debug("- Occupancy: %s%%", occupancy_rate)
         
         return jsonify([enhanced_report]), 200
         
     except Exception as e:
-        print(f"❌ Enhanced real report error: {e}")
+        logger.error("❌ Enhanced real report error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 # =========================================================================
@@ -669,7 +573,7 @@ def get_maintenance_analytics():
         affected_schedules = []
         
         for schedule in all_schedules:
-            bus_id = schedule.get('busId')
+            bus_id = schedule.get('bus_id')
             bus_data = None
             if bus_id:
                 try:
@@ -692,7 +596,7 @@ def get_maintenance_analytics():
         return jsonify(maintenance_analysis), 200
         
     except Exception as e:
-        print(f"❌ Maintenance analytics error: {e}")
+        logger.error("❌ Maintenance analytics error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/analytics/schedule-availability', methods=['GET'])
@@ -727,7 +631,7 @@ def get_schedule_availability_analytics():
                 continue
             
             # Check maintenance status
-            bus_id = schedule.get('busId')
+            bus_id = schedule.get('bus_id')
             bus_data = None
             if bus_id:
                 try:
@@ -757,7 +661,7 @@ def get_schedule_availability_analytics():
         return jsonify(availability_analysis), 200
         
     except Exception as e:
-        print(f"❌ Schedule availability analytics error: {e}")
+        logger.error("❌ Schedule availability analytics error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 # =========================================================================
@@ -871,17 +775,10 @@ def check_driver_conflict_admin(driver_name, departure_date, schedule_id=None):
         else:
             date_obj = departure_date
         
-        # Get start and end of the day
-        start_of_day = date_obj.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_of_day = date_obj.replace(hour=23, minute=59, second=59, microsecond=999999)
-        
         # Build query to find schedules with same driver on same day
         query = {
             'driver_name': driver_name.strip(),
-            'departure_date': {
-                '$gte': start_of_day,
-                '$lte': end_of_day
-            },
+            'departure_date': day(date_obj),
             'status': {'$nin': ['cancelled', 'completed']}
         }
         
@@ -911,7 +808,7 @@ def check_driver_conflict_admin(driver_name, departure_date, schedule_id=None):
         return None  # No conflict
         
     except Exception as e:
-        print(f"❌ Error checking driver conflict: {e}")
+        logger.error("❌ Error checking driver conflict: %s", e)
         return None
 
 
@@ -950,7 +847,7 @@ def create_entity(entity):
                         # Save file
                         file.save(filepath)
                         data[f'{doc_type}_url'] = f'/{filepath}'
-                        print(f"✅ Saved {doc_type}: {filepath}")
+                        logger.debug("✅ Saved %s: %s", doc_type, filepath, extra=PER_ITEM)
                         
                         # Try to extract license info from license document
                         if doc_type == 'license_document':
@@ -959,10 +856,10 @@ def create_entity(entity):
                                 # Only auto-fill if not manually provided
                                 if not data.get('license_number') and extracted_info.get('license_number'):
                                     data['license_number'] = extracted_info['license_number']
-                                    print(f"✅ Extracted license number: {extracted_info['license_number']}")
+                                    logger.debug("✅ Extracted license number: %s", extracted_info['license_number'], extra=PER_ITEM)
                                 if not data.get('license_expiry') and extracted_info.get('expiry_date'):
                                     data['license_expiry'] = extracted_info['expiry_date']
-                                    print(f"✅ Extracted expiry date: {extracted_info['expiry_date']}")
+                                    logger.debug("✅ Extracted expiry date: %s", extracted_info['expiry_date'], extra=PER_ITEM)
                         
                         # Store file info
                         file_info = get_file_info(filepath)
@@ -1008,9 +905,9 @@ def create_entity(entity):
                 })
                 if driver:
                     data['driver_id'] = str(driver['_id'])
-                    print(f"✅ Found driver_id {data['driver_id']} for driver {driver_name}")
+                    logger.debug("✅ Found driver_id %s for driver %s", data['driver_id'], driver_name)
                 else:
-                    print(f"⚠️ Driver not found: {driver_name}")
+                    logger.warning("⚠️ Driver not found: %s", driver_name)
         
         # Add timestamps
         data['created_at'] = datetime.utcnow()
@@ -1023,16 +920,16 @@ def create_entity(entity):
             if 'password' in data and data['password']:
                 from app import bcrypt
                 data['password'] = bcrypt.generate_password_hash(data['password']).decode('utf-8')
-                print(f"✅ Password hashed for new driver")
+                logger.debug("✅ Password hashed for new driver")
         
         # Hash password for all user types (user, ticketer, operator, admin)
         if entity in ['user', 'ticketer', 'operator', 'admin']:
             if 'password' in data and data['password']:
                 from app import bcrypt
                 data['password'] = bcrypt.generate_password_hash(data['password']).decode('utf-8')
-                print(f"✅ Password hashed for new {entity}")
+                logger.debug("✅ Password hashed for new %s", entity)
         
-        result = mongo.db[collection_name].insert_one(data)
+        result = mongo.db[collection_name].insert_one(canonical_document(collection_name, data))
         created_item = mongo.db[collection_name].find_one({'_id': result.inserted_id})
         
         return jsonify(serialize_doc(created_item)), 201
@@ -1077,7 +974,7 @@ def update_entity(entity, item_id):
                         # Save file
                         file.save(filepath)
                         data[f'{doc_type}_url'] = f'/{filepath}'
-                        print(f"✅ Updated {doc_type}: {filepath}")
+                        logger.debug("✅ Updated %s: %s", doc_type, filepath, extra=PER_ITEM)
                         
                         # Try to extract license info from license document
                         if doc_type == 'license_document':
@@ -1086,10 +983,10 @@ def update_entity(entity, item_id):
                                 # Only auto-fill if not manually provided
                                 if not data.get('license_number') and extracted_info.get('license_number'):
                                     data['license_number'] = extracted_info['license_number']
-                                    print(f"✅ Extracted license number: {extracted_info['license_number']}")
+                                    logger.debug("✅ Extracted license number: %s", extracted_info['license_number'], extra=PER_ITEM)
                                 if not data.get('license_expiry') and extracted_info.get('expiry_date'):
                                     data['license_expiry'] = extracted_info['expiry_date']
-                                    print(f"✅ Extracted expiry date: {extracted_info['expiry_date']}")
+                                    logger.debug("✅ Extracted expiry date: %s", extracted_info['expiry_date'], extra=PER_ITEM)
                         
                         # Store file info
                         file_info = get_file_info(filepath)
@@ -1135,7 +1032,7 @@ def update_entity(entity, item_id):
             if 'password' in data and data['password']:
                 from app import bcrypt
                 data['password'] = bcrypt.generate_password_hash(data['password']).decode('utf-8')
-                print(f"✅ Password hashed for {entity} update")
+                logger.debug("✅ Password hashed for %s update", entity)
             else:
                 # Remove password field if empty (don't update it)
                 data.pop('password', None)
@@ -1143,7 +1040,7 @@ def update_entity(entity, item_id):
         item_id_obj = safe_object_id(item_id)
         result = mongo.db[collection_name].update_one(
             {'_id': item_id_obj},
-            {'$set': data}
+            {'$set': canonical_document(collection_name, data)}
         )
         
         if result.matched_count == 0:
@@ -1225,7 +1122,7 @@ def get_all_schedules_legacy():
                         schedule['driver_name'] = 'Not assigned'
                         schedule['driver_phone'] = None
                 except Exception as e:
-                    print(f"Error fetching driver info for schedule {schedule.get('_id')}: {e}")
+                    logger.error("Error fetching driver info for schedule %s: %s", schedule.get('_id'), e)
                     if not schedule.get('driver_name'):
                         schedule['driver_name'] = 'Not assigned'
                         schedule['driver_phone'] = None
@@ -1238,7 +1135,7 @@ def get_all_schedules_legacy():
         return jsonify({'schedules': serialized_schedules}), 200
         
     except Exception as e:
-        print(f"Error in get_all_schedules_legacy: {e}")
+        logger.error("Error in get_all_schedules_legacy: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/bookings', methods=['GET'])
@@ -1280,7 +1177,7 @@ def get_all_payments_legacy():
             'cancellation_status': 'approved'
         }))
         
-        print(f"💰 Found {len(cancelled_bookings)} approved cancelled bookings for refund calculation")
+        logger.debug("💰 Found %s approved cancelled bookings for refund calculation", len(cancelled_bookings))
         
         # Calculate total refunds
         total_refunds = 0
@@ -1294,9 +1191,9 @@ def get_all_payments_legacy():
                 refund_amount = total_amount * (expected_pct / 100)
             
             total_refunds += refund_amount
-            print(f"   📋 {pnr}: Total={total_amount} ETB, Refund={refund_amount} ETB ({expected_pct}%%)")
+            logger.debug("📋 %s: Total=%s ETB, Refund=%s ETB (%s%%)", pnr, total_amount, refund_amount, expected_pct, extra=PER_ITEM)
         
-        print(f"   ✅ Total Refunds: {total_refunds} ETB")
+        logger.debug("✅ Total Refunds: %s ETB", total_refunds)
         
         # Add refund statistics to response
         return jsonify({
@@ -1308,7 +1205,7 @@ def get_all_payments_legacy():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error in get_all_payments_legacy: {str(e)}")
+        logger.error("❌ Error in get_all_payments_legacy: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 # =========================================================================
@@ -1332,7 +1229,7 @@ def export_reports():
         start_date = data.get('start_date')
         end_date = data.get('end_date')
         
-        print(f"📊 Export request: format={format_type}, type={report_type}, dates={start_date} to {end_date}")
+        logger.debug("📊 Export request: format=%s, type=%s, dates=%s to %s", format_type, report_type, start_date, end_date)
         
         if format_type == 'csv':
             # Generate CSV data
@@ -1350,7 +1247,7 @@ def export_reports():
             return jsonify({'error': f'Unsupported format: {format_type}'}), 400
         
     except Exception as e:
-        print(f"❌ Export error: {e}")
+        logger.error("❌ Export error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 def generate_comprehensive_csv(start_date=None, end_date=None):
@@ -1451,7 +1348,7 @@ def generate_comprehensive_csv(start_date=None, end_date=None):
         return '\n'.join(csv_lines)
         
     except Exception as e:
-        print(f"❌ CSV generation error: {e}")
+        logger.error("❌ CSV generation error: %s", e)
         return f"Error generating CSV: {str(e)}"
 
 def generate_bookings_csv():
@@ -1481,8 +1378,7 @@ def get_customers():
             
             # Build comprehensive match conditions
             match_conditions = [
-                {'user_id': customer_id},  # ObjectId format
-                {'user_id': str(customer_id)},  # String format
+                {'user_id': customer_id},
             ]
             
             # Phone matching with multiple formats
@@ -1525,8 +1421,8 @@ def get_customers():
             total_refunds = 0
             cancelled_count = 0
             
-            print(f"\n💰 Calculating spending for customer: {customer.get('name')} ({customer.get('phone')})")
-            print(f"   Found {len(all_bookings)} total bookings")
+            logger.debug("💰 Calculating spending for customer: %s (%s)", customer.get('name'), customer.get('phone'), extra=PER_ITEM)
+            logger.debug("Found %s total bookings", len(all_bookings), extra=PER_ITEM)
             
             for booking in all_bookings:
                 pnr = booking.get('pnr_number', 'N/A')
@@ -1548,17 +1444,17 @@ def get_customers():
                     total_refunds += refund_amount
                     cancelled_count += 1
                     
-                    print(f"   📋 {pnr} (CANCELLED-APPROVED): Total={total_amount} ETB, Refund={refund_amount} ETB, Fee={cancellation_fee} ETB")
+                    logger.debug("📋 %s (CANCELLED-APPROVED): Total=%s ETB, Refund=%s ETB, Fee=%s ETB", pnr, total_amount, refund_amount, cancellation_fee, extra=PER_ITEM)
                 elif status == 'cancelled':
                     # Cancelled but not approved - don't count at all
-                    print(f"   📋 {pnr} (CANCELLED-NOT APPROVED): Status={cancellation_status}, Skipped")
+                    logger.debug("📋 %s (CANCELLED-NOT APPROVED): Status=%s, Skipped", pnr, cancellation_status, extra=PER_ITEM)
                     pass
                 elif status != 'cancelled':
                     # For non-cancelled bookings, count full amount
                     total_spent += total_amount
-                    print(f"   📋 {pnr} ({status.upper()}): {total_amount} ETB")
+                    logger.debug("📋 %s (%s): %s ETB", pnr, status.upper(), total_amount, extra=PER_ITEM)
             
-            print(f"   ✅ Total Spent: {total_spent} ETB, Total Refunds: {total_refunds} ETB, Cancelled: {cancelled_count}")
+            logger.debug("✅ Total Spent: %s ETB, Total Refunds: %s ETB, Cancelled: %s", total_spent, total_refunds, cancelled_count, extra=PER_ITEM)
             
             # Get last booking date from bookings
             last_booking = max([b.get('created_at') or b.get('booked_at') for b in all_bookings], default=None) if all_bookings else None
@@ -1580,9 +1476,7 @@ def get_customers():
         }), 200
 
     except Exception as e:
-        print(f"❌ Error in get_customers: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error("❌ Error in get_customers: %s", str(e), exc_info=True)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @admin_bp.route('/customer/<string:customer_id>/bookings', methods=['GET'])
@@ -1606,8 +1500,7 @@ def get_customer_bookings(customer_id):
         
         try:
             if len(customer_id) == 24:
-                match_conditions.append({'user_id': ObjectId(customer_id)})
-                match_conditions.append({'user_id': customer_id})  # String format
+                match_conditions.append({'user_id': user_ref(customer_id)})
         except:
             pass
         
@@ -1661,3 +1554,27 @@ def get_customer_bookings(customer_id):
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
+
+@admin_bp.route('/metrics', methods=['GET'])
+@jwt_required()
+def get_request_metrics():
+    """Per-endpoint latency percentiles and MongoDB queries per request (this process)"""
+    try:
+        if not is_admin():
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        sort = request.args.get('sort', 'total_time')
+        limit = request.args.get('limit', 50, type=int)
+        
+        endpoints = request_metrics.endpoint_summaries(sort=sort, limit=limit)
+        return jsonify({
+            'success': True,
+            'enabled': request_metrics.enabled,
+            'since': datetime.utcfromtimestamp(request_metrics.started_at).isoformat(),
+            'sort': sort,
+            'endpoints': endpoints
+        }), 200
+    
+    except Exception as e:
+        logger.error("❌ Error getting request metrics: %s", e, exc_info=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
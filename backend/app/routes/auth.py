@@ -1,44 +1,48 @@
+import logging
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from app import mongo, bcrypt
+from app.utils.authz import token_claims
+from app.utils.query_budget import query_budget
 from bson import ObjectId
 from datetime import datetime
 import sys
 
 auth_bp = Blueprint('auth', __name__)
+logger = logging.getLogger(__name__)
 
 @auth_bp.route('/register', methods=['POST'])
 def register():
     try:
         data = request.get_json()
-        print(f"📝 Registration attempt for: {data.get('email')}", flush=True)
-        print(f"📊 Registration data received: {list(data.keys())}", flush=True)
+        logger.debug("📝 Registration attempt for: %s", data.get('email'))
+        logger.debug("📊 Registration data received: %s", list(data.keys()))
 
         # Validate required fields
         required_fields = ['name', 'email', 'password']
         for field in required_fields:
             if not data.get(field):
-                print(f"❌ Missing required field: {field}")
+                logger.warning("❌ Missing required field: %s", field)
                 return jsonify({'message': f'{field} is required'}), 400
 
-        print("✅ All required fields present")
+        logger.debug("✅ All required fields present")
 
         # Check if user already exists
-        print(f"🔍 Checking if user exists: {data['email']}")
+        logger.debug("🔍 Checking if user exists: %s", data['email'])
         existing_user = mongo.db.users.find_one({'email': data['email']})
         if existing_user:
-            print(f"❌ User already exists: {data['email']}")
+            logger.warning("❌ User already exists: %s", data['email'])
             return jsonify({'message': 'User with this email already exists'}), 400
 
-        print("✅ User doesn't exist, proceeding with registration")
+        logger.debug("✅ User doesn't exist, proceeding with registration")
 
         # Hash password
-        print("🔐 Hashing password...")
+        logger.debug("🔐 Hashing password...")
         hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
-        print("✅ Password hashed successfully")
+        logger.debug("✅ Password hashed successfully")
 
         # Create user document with ALL required fields
-        print("📝 Creating user document...")
+        logger.debug("📝 Creating user document...")
         user = {
             'name': data['name'],
             'email': data['email'],
@@ -53,26 +57,23 @@ def register():
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
-        print("✅ User document created")
+        logger.debug("✅ User document created")
 
         # Insert user
-        print("💾 Inserting user into database...")
+        logger.debug("💾 Inserting user into database...")
         result = mongo.db.users.insert_one(user)
         user_id = str(result.inserted_id)
-        print(f"✅ User inserted with ID: {user_id}")
+        logger.debug("✅ User inserted with ID: %s", user_id)
 
         # Create access token
-        print("🎫 Creating access token...")
+        logger.debug("🎫 Creating access token...")
         access_token = create_access_token(
             identity=user_id,
-            additional_claims={
-                'email': user['email'],
-                'role': user['role']
-            }
+            additional_claims=token_claims(user)
         )
-        print("✅ Access token created")
+        logger.debug("✅ Access token created")
 
-        print(f"✅ Customer registered successfully: {user['email']}")
+        logger.debug("✅ Customer registered successfully: %s", user['email'])
 
         return jsonify({
             'access_token': access_token,
@@ -91,52 +92,47 @@ def register():
         }), 201
 
     except Exception as e:
-        import traceback
-        print(f"❌ Registration error: {str(e)}")
-        print(f"❌ Full traceback:")
-        traceback.print_exc()
+        logger.error("❌ Registration error: %s", str(e), exc_info=True)
         return jsonify({'message': 'Registration failed', 'error': str(e)}), 500
 
 
         
 @auth_bp.route('/login', methods=['POST'])
+@query_budget(3)
 def login():
     try:
         data = request.get_json()
-        print(f"🔐 Login attempt for: {data.get('email')}")
-        print(f"📊 Request data: {data}")
+        logger.debug("🔐 Login attempt for: %s", data.get('email'))
 
         # Validate required fields
         if not data.get('email') or not data.get('password'):
-            print("❌ Missing email or password")
+            logger.warning("❌ Missing email or password")
             return jsonify({'message': 'Email and password are required'}), 400
 
         # Find user
         user = mongo.db.users.find_one({'email': data['email']})
-        print(f"🔍 User found: {user is not None}")
+        logger.debug("🔍 User found: %s", user is not None)
         
         if not user:
-            print(f"❌ No user found with email: {data['email']}")
+            logger.warning("❌ No user found with email: %s", data['email'])
             return jsonify({'message': 'Invalid email or password'}), 401
 
         # Check password
         password_valid = bcrypt.check_password_hash(user['password'], data['password'])
-        print(f"🔐 Password valid: {password_valid}")
+        logger.debug("🔐 Password valid: %s", password_valid)
         
         if not password_valid:
-            print("❌ Invalid password")
+            logger.warning("❌ Invalid password")
             return jsonify({'message': 'Invalid email or password'}), 401
 
         # Create access token
+        # Role and station ride in the token, so role checks need no users query
         access_token = create_access_token(
             identity=str(user['_id']),
-            additional_claims={
-                'email': user['email'],
-                'role': user['role']
-            }
+            additional_claims=token_claims(user)
         )
 
-        print(f"✅ User logged in successfully: {user['email']}")
+        logger.debug("✅ User logged in successfully: %s", user['email'])
 
         # Build user response with loyalty data for customers
         user_response = {
@@ -167,10 +163,11 @@ def login():
         }), 200
 
     except Exception as e:
-        print(f"❌ Login error: {str(e)}")
+        logger.error("❌ Login error: %s", str(e))
         return jsonify({'message': 'Login failed', 'error': str(e)}), 500
 
 @auth_bp.route('/me', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 def get_current_user():
     try:
@@ -206,7 +203,7 @@ def get_current_user():
         return jsonify(user_response), 200
 
     except Exception as e:
-        print(f"❌ Get current user error: {str(e)}")
+        logger.error("❌ Get current user error: %s", str(e))
         return jsonify({'message': 'Failed to get user data', 'error': str(e)}), 500
 
 
@@ -218,8 +215,8 @@ def update_profile():
         current_user_id = get_jwt_identity()
         data = request.get_json()
         
-        print(f"📝 Profile update request for user: {current_user_id}")
-        print(f"📊 Update data: {data}")
+        logger.debug("📝 Profile update request for user: %s", current_user_id)
+        logger.debug("📊 Update fields: %s", sorted(data or {}))
         
         # Get user
         user = mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
@@ -283,12 +280,12 @@ def update_profile():
             user_response['free_trips_used'] = updated_user.get('free_trips_used', 0)
             user_response['tier_year_start'] = updated_user.get('tier_year_start').isoformat() if updated_user.get('tier_year_start') else None
         
-        print(f"✅ Profile updated successfully for user: {current_user_id}")
+        logger.debug("✅ Profile updated successfully for user: %s", current_user_id)
         
         return jsonify(user_response), 200
         
     except Exception as e:
-        print(f"❌ Error updating profile: {str(e)}")
+        logger.error("❌ Error updating profile: %s", str(e))
         return jsonify({'error': 'Failed to update profile'}), 500
 
 @auth_bp.route('/change-password', methods=['POST'])
@@ -299,7 +296,7 @@ def change_password():
         current_user_id = get_jwt_identity()
         data = request.get_json()
         
-        print(f"🔐 Password change request for user: {current_user_id}")
+        logger.debug("🔐 Password change request for user: %s", current_user_id)
         
         # Validate required fields
         current_password = data.get('current_password')
@@ -334,7 +331,7 @@ def change_password():
             }
         )
         
-        print(f"✅ Password changed successfully for user: {current_user_id}")
+        logger.debug("✅ Password changed successfully for user: %s", current_user_id)
         
         return jsonify({
             'success': True,
@@ -342,5 +339,5 @@ def change_password():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error changing password: {str(e)}")
+        logger.error("❌ Error changing password: %s", str(e))
         return jsonify({'error': 'Failed to change password'}), 500
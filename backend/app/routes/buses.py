@@ -1,19 +1,15 @@
+import logging
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from bson import ObjectId
 from datetime import datetime
 from app import mongo
+from app.utils.authz import is_admin
+from app.utils.query_budget import query_budget
+from app.utils.schedule_search import sync_bus, sync_schedule
 
 buses_bp = Blueprint('buses', __name__)
-
-def is_admin():
-    """Check if current user is admin"""
-    try:
-        current_user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
-        return user and user.get('role') == 'admin'
-    except:
-        return False
+logger = logging.getLogger(__name__)
 
 def is_bus_under_maintenance(bus_data):
     """Check if bus is under maintenance or inactive"""
@@ -29,7 +25,7 @@ def is_bus_under_maintenance(bus_data):
         return False
         
     except Exception as e:
-        print(f"❌ Error checking bus maintenance: {e}")
+        logger.error("❌ Error checking bus maintenance: %s", e)
         return False
 
 @buses_bp.route('/', methods=['GET'])
@@ -64,6 +60,7 @@ def get_buses():
         return jsonify({'error': str(e)}), 500
 
 @buses_bp.route('/active', methods=['GET'])
+@query_budget(1)
 def get_active_buses():
     """Get all active buses (not under maintenance)"""
     try:
@@ -191,14 +188,14 @@ def get_bus(bus_id):
         
         # Get upcoming schedules for this bus
         upcoming_schedules = list(mongo.db.busschedules.find({
-            'busId': bus_id,
+            'bus_id': bus_id,
             'departure_date': {'$gte': datetime.utcnow().strftime('%Y-%m-%d')}
         }).sort('departure_date', 1).limit(5))
         
         # Format schedules
         formatted_schedules = []
         for schedule in upcoming_schedules:
-            route = mongo.db.routes.find_one({'_id': ObjectId(schedule['routeId'])})
+            route = mongo.db.routes.find_one({'_id': ObjectId(schedule['route_id'])})
             formatted_schedule = {
                 'schedule_id': str(schedule['_id']),
                 'departure_date': schedule.get('departure_date'),
@@ -237,6 +234,8 @@ def update_bus(bus_id):
         if result.matched_count == 0:
             return jsonify({'error': 'Bus not found'}), 404
         
+        sync_bus(bus_id)
+        
         # Get updated bus
         updated_bus = mongo.db.buses.find_one({'_id': ObjectId(bus_id)})
         
@@ -278,9 +277,11 @@ def set_bus_maintenance(bus_id):
         if result.matched_count == 0:
             return jsonify({'error': 'Bus not found'}), 404
         
+        sync_bus(bus_id)
+        
         # Cancel or update upcoming schedules for this bus
         upcoming_schedules = mongo.db.busschedules.find({
-            'busId': bus_id,
+            'bus_id': bus_id,
             'departure_date': {'$gte': datetime.utcnow().strftime('%Y-%m-%d')},
             'status': 'active'
         })
@@ -296,6 +297,7 @@ def set_bus_maintenance(bus_id):
                     'updatedAt': datetime.utcnow()
                 }}
             )
+            sync_schedule(schedule['_id'])
             cancelled_count += 1
         
         return jsonify({
@@ -332,6 +334,8 @@ def activate_bus(bus_id):
         if result.matched_count == 0:
             return jsonify({'error': 'Bus not found'}), 404
         
+        sync_bus(bus_id)
+        
         return jsonify({
             'message': 'Bus activated successfully',
             'bus_id': bus_id,
@@ -405,7 +409,7 @@ def get_bus_schedules(bus_id):
         date_to = request.args.get('date_to')
         
         # Build query
-        query = {'busId': bus_id}
+        query = {'bus_id': bus_id}
         
         # Add status filter
         if status_filter != 'all':
@@ -426,7 +430,7 @@ def get_bus_schedules(bus_id):
         # Enrich with route information and booking counts
         enriched_schedules = []
         for schedule in schedules:
-            route = mongo.db.routes.find_one({'_id': ObjectId(schedule['routeId'])})
+            route = mongo.db.routes.find_one({'_id': ObjectId(schedule['route_id'])})
             
             # Get booking count for this schedule
             booking_count = mongo.db.bookings.count_documents({
@@ -518,7 +522,7 @@ def get_bus_health(bus_id):
         
         # Get recent schedules performance
         recent_schedules = list(mongo.db.busschedules.find({
-            'busId': bus_id,
+            'bus_id': bus_id,
             'departure_date': {'$gte': (datetime.utcnow() - timedelta(days=30)).strftime('%Y-%m-%d')}
         }))
         
@@ -1,11 +1,14 @@
+import logging
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from bson import ObjectId
 from app import mongo
+from app.logging import PER_ITEM
 import random 
 
 dashboard_bp = Blueprint('dashboard', __name__)
+logger = logging.getLogger(__name__)
 
 def get_user_bookings(user_id):
     """Helper function to get user bookings using ObjectId OR matching phone/email"""
@@ -34,10 +37,10 @@ def get_user_bookings(user_id):
             query['$or'].append({'passenger_email': user.get('email')})
         
         bookings = list(mongo.db.bookings.find(query))
-        print(f"✅ Found {len(bookings)} bookings for user (including counter bookings)")
+        logger.debug("✅ Found %s bookings for user (including counter bookings)", len(bookings))
         return bookings
     except Exception as e:
-        print(f"❌ Error getting user bookings: {e}")
+        logger.error("❌ Error getting user bookings: %s", e)
         return []
 
 @dashboard_bp.route('/', methods=['GET'])
@@ -88,7 +91,7 @@ def get_dashboard_overview():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error in get_dashboard_overview: {e}")
+        logger.error("❌ Error in get_dashboard_overview: %s", e)
         return jsonify({
             'success': False,
             'error': 'Failed to fetch dashboard overview'
@@ -127,25 +130,25 @@ def debug_user_bookings():
     try:
         current_user_id = get_jwt_identity()
         
-        print(f"🔍 DEBUG: Looking for bookings for user_id: {current_user_id}")
-        print(f"🔍 DEBUG: User ID type: {type(current_user_id)}")
+        logger.debug("🔍 DEBUG: Looking for bookings for user_id: %s", current_user_id)
+        logger.debug("🔍 DEBUG: User ID type: %s", type(current_user_id))
         
         # Check if user exists
         user = mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
-        print(f"🔍 DEBUG: User found: {user is not None}")
+        logger.debug("🔍 DEBUG: User found: %s", user is not None)
         
         if user:
-            print(f"🔍 DEBUG: User email: {user.get('email')}")
-            print(f"🔍 DEBUG: User name: {user.get('full_name')}")
+            logger.debug("🔍 DEBUG: User email: %s", user.get('email'))
+            logger.debug("🔍 DEBUG: User name: %s", user.get('full_name'))
         
         # Check bookings with ObjectId format
         bookings_count = mongo.db.bookings.count_documents({'user_id': ObjectId(current_user_id)})
         
-        print(f"🔍 DEBUG: Bookings count with ObjectId user_id: {bookings_count}")
+        logger.debug("🔍 DEBUG: Bookings count with ObjectId user_id: %s", bookings_count)
         
         # Get actual bookings
         user_bookings = get_user_bookings(current_user_id)
-        print(f"🔍 DEBUG: Actual bookings found: {len(user_bookings)}")
+        logger.debug("🔍 DEBUG: Actual bookings found: %s", len(user_bookings))
         
         return jsonify({
             'current_user_id': current_user_id,
@@ -155,21 +158,21 @@ def debug_user_bookings():
         }), 200
         
     except Exception as e:
-        print(f"❌ Debug error: {e}")
+        logger.error("❌ Debug error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @dashboard_bp.route('/routes', methods=['GET'])
 def get_popular_routes():
     """Get popular routes with actual schedule fares"""
     try:
-        print("🔍 Fetching popular routes from schedules...")
+        logger.debug("🔍 Fetching popular routes from schedules...")
         
         # Get all scheduled schedules (don't filter by date yet, we'll do it in Python)
         all_schedules = list(mongo.db.busschedules.find({
             'status': 'scheduled'
         }).limit(100))
         
-        print(f"📊 Found {len(all_schedules)} total scheduled trips")
+        logger.debug("📊 Found %s total scheduled trips", len(all_schedules))
         
         # Filter for upcoming schedules (handle both datetime and string dates)
         upcoming_schedules = []
@@ -194,7 +197,7 @@ def get_popular_routes():
             if departure_date >= current_date:
                 upcoming_schedules.append(schedule)
         
-        print(f"📊 Found {len(upcoming_schedules)} upcoming scheduled trips")
+        logger.debug("📊 Found %s upcoming scheduled trips", len(upcoming_schedules))
         
         # Group schedules by route (origin + destination)
         routes_map = {}
@@ -260,9 +263,7 @@ def get_popular_routes():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error in get_popular_routes: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error("❌ Error in get_popular_routes: %s", e, exc_info=True)
         return jsonify({
             'success': False,
             'error': 'Failed to fetch routes data',
@@ -289,22 +290,26 @@ def today_schedule():
         today_start = datetime.combine(today, datetime.min.time())
         today_end = datetime.combine(today, datetime.max.time())
         
-        print(f"📅 Fetching today's schedules: {today_start} to {today_end}")
+        logger.debug("📅 Fetching today's schedules: %s to %s", today_start, today_end)
         
         schedules = list(mongo.db.busschedules.aggregate([
             {
                 '$match': {
-                    'departure_date': {
-                        '$gte': today_start,
-                        '$lt': today_end
-                    },
+                    'departure_date': today.isoformat(),
                     'status': 'scheduled'
                 }
             },
+            {
+                # bus_id/route_id are stored as strings; the joined _ids are ObjectIds
+                '$addFields': {
+                    'bus_oid': {'$convert': {'input': '$bus_id', 'to': 'objectId', 'onError': None, 'onNull': None}},
+                    'route_oid': {'$convert': {'input': '$route_id', 'to': 'objectId', 'onError': None, 'onNull': None}}
+                }
+            },
             {
                 '$lookup': {
                     'from': 'buses',
-                    'localField': 'busId',
+                    'localField': 'bus_oid',
                     'foreignField': '_id',
                     'as': 'bus'
                 }
@@ -312,7 +317,7 @@ def today_schedule():
             {
                 '$lookup': {
                     'from': 'routes',
-                    'localField': 'routeId',
+                    'localField': 'route_oid',
                     'foreignField': '_id',
                     'as': 'route'
                 }
@@ -354,7 +359,7 @@ def today_schedule():
             }
         ]))
         
-        print(f"✅ Found {len(schedules)} schedules for today")
+        logger.debug("✅ Found %s schedules for today", len(schedules))
         
         # Format dates for JSON serialization
         for schedule in schedules:
@@ -369,7 +374,7 @@ def today_schedule():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error in today_schedule: {e}")
+        logger.error("❌ Error in today_schedule: %s", e)
         return jsonify({
             'success': False,
             'schedules': [],
@@ -387,12 +392,12 @@ def get_dashboard_stats():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        print(f"📊 Fetching dashboard stats for user: {current_user_id}")
+        logger.debug("📊 Fetching dashboard stats for user: %s", current_user_id)
         
         # Get user's bookings using ObjectId
         user_bookings = get_user_bookings(current_user_id)
         
-        print(f"📊 Found {len(user_bookings)} bookings for user")
+        logger.debug("📊 Found %s bookings for user", len(user_bookings))
         
         # Calculate stats
         total_bookings = len(user_bookings)
@@ -443,12 +448,12 @@ def get_dashboard_stats():
                     # Check if it's a future trip
                     if travel_date > current_time:
                         upcoming_trips += 1
-                        print(f"✅ Counting as upcoming: {booking.get('_id')} - {travel_date}")
+                        logger.debug("✅ Counting as upcoming: %s - %s", booking.get('_id'), travel_date, extra=PER_ITEM)
                     else:
                         completed_trips += 1
                         
             except Exception as date_error:
-                print(f"⚠️ Error parsing travel date for booking {booking.get('_id')}: {date_error}")
+                logger.error("⚠️ Error parsing travel date for booking %s: %s", booking.get('_id'), date_error)
                 continue
         
         # Get loyalty points from user document (actual points from loyalty system)
@@ -482,15 +487,13 @@ def get_dashboard_stats():
             'memberSince': user.get('created_at', current_time).strftime('%Y-%m-%d') if isinstance(user.get('created_at'), datetime) else '2024-01-01'
         }
         
-        print(f"✅ FINAL Dashboard stats: {stats_data}")
-        print(f"✅ Upcoming trips count: {upcoming_trips}")
+        logger.debug("✅ FINAL Dashboard stats: %s", stats_data)
+        logger.debug("✅ Upcoming trips count: %s", upcoming_trips)
         
         return jsonify(stats_data), 200
         
     except Exception as e:
-        print(f"❌ Error in get_dashboard_stats: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error("❌ Error in get_dashboard_stats: %s", e, exc_info=True)
         return jsonify({'error': 'Failed to fetch dashboard statistics'}), 500
 
 def get_loyalty_tier(points):
@@ -512,7 +515,7 @@ def get_recent_bookings():
         current_user_id = get_jwt_identity()
         limit = int(request.args.get('limit', 5))
         
-        print(f"📋 Fetching recent bookings for user: {current_user_id}, limit: {limit}")
+        logger.debug("📋 Fetching recent bookings for user: %s, limit: %s", current_user_id, limit)
         
         # Get user's bookings using ObjectId
         user_bookings = get_user_bookings(current_user_id)
@@ -523,7 +526,7 @@ def get_recent_bookings():
         # Sort by created_at and limit
         recent_bookings = sorted(user_bookings, key=lambda x: x.get('created_at', datetime.min), reverse=True)[:limit]
         
-        print(f"📋 Found {len(recent_bookings)} recent bookings")
+        logger.debug("📋 Found %s recent bookings", len(recent_bookings))
         
         bookings_data = []
         for booking in recent_bookings:
@@ -536,7 +539,7 @@ def get_recent_bookings():
                 schedule = mongo.db.busschedules.find_one({'_id': ObjectId(schedule_id)})
                 if schedule:
                     # Look up route information
-                    route_id = schedule.get('routeId')
+                    route_id = schedule.get('route_id')
                     if route_id:
                         route = mongo.db.routes.find_one({'_id': ObjectId(route_id)})
                         if route:
@@ -549,7 +552,7 @@ def get_recent_bookings():
                             }
                     
                     # 🔥 FIX: Get bus information from buses collection
-                    bus_id = schedule.get('busId') or schedule.get('bus_id')
+                    bus_id = schedule.get('bus_id')
                     if bus_id:
                         try:
                             bus = mongo.db.buses.find_one({'_id': ObjectId(bus_id)})
@@ -563,11 +566,11 @@ def get_recent_bookings():
                                 'bus_name': bus.get('bus_name'),
                                 'bus_type': bus.get('type') or bus.get('bus_type')
                             }
-                            print(f"✅ Found bus info: {bus_info}")
+                            logger.debug("✅ Found bus info: %s", bus_info, extra=PER_ITEM)
                         else:
-                            print(f"❌ Bus not found for id: {bus_id}")
+                            logger.warning("❌ Bus not found for id: %s", bus_id)
                     else:
-                        print(f"❌ No bus_id in schedule")
+                        logger.warning("❌ No bus_id in schedule")
             
             # Format dates for JSON serialization
             created_at = booking.get('created_at')
@@ -620,7 +623,7 @@ def get_recent_bookings():
                 'refund_status': booking.get('refund_status')
             }
             
-            print(f"✅ Booking {booking_data['pnr_number']} - Bus: {booking_data['bus_number']} - Passenger: {booking_data['passenger_name']}")
+            logger.debug("✅ Booking %s - Bus: %s - Passenger: %s", booking_data['pnr_number'], booking_data['bus_number'], booking_data['passenger_name'], extra=PER_ITEM)
             bookings_data.append(booking_data)
         
         return jsonify({
@@ -630,7 +633,7 @@ def get_recent_bookings():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error in get_recent_bookings: {e}")
+        logger.error("❌ Error in get_recent_bookings: %s", e)
         return jsonify({
             'success': False,
             'error': 'Failed to fetch recent bookings',
@@ -647,36 +650,36 @@ def get_upcoming_trips():
         current_user_id = get_jwt_identity()
         current_time = datetime.utcnow()
         
-        print(f"🔍 UPCOMING TRIPS - User ID: {current_user_id}")
+        logger.debug("🔍 UPCOMING TRIPS - User ID: %s", current_user_id)
         
         # Get user's bookings using ObjectId
         user_bookings = get_user_bookings(current_user_id)
-        print(f"🔍 UPCOMING TRIPS - Total user bookings: {len(user_bookings)}")
+        logger.debug("🔍 UPCOMING TRIPS - Total user bookings: %s", len(user_bookings))
         
         # Include both confirmed AND pending bookings for upcoming trips
         upcoming_bookings = [b for b in user_bookings if b.get('status') in ['confirmed', 'pending']]
-        print(f"🔍 UPCOMING TRIPS - Upcoming bookings (confirmed+pending): {len(upcoming_bookings)}")
+        logger.debug("🔍 UPCOMING TRIPS - Upcoming bookings (confirmed+pending): %s", len(upcoming_bookings))
         
         trips_data = []
         for booking in upcoming_bookings:
-            print(f"🔍 Processing booking: {booking.get('_id')} - PNR: {booking.get('pnr_number')} - Status: {booking.get('status')}")
-            print(f"🔍 Booking has cities: departure={booking.get('departure_city')}, arrival={booking.get('arrival_city')}")
+            logger.debug("🔍 Processing booking: %s - PNR: %s - Status: %s", booking.get('_id'), booking.get('pnr_number'), booking.get('status'), extra=PER_ITEM)
+            logger.debug("🔍 Booking has cities: departure=%s, arrival=%s", booking.get('departure_city'), booking.get('arrival_city'), extra=PER_ITEM)
             
             # Get schedule information
             schedule_id = booking.get('schedule_id')
             if not schedule_id:
-                print(f"❌ No schedule_id for booking {booking.get('_id')}")
+                logger.warning("❌ No schedule_id for booking %s", booking.get('_id'))
                 continue
                 
             schedule = mongo.db.busschedules.find_one({'_id': ObjectId(schedule_id)})
             if not schedule:
-                print(f"❌ Schedule not found for id: {schedule_id}")
+                logger.warning("❌ Schedule not found for id: %s", schedule_id)
                 continue
             
             # Check if this is an upcoming trip
             travel_date = schedule.get('departure_date')
             if not travel_date:
-                print(f"❌ No travel_date in schedule")
+                logger.warning("❌ No travel_date in schedule")
                 continue
             
             try:
@@ -686,21 +689,21 @@ def get_upcoming_trips():
                     else:
                         travel_date = datetime.strptime(travel_date, '%Y-%m-%d')
                 
-                print(f"🔍 Travel date: {travel_date} | Current time: {current_time}")
-                print(f"🔍 Is future? {travel_date > current_time}")
+                logger.debug("🔍 Travel date: %s | Current time: %s", travel_date, current_time, extra=PER_ITEM)
+                logger.debug("🔍 Is future? %s", travel_date > current_time, extra=PER_ITEM)
                 
                 # Only include future trips
                 if travel_date <= current_time:
-                    print(f"❌ Trip is in the past, skipping")
+                    logger.warning("❌ Trip is in the past, skipping")
                     continue
                     
             except Exception as date_error:
-                print(f"❌ Error parsing travel date: {date_error}")
+                logger.error("❌ Error parsing travel date: %s", date_error)
                 continue
             
             # Get route information
             route_info = {}
-            route_id = schedule.get('routeId')
+            route_id = schedule.get('route_id')
             if route_id:
                 route = mongo.db.routes.find_one({'_id': ObjectId(route_id)})
                 if route:
@@ -711,7 +714,7 @@ def get_upcoming_trips():
             
             # 🔥 FIX: Get bus information properly
             bus_info = {}
-            bus_id = schedule.get('busId')
+            bus_id = schedule.get('bus_id')
             if bus_id:
                 bus = mongo.db.buses.find_one({'_id': ObjectId(bus_id)})
                 if bus:
@@ -720,11 +723,11 @@ def get_upcoming_trips():
                         'bus_name': bus.get('bus_name', 'N/A'),
                         'bus_type': bus.get('bus_type', 'Standard')
                     }
-                    print(f"✅ Found bus info: {bus_info}")
+                    logger.debug("✅ Found bus info: %s", bus_info, extra=PER_ITEM)
                 else:
-                    print(f"❌ Bus not found for id: {bus_id}")
+                    logger.warning("❌ Bus not found for id: %s", bus_id)
             else:
-                print(f"❌ No bus_id in schedule")
+                logger.warning("❌ No bus_id in schedule")
             
             # Format travel date
             if isinstance(travel_date, datetime):
@@ -738,13 +741,13 @@ def get_upcoming_trips():
             route_departure = route_info.get('departure_city', 'Unknown')
             route_arrival = route_info.get('arrival_city', 'Unknown')
             
-            print(f"🔍 Booking cities: {booking_departure} → {booking_arrival}")
-            print(f"🔍 Route cities: {route_departure} → {route_arrival}")
+            logger.debug("🔍 Booking cities: %s → %s", booking_departure, booking_arrival, extra=PER_ITEM)
+            logger.debug("🔍 Route cities: %s → %s", route_departure, route_arrival, extra=PER_ITEM)
             
             departure_city = booking_departure or route_departure
             arrival_city = booking_arrival or route_arrival
             
-            print(f"🔍 Final cities: {departure_city} → {arrival_city}")
+            logger.debug("🔍 Final cities: %s → %s", departure_city, arrival_city, extra=PER_ITEM)
             
             trip_data = {
                 '_id': str(booking['_id']),
@@ -766,13 +769,13 @@ def get_upcoming_trips():
                 'bus_name': bus_info.get('bus_name', 'N/A')
             }
             
-            print(f"✅ Added upcoming trip: {trip_data['departure_city']} → {trip_data['arrival_city']} | Bus: {trip_data['bus_number']}")
+            logger.debug("✅ Added upcoming trip: %s → %s | Bus: %s", trip_data['departure_city'], trip_data['arrival_city'], trip_data['bus_number'], extra=PER_ITEM)
             trips_data.append(trip_data)
         
         # Sort by travel date
         trips_data.sort(key=lambda x: x.get('travel_date', ''))
         
-        print(f"✅ UPCOMING TRIPS - Final result: {len(trips_data)} trips")
+        logger.debug("✅ UPCOMING TRIPS - Final result: %s trips", len(trips_data))
         
         return jsonify({
             'success': True,
@@ -781,9 +784,7 @@ def get_upcoming_trips():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error in get_upcoming_trips: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error("❌ Error in get_upcoming_trips: %s", e, exc_info=True)
         return jsonify({
             'success': False,
             'upcoming_trips': [],
@@ -809,7 +810,7 @@ def get_user_bookings_for_dashboard():
                 schedule = mongo.db.busschedules.find_one({'_id': ObjectId(schedule_id)})
                 if schedule:
                     # Look up route information
-                    route_id = schedule.get('routeId')
+                    route_id = schedule.get('route_id')
                     if route_id:
                         route = mongo.db.routes.find_one({'_id': ObjectId(route_id)})
                         if route:
@@ -851,7 +852,7 @@ def get_user_bookings_for_dashboard():
         return jsonify(bookings_data), 200
         
     except Exception as e:
-        print(f"❌ Error in get_user_bookings_for_dashboard: {e}")
+        logger.error("❌ Error in get_user_bookings_for_dashboard: %s", e)
         return jsonify([]), 500
 
 @dashboard_bp.route('/health', methods=['GET'])
@@ -1,24 +1,32 @@
+import logging
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from datetime import datetime, timedelta
 from app import mongo
+from app.logging import PER_ITEM
+from app.utils.rollups import BOOKING_PROJECTION, record_booking_change
+from app.utils.booking_commit import release_booking_capacity
+from app.utils.seat_map_cache import seat_map_cache
+from app.utils.schedule_search import refresh_seat_counts, sync_schedule
+from app.utils.schema import day, day_range, schedule_ref
 
 driver_app_bp = Blueprint('driver_app', __name__)
+logger = logging.getLogger(__name__)
 
 def get_current_driver():
     """Get current driver from JWT token"""
     try:
         current_user_id = get_jwt_identity()
-        print(f"🔑 JWT Identity: {current_user_id}")
+        logger.debug("🔑 JWT Identity: %s", current_user_id)
         driver = mongo.db.users.find_one({'_id': ObjectId(current_user_id), 'role': 'driver'})
         if driver:
-            print(f"✅ Found driver: {driver.get('full_name')} (ID: {driver['_id']})")
+            logger.debug("✅ Found driver: %s (ID: %s)", driver.get('full_name'), driver['_id'])
         else:
-            print(f"❌ No driver found with ID: {current_user_id}")
+            logger.warning("❌ No driver found with ID: %s", current_user_id)
         return driver
     except Exception as e:
-        print(f"❌ Error getting current driver: {e}")
+        logger.error("❌ Error getting current driver: %s", e)
         return None
 
 def calculate_duration(departure_time, arrival_time):
@@ -57,27 +65,12 @@ def calculate_duration(departure_time, arrival_time):
         else:
             return f"{minutes}m"
     except Exception as e:
-        print(f"Error calculating duration: {e}")
+        logger.error("Error calculating duration: %s", e)
         return None
 
 def get_schedule_id_query(schedule_id):
-    """Get query for schedule_id that works with both string and ObjectId"""
-    try:
-        return {'schedule_id': schedule_id}
-    except:
-        return {'schedule_id': schedule_id}
-
-def get_schedule_id_query(schedule_id):
-    """Create a query that works with both string and ObjectId schedule_id formats"""
-    try:
-        return {
-            '$or': [
-                {'schedule_id': schedule_id},  # String format
-                {'schedule_id': ObjectId(schedule_id)}  # ObjectId format
-            ]
-        }
-    except:
-        return {'schedule_id': schedule_id}
+    """Bookings query for a schedule (schedule_id is stored as a string)"""
+    return {'schedule_id': schedule_ref(schedule_id)}
 
 # ==================== DEBUG ====================
 @driver_app_bp.route('/debug/info', methods=['GET'])
@@ -120,9 +113,7 @@ def debug_driver_info():
         }), 200
         
     except Exception as e:
-        print(f"❌ Debug error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error("❌ Debug error: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 # ==================== DASHBOARD ====================
@@ -139,49 +130,39 @@ def get_driver_stats():
         now = datetime.utcnow()
         today = now.replace(hour=0, minute=0, second=0, microsecond=0)
         today_str = today.strftime('%Y-%m-%d')
-        tomorrow_str = (today + timedelta(days=1)).strftime('%Y-%m-%d')
         
-        print(f"📊 Getting stats for driver: {driver_id}")
-        print(f"📅 Today: {today_str}")
+        logger.debug("📊 Getting stats for driver: %s", driver_id)
+        logger.debug("📅 Today: %s", today_str)
         
         # Get ALL trips for this driver to debug
         all_trips = list(mongo.db.busschedules.find({'driver_id': driver_id}))
-        print(f"🔍 Total trips found for driver: {len(all_trips)}")
+        logger.debug("🔍 Total trips found for driver: %s", len(all_trips))
         
-        # Get today's trips - handle both string and datetime formats
+        # Get today's trips
         today_trips = list(mongo.db.busschedules.find({
             'driver_id': driver_id,
-            '$or': [
-                {'departure_date': {'$gte': today, '$lt': today + timedelta(days=1)}},
-                {'departure_date': {'$gte': today_str, '$lt': tomorrow_str}}
-            ]
+            'departure_date': today_str
         }))
         
-        print(f"📅 Today's trips: {len(today_trips)}")
+        logger.debug("📅 Today's trips: %s", len(today_trips))
         
         # Get upcoming trips (next 7 days)
         week_from_now_str = (today + timedelta(days=7)).strftime('%Y-%m-%d')
         upcoming_trips = list(mongo.db.busschedules.find({
             'driver_id': driver_id,
-            '$or': [
-                {'departure_date': {'$gte': today, '$lt': today + timedelta(days=7)}},
-                {'departure_date': {'$gte': today_str, '$lt': week_from_now_str}}
-            ]
+            'departure_date': {'$gte': today_str, '$lt': week_from_now_str}
         }).sort('departure_date', 1))
         
-        print(f"📅 Upcoming trips (7 days): {len(upcoming_trips)}")
+        logger.debug("📅 Upcoming trips (7 days): %s", len(upcoming_trips))
         
         # Get active trip (currently in progress)
         active_trip = mongo.db.busschedules.find_one({
             'driver_id': driver_id,
             'status': {'$in': ['departed', 'active', 'in_progress']},
-            '$or': [
-                {'departure_date': {'$lte': now}},
-                {'departure_date': {'$lte': today_str}}
-            ]
+            'departure_date': {'$lte': today_str}
         })
         
-        print(f"🚌 Active trip: {active_trip['_id'] if active_trip else 'None'}")
+        logger.debug("🚌 Active trip: %s", active_trip['_id'] if active_trip else 'None')
         
         # Calculate total passengers for today
         total_passengers_today = 0
@@ -195,26 +176,23 @@ def get_driver_stats():
             total_passengers_today += len(bookings)
             checked_in_today += len([b for b in bookings if b.get('status') == 'checked_in'])
         
-        print(f"👥 Total passengers today: {total_passengers_today}")
+        logger.debug("👥 Total passengers today: %s", total_passengers_today)
         
         # Get monthly stats
         month_start = today.replace(day=1)
         month_start_str = month_start.strftime('%Y-%m-%d')
         monthly_trips = mongo.db.busschedules.count_documents({
             'driver_id': driver_id,
-            '$or': [
-                {'departure_date': {'$gte': month_start}},
-                {'departure_date': {'$gte': month_start_str}}
-            ],
+            'departure_date': {'$gte': month_start_str},
             'status': {'$in': ['completed', 'departed', 'arrived']}
         })
         
-        print(f"📊 Monthly completed trips: {monthly_trips}")
+        logger.debug("📊 Monthly completed trips: %s", monthly_trips)
         
         # Prepare active trip info with route details
         active_trip_info = None
         if active_trip:
-            route_id = active_trip.get('routeId') or active_trip.get('route_id')
+            route_id = active_trip.get('route_id')
             route = None
             if route_id:
                 try:
@@ -247,14 +225,12 @@ def get_driver_stats():
             }
         }
         
-        print(f"✅ Stats response: {stats}")
+        logger.debug("✅ Stats response: %s", stats)
         
         return jsonify(stats), 200
         
     except Exception as e:
-        print(f"❌ Dashboard stats error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error("❌ Dashboard stats error: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 # ==================== TRIPS ====================
@@ -314,7 +290,7 @@ def get_driver_trips():
         }), 200
         
     except Exception as e:
-        print(f"❌ Get driver trips error: {e}")
+        logger.error("❌ Get driver trips error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @driver_app_bp.route('/trips/active', methods=['GET'])
@@ -328,92 +304,32 @@ def get_active_trip():
         
         driver_id = str(driver['_id'])
         
-        print(f"🔍 Looking for active trip for driver: {driver_id}")
-        
-        # DEBUG: Check if test schedule exists
-        test_schedule = mongo.db.busschedules.find_one({'_id': ObjectId('691e10717be2deb203bcab48')})
-        if test_schedule:
-            print(f"🧪 Test schedule exists: driver_id={test_schedule.get('driver_id')}, status={test_schedule.get('status')}, date={test_schedule.get('departure_date')}")
-        
-        # First, try to find any trip assigned to this driver
-        all_driver_trips = list(mongo.db.busschedules.find({'driver_id': driver_id}))
-        print(f"📊 Total trips for driver: {len(all_driver_trips)}")
+        logger.debug("🔍 Looking for active trip for driver: %s", driver_id)
         
         now = datetime.utcnow()
         today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = today_start + timedelta(days=1)
-        
-        if all_driver_trips:
-            for trip in all_driver_trips:
-                dep_date = trip.get('departure_date')
-                # Handle both string and datetime formats
-                if isinstance(dep_date, str):
-                    try:
-                        from dateutil import parser
-                        dep_date_dt = parser.parse(dep_date)
-                    except:
-                        dep_date_dt = None
-                else:
-                    dep_date_dt = dep_date
-                
-                is_today = today_start <= dep_date_dt < today_end if dep_date_dt else False
-                print(f"  - Trip {trip.get('_id')}: status={trip.get('status')}, date={dep_date} (type: {type(dep_date).__name__}), is_today={is_today}")
+        today_str = day(now)
         
         # Strategy 1: Find currently in-progress trip (already started) - must be today or earlier
-        
+        # departure_date is a 'YYYY-MM-DD' string (see app.utils.schema), so date
+        # filters are plain indexable comparisons with no Python-side parsing
         active_trip = mongo.db.busschedules.find_one({
             'driver_id': driver_id,
             'status': {'$in': ['boarding', 'departed', 'active', 'in_progress']},
-            'departure_date': {'$lte': now}  # Only trips from today or earlier
+            'departure_date': {'$lte': today_str}
         })
         
         # Strategy 2: Find today's trip that's within 2 hours of departure
         if not active_trip:
-            today_end = today_start + timedelta(days=1)
-            
-            print(f"⏰ Current time: {now}")
-            print(f"📅 Looking for trips today between {today_start} and {today_end}")
+            logger.debug("⏰ Current time: %s", now)
             
-            # Get all trips for this driver with today's status
-            # We'll filter by date manually since departure_date might be string or datetime
-            query_filter = {
+            todays_trips = list(mongo.db.busschedules.find({
                 'driver_id': driver_id,
-                'status': {'$in': ['scheduled', 'boarding', 'departed', 'active', 'in_progress']}
-            }
-            todays_trips = list(mongo.db.busschedules.find(query_filter))
-            
-            print(f"📋 Found {len(todays_trips)} trips with valid status")
-            print(f"🔍 Query filter: {query_filter}")
-            
-            # Filter to only today's trips (handle both string and datetime)
-            filtered_trips = []
-            for trip in todays_trips:
-                dep_date = trip.get('departure_date')
-                dep_date_original = dep_date
-                
-                print(f"  🔍 Checking trip {trip.get('_id')}: departure_date={dep_date} (type: {type(dep_date).__name__})")
-                
-                # Convert string to datetime if needed
-                if isinstance(dep_date, str):
-                    try:
-                        from dateutil import parser
-                        dep_date = parser.parse(dep_date)
-                        print(f"     ✅ Parsed string to datetime: {dep_date}")
-                    except Exception as e:
-                        print(f"     ❌ Failed to parse: {e}")
-                        continue
-                
-                # Check if it's today
-                if dep_date:
-                    is_today = today_start <= dep_date < today_end
-                    print(f"     📅 Is today? {is_today} (comparing {dep_date} with {today_start} to {today_end})")
-                    if is_today:
-                        filtered_trips.append(trip)
-                        print(f"     ✅ Added to filtered trips")
-            
-            todays_trips = filtered_trips
+                'status': {'$in': ['scheduled', 'boarding', 'departed', 'active', 'in_progress']},
+                'departure_date': today_str
+            }).sort('departure_time', 1))
             
-            print(f"📋 Found {len(todays_trips)} trips for today")
+            logger.debug("📋 Found %s trips for today", len(todays_trips))
             
             # Filter trips that are within 2 hours before departure
             for trip in todays_trips:
@@ -445,12 +361,12 @@ def get_active_trip():
                             minute=departure_minute
                         )
                     
-                    print(f"  - Trip {trip.get('_id')}: departure = {departure_datetime}")
+                    logger.debug("- Trip %s: departure = %s", trip.get('_id'), departure_datetime, extra=PER_ITEM)
                     
                     # Calculate time difference
                     time_until_departure = (departure_datetime - now).total_seconds() / 3600  # in hours
                     
-                    print(f"    ⏱️  Time until departure: {time_until_departure:.2f} hours")
+                    logger.debug("⏱️  Time until departure: %s hours", format(time_until_departure, ".2f"), extra=PER_ITEM)
                     
                     # Show trip if:
                     # - Status is scheduled and departure is within next 2 hours
@@ -460,25 +376,23 @@ def get_active_trip():
                     if trip_status == 'scheduled':
                         # For scheduled trips, show if within reasonable window (departed up to 24 hours ago or departing in next 2 hours)
                         if -24 <= time_until_departure <= 2:
-                            print(f"    ✅ This trip is active (scheduled, within time window)")
+                            logger.debug("✅ This trip is active (scheduled, within time window)", extra=PER_ITEM)
                             active_trip = trip
                             break
                         else:
-                            print(f"    ⏭️  Trip not in active window yet")
+                            logger.debug("⏭️  Trip not in active window yet", extra=PER_ITEM)
                     else:
                         # For trips with other statuses (boarding, departed, etc.), always show them
-                        print(f"    ✅ This trip is active (status: {trip_status})")
+                        logger.debug("✅ This trip is active (status: %s)", trip_status, extra=PER_ITEM)
                         active_trip = trip
                         break
                         
                 except Exception as time_error:
-                    print(f"    ⚠️  Error parsing time: {time_error}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.error("⚠️  Error parsing time: %s", time_error, exc_info=True)
                     continue
         
         if not active_trip:
-            print("❌ No trips found for this driver at all")
+            logger.warning("❌ No trips found for this driver at all")
             return jsonify({
                 'success': True,
                 'trip': None,
@@ -486,14 +400,14 @@ def get_active_trip():
                 'message': 'No active trip found'
             }), 200
         
-        print(f"✅ Found trip: {active_trip.get('_id')} with status: {active_trip.get('status')}")
+        logger.debug("✅ Found trip: %s with status: %s", active_trip.get('_id'), active_trip.get('status'))
         
         # Serialize trip
         from app.routes.operator import serialize_document
         trip_data = serialize_document(active_trip)
         
         # Get route information
-        route_id = active_trip.get('routeId') or active_trip.get('route_id')
+        route_id = active_trip.get('route_id')
         if route_id:
             try:
                 route = mongo.db.routes.find_one({'_id': ObjectId(route_id)})
@@ -506,10 +420,10 @@ def get_active_trip():
                     trip_data['distance_km'] = route.get('distance_km', 0)
                     trip_data['total_distance_km'] = route.get('distance_km', 0)
             except Exception as route_error:
-                print(f"⚠️ Error fetching route: {route_error}")
+                logger.error("⚠️ Error fetching route: %s", route_error)
         
         # Get bus information
-        bus_id = active_trip.get('busId') or active_trip.get('bus_id')
+        bus_id = active_trip.get('bus_id')
         if bus_id:
             try:
                 bus = mongo.db.buses.find_one({'_id': ObjectId(bus_id)})
@@ -521,7 +435,7 @@ def get_active_trip():
                         'type': bus.get('type')
                     }
             except Exception as bus_error:
-                print(f"⚠️ Error fetching bus: {bus_error}")
+                logger.error("⚠️ Error fetching bus: %s", bus_error)
         
         # Add passenger count
         passenger_count = mongo.db.bookings.count_documents({
@@ -535,7 +449,7 @@ def get_active_trip():
         if not trip_data.get('departure_time'):
             trip_data['departure_time'] = active_trip.get('departure_time') or 'N/A'
         
-        print(f"📦 Returning trip data: {trip_data.get('_id')}")
+        logger.debug("📦 Returning trip data: %s", trip_data.get('_id'))
         
         return jsonify({
             'success': True,
@@ -544,9 +458,7 @@ def get_active_trip():
         }), 200
         
     except Exception as e:
-        print(f"❌ Get active trip error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error("❌ Get active trip error: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @driver_app_bp.route('/trips/upcoming', methods=['GET'])
@@ -564,7 +476,7 @@ def get_upcoming_trips():
         # Get trips from now to next 30 days
         trips = list(mongo.db.busschedules.find({
             'driver_id': driver_id,
-            'departure_date': {'$gte': now, '$lt': now + timedelta(days=30)},
+            'departure_date': day_range(now, 30),
             'status': {'$in': ['scheduled', 'delayed']}
         }).sort('departure_date', 1))
         
@@ -572,7 +484,7 @@ def get_upcoming_trips():
         for trip in trips:
             # Safely get route
             route = None
-            route_id = trip.get('routeId') or trip.get('route_id')
+            route_id = trip.get('route_id')
             if route_id:
                 try:
                     route = mongo.db.routes.find_one({'_id': ObjectId(route_id)})
@@ -581,7 +493,7 @@ def get_upcoming_trips():
             
             # Safely get bus
             bus = None
-            bus_id = trip.get('busId') or trip.get('bus_id')
+            bus_id = trip.get('bus_id')
             if bus_id:
                 try:
                     bus = mongo.db.buses.find_one({'_id': ObjectId(bus_id)})
@@ -648,7 +560,7 @@ def get_trip_details(trip_id):
         
         # Get route and bus details safely
         route = None
-        route_id = trip.get('routeId') or trip.get('route_id')
+        route_id = trip.get('route_id')
         if route_id:
             try:
                 route = mongo.db.routes.find_one({'_id': ObjectId(route_id)})
@@ -656,7 +568,7 @@ def get_trip_details(trip_id):
                 route = mongo.db.routes.find_one({'_id': route_id})
         
         bus = None
-        bus_id = trip.get('busId') or trip.get('bus_id')
+        bus_id = trip.get('bus_id')
         if bus_id:
             try:
                 bus = mongo.db.buses.find_one({'_id': ObjectId(bus_id)})
@@ -728,9 +640,7 @@ def get_trip_details(trip_id):
         return jsonify(trip_details), 200
         
     except Exception as e:
-        print(f"❌ Get trip details error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error("❌ Get trip details error: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @driver_app_bp.route('/trips/<trip_id>/passengers', methods=['GET'])
@@ -758,7 +668,7 @@ def get_trip_passengers(trip_id):
             travel_datetime = datetime.strptime(f"{travel_date} {departure_time}", '%Y-%m-%d %H:%M')
             checkin_opens_at = travel_datetime - timedelta(hours=24)
         except Exception as e:
-            print(f"Error parsing trip time: {e}")
+            logger.error("Error parsing trip time: %s", e)
         
         # Query bookings by both string and ObjectId formats
         query = get_schedule_id_query(trip_id)
@@ -880,10 +790,10 @@ def checkin_passenger(trip_id):
             
             # Allow check-in even after departure (for late arrivals) but log a warning
             if now > travel_datetime:
-                print(f"⚠️ Late check-in: Passenger checking in after departure time")
+                logger.warning("⚠️ Late check-in: Passenger checking in after departure time")
                 
         except Exception as e:
-            print(f"Error validating check-in time: {e}")
+            logger.error("Error validating check-in time: %s", e)
             # Continue with check-in if time validation fails
         
         # Update booking status
@@ -896,6 +806,7 @@ def checkin_passenger(trip_id):
                 'checked_in_by': str(driver['_id'])
             }}
         )
+        record_booking_change(booking)
         
         return jsonify({
             'message': 'Passenger checked in successfully',
@@ -926,9 +837,15 @@ def mark_no_show(trip_id):
         if not trip or trip.get('driver_id') != str(driver['_id']):
             return jsonify({'error': 'Unauthorized'}), 403
         
+        booking = mongo.db.bookings.find_one(
+            {'_id': ObjectId(booking_id), 'schedule_id': trip_id}, {**BOOKING_PROJECTION, 'schedule_id': 1}
+        )
+        if not booking:
+            return jsonify({'error': 'Booking not found'}), 404
+        
         # Update booking status
         result = mongo.db.bookings.update_one(
-            {'_id': ObjectId(booking_id)},
+            {'_id': ObjectId(booking_id), 'status': booking.get('status')},
             {'$set': {
                 'status': 'no_show',
                 'no_show_marked_at': datetime.utcnow(),
@@ -939,6 +856,11 @@ def mark_no_show(trip_id):
         if result.modified_count == 0:
             return jsonify({'error': 'Booking not found'}), 404
         
+        record_booking_change(booking)
+        release_booking_capacity(booking)
+        seat_map_cache.invalidate(trip_id)
+        refresh_seat_counts(trip_id)
+        
         return jsonify({'message': 'Passenger marked as no-show'}), 200
         
     except Exception as e:
@@ -985,6 +907,7 @@ def update_trip_status(trip_id):
             {'_id': ObjectId(trip_id)},
             {'$set': update_data}
         )
+        sync_schedule(trip_id)
         
         return jsonify({
             'message': f'Trip status updated to {new_status}',
@@ -1062,9 +985,10 @@ def start_trip(trip_id):
             }}
         )
         
-        print(f"🚀 Trip {trip_id} started by driver {driver.get('name')}")
-        print(f"   - Status changed to 'departed' (On Route)")
-        print(f"   - Modified count: {result.modified_count}")
+        logger.debug("🚀 Trip %s started by driver %s", trip_id, driver.get('name'))
+        logger.debug("- Status changed to 'departed' (On Route)")
+        logger.debug("- Modified count: %s", result.modified_count)
+        sync_schedule(trip_id)
         
         return jsonify({
             'success': True,
@@ -1075,7 +999,7 @@ def start_trip(trip_id):
         }), 200
         
     except Exception as e:
-        print(f"❌ Start trip error: {e}")
+        logger.error("❌ Start trip error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @driver_app_bp.route('/trips/<trip_id>/can-start', methods=['GET'])
@@ -1142,7 +1066,7 @@ def can_start_trip(trip_id):
         }), 200
         
     except Exception as e:
-        print(f"❌ Can start trip check error: {e}")
+        logger.error("❌ Can start trip check error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @driver_app_bp.route('/trips/<trip_id>/complete', methods=['POST'])
@@ -1167,13 +1091,17 @@ def complete_trip(trip_id):
             }}
         )
         
-        print(f"✅ Trip {trip_id} completed - modified count: {result.modified_count}")
+        logger.debug("✅ Trip %s completed - modified count: %s", trip_id, result.modified_count)
+        sync_schedule(trip_id)
         
         # Mark all confirmed bookings as completed
+        checked_in = list(mongo.db.bookings.find({'schedule_id': trip_id, 'status': 'checked_in'}, BOOKING_PROJECTION))
         mongo.db.bookings.update_many(
             {'schedule_id': trip_id, 'status': 'checked_in'},
             {'$set': {'status': 'completed'}}
         )
+        for booking in checked_in:
+            record_booking_change(booking, dict(booking, status='completed'))
         
         return jsonify({'message': 'Trip completed successfully'}), 200
         
@@ -1240,7 +1168,7 @@ def submit_bus_report():
         # Insert report
         result = mongo.db.bus_reports.insert_one(report)
         
-        print(f"✅ Bus report submitted: {report['title']} (ID: {result.inserted_id})")
+        logger.debug("✅ Bus report submitted: %s (ID: %s)", report['title'], result.inserted_id)
         
         return jsonify({
             'message': 'Report submitted successfully',
@@ -1248,7 +1176,7 @@ def submit_bus_report():
         }), 201
         
     except Exception as e:
-        print(f"❌ Error submitting bus report: {str(e)}")
+        logger.error("❌ Error submitting bus report: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 @driver_app_bp.route('/bus-reports', methods=['GET'])
@@ -1289,7 +1217,7 @@ def get_bus_reports():
         return jsonify({'reports': serialized_reports}), 200
         
     except Exception as e:
-        print(f"❌ Error fetching bus reports: {str(e)}")
+        logger.error("❌ Error fetching bus reports: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 # ==================== SCHEDULES ====================
@@ -1315,19 +1243,15 @@ def get_driver_schedules():
         else:
             end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
         
-        # Query with both field name formats
         schedules = list(mongo.db.busschedules.find({
             'driver_id': str(driver['_id']),
-            '$or': [
-                {'departure_date': {'$gte': start_date, '$lte': end_date}},
-                {'departure_date': {'$gte': start_date.strftime('%Y-%m-%d'), '$lte': end_date.strftime('%Y-%m-%d')}}
-            ]
-        }).sort([('departure_date', 1), ('departure_date', 1)]))
+            'departure_date': {'$gte': day(start_date), '$lte': day(end_date)}
+        }).sort([('departure_date', 1), ('departure_time', 1)]))
         
         enriched_schedules = []
         for schedule in schedules:
             # Get route
-            route_id = schedule.get('routeId') or schedule.get('route_id')
+            route_id = schedule.get('route_id')
             route = None
             if route_id:
                 try:
@@ -1336,7 +1260,7 @@ def get_driver_schedules():
                     route = mongo.db.routes.find_one({'_id': route_id})
             
             # Get bus - try by ID first, then by bus_number
-            bus_id = schedule.get('busId') or schedule.get('bus_id')
+            bus_id = schedule.get('bus_id')
             bus = None
             if bus_id:
                 try:
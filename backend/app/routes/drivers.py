@@ -3,18 +3,11 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from datetime import datetime, timedelta
 from app import mongo
+from app.utils.authz import is_admin
+from app.utils.schedule_search import sync_schedule
 
 drivers_bp = Blueprint('drivers', __name__)
 
-def is_admin():
-    """Check if current user is admin"""
-    try:
-        current_user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
-        return user and user.get('role') == 'admin'
-    except:
-        return False
-
 @drivers_bp.route('/assignments', methods=['GET'])
 @jwt_required()
 def get_driver_assignments():
@@ -96,8 +89,8 @@ def assign_driver_to_route():
         assignment = {
             'driver_id': driver_id,
             'schedule_id': schedule_id,
-            'route_id': schedule['routeId'],
-            'bus_id': schedule['busId'],
+            'route_id': schedule.get('route_id'),
+            'bus_id': schedule.get('bus_id'),
             'assigned_date': datetime.utcnow(),
             'assigned_by': get_jwt_identity(),
             'status': 'active'
@@ -114,6 +107,7 @@ def assign_driver_to_route():
                 'assignment_status': 'assigned'
             }}
         )
+        sync_schedule(schedule_id)
         
         return jsonify({
             'message': 'Driver assigned successfully',
@@ -267,6 +261,7 @@ def remove_assignment(assignment_id):
                 'assignment_status': 'unassigned'
             }}
         )
+        sync_schedule(assignment['schedule_id'])
         
         return jsonify({'message': 'Assignment removed successfully'}), 200
         
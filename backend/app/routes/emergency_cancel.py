@@ -10,20 +10,15 @@ from datetime import datetime
 import logging
 
 from app import mongo
+from app.utils.authz import is_admin
+from app.utils.rollups import record_booking_change
+from app.utils.seat_map_cache import seat_map_cache
+from app.utils.schedule_search import sync_schedule
+from app.utils.schema import schedule_ref
 
 emergency_bp = Blueprint('emergency', __name__)
 logger = logging.getLogger(__name__)
 
-def is_admin():
-    """Check if current user is admin"""
-    try:
-        current_user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
-        return user and user.get('role') == 'admin'
-    except Exception as e:
-        logger.error(f"Admin check error: {e}")
-        return False
-
 @emergency_bp.route('/schedules/<schedule_id>/emergency-cancel', methods=['POST'])
 @jwt_required()
 def emergency_cancel_schedule(schedule_id):
@@ -63,12 +58,12 @@ def emergency_cancel_schedule(schedule_id):
         
         # Get all bookings for this schedule
         bookings = list(mongo.db.bookings.find({
-            'schedule_id': ObjectId(schedule_id),
+            'schedule_id': schedule_ref(schedule_id),
             'status': {'$in': ['confirmed', 'pending', 'checked_in']},
             'payment_status': 'paid'
         }))
         
-        logger.info(f"🚨 Emergency cancellation: Schedule {schedule_id}, {len(bookings)} bookings affected")
+        logger.info("🚨 Emergency cancellation: Schedule %s, %s bookings affected", schedule_id, len(bookings))
         
         # Calculate total refund amount
         total_refund_amount = 0
@@ -99,6 +94,7 @@ def emergency_cancel_schedule(schedule_id):
                         }
                     }
                 )
+                record_booking_change(booking)
                 
                 # Create refund record
                 refund_record = {
@@ -128,16 +124,19 @@ def emergency_cancel_schedule(schedule_id):
                     'refund_amount': refund_amount
                 })
                 
-                logger.info(f"✅ Refunded booking {booking.get('pnr_number')}: {refund_amount} ETB")
+                logger.info("✅ Refunded booking %s: %s ETB", booking.get('pnr_number'), refund_amount)
                 
             except Exception as e:
-                logger.error(f"❌ Failed to refund booking {booking.get('_id')}: {e}")
+                logger.error("❌ Failed to refund booking %s: %s", booking.get('_id'), e)
                 failed_refunds.append({
                     'booking_id': str(booking.get('_id')),
                     'pnr_number': booking.get('pnr_number'),
                     'error': str(e)
                 })
         
+        # Every booking on this schedule changed; reload its seat map on next read
+        seat_map_cache.invalidate(schedule_id)
+        
         # Calculate total seats to restore
         total_seats_to_restore = sum(len(b.get('seat_numbers', [])) for b in bookings)
         
@@ -161,8 +160,9 @@ def emergency_cancel_schedule(schedule_id):
                 }
             }
         )
+        sync_schedule(schedule_id)
         
-        logger.info(f"✅ Schedule {schedule_id} cancelled. Total refund: {total_refund_amount} ETB")
+        logger.info("✅ Schedule %s cancelled. Total refund: %s ETB", schedule_id, total_refund_amount)
         
         # TODO: Send notifications to passengers
         # - Email notification
@@ -184,7 +184,7 @@ def emergency_cancel_schedule(schedule_id):
         }), 200
         
     except Exception as e:
-        logger.error(f"❌ Emergency cancellation error: {e}")
+        logger.error("❌ Emergency cancellation error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -218,5 +218,5 @@ def get_refund_summary(schedule_id):
         }), 200
         
     except Exception as e:
-        logger.error(f"Error getting refund summary: {e}")
+        logger.error("Error getting refund summary: %s", e)
         return jsonify({'error': str(e)}), 500
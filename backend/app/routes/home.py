@@ -1,7 +1,9 @@
+import logging
 from flask import Blueprint, jsonify
 from datetime import datetime
 
 home_bp = Blueprint('home', __name__)
+logger = logging.getLogger(__name__)
 
 # Cache for frequently accessed data (simple in-memory cache)
 _home_cache = {
@@ -28,7 +30,7 @@ def get_popular_routes():
     try:
         # Check cache first
         if _home_cache['routes'] and is_cache_valid():
-            print("✅ Serving routes from cache")
+            logger.debug("✅ Serving routes from cache")
             return jsonify(_home_cache['routes'])
         
         from app import mongo
@@ -60,11 +62,11 @@ def get_popular_routes():
         _home_cache['routes'] = formatted_routes
         _home_cache['last_updated'] = datetime.utcnow()
         
-        print(f"✅ Found {len(formatted_routes)} routes from database")
+        logger.debug("✅ Found %s routes from database", len(formatted_routes))
         return jsonify(formatted_routes)
         
     except Exception as e:
-        print(f"❌ Error fetching routes from DB, using fallback: {e}")
+        logger.error("❌ Error fetching routes from DB, using fallback: %s", e)
         # Fallback Ethiopian routes - always available
         ethiopian_routes = get_fallback_routes()
         return jsonify(ethiopian_routes)
@@ -75,9 +77,9 @@ def get_trips_count_for_route(route_id):
         from app import mongo
         db = mongo.db
         count = db.busschedules.count_documents({
-            'routeId': route_id,
+            'route_id': str(route_id),
             'status': 'scheduled',
-            'departure_date': {'$gte': datetime.utcnow()}
+            'departure_date': {'$gte': datetime.utcnow().strftime('%Y-%m-%d')}
         })
         return max(count, 4)  # Minimum 4 trips for display
     except:
@@ -155,7 +157,7 @@ def get_stats():
     try:
         # Check cache first
         if _home_cache['stats'] and is_cache_valid():
-            print("✅ Serving stats from cache")
+            logger.debug("✅ Serving stats from cache")
             return jsonify(_home_cache['stats'])
         
         from app import mongo
@@ -190,7 +192,7 @@ def get_stats():
         return jsonify(stats_data)
         
     except Exception as e:
-        print(f"❌ Error fetching stats from DB, using fallback: {e}")
+        logger.error("❌ Error fetching stats from DB, using fallback: %s", e)
         return jsonify({
             "travelers": 50000,
             "monthly_travelers": 4500,
@@ -216,7 +218,7 @@ def get_cities():
     try:
         # Check cache first
         if _home_cache['cities'] and is_cache_valid():
-            print("✅ Serving cities from cache")
+            logger.debug("✅ Serving cities from cache")
             return jsonify(_home_cache['cities'])
         
         from app import mongo
@@ -234,11 +236,11 @@ def get_cities():
         _home_cache['cities'] = all_cities
         _home_cache['last_updated'] = datetime.utcnow()
         
-        print(f"✅ Found {len(all_cities)} cities from database")
+        logger.debug("✅ Found %s cities from database", len(all_cities))
         return jsonify(all_cities)
         
     except Exception as e:
-        print(f"❌ Error fetching cities from DB, using fallback: {e}")
+        logger.error("❌ Error fetching cities from DB, using fallback: %s", e)
         ethiopian_cities = get_fallback_cities()
         return jsonify(ethiopian_cities)
 
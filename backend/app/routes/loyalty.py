@@ -3,6 +3,7 @@ Loyalty System API Routes
 Handles loyalty points, tier benefits, and rewards
 """
 
+import logging
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
@@ -14,7 +15,11 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import mongo
+from app.utils.authz import role_required
+from app.utils.query_budget import query_budget
+from app.utils.rollups import record_booking_change
 from app.utils.loyalty import (
+    accrue_points,
     get_loyalty_tier,
     get_tier_benefits,
     calculate_loyalty_points,
@@ -25,6 +30,7 @@ from app.utils.loyalty import (
     generate_referral_code,
     calculate_referral_bonus,
     get_tier_progress,
+    get_stored_policy,
     clear_policy_cache
 )
 
@@ -51,8 +57,10 @@ def serialize_doc(doc):
     return doc
 
 loyalty_bp = Blueprint('loyalty', __name__, url_prefix='/api/loyalty')
+logger = logging.getLogger(__name__)
 
 @loyalty_bp.route('/benefits', methods=['GET'])
+@query_budget(3)
 @jwt_required()
 def get_user_benefits():
     """Get current user's loyalty tier and benefits"""
@@ -94,7 +102,7 @@ def get_user_benefits():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error getting benefits: {str(e)}")
+        logger.error("❌ Error getting benefits: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 @loyalty_bp.route('/apply-discount', methods=['POST'])
@@ -105,34 +113,34 @@ def apply_tier_discount():
         user_id = get_jwt_identity()
         data = request.get_json()
         
-        print(f"💰 Apply discount request from user: {user_id}")
-        print(f"📦 Request data: {data}")
+        logger.debug("💰 Apply discount request from user: %s", user_id)
+        logger.debug("📦 Request data: %s", data)
         
         base_price = data.get('base_price')
         if not base_price:
-            print("❌ No base_price provided")
+            logger.warning("❌ No base_price provided")
             return jsonify({'error': 'Base price is required'}), 400
         
         user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
         if not user:
-            print(f"❌ User not found: {user_id}")
+            logger.warning("❌ User not found: %s", user_id)
             return jsonify({'error': 'User not found'}), 404
         
         loyalty_points = user.get('loyalty_points', 0)
         tier = get_loyalty_tier(loyalty_points)
         benefits = get_tier_benefits(tier)
         
-        print(f"👤 User: {user.get('name')}")
-        print(f"⭐ Loyalty points: {loyalty_points}")
-        print(f"🏆 Tier: {tier}")
-        print(f"💎 Discount percentage: {benefits['discount_percentage']}%")
+        logger.debug("👤 User: %s", user.get('name'))
+        logger.debug("⭐ Loyalty points: %s", loyalty_points)
+        logger.debug("🏆 Tier: %s", tier)
+        logger.debug("💎 Discount percentage: %s%%", benefits['discount_percentage'])
         
         discount_amount = calculate_discount_amount(base_price, tier)
         final_price = base_price - discount_amount
         
-        print(f"💵 Base price: {base_price} ETB")
-        print(f"💰 Discount amount: {discount_amount} ETB")
-        print(f"✅ Final price: {final_price} ETB")
+        logger.debug("💵 Base price: %s ETB", base_price)
+        logger.debug("💰 Discount amount: %s ETB", discount_amount)
+        logger.debug("✅ Final price: %s ETB", final_price)
         
         response_data = {
             'success': True,
@@ -143,12 +151,12 @@ def apply_tier_discount():
             'final_price': final_price
         }
         
-        print(f"📤 Sending response: {response_data}")
+        logger.debug("📤 Sending response: %s", response_data)
         
         return jsonify(response_data), 200
         
     except Exception as e:
-        print(f"❌ Error applying discount: {str(e)}")
+        logger.error("❌ Error applying discount: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 @loyalty_bp.route('/check-free-trip', methods=['POST'])
@@ -184,7 +192,7 @@ def check_free_trip_eligibility():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error checking free trip: {str(e)}")
+        logger.error("❌ Error checking free trip: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 @loyalty_bp.route('/redeem-free-trip', methods=['POST'])
@@ -223,6 +231,7 @@ def redeem_free_trip():
                 'payment_status': 'paid'
             }}
         )
+        record_booking_change(booking)
         
         # Update user's free trips
         free_trips_used = user.get('free_trips_used', 0) + 1
@@ -243,7 +252,7 @@ def redeem_free_trip():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error redeeming free trip: {str(e)}")
+        logger.error("❌ Error redeeming free trip: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 @loyalty_bp.route('/claim-birthday-bonus', methods=['POST'])
@@ -262,19 +271,18 @@ def claim_birthday_bonus():
             return jsonify({'error': result['reason']}), 400
         
         bonus_points = result['bonus_points']
-        current_points = user.get('loyalty_points', 0)
-        new_points = current_points + bonus_points
-        new_tier = get_loyalty_tier(new_points)
+        current_year = datetime.utcnow().year
         
-        # Update user
-        mongo.db.users.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$set': {
-                'loyalty_points': new_points,
-                'loyalty_tier': new_tier,
-                'birthday_bonus_claimed_year': datetime.utcnow().year
-            }}
+        # Update user; the year check in the filter stops a second claim racing this one
+        accrual = accrue_points(
+            user_id, bonus_points,
+            match={'birthday_bonus_claimed_year': {'$not': {'$gte': current_year}}},
+            set_fields={'birthday_bonus_claimed_year': current_year}
         )
+        if not accrual:
+            return jsonify({'error': 'Birthday bonus already claimed this year'}), 400
+        new_points = accrual['loyalty_points']
+        new_tier = accrual['loyalty_tier']
         
         return jsonify({
             'success': True,
@@ -285,7 +293,7 @@ def claim_birthday_bonus():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error claiming birthday bonus: {str(e)}")
+        logger.error("❌ Error claiming birthday bonus: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 @loyalty_bp.route('/generate-referral-code', methods=['POST'])
@@ -327,7 +335,7 @@ def create_referral_code():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error generating referral code: {str(e)}")
+        logger.error("❌ Error generating referral code: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 @loyalty_bp.route('/apply-referral', methods=['POST'])
@@ -359,34 +367,21 @@ def apply_referral_code():
         if bonus_points == 0:
             return jsonify({'error': 'Referrer tier does not offer referral bonus'}), 400
         
-        # Update referrer
-        referrer_new_points = referrer.get('loyalty_points', 0) + bonus_points
-        referrer_new_tier = get_loyalty_tier(referrer_new_points)
-        
-        mongo.db.users.update_one(
-            {'_id': referrer['_id']},
-            {
-                '$set': {
-                    'loyalty_points': referrer_new_points,
-                    'loyalty_tier': referrer_new_tier
-                },
-                '$inc': {'total_referrals': 1}
-            }
-        )
-        
-        # Update current user (referee gets 50 bonus points)
+        # Update current user first (referee gets 50 bonus points); the filter
+        # stops a second referral racing this one
         referee_bonus = 50
-        current_user_points = current_user.get('loyalty_points', 0) + referee_bonus
-        current_user_tier = get_loyalty_tier(current_user_points)
-        
-        mongo.db.users.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$set': {
-                'referred_by': referrer['_id'],
-                'loyalty_points': current_user_points,
-                'loyalty_tier': current_user_tier
-            }}
+        referee = accrue_points(
+            user_id, referee_bonus,
+            match={'referred_by': None},
+            set_fields={'referred_by': referrer['_id']}
         )
+        if not referee:
+            return jsonify({'error': 'You have already used a referral code'}), 400
+        current_user_points = referee['loyalty_points']
+        current_user_tier = referee['loyalty_tier']
+        
+        # Update referrer
+        accrue_points(referrer['_id'], bonus_points, inc={'total_referrals': 1})
         
         return jsonify({
             'success': True,
@@ -398,7 +393,7 @@ def apply_referral_code():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error applying referral: {str(e)}")
+        logger.error("❌ Error applying referral: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 @loyalty_bp.route('/history', methods=['GET'])
@@ -430,23 +425,16 @@ def get_loyalty_history():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error getting loyalty history: {str(e)}")
+        logger.error("❌ Error getting loyalty history: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 
 # Admin endpoints
 @loyalty_bp.route('/admin/stats', methods=['GET'])
-@jwt_required()
+@role_required('admin', error='Unauthorized')
 def get_admin_loyalty_stats():
     """Get loyalty program statistics for admin"""
     try:
-        user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
-        
-        # Check if user is admin
-        if not user or user.get('role') != 'admin':
-            return jsonify({'error': 'Unauthorized'}), 403
-        
         # Get all customers
         customers = list(mongo.db.users.find({'role': 'customer'}))
         
@@ -481,21 +469,14 @@ def get_admin_loyalty_stats():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error getting admin stats: {str(e)}")
+        logger.error("❌ Error getting admin stats: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 @loyalty_bp.route('/admin/customers', methods=['GET'])
-@jwt_required()
+@role_required('admin', error='Unauthorized')
 def get_admin_loyalty_customers():
     """Get all customers with loyalty data for admin"""
     try:
-        user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
-        
-        # Check if user is admin
-        if not user or user.get('role') != 'admin':
-            return jsonify({'error': 'Unauthorized'}), 403
-        
         # Get filter parameters
         tier_filter = request.args.get('tier')
         
@@ -514,22 +495,16 @@ def get_admin_loyalty_customers():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error getting admin customers: {str(e)}")
+        logger.error("❌ Error getting admin customers: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 @loyalty_bp.route('/admin/customer/<customer_id>/adjust-points', methods=['POST'])
-@jwt_required()
-def adjust_customer_points():
+@role_required('admin', error='Unauthorized')
+def adjust_customer_points(customer_id):
     """Manually adjust customer loyalty points (admin only)"""
     try:
         user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
-        
-        # Check if user is admin
-        if not user or user.get('role') != 'admin':
-            return jsonify({'error': 'Unauthorized'}), 403
         
-        customer_id = request.view_args['customer_id']
         data = request.get_json()
         
         points_adjustment = data.get('points_adjustment')
@@ -538,24 +513,13 @@ def adjust_customer_points():
         if points_adjustment is None:
             return jsonify({'error': 'Points adjustment is required'}), 400
         
-        # Get customer
-        customer = mongo.db.users.find_one({'_id': ObjectId(customer_id)})
-        if not customer:
+        # Apply the adjustment and recompute the tier in one write (points never go negative)
+        accrual = accrue_points(customer_id, points_adjustment)
+        if not accrual:
             return jsonify({'error': 'Customer not found'}), 404
-        
-        # Calculate new points
-        current_points = customer.get('loyalty_points', 0)
-        new_points = max(0, current_points + points_adjustment)  # Don't allow negative points
-        new_tier = get_loyalty_tier(new_points)
-        
-        # Update customer
-        mongo.db.users.update_one(
-            {'_id': ObjectId(customer_id)},
-            {'$set': {
-                'loyalty_points': new_points,
-                'loyalty_tier': new_tier
-            }}
-        )
+        current_points = accrual['previous_points']
+        new_points = accrual['loyalty_points']
+        new_tier = accrual['loyalty_tier']
         
         # Log the adjustment
         mongo.db.loyalty_adjustments.insert_one({
@@ -577,29 +541,24 @@ def adjust_customer_points():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error adjusting points: {str(e)}")
+        logger.error("❌ Error adjusting points: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 @loyalty_bp.route('/admin/policy', methods=['GET'])
-@jwt_required()
+@role_required('admin', error='Unauthorized')
 def get_loyalty_policy():
     """Get loyalty program policy (admin only)"""
     try:
         user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
-        
-        # Check if user is admin
-        if not user or user.get('role') != 'admin':
-            return jsonify({'error': 'Unauthorized'}), 403
         
         # Check if policy exists in database
-        stored_policy_doc = mongo.db.loyalty_policy.find_one({'_id': 'current_policy'})
+        stored_policy = get_stored_policy()
         
-        if stored_policy_doc and 'policy' in stored_policy_doc:
+        if stored_policy:
             # Return stored policy
             return jsonify({
                 'success': True,
-                'policy': stored_policy_doc['policy']
+                'policy': stored_policy
             }), 200
         
         # If no policy exists, create default policy
@@ -639,8 +598,9 @@ def get_loyalty_policy():
             'updated_at': datetime.utcnow(),
             'created_at': datetime.utcnow()
         })
+        clear_policy_cache()
         
-        print(f"✅ Default loyalty policy initialized in database")
+        logger.debug("✅ Default loyalty policy initialized in database")
         
         return jsonify({
             'success': True,
@@ -648,20 +608,15 @@ def get_loyalty_policy():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error getting policy: {str(e)}")
+        logger.error("❌ Error getting policy: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 @loyalty_bp.route('/admin/policy', methods=['PUT'])
-@jwt_required()
+@role_required('admin', error='Unauthorized')
 def update_loyalty_policy():
     """Update loyalty program policy (admin only)"""
     try:
         user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
-        
-        # Check if user is admin
-        if not user or user.get('role') != 'admin':
-            return jsonify({'error': 'Unauthorized'}), 403
         
         data = request.get_json()
         policy = data.get('policy')
@@ -680,10 +635,10 @@ def update_loyalty_policy():
             upsert=True
         )
         
-        # Clear the policy cache so new policy takes effect immediately
+        # Bump the policy version so every worker reloads it
         clear_policy_cache()
         
-        print(f"✅ Loyalty policy updated and cache cleared")
+        logger.debug("✅ Loyalty policy updated and cache cleared")
         
         return jsonify({
             'success': True,
@@ -691,5 +646,5 @@ def update_loyalty_policy():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error updating policy: {str(e)}")
+        logger.error("❌ Error updating policy: %s", str(e))
         return jsonify({'error': str(e)}), 500
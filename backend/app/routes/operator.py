@@ -3,6 +3,15 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from bson import ObjectId
 from app import mongo
+from app.logging import PER_ITEM
+from app.utils.authz import has_role, is_admin, user_changed
+from app.utils.booking_commit import release_booking_capacity
+from app.utils.config_cache import config_cache, find_tariff_rate, find_tariff_rates
+from app.utils.query_budget import query_budget
+from app.utils.seat_map_cache import seat_map_cache
+from app.utils.rollups import daily_series, record_booking_change, rollup_series, rollup_totals
+from app.utils.schedule_search import occupancy_by_day, refresh_seat_counts, seat_occupancy_rate, sync_schedule
+from app.utils.schema import canonical_document, day, day_span
 import logging
 
 operator_bp = Blueprint('operator', __name__)
@@ -11,23 +20,7 @@ logger = logging.getLogger(__name__)
 # Utility Functions
 def is_operator_or_admin():
     """Check if current user is operator, driver or admin"""
-    try:
-        current_user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
-        return user and user.get('role') in ['operator', 'admin', 'driver']
-    except Exception as e:
-        logger.error(f"Role check error: {e}")
-        return False
-
-def is_admin():
-    """Check if current user is admin"""
-    try:
-        current_user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
-        return user and user.get('role') == 'admin'
-    except Exception as e:
-        logger.error(f"Admin check error: {e}")
-        return False
+    return has_role('operator', 'admin', 'driver')
 
 def get_current_user_data():
     """Get current user data"""
@@ -35,7 +28,7 @@ def get_current_user_data():
         current_user_id = get_jwt_identity()
         return mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
     except Exception as e:
-        logger.error(f"Error getting current user: {e}")
+        logger.error("Error getting current user: %s", e)
         return None
 
 def serialize_document(doc):
@@ -72,7 +65,7 @@ def calculate_date_range(timeframe):
     now = datetime.utcnow()
     today = now.replace(hour=0, minute=0, second=0, microsecond=0)
     
-    print(f"📅 Calculating range for: {timeframe}, Today: {today.date()}")
+    logger.debug("📅 Calculating range for: %s, Today: %s", timeframe, today.date())
     
     if timeframe == 'week':
         # CURRENT WEEK: Monday to Sunday of current week
@@ -88,7 +81,7 @@ def calculate_date_range(timeframe):
         start_date = today
         end_date = today + timedelta(days=1)
     
-    print(f"📅 Date range: {start_date.date()} to {end_date.date()}")
+    logger.debug("📅 Date range: %s to %s", start_date.date(), end_date.date())
     
     return start_date, end_date
 
@@ -134,40 +127,22 @@ def get_revenue_analysis():
         for timeframe in timeframes:
             start_date, end_date = calculate_date_range(timeframe)
             
-            # Get bookings CREATED in this timeframe
-            bookings = list(mongo.db.bookings.find({
-                'created_at': {
-                    '$gte': start_date,
-                    '$lt': end_date
-                }
-            }))
-            
-            # Calculate metrics
-            total_bookings_count = len(bookings)
-            total_revenue = sum(b.get('total_amount', 0) for b in bookings)
-            confirmed_revenue = sum(b.get('total_amount', 0) for b in bookings if b.get('status') != 'cancelled')
-            
-            # Calculate actual revenue from cancelled bookings (cancellation fees only)
-            cancelled_bookings_list = [b for b in bookings if b.get('status') == 'cancelled']
-            cancelled_revenue_lost = 0  # Total refunded
-            cancellation_fees_earned = 0  # Fees we keep
+            # Pre-aggregated figures for bookings CREATED in this timeframe
+            totals = rollup_totals(start_date, end_date)
             
-            for booking in cancelled_bookings_list:
-                total_amount = booking.get('total_amount', 0)
-                refund_amount = booking.get('refund_amount', 0)
-                if refund_amount == 0 and booking.get('expected_refund_percentage'):
-                    refund_amount = total_amount * (booking.get('expected_refund_percentage', 60) / 100)
-                cancellation_fee = total_amount - refund_amount
-                cancelled_revenue_lost += refund_amount
-                cancellation_fees_earned += cancellation_fee
+            total_bookings_count = totals['bookings']
+            total_revenue = totals['gross_amount']
+            confirmed_revenue = totals['confirmed_amount']
+            cancelled_revenue_lost = totals['refunds']  # Total refunded
+            cancellation_fees_earned = totals['cancellation_fees']  # Fees we keep
             
             # Net revenue = confirmed bookings + cancellation fees
-            net_revenue = confirmed_revenue + cancellation_fees_earned
+            net_revenue = totals['revenue']
             
             # Count bookings by status
-            confirmed_bookings = len([b for b in bookings if b.get('status') in ['confirmed', 'pending']])
-            checked_in_bookings = len([b for b in bookings if b.get('status') in ['checked_in', 'completed']])
-            cancelled_bookings = len(cancelled_bookings_list)
+            confirmed_bookings = totals['pending']
+            checked_in_bookings = totals['checked_in']
+            cancelled_bookings = totals['cancelled']
             
             analysis[timeframe] = {
                 'date_range': f"{start_date.strftime('%Y-%m-%d')} to {(end_date - timedelta(days=1)).strftime('%Y-%m-%d')}",
@@ -194,7 +169,7 @@ def get_revenue_analysis():
         }), 200
         
     except Exception as e:
-        logger.error(f"Revenue analysis error: {e}")
+        logger.error("Revenue analysis error: %s", e)
         return jsonify({'error': f'Failed to fetch revenue analysis: {str(e)}'}), 500
 
 
@@ -210,7 +185,7 @@ def quick_checkin():
         data = request.get_json()
         pnr_number = data.get('pnr_number')
         
-        print(f"🎫 Quick check-in attempt for PNR: {pnr_number}")
+        logger.debug("🎫 Quick check-in attempt for PNR: %s", pnr_number)
         
         if not pnr_number:
             return jsonify({'error': 'PNR number is required'}), 400
@@ -221,7 +196,7 @@ def quick_checkin():
         if not booking:
             return jsonify({'error': 'Booking not found. Please check PNR number.'}), 404
         
-        print(f"✅ Booking found: {booking.get('_id')}, Status: {booking.get('status')}")
+        logger.debug("✅ Booking found: %s, Status: %s", booking.get('_id'), booking.get('status'))
         
         # Check current status
         current_status = booking.get('status')
@@ -262,7 +237,7 @@ def quick_checkin():
                     time_until_departure = departure_datetime - current_datetime
                     hours_until_departure = time_until_departure.total_seconds() / 3600
                     
-                    print(f"⏰ Check-in timing: {hours_until_departure:.2f} hours until departure")
+                    logger.debug("⏰ Check-in timing: %s hours until departure", format(hours_until_departure, ".2f"))
                     
                     # BLOCK: If departure has already passed
                     if hours_until_departure <= 0:
@@ -291,19 +266,19 @@ def quick_checkin():
                     # ALLOW with WARNING: If departure is more than 24 hours away (early check-in)
                     if hours_until_departure > 24:
                         check_in_warning = f'⚠️ Early check-in - Departure is in {round(hours_until_departure, 1)} hours. Passenger can check in now.'
-                        print(f"ℹ️ {check_in_warning}")
+                        logger.debug("ℹ️ %s", check_in_warning)
                     
                     # ALLOW: Check-in is within optimal window (6-24 hours) - no warning needed
                     # ALLOW with WARNING: If departure is soon (2-6 hours)
                     elif hours_until_departure <= 6:
                         check_in_warning = f'⚠️ Departure is in {round(hours_until_departure, 1)} hours - Passenger should arrive soon!'
-                        print(f"⚠️ {check_in_warning}")
+                        logger.warning("⚠️ %s", check_in_warning)
                     
                 except ValueError as ve:
-                    print(f"⚠️ Invalid date/time format: {ve}")
+                    logger.warning("⚠️ Invalid date/time format: %s", ve)
                     # Continue with check-in if date parsing fails (backward compatibility)
             else:
-                print(f"⚠️ Missing travel_date or departure_time - skipping time validation")
+                logger.warning("⚠️ Missing travel_date or departure_time - skipping time validation")
         
         # Update booking status
         current_time = datetime.now()
@@ -332,8 +307,9 @@ def quick_checkin():
         
         # Get updated booking
         updated_booking = mongo.db.bookings.find_one({'pnr_number': pnr_number.upper()})
+        record_booking_change(booking, updated_booking)
         
-        print(f"✅ Status updated: {current_status} → {new_status}")
+        logger.debug("✅ Status updated: %s → %s", current_status, new_status)
         
         # Prepare response
         response_data = {
@@ -352,7 +328,7 @@ def quick_checkin():
         return jsonify(response_data), 200
         
     except Exception as e:
-        print(f"❌ Quick checkin error: {e}")
+        logger.error("❌ Quick checkin error: %s", e)
         return jsonify({'error': f'Quick check-in failed: {str(e)}'}), 500
 
 @operator_bp.route('/bookings/<booking_id>/cancel', methods=['POST'])
@@ -366,7 +342,7 @@ def cancel_booking(booking_id):
         data = request.get_json() or {}
         reason = data.get('reason', 'Cancelled by operator')
         
-        print(f"🛑 Cancelling booking: {booking_id}")
+        logger.debug("🛑 Cancelling booking: %s", booking_id)
         
         booking_oid = validate_object_id(booking_id)
         booking = mongo.db.bookings.find_one({'_id': booking_oid})
@@ -375,7 +351,7 @@ def cancel_booking(booking_id):
             return jsonify({'error': 'Booking not found'}), 404
         
         current_status = booking.get('status')
-        print(f"📋 Current booking status: {current_status}")
+        logger.debug("📋 Current booking status: %s", current_status)
         
         # Check if booking can be cancelled
         cancellable_statuses = ['pending', 'confirmed']
@@ -392,15 +368,15 @@ def cancel_booking(booking_id):
         refund_amount = round(total_amount * refund_percentage, 2)
         cancellation_fee = round(total_amount - refund_amount, 2)
         
-        print(f"💰 Refund calculation:")
-        print(f"   - Total Amount: ETB {total_amount}")
-        print(f"   - Refund (60%): ETB {refund_amount}")
-        print(f"   - Cancellation Fee (40%): ETB {cancellation_fee}")
+        logger.debug("💰 Refund calculation:")
+        logger.debug("- Total Amount: ETB %s", total_amount)
+        logger.debug("- Refund (60%%): ETB %s", refund_amount)
+        logger.debug("- Cancellation Fee (40%%): ETB %s", cancellation_fee)
         
         # Update booking status to cancelled
         current_time = datetime.now()
         update_result = mongo.db.bookings.update_one(
-            {'_id': booking_oid},
+            {'_id': booking_oid, 'status': current_status},
             {
                 '$set': {
                     'status': 'cancelled',
@@ -421,11 +397,16 @@ def cancel_booking(booking_id):
         if update_result.modified_count == 0:
             return jsonify({'error': 'Failed to cancel booking'}), 500
         
+        release_booking_capacity(booking)
+        seat_map_cache.booking_released(booking)
+        refresh_seat_counts(booking.get('schedule_id'))
+        
         # Get updated booking
         updated_booking = mongo.db.bookings.find_one({'_id': booking_oid})
+        record_booking_change(booking, updated_booking)
         
-        print(f"✅ Booking cancelled successfully: {booking_id}")
-        print(f"   - Refund Amount: ETB {refund_amount}")
+        logger.debug("✅ Booking cancelled successfully: %s", booking_id)
+        logger.debug("- Refund Amount: ETB %s", refund_amount)
         
         return jsonify({
             'success': True,
@@ -442,10 +423,11 @@ def cancel_booking(booking_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Cancel booking error: {e}")
+        logger.error("Cancel booking error: %s", e)
         return jsonify({'error': f'Failed to cancel booking: {str(e)}'}), 500
 
 @operator_bp.route('/checkin/pending', methods=['GET'])
+@query_budget(1)
 @jwt_required()
 def get_pending_checkins():
     """Get pending check-ins for UPCOMING TRAVEL DATES (next 7 days)"""
@@ -458,7 +440,7 @@ def get_pending_checkins():
         next_week = today + timedelta(days=7)
         next_week_str = next_week.strftime('%Y-%m-%d')
         
-        print(f"🔍 Looking for pending checkins for travel dates: {today_str} to {next_week_str}")
+        logger.debug("🔍 Looking for pending checkins for travel dates: %s to %s", today_str, next_week_str)
         
         # Get bookings for the next 7 days
         pending_checkins = list(mongo.db.bookings.find({
@@ -470,7 +452,7 @@ def get_pending_checkins():
             'check_in_status': {'$ne': 'checked_in'}  # Exclude already checked in
         }).sort([('travel_date', 1), ('departure_time', 1)]))
         
-        print(f"✅ Found {len(pending_checkins)} pending checkins for next 7 days")
+        logger.debug("✅ Found %s pending checkins for next 7 days", len(pending_checkins))
         
         formatted_checkins = []
         for checkin in pending_checkins:
@@ -499,7 +481,7 @@ def get_pending_checkins():
                     else:
                         checkin_message = f'Departs in {int(hours_until)}h {int((hours_until % 1) * 60)}m'
             except Exception as e:
-                print(f"Error calculating check-in time: {e}")
+                logger.error("Error calculating check-in time: %s", e)
             
             formatted_checkins.append({
                 '_id': str(checkin['_id']),
@@ -534,7 +516,7 @@ def get_pending_checkins():
         }), 200
         
     except Exception as e:
-        logger.error(f"Pending checkins error: {e}")
+        logger.error("Pending checkins error: %s", e)
         return jsonify({'error': f'Failed to fetch pending check-ins: {str(e)}'}), 500
 
 @operator_bp.route('/checkin/today', methods=['GET'])
@@ -583,12 +565,13 @@ def get_todays_checkins():
         }), 200
         
     except Exception as e:
-        logger.error(f"Today's checkins error: {e}")
+        logger.error("Today's checkins error: %s", e)
         return jsonify({'error': f'Failed to fetch today\'s check-ins: {str(e)}'}), 500
 
 # ==================== BOOKING MANAGEMENT ====================
 
 @operator_bp.route('/bookings', methods=['GET'])
+@query_budget(1)
 @jwt_required()
 def get_bookings():
     """Get all bookings for operator with timeframe filtering based on created_at"""
@@ -610,7 +593,7 @@ def get_bookings():
         if timeframe:
             start_date, end_date = calculate_date_range(timeframe)
             
-            print(f"📅 Filtering bookings by CREATED timeframe: {timeframe} ({start_date.date()} to {end_date.date()})")
+            logger.debug("📅 Filtering bookings by CREATED timeframe: %s (%s to %s)", timeframe, start_date.date(), end_date.date())
             
             query['created_at'] = {
                 '$gte': start_date,
@@ -620,9 +603,9 @@ def get_bookings():
         if schedule_id:
             query['schedule_id'] = schedule_id
         
-        print(f"📋 Bookings query: {query}")
+        logger.debug("📋 Bookings query: %s", query)
         bookings = list(mongo.db.bookings.find(query).sort('created_at', -1))
-        print(f"📊 Found {len(bookings)} bookings")
+        logger.debug("📊 Found %s bookings", len(bookings))
         
         # Enhanced serialization with status information
         enhanced_bookings = []
@@ -641,7 +624,7 @@ def get_bookings():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get bookings error: {e}")
+        logger.error("Get bookings error: %s", e)
         return jsonify({'error': f'Failed to fetch bookings: {str(e)}'}), 500
 
 @operator_bp.route('/bookings/lookup', methods=['GET'])
@@ -701,12 +684,13 @@ def lookup_booking():
         }), 200
         
     except Exception as e:
-        logger.error(f"Booking lookup error: {e}")
+        logger.error("Booking lookup error: %s", e)
         return jsonify({'error': f'Booking lookup failed: {str(e)}'}), 500
 
 # ==================== DASHBOARD ENDPOINTS ====================
 
 @operator_bp.route('/dashboard/stats', methods=['GET'])
+@query_budget(13)
 @jwt_required()
 def get_operator_dashboard_stats():
     """Get operator dashboard statistics - BASED ON CREATED DATE"""
@@ -716,131 +700,42 @@ def get_operator_dashboard_stats():
         
         timeframe = request.args.get('timeframe', 'today')
         
-        print(f"📊 Dashboard stats for timeframe: {timeframe} - BASED ON CREATED DATE")
+        logger.debug("📊 Dashboard stats for timeframe: %s - BASED ON CREATED DATE", timeframe)
         
         # Calculate date range for CREATED DATE
         start_date, end_date = calculate_date_range(timeframe)
         
-        print(f"📅 Date range for created_at: {start_date} to {end_date}")
-        
-        # Get bookings based on CREATED DATE (when they were booked)
-        # Also include bookings without created_at field (legacy bookings)
-        query = {
-            '$or': [
-                {
-                    'created_at': {
-                        '$gte': start_date,
-                        '$lt': end_date
-                    }
-                },
-                {
-                    'created_at': {'$exists': False},
-                    'travel_date': {
-                        '$gte': start_date.strftime('%Y-%m-%d'),
-                        '$lte': end_date.strftime('%Y-%m-%d')
-                    }
-                }
-            ]
-        }
-        
-        print(f"📋 Query: {query}")
-        
-        timeframe_bookings = list(mongo.db.bookings.find(query))
-        
-        print(f"📋 Found {len(timeframe_bookings)} bookings CREATED in timeframe {timeframe}")
+        logger.debug("📅 Date range for created_at: %s to %s", start_date, end_date)
         
-        # Debug: Show all bookings in DB
-        all_bookings = list(mongo.db.bookings.find({}))
-        print(f"📊 Total bookings in database: {len(all_bookings)}")
-        for b in all_bookings:
-            print(f"   - PNR: {b.get('pnr_number')}, created_at: {b.get('created_at')}, travel_date: {b.get('travel_date')}")
+        # Booking figures for the period come from the daily rollups (by CREATED DATE;
+        # bookings without created_at count on their booked_at/travel_date)
+        totals = rollup_totals(start_date, end_date)
         
         # Calculate stats - ALL bookings created in the timeframe
-        period_checkins = len([b for b in timeframe_bookings if b.get('status') in ['checked_in', 'completed']])
-        pending_checkins = len([b for b in timeframe_bookings if b.get('status') in ['confirmed', 'pending']])
-        period_bookings_count = len(timeframe_bookings)
-        
-        # Calculate revenue - include ALL bookings created in the period
-        # For cancelled bookings, subtract the refund amount (keep the cancellation fee)
-        period_revenue = 0
-        for booking in timeframe_bookings:
-            if booking.get('status') == 'cancelled':
-                # For cancelled bookings, only count the cancellation fee (not the refund)
-                total_amount = booking.get('total_amount', 0)
-                refund_amount = booking.get('refund_amount', 0)
-                # If refund_amount is not set, calculate from expected percentage
-                if refund_amount == 0 and booking.get('expected_refund_percentage'):
-                    refund_amount = total_amount * (booking.get('expected_refund_percentage', 60) / 100)
-                # Revenue is total minus refund (i.e., the cancellation fee we keep)
-                cancellation_fee = total_amount - refund_amount
-                period_revenue += cancellation_fee
-            else:
-                # For non-cancelled bookings, count full amount
-                period_revenue += booking.get('total_amount', 0)
-        
-        # Count completed and cancelled trips created in the period
-        completed_trips = len([b for b in timeframe_bookings if b.get('status') == 'completed'])
-        cancelled_trips = len([b for b in timeframe_bookings if b.get('status') == 'cancelled'])
-        
-        print(f"📊 Detailed counts for {timeframe} (CREATED DATE):")
-        print(f"   - Total bookings created: {period_bookings_count}")
-        print(f"   - Checked in: {period_checkins}")
-        print(f"   - Pending: {pending_checkins}")
-        print(f"   - Completed: {completed_trips}")
-        print(f"   - Cancelled: {cancelled_trips}")
-        print(f"   - Revenue generated: {period_revenue}")
+        period_checkins = totals['checked_in']
+        pending_checkins = totals['pending']
+        period_bookings_count = totals['bookings']
         
-        # Get ALL schedules for occupancy calculation
-        all_schedules = list(mongo.db.busschedules.find({}))
+        # Revenue: full amount for active bookings, cancellation fee for cancelled ones
+        period_revenue = totals['revenue']
         
-        print(f"🚌 Found {len(all_schedules)} total schedules")
-        
-        # Calculate overall occupancy rate (all time)
-        total_seats = 0
-        booked_seats = 0
+        # Count completed and cancelled trips created in the period
+        completed_trips = totals['completed']
+        cancelled_trips = totals['cancelled']
         
-        for schedule in all_schedules:
-            schedule_id = str(schedule['_id'])
-            schedule_seats = schedule.get('total_seats', 45)
-            total_seats += schedule_seats
-            
-            # Count bookings for this schedule
-            schedule_bookings = mongo.db.bookings.count_documents({
-                'schedule_id': schedule_id,
-                'status': {'$ne': 'cancelled'}
-            })
-            booked_seats += min(schedule_bookings, schedule_seats)
+        logger.debug("📊 %s (CREATED DATE): %s bookings, %s checked in, %s pending, %s cancelled, revenue %s", timeframe, period_bookings_count, period_checkins, pending_checkins, cancelled_trips, period_revenue)
         
-        occupancy_rate = round((booked_seats / total_seats * 100), 1) if total_seats > 0 else 0
+        # Overall occupancy rate (all departures) from the schedule search read model
+        occupancy_rate = seat_occupancy_rate()
         
         # Trip stats breakdown by status
         # Active Trips = Scheduled + Boarding + Departed + Active
         # On Route Trips = Departed + Active (subset of Active Trips)
         
-        # Handle both string and datetime formats for departure_date
-        start_date_str = start_date.strftime('%Y-%m-%d')
-        end_date_str = end_date.strftime('%Y-%m-%d')
+        # departure_date is stored as a 'YYYY-MM-DD' string (see app.utils.schema)
+        schedule_date_filter = {'departure_date': day_span(start_date, end_date)}
         
-        schedule_date_filter = {
-            '$or': [
-                # String format (most common)
-                {
-                    'departure_date': {
-                        '$gte': start_date_str,
-                        '$lt': end_date_str
-                    }
-                },
-                # Datetime format (legacy)
-                {
-                    'departure_date': {
-                        '$gte': start_date,
-                        '$lt': end_date
-                    }
-                }
-            ]
-        }
-        
-        print(f"🔍 Schedule date filter: {schedule_date_filter}")
+        logger.debug("🔍 Schedule date filter: %s", schedule_date_filter)
         
         # Count trips by status
         scheduled_trips = mongo.db.busschedules.count_documents({
@@ -891,30 +786,13 @@ def get_operator_dashboard_stats():
         prev_start, prev_end = calculate_previous_period(start_date, end_date, timeframe)
         
         prev_active_trips = mongo.db.busschedules.count_documents({
-            'departure_date': {'$gte': prev_start, '$lt': prev_end},
+            'departure_date': day_span(prev_start, prev_end),
             'status': {'$in': ['scheduled', 'boarding', 'active', 'departed']}
         })
         
-        prev_bookings = mongo.db.bookings.count_documents({
-            'created_at': {'$gte': prev_start, '$lt': prev_end}
-        })
-        
-        # Calculate previous period revenue with refunds accounted
-        prev_period_bookings = list(mongo.db.bookings.find({
-            'created_at': {'$gte': prev_start, '$lt': prev_end}
-        }))
-        
-        prev_revenue = 0
-        for booking in prev_period_bookings:
-            if booking.get('status') == 'cancelled':
-                total_amount = booking.get('total_amount', 0)
-                refund_amount = booking.get('refund_amount', 0)
-                if refund_amount == 0 and booking.get('expected_refund_percentage'):
-                    refund_amount = total_amount * (booking.get('expected_refund_percentage', 60) / 100)
-                cancellation_fee = total_amount - refund_amount
-                prev_revenue += cancellation_fee
-            else:
-                prev_revenue += booking.get('total_amount', 0)
+        prev_totals = rollup_totals(prev_start, prev_end)
+        prev_bookings = prev_totals['bookings']
+        prev_revenue = prev_totals['revenue']
         
         # Calculate percentage changes
         active_trips_trend = calculate_trend(active_trips, prev_active_trips)
@@ -922,16 +800,16 @@ def get_operator_dashboard_stats():
         revenue_trend = calculate_trend(period_revenue, prev_revenue)
         occupancy_trend = 0  # Occupancy is overall, not period-specific
         
-        print(f"📈 Final {timeframe.capitalize()} stats (CREATED DATE):")
-        print(f"   - Active Trips: {active_trips} (Scheduled: {scheduled_trips}, Boarding: {boarding_trips}, On Route: {on_route_trips})")
-        print(f"   - Bookings created: {period_bookings_count}")
-        print(f"   - Checkins: {period_checkins}")
-        print(f"   - Pending: {pending_checkins}")
-        print(f"   - Revenue generated: {period_revenue}")
-        print(f"   - Occupancy: {occupancy_rate}%")
-        print(f"   - Completed: {completed_trips}")
-        print(f"   - Cancelled: {cancelled_trips}")
-        print(f"   - Trends: Active {active_trips_trend}%, Bookings {bookings_trend}%, Revenue {revenue_trend}%")
+        logger.debug("📈 Final %s stats (CREATED DATE):", timeframe.capitalize())
+        logger.debug("- Active Trips: %s (Scheduled: %s, Boarding: %s, On Route: %s)", active_trips, scheduled_trips, boarding_trips, on_route_trips)
+        logger.debug("- Bookings created: %s", period_bookings_count)
+        logger.debug("- Checkins: %s", period_checkins)
+        logger.debug("- Pending: %s", pending_checkins)
+        logger.debug("- Revenue generated: %s", period_revenue)
+        logger.debug("- Occupancy: %s%%", occupancy_rate)
+        logger.debug("- Completed: %s", completed_trips)
+        logger.debug("- Cancelled: %s", cancelled_trips)
+        logger.debug("- Trends: Active %s%%, Bookings %s%%, Revenue %s%%", active_trips_trend, bookings_trend, revenue_trend)
         
         return jsonify({
             'success': True,
@@ -966,8 +844,9 @@ def get_operator_dashboard_stats():
             'period_type': 'current',
             'debug': {
                 'total_bookings_in_db': mongo.db.bookings.count_documents({}),
-                'timeframe_bookings_count': len(timeframe_bookings),
+                'timeframe_bookings_count': period_bookings_count,
                 'calculation_based_on': 'created_date',
+                'source': 'daily_rollups',
                 'trip_breakdown': {
                     'scheduled': scheduled_trips,
                     'boarding': boarding_trips,
@@ -980,10 +859,11 @@ def get_operator_dashboard_stats():
         }), 200
         
     except Exception as e:
-        logger.error(f"Dashboard stats error: {e}")
+        logger.error("Dashboard stats error: %s", e)
         return jsonify({'error': f'Failed to fetch dashboard stats: {str(e)}'}), 500
 
 @operator_bp.route('/dashboard/recent-trips', methods=['GET'])
+@query_budget(6)
 @jwt_required()
 def get_recent_trips():
     """Get recent trips for dashboard"""
@@ -1030,7 +910,7 @@ def get_recent_trips():
         }), 200
         
     except Exception as e:
-        logger.error(f"Recent trips error: {e}")
+        logger.error("Recent trips error: %s", e)
         return jsonify({'error': f'Failed to fetch recent trips: {str(e)}'}), 500
 
 @operator_bp.route('/dashboard/alerts', methods=['GET'])
@@ -1096,10 +976,11 @@ def get_dashboard_alerts():
         }), 200
         
     except Exception as e:
-        logger.error(f"Dashboard alerts error: {e}")
+        logger.error("Dashboard alerts error: %s", e)
         return jsonify({'error': f'Failed to fetch alerts: {str(e)}'}), 500
 
 @operator_bp.route('/dashboard/charts', methods=['GET'])
+@query_budget(3)
 @jwt_required()
 def get_dashboard_charts():
     """Get chart data for dashboard"""
@@ -1111,47 +992,26 @@ def get_dashboard_charts():
         
         # Calculate date range
         now = datetime.utcnow()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
         
         if timeframe == 'week':
-            # Last 7 days
+            # Last 7 days: revenue from the daily rollups, occupancy from departures that day
             days = 7
+            first_day = today - timedelta(days=days - 1)
+            occupancy = occupancy_by_day(first_day, today + timedelta(days=1))
             labels = []
             revenue_data = []
             occupancy_data = []
             
-            for i in range(days):
-                day_date = now - timedelta(days=days - 1 - i)
-                day_start = day_date.replace(hour=0, minute=0, second=0, microsecond=0)
-                day_end = day_start + timedelta(days=1)
-                
-                # Revenue for this day
-                day_bookings = list(mongo.db.bookings.find({
-                    'created_at': {'$gte': day_start, '$lt': day_end},
-                    'status': {'$ne': 'cancelled'}
-                }))
-                
-                day_revenue = sum(b.get('total_amount', 0) for b in day_bookings)
-                
-                # Occupancy for this day
-                day_schedules = list(mongo.db.busschedules.find({
-                    'departure_date': {'$gte': day_start, '$lt': day_end}
-                }))
-                
-                total_seats = sum(s.get('total_seats', 45) for s in day_schedules)
-                booked_seats = 0
-                
-                for schedule in day_schedules:
-                    schedule_id = str(schedule['_id'])
-                    booked_seats += mongo.db.bookings.count_documents({
-                        'schedule_id': schedule_id,
-                        'status': {'$ne': 'cancelled'}
-                    })
-                
-                day_occupancy = (booked_seats / total_seats * 100) if total_seats > 0 else 0
+            for day_date, totals in daily_series(first_day, days):
+                seats = occupancy.get(day(day_date)) or {'booked_seats': 0, 'total_seats': 0}
+                day_occupancy = (seats['booked_seats'] / seats['total_seats'] * 100) if seats['total_seats'] > 0 else 0
                 
                 labels.append(day_date.strftime('%a'))  # Mon, Tue, etc.
-                revenue_data.append(day_revenue)
+                revenue_data.append(totals['confirmed_amount'])
                 occupancy_data.append(round(day_occupancy, 1))
+            
+            sources_start = first_day
         
         else:  # month
             # Last 30 days grouped by week
@@ -1159,21 +1019,25 @@ def get_dashboard_charts():
             revenue_data = [0, 0, 0, 0]
             occupancy_data = [0, 0, 0, 0]
             
-            # Simplified monthly data - you can enhance this
+            sources_start = today - timedelta(days=30)
+            daily = daily_series(sources_start, 28)
+            occupancy = occupancy_by_day(sources_start, sources_start + timedelta(days=28))
             for i in range(4):
-                week_start = now - timedelta(days=30 - (i * 7))
-                week_end = week_start + timedelta(days=7)
-                
-                week_bookings = list(mongo.db.bookings.find({
-                    'created_at': {'$gte': week_start, '$lt': week_end},
-                    'status': {'$ne': 'cancelled'}
-                }))
-                
-                revenue_data[i] = sum(b.get('total_amount', 0) for b in week_bookings)
-                occupancy_data[i] = 70 + (i * 5)  # Placeholder
-        
-        # Booking sources (simplified)
-        total_bookings = mongo.db.bookings.count_documents({'status': {'$ne': 'cancelled'}})
+                week = daily[i * 7:(i + 1) * 7]
+                revenue_data[i] = sum(totals['confirmed_amount'] for _, totals in week)
+                week_seats = [occupancy.get(day(day_date)) for day_date, _ in week]
+                booked = sum(seats['booked_seats'] for seats in week_seats if seats)
+                capacity = sum(seats['total_seats'] for seats in week_seats if seats)
+                occupancy_data[i] = round(booked / capacity * 100, 1) if capacity > 0 else 0
+        
+        # Booking sources (share of bookings made in the period)
+        sources = rollup_series(sources_start, today + timedelta(days=1), group_by='booking_source')
+        source_total = sum(totals['bookings'] for totals in sources.values())
+        source_labels = [str(source).replace('_', ' ').title() for source in sources]
+        source_data = [
+            round(totals['bookings'] / source_total * 100, 1) if source_total > 0 else 0
+            for totals in sources.values()
+        ]
         
         return jsonify({
             'success': True,
@@ -1186,18 +1050,19 @@ def get_dashboard_charts():
                 'data': occupancy_data
             },
             'booking_sources': {
-                'labels': ['Website', 'Mobile App', 'Agent', 'Walk-in'],
-                'data': [45, 35, 15, 5]  # Placeholder percentages
+                'labels': source_labels,
+                'data': source_data
             }
         }), 200
         
     except Exception as e:
-        logger.error(f"Dashboard charts error: {e}")
+        logger.error("Dashboard charts error: %s", e)
         return jsonify({'error': f'Failed to fetch chart data: {str(e)}'}), 500
 
 # ==================== SCHEDULE MANAGEMENT ====================
 
 @operator_bp.route('/schedules', methods=['GET'])
+@query_budget(1)
 @jwt_required()
 def get_schedules():
     """Get all schedules with filtering and timeframe support"""
@@ -1224,25 +1089,19 @@ def get_schedules():
         if timeframe:
             start_date, end_date = calculate_date_range(timeframe)
             
-            print(f"📅 Filtering schedules by timeframe: {timeframe} ({start_date} to {end_date})")
+            logger.debug("📅 Filtering schedules by timeframe: %s (%s to %s)", timeframe, start_date, end_date)
             
-            query['departure_date'] = {
-                '$gte': start_date,
-                '$lt': end_date
-            }
+            query['departure_date'] = day_span(start_date, end_date)
         elif date:
             # Specific date filter (legacy support)
             try:
-                search_date = datetime.strptime(date, '%Y-%m-%d')
-                start_date = search_date.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_date = start_date + timedelta(days=1)
-                query['departure_date'] = {'$gte': start_date, '$lt': end_date}
+                query['departure_date'] = day(datetime.strptime(date, '%Y-%m-%d'))
             except ValueError:
                 return jsonify({'error': 'Invalid date format'}), 400
         
-        print(f"📋 Schedules query: {query}")
+        logger.debug("📋 Schedules query: %s", query)
         schedules = list(mongo.db.busschedules.find(query).sort('departure_date', 1))
-        print(f"📊 Found {len(schedules)} schedules")
+        logger.debug("📊 Found %s schedules", len(schedules))
         
         enriched_schedules = []
         for schedule in schedules:
@@ -1277,7 +1136,7 @@ def get_schedules():
                 'bus_number': bus_number,
                 'bus_type': schedule.get('bus_type', schedule.get('busType', 'Standard')),
                 'driver_name': schedule.get('driver_name', 'Not assigned'),
-                'departure_date': schedule.get('departure_date', schedule.get('departure_date', '').strftime('%Y-%m-%d') if isinstance(schedule.get('departure_date'), datetime) else ''),
+                'departure_date': day(schedule.get('departure_date')) or '',
                 'departure_time': schedule.get('departure_time', schedule.get('departureTime', '')),
                 'arrival_time': schedule.get('arrival_time', schedule.get('arrivalTime', '')),
                 'status': schedule.get('status', 'scheduled'),
@@ -1302,7 +1161,7 @@ def get_schedules():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get schedules error: {e}")
+        logger.error("Get schedules error: %s", e)
         return jsonify({'error': f'Failed to fetch schedules: {str(e)}'}), 500
 
 # ==================== ROUTES MANAGEMENT ====================
@@ -1315,7 +1174,7 @@ def get_routes():
         if not is_operator_or_admin():
             return jsonify({'error': 'Operator access required'}), 403
         
-        print("📋 Fetching all routes for operator")
+        logger.debug("📋 Fetching all routes for operator")
         
         routes = list(mongo.db.routes.find({'status': {'$ne': 'inactive'}}))
         
@@ -1339,7 +1198,7 @@ def get_routes():
                 'status': route.get('status', 'active')
             })
         
-        print(f"✅ Found {len(formatted_routes)} routes")
+        logger.debug("✅ Found %s routes", len(formatted_routes))
         
         return jsonify({
             'success': True,
@@ -1348,13 +1207,14 @@ def get_routes():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get routes error: {e}")
+        logger.error("Get routes error: %s", e)
         return jsonify({'error': f'Failed to fetch routes: {str(e)}'}), 500
 
 
 # ==================== BUSES MANAGEMENT ====================
 
 @operator_bp.route('/buses', methods=['GET'])
+@query_budget(1)
 @jwt_required()
 def get_buses():
     """Get all buses for operator (only active buses, excluding maintenance and inactive)"""
@@ -1362,25 +1222,25 @@ def get_buses():
         if not is_operator_or_admin():
             return jsonify({'error': 'Operator access required'}), 403
         
-        print("📋 Fetching available buses for operator")
+        logger.debug("📋 Fetching available buses for operator")
         
         # Get all buses first
         all_buses = list(mongo.db.buses.find({}))
-        print(f"🔍 Total buses in database: {len(all_buses)}")
+        logger.debug("🔍 Total buses in database: %s", len(all_buses))
         
         formatted_buses = []
         for bus in all_buses:
             bus_status = (bus.get('status') or 'active').lower().strip()
             bus_number = bus.get('bus_number', 'Unknown')
             
-            print(f"🚌 Bus {bus_number}: status = '{bus_status}'")
+            logger.debug("🚌 Bus %s: status = '%s'", bus_number, bus_status, extra=PER_ITEM)
             
             # Skip buses that are not available for scheduling
             if bus_status in ['inactive', 'maintenance', 'under_maintenance', 'retired', 'out_of_service']:
-                print(f"   ❌ Skipping bus {bus_number} - status: {bus_status}")
+                logger.warning("❌ Skipping bus %s - status: %s", bus_number, bus_status)
                 continue
             
-            print(f"   ✅ Including bus {bus_number}")
+            logger.debug("✅ Including bus %s", bus_number, extra=PER_ITEM)
             
             formatted_buses.append({
                 '_id': str(bus['_id']),
@@ -1397,7 +1257,7 @@ def get_buses():
                 'year': bus.get('year', '')
             })
         
-        print(f"✅ Found {len(formatted_buses)} available buses (excluding maintenance/inactive)")
+        logger.debug("✅ Found %s available buses (excluding maintenance/inactive)", len(formatted_buses))
         
         return jsonify({
             'success': True,
@@ -1406,7 +1266,7 @@ def get_buses():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get buses error: {e}")
+        logger.error("Get buses error: %s", e)
         return jsonify({'error': f'Failed to fetch buses: {str(e)}'}), 500
 
 
@@ -1444,7 +1304,7 @@ def get_drivers():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get drivers error: {e}")
+        logger.error("Get drivers error: %s", e)
         return jsonify({'error': f'Failed to fetch drivers: {str(e)}'}), 500
 
 # ==================== SYSTEM STATUS ====================
@@ -1482,7 +1342,7 @@ def get_system_status():
         }), 200
         
     except Exception as e:
-        logger.error(f"System status error: {e}")
+        logger.error("System status error: %s", e)
         return jsonify({
             'status': 'unhealthy',
             'service': 'Operator API',
@@ -1504,17 +1364,10 @@ def check_driver_conflict(driver_name, departure_date, schedule_id=None):
         else:
             date_obj = departure_date
         
-        # Get start and end of the day
-        start_of_day = date_obj.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_of_day = date_obj.replace(hour=23, minute=59, second=59, microsecond=999999)
-        
         # Build query to find schedules with same driver on same day
         query = {
             'driver_name': driver_name.strip(),
-            'departure_date': {
-                '$gte': start_of_day,
-                '$lte': end_of_day
-            },
+            'departure_date': day(date_obj),
             'status': {'$nin': ['cancelled', 'completed']}  # Exclude cancelled/completed schedules
         }
         
@@ -1546,7 +1399,7 @@ def check_driver_conflict(driver_name, departure_date, schedule_id=None):
         return None  # No conflict
         
     except Exception as e:
-        print(f"❌ Error checking driver conflict: {e}")
+        logger.error("❌ Error checking driver conflict: %s", e)
         return None
 
 
@@ -1558,7 +1411,7 @@ def get_driver_conflicts():
         if not is_operator_or_admin():
             return jsonify({'error': 'Operator access required'}), 403
         
-        print("🔍 Checking for driver conflicts in schedules...")
+        logger.debug("🔍 Checking for driver conflicts in schedules...")
         
         # Get all active schedules (not cancelled or completed)
         schedules = list(mongo.db.busschedules.find({
@@ -1602,7 +1455,7 @@ def get_driver_conflicts():
                 
                 conflicts.append(conflict)
         
-        print(f"✅ Found {len(conflicts)} driver conflicts")
+        logger.debug("✅ Found %s driver conflicts", len(conflicts))
         
         return jsonify({
             'success': True,
@@ -1611,7 +1464,7 @@ def get_driver_conflicts():
         }), 200
         
     except Exception as e:
-        logger.error(f"Error checking driver conflicts: {e}")
+        logger.error("Error checking driver conflicts: %s", e)
         return jsonify({'error': f'Failed to check driver conflicts: {str(e)}'}), 500
 
 
@@ -1624,7 +1477,7 @@ def create_schedule():
             return jsonify({'error': 'Operator access required'}), 403
         
         data = request.get_json()
-        print(f"🆕 Creating schedule with data: {data}")
+        logger.debug("🆕 Creating schedule with data: %s", data)
         
         # Validate required fields
         required_fields = ['route_name', 'origin_city', 'destination_city', 'bus_number', 
@@ -1677,10 +1530,7 @@ def create_schedule():
         discount_reason = data.get('discount_reason', '')
         
         # Get maximum tariff rate for this bus type
-        tariff_rate = mongo.db.tariff_rates.find_one({
-            'bus_type': bus_type,
-            'is_active': True
-        })
+        tariff_rate = find_tariff_rate(bus_type)
         
         if tariff_rate:
             # Calculate maximum allowed fare based on route distance
@@ -1727,15 +1577,7 @@ def create_schedule():
         discount_reason = data.get('discount_reason', '')
         
         # Get current tariff rate for validation
-        tariff_rate = mongo.db.tariff_rates.find_one({
-            'bus_type': bus_type,
-            'is_active': True,
-            'effective_from': {'$lte': now},
-            '$or': [
-                {'effective_until': None},
-                {'effective_until': {'$gte': now}}
-            ]
-        })
+        tariff_rate = find_tariff_rate(bus_type, effective_at=now)
         
         # Calculate maximum allowed fare based on tariff
         if tariff_rate:
@@ -1792,9 +1634,9 @@ def create_schedule():
             })
             if driver:
                 driver_id = str(driver['_id'])
-                print(f"✅ Found driver_id {driver_id} for driver {driver_name}")
+                logger.debug("✅ Found driver_id %s for driver %s", driver_id, driver_name)
             else:
-                print(f"⚠️ Driver not found: {driver_name}")
+                logger.warning("⚠️ Driver not found: %s", driver_name)
         
         schedule_data = {
             # Route information
@@ -1812,7 +1654,7 @@ def create_schedule():
             'driver_id': driver_id,  # ✅ Add driver_id field
             
             # Schedule timing
-            'departure_date': departure_datetime,
+            'departure_date': day(departure_datetime),
             'departure_time': data['departure_time'],
             'arrival_time': arrival_datetime.strftime('%H:%M'),
             
@@ -1831,10 +1673,11 @@ def create_schedule():
         }
         
         # Insert schedule
-        result = mongo.db.busschedules.insert_one(schedule_data)
+        result = mongo.db.busschedules.insert_one(canonical_document('busschedules', schedule_data))
         schedule_id = str(result.inserted_id)
+        sync_schedule(schedule_id)
         
-        print(f"✅ Schedule created successfully: {schedule_id}")
+        logger.debug("✅ Schedule created successfully: %s", schedule_id)
         
         # Return the exact same structure as get_schedules
         enriched_schedule = {
@@ -1862,7 +1705,7 @@ def create_schedule():
         }), 201
         
     except Exception as e:
-        logger.error(f"Create schedule error: {e}")
+        logger.error("Create schedule error: %s", e)
         return jsonify({'error': f'Failed to create schedule: {str(e)}'}), 500
     
 @operator_bp.route('/schedules/<schedule_id>', methods=['PUT'])
@@ -1874,7 +1717,7 @@ def update_schedule(schedule_id):
             return jsonify({'error': 'Operator access required'}), 403
         
         data = request.get_json()
-        print(f"🔄 Updating schedule: {schedule_id} with data: {data}")
+        logger.debug("🔄 Updating schedule: %s with data: %s", schedule_id, data)
         
         schedule_oid = validate_object_id(schedule_id)
         
@@ -1968,7 +1811,7 @@ def update_schedule(schedule_id):
                     update_data['arrival_time'] = arrival_time_str
                     
             except (ValueError, IndexError) as e:
-                print(f"⚠️ Date/time parsing error: {e}")
+                logger.error("⚠️ Date/time parsing error: %s", e)
                 return jsonify({'error': f'Invalid date/time format: {str(e)}'}), 400
         
         # Handle driver assignment
@@ -1982,9 +1825,9 @@ def update_schedule(schedule_id):
                         update_data['driver_id'] = driver_id
                         update_data['driver_name'] = driver.get('name', '')
                     else:
-                        print(f"⚠️ Driver not found: {driver_id}")
+                        logger.warning("⚠️ Driver not found: %s", driver_id)
                 except Exception as e:
-                    print(f"⚠️ Error fetching driver: {e}")
+                    logger.error("⚠️ Error fetching driver: %s", e)
             else:
                 # Clear driver assignment
                 update_data['driver_id'] = None
@@ -2011,18 +1854,20 @@ def update_schedule(schedule_id):
                     }
                 }), 409  # 409 Conflict status code
         
-        print(f"📝 Update data: {update_data}")
+        logger.debug("📝 Update data: %s", update_data)
         
         result = mongo.db.busschedules.update_one(
             {'_id': schedule_oid},
             {'$set': update_data}
         )
         
-        print(f"✅ Update result - modified: {result.modified_count}")
+        logger.debug("✅ Update result - modified: %s", result.modified_count)
         
         if result.modified_count == 0:
             return jsonify({'error': 'No changes made to schedule'}), 400
         
+        sync_schedule(schedule_id)
+        
         # Get updated schedule
         updated_schedule = mongo.db.busschedules.find_one({'_id': schedule_oid})
         
@@ -2035,7 +1880,7 @@ def update_schedule(schedule_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Update schedule error: {e}")
+        logger.error("Update schedule error: %s", e)
         return jsonify({'error': f'Failed to update schedule: {str(e)}'}), 500
 
 @operator_bp.route('/schedules/<schedule_id>', methods=['DELETE'])
@@ -2046,7 +1891,7 @@ def delete_schedule(schedule_id):
         if not is_operator_or_admin():
             return jsonify({'error': 'Operator access required'}), 403
         
-        print(f"🗑️ Deleting schedule: {schedule_id}")
+        logger.debug("🗑️ Deleting schedule: %s", schedule_id)
         
         schedule_oid = validate_object_id(schedule_id)
         
@@ -2072,7 +1917,9 @@ def delete_schedule(schedule_id):
         if result.deleted_count == 0:
             return jsonify({'error': 'Failed to delete schedule'}), 500
         
-        print(f"✅ Schedule deleted successfully: {schedule_id}")
+        sync_schedule(schedule_id)
+        
+        logger.debug("✅ Schedule deleted successfully: %s", schedule_id)
         
         return jsonify({
             'success': True,
@@ -2082,7 +1929,7 @@ def delete_schedule(schedule_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Delete schedule error: {e}")
+        logger.error("Delete schedule error: %s", e)
         return jsonify({'error': f'Failed to delete schedule: {str(e)}'}), 500
 
 @operator_bp.route('/schedules/<schedule_id>/status', methods=['PUT'])
@@ -2122,6 +1969,8 @@ def update_schedule_status(schedule_id):
         if result.modified_count == 0:
             return jsonify({'error': 'Failed to update schedule status'}), 500
         
+        sync_schedule(schedule_id)
+        
         # Get updated schedule
         updated_schedule = mongo.db.busschedules.find_one({'_id': schedule_oid})
         
@@ -2134,7 +1983,7 @@ def update_schedule_status(schedule_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Update schedule status error: {e}")
+        logger.error("Update schedule status error: %s", e)
         return jsonify({'error': f'Failed to update schedule status: {str(e)}'}), 500
 
 @operator_bp.route('/schedules/<schedule_id>', methods=['GET'])
@@ -2194,7 +2043,7 @@ def get_schedule_details(schedule_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Get schedule details error: {e}")
+        logger.error("Get schedule details error: %s", e)
         return jsonify({'error': f'Failed to fetch schedule details: {str(e)}'}), 500
 
 @operator_bp.route('/schedules/<schedule_id>/pause', methods=['POST'])
@@ -2225,6 +2074,8 @@ def pause_schedule(schedule_id):
         if result.modified_count == 0:
             return jsonify({'error': 'Failed to pause schedule'}), 500
         
+        sync_schedule(schedule_id)
+        
         return jsonify({
             'success': True,
             'message': 'Schedule paused successfully'
@@ -2233,7 +2084,7 @@ def pause_schedule(schedule_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Pause schedule error: {e}")
+        logger.error("Pause schedule error: %s", e)
         return jsonify({'error': f'Failed to pause schedule: {str(e)}'}), 500
 
 @operator_bp.route('/schedules/<schedule_id>/resume', methods=['POST'])
@@ -2264,6 +2115,8 @@ def resume_schedule(schedule_id):
         if result.modified_count == 0:
             return jsonify({'error': 'Failed to resume schedule'}), 500
         
+        sync_schedule(schedule_id)
+        
         return jsonify({
             'success': True,
             'message': 'Schedule resumed successfully'
@@ -2272,7 +2125,7 @@ def resume_schedule(schedule_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Resume schedule error: {e}")
+        logger.error("Resume schedule error: %s", e)
         return jsonify({'error': f'Failed to resume schedule: {str(e)}'}), 500
 @operator_bp.route('/drivers/<driver_id>', methods=['DELETE'])
 @jwt_required()
@@ -2308,6 +2161,7 @@ def delete_driver(driver_id):
                 'updated_at': datetime.now()
             }}
         )
+        user_changed(driver_oid)
         
         if result.modified_count == 0:
             return jsonify({'error': 'Failed to delete driver'}), 500
@@ -2320,7 +2174,7 @@ def delete_driver(driver_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Delete driver error: {e}")
+        logger.error("Delete driver error: %s", e)
         return jsonify({'error': f'Failed to delete driver: {str(e)}'}), 500
 
 @operator_bp.route('/drivers/<driver_id>/performance', methods=['GET'])
@@ -2375,7 +2229,7 @@ def get_driver_performance(driver_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Get driver performance error: {e}")
+        logger.error("Get driver performance error: %s", e)
         return jsonify({'error': f'Failed to fetch driver performance: {str(e)}'}), 500
 
 @operator_bp.route('/drivers/<driver_id>/status', methods=['PUT'])
@@ -2406,6 +2260,7 @@ def update_driver_status(driver_id):
                 'updated_at': datetime.now()
             }}
         )
+        user_changed(driver_oid)
         
         if result.modified_count == 0:
             return jsonify({'error': 'Failed to update driver status'}), 500
@@ -2420,7 +2275,7 @@ def update_driver_status(driver_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Update driver status error: {e}")
+        logger.error("Update driver status error: %s", e)
         return jsonify({'error': f'Failed to update driver status: {str(e)}'}), 500
                 
 @operator_bp.route('/drivers', methods=['POST'])
@@ -2432,7 +2287,7 @@ def create_driver():
             return jsonify({'error': 'Operator access required'}), 403
         
         data = request.get_json()
-        print(f"🆕 Creating driver with data: {data}")
+        logger.debug("🆕 Creating driver with data: %s", data)
         
         # Validate required fields
         required_fields = ['name', 'email', 'phone', 'license_number']
@@ -2464,7 +2319,7 @@ def create_driver():
         result = mongo.db.users.insert_one(driver_data)
         driver_data['_id'] = str(result.inserted_id)
         
-        print(f"✅ Driver created successfully: {result.inserted_id}")
+        logger.debug("✅ Driver created successfully: %s", result.inserted_id)
         
         return jsonify({
             'success': True,
@@ -2473,7 +2328,7 @@ def create_driver():
         }), 201
         
     except Exception as e:
-        logger.error(f"Create driver error: {e}")
+        logger.error("Create driver error: %s", e)
         return jsonify({'error': f'Failed to create driver: {str(e)}'}), 500
 
 @operator_bp.route('/drivers/<driver_id>', methods=['PUT'])
@@ -2485,7 +2340,7 @@ def update_driver(driver_id):
             return jsonify({'error': 'Operator access required'}), 403
         
         data = request.get_json()
-        print(f"🔄 Updating driver: {driver_id} with data: {data}")
+        logger.debug("🔄 Updating driver: %s with data: %s", driver_id, data)
         
         driver_oid = validate_object_id(driver_id)
         
@@ -2507,14 +2362,15 @@ def update_driver(driver_id):
             if field in data:
                 update_data[field] = data[field]
         
-        print(f"📝 Update data: {update_data}")
+        logger.debug("📝 Update data: %s", update_data)
         
         result = mongo.db.users.update_one(
             {'_id': driver_oid},
             {'$set': update_data}
         )
+        user_changed(driver_oid)
         
-        print(f"✅ Update result - modified: {result.modified_count}")
+        logger.debug("✅ Update result - modified: %s", result.modified_count)
         
         if result.modified_count == 0:
             return jsonify({'error': 'No changes made to driver'}), 400
@@ -2531,7 +2387,7 @@ def update_driver(driver_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Update driver error: {e}")
+        logger.error("Update driver error: %s", e)
         return jsonify({'error': f'Failed to update driver: {str(e)}'}), 500
        
 @operator_bp.route('/drivers/<driver_id>/assignments', methods=['GET'])
@@ -2567,7 +2423,7 @@ def get_driver_assignments(driver_id):
                     if schedule:
                         enriched_assignment['schedule_details'] = {
                             'route_name': f"{schedule.get('origin_city', 'Unknown')} - {schedule.get('destination_city', 'Unknown')}",
-                            'departure_date': schedule.get('departure_date', '').strftime('%Y-%m-%d') if isinstance(schedule.get('departure_date'), datetime) else '',
+                            'departure_date': day(schedule.get('departure_date')) or '',
                             'departure_time': schedule.get('departure_time', ''),
                             'bus_number': schedule.get('bus_number', 'Unknown'),
                             'status': schedule.get('status', 'scheduled')
@@ -2589,7 +2445,7 @@ def get_driver_assignments(driver_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Get driver assignments error: {e}")
+        logger.error("Get driver assignments error: %s", e)
         return jsonify({'error': f'Failed to fetch driver assignments: {str(e)}'}), 500
 
 @operator_bp.route('/assign-driver', methods=['POST'])
@@ -2646,6 +2502,8 @@ def assign_driver_to_schedule():
         if result.modified_count == 0:
             return jsonify({'error': 'Failed to assign driver to schedule'}), 500
         
+        sync_schedule(schedule_oid)
+        
         # Create assignment record in driver_assignments collection
         assignment_data = {
             'driver_id': driver_id,
@@ -2674,7 +2532,7 @@ def assign_driver_to_schedule():
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Assign driver error: {e}")
+        logger.error("Assign driver error: %s", e)
         return jsonify({'error': f'Failed to assign driver: {str(e)}'}), 500
 
 @operator_bp.route('/assignments/<assignment_id>', methods=['PUT'])
@@ -2719,7 +2577,7 @@ def update_assignment(assignment_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Update assignment error: {e}")
+        logger.error("Update assignment error: %s", e)
         return jsonify({'error': f'Failed to update assignment: {str(e)}'}), 500
 
 @operator_bp.route('/assignments/<assignment_id>', methods=['DELETE'])
@@ -2752,8 +2610,9 @@ def remove_assignment(assignment_id):
                         'assignment_notes': ""
                     }}
                 )
+                sync_schedule(schedule_oid)
             except:
-                logger.warning(f"Could not remove driver from schedule: {schedule_id}")
+                logger.warning("Could not remove driver from schedule: %s", schedule_id)
         
         # Soft delete assignment by setting status to cancelled
         result = mongo.db.driver_assignments.update_one(
@@ -2776,7 +2635,7 @@ def remove_assignment(assignment_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Remove assignment error: {e}")
+        logger.error("Remove assignment error: %s", e)
         return jsonify({'error': f'Failed to remove assignment: {str(e)}'}), 500
 
 @operator_bp.route('/assignments', methods=['GET'])
@@ -2831,7 +2690,7 @@ def get_all_assignments():
                     if schedule:
                         enriched_assignment['schedule_details'] = {
                             'route_name': f"{schedule.get('origin_city', 'Unknown')} - {schedule.get('destination_city', 'Unknown')}",
-                            'departure_date': schedule.get('departure_date', '').strftime('%Y-%m-%d') if isinstance(schedule.get('departure_date'), datetime) else '',
+                            'departure_date': day(schedule.get('departure_date')) or '',
                             'departure_time': schedule.get('departure_time', ''),
                             'bus_number': schedule.get('bus_number', 'Unknown'),
                             'status': schedule.get('status', 'scheduled')
@@ -2848,7 +2707,7 @@ def get_all_assignments():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get all assignments error: {e}")
+        logger.error("Get all assignments error: %s", e)
         return jsonify({'error': f'Failed to fetch assignments: {str(e)}'}), 500
 
 
@@ -2889,7 +2748,7 @@ def get_recent_checkins():
         }), 200
         
     except Exception as e:
-        logger.error(f"Recent check-ins error: {e}")
+        logger.error("Recent check-ins error: %s", e)
         return jsonify({'error': f'Failed to fetch recent check-ins: {str(e)}'}), 500
 
 @operator_bp.route('/checkins/pending', methods=['GET'])
@@ -2941,7 +2800,7 @@ def get_pending_checkins_list():
                     checkin_message = 'Bus departed'
                     
             except Exception as e:
-                print(f"Error calculating time: {e}")
+                logger.error("Error calculating time: %s", e)
                 time_until_checkin = 0
                 time_until_departure = 0
                 checkin_status = 'unknown'
@@ -2983,7 +2842,7 @@ def get_pending_checkins_list():
         }), 200
         
     except Exception as e:
-        logger.error(f"Pending check-ins error: {e}")
+        logger.error("Pending check-ins error: %s", e)
         return jsonify({'error': f'Failed to fetch pending check-ins: {str(e)}'}), 500
 
 @operator_bp.route('/checkins/stats', methods=['GET'])
@@ -3052,7 +2911,7 @@ def get_checkin_stats():
         }), 200
         
     except Exception as e:
-        logger.error(f"Check-in stats error: {e}")
+        logger.error("Check-in stats error: %s", e)
         return jsonify({'error': f'Failed to fetch check-in stats: {str(e)}'}), 500
 
 @operator_bp.route('/bookings/search', methods=['GET'])
@@ -3123,7 +2982,7 @@ def search_booking():
         }), 200
         
     except Exception as e:
-        logger.error(f"Search booking error: {e}")
+        logger.error("Search booking error: %s", e)
         return jsonify({'error': f'Failed to search booking: {str(e)}'}), 500
 
 @operator_bp.route('/bookings/<booking_id>/checkin', methods=['POST'])
@@ -3188,7 +3047,7 @@ def checkin_booking(booking_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Check-in error: {e}")
+        logger.error("Check-in error: %s", e)
         return jsonify({'error': f'Failed to check in passenger: {str(e)}'}), 500
 
 @operator_bp.route('/notifications/checkin', methods=['POST'])
@@ -3202,8 +3061,8 @@ def send_checkin_notification():
         data = request.get_json()
         
         # Log notification request
-        logger.info(f"Check-in notification requested for booking: {data.get('booking_id')}")
-        logger.info(f"Phone: {data.get('passenger_phone')}, Email: {data.get('passenger_email')}")
+        logger.info("Check-in notification requested for booking: %s", data.get('booking_id'))
+        logger.info("Phone: %s, Email: %s", data.get('passenger_phone'), data.get('passenger_email'))
         
         # TODO: Integrate with SMS/Email service
         # For now, just return success
@@ -3214,7 +3073,7 @@ def send_checkin_notification():
         }), 200
         
     except Exception as e:
-        logger.error(f"Notification error: {e}")
+        logger.error("Notification error: %s", e)
         return jsonify({'error': f'Failed to send notification: {str(e)}'}), 500
 
 
@@ -3237,7 +3096,7 @@ def get_tracking_updates():
         
         # Get schedules for today
         schedules = list(mongo.db.busschedules.find({
-            'departure_date': {'$gte': datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)}
+            'departure_date': {'$gte': day(datetime.now())}
         }))
         
         # Enrich tracking data with schedule info
@@ -3258,7 +3117,7 @@ def get_tracking_updates():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get tracking updates error: {e}")
+        logger.error("Get tracking updates error: %s", e)
         return jsonify({'error': f'Failed to fetch tracking updates: {str(e)}'}), 500
 
 @operator_bp.route('/tracking/schedule/<schedule_id>', methods=['GET'])
@@ -3281,7 +3140,7 @@ def get_schedule_tracking(schedule_id):
         }), 200
         
     except Exception as e:
-        logger.error(f"Get schedule tracking error: {e}")
+        logger.error("Get schedule tracking error: %s", e)
         return jsonify({'error': f'Failed to fetch schedule tracking: {str(e)}'}), 500
 
 @operator_bp.route('/tracking/live', methods=['GET'])
@@ -3296,7 +3155,7 @@ def get_live_tracking():
         
         # Get today's schedules
         schedules = list(mongo.db.busschedules.find({
-            'departure_date': {'$gte': today}
+            'departure_date': {'$gte': day(today)}
         }))
         
         live_tracking = []
@@ -3334,7 +3193,7 @@ def get_live_tracking():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get live tracking error: {e}")
+        logger.error("Get live tracking error: %s", e)
         return jsonify({'error': f'Failed to fetch live tracking: {str(e)}'}), 500
 
 # ==================== REPORTS & ANALYTICS ====================
@@ -3351,7 +3210,7 @@ def get_reports():
         start_date_str = request.args.get('startDate')
         end_date_str = request.args.get('endDate')
         
-        print(f"📊 Generating reports for period: {period}")
+        logger.debug("📊 Generating reports for period: %s", period)
         
         # Calculate date range
         if period == 'custom' and start_date_str and end_date_str:
@@ -3364,7 +3223,7 @@ def get_reports():
         tomorrow = today + timedelta(days=1)
         tomorrow_end = tomorrow + timedelta(days=1)
         
-        print(f"📅 Report date range: {start_date.date()} to {end_date.date()}")
+        logger.debug("📅 Report date range: %s to %s", start_date.date(), end_date.date())
         
         # Get today's bookings (by CREATED DATE - tickets sold today)
         # This shows bookings MADE today, regardless of travel date
@@ -3387,9 +3246,9 @@ def get_reports():
             ]
         }))
         
-        print(f"📊 Today's bookings (created {today.date()}): {len(today_bookings)}")
+        logger.debug("📊 Today's bookings (created %s): %s", today.date(), len(today_bookings))
         if today_bookings:
-            print(f"   Sample: PNR {today_bookings[0].get('pnr_number')}, Travel: {today_bookings[0].get('travel_date')}, Amount: {today_bookings[0].get('total_amount')}")
+            logger.debug("Sample: PNR %s, Travel: %s, Amount: %s", today_bookings[0].get('pnr_number'), today_bookings[0].get('travel_date'), today_bookings[0].get('total_amount'))
         
         # Get tomorrow's bookings (by CREATED DATE - tickets sold tomorrow)
         # Include ALL bookings (even cancelled) to show accurate sales data
@@ -3424,7 +3283,7 @@ def get_reports():
                     else:
                         schedule = mongo.db.busschedules.find_one({'_id': schedule_id})
                 except Exception as e:
-                    print(f"⚠️ Failed to fetch schedule for booking {booking.get('_id')}: {e}")
+                    logger.error("⚠️ Failed to fetch schedule for booking %s: %s", booking.get('_id'), e)
             
             # Get bus number from schedule or booking
             bus_number = booking.get('bus_number', 'N/A')
@@ -3460,7 +3319,7 @@ def get_reports():
                     else:
                         schedule = mongo.db.busschedules.find_one({'_id': schedule_id})
                 except Exception as e:
-                    print(f"⚠️ Failed to fetch schedule for booking {booking.get('_id')}: {e}")
+                    logger.error("⚠️ Failed to fetch schedule for booking %s: %s", booking.get('_id'), e)
             
             # Get bus number from schedule or booking
             bus_number = booking.get('bus_number', 'N/A')
@@ -3483,139 +3342,54 @@ def get_reports():
                 'status': booking.get('status', 'confirmed')
             })
         
-        # Calculate today's revenue (EARNED TODAY from bookings made today)
-        # For non-cancelled bookings: full amount
-        # For cancelled bookings: cancellation fee (40%)
-        today_revenue = 0
-        for b in today_bookings:
-            if b.get('status') == 'cancelled':
-                # Add cancellation fee (40% of total)
-                today_revenue += b.get('cancellation_fee', 0)
-            else:
-                # Add full amount for non-cancelled bookings
-                today_revenue += b.get('total_amount', 0)
+        # Revenue and passenger figures come from the daily rollups:
+        # full amount for active bookings, cancellation fee for cancelled ones
+        today_totals = rollup_totals(today, tomorrow)
+        today_revenue = today_totals['revenue']
         
         # Passenger count excludes cancelled bookings
-        today_passenger_count = sum(len(b.get('seat_numbers', [])) for b in today_bookings if b.get('status') != 'cancelled')
+        today_passenger_count = today_totals['passengers']
         
-        print(f"💰 Today's revenue (earned today): ETB {today_revenue}")
-        print(f"👥 Today's passengers (non-cancelled): {today_passenger_count}")
+        logger.debug("💰 Today's revenue (earned today): ETB %s", today_revenue)
+        logger.debug("👥 Today's passengers (non-cancelled): %s", today_passenger_count)
         
-        # Get weekly stats
+        # Get weekly stats (including cancelled bookings)
         week_start = today - timedelta(days=today.weekday())
         week_end = week_start + timedelta(days=7)
+        weekly_totals = rollup_totals(week_start, week_end)
         
-        # Get ALL weekly bookings (including cancelled)
-        weekly_bookings = list(mongo.db.bookings.find({
-            'created_at': {'$gte': week_start, '$lt': week_end}
-        }))
-        
-        # Calculate weekly revenue (full amount + cancellation fees)
-        weekly_revenue = 0
-        for b in weekly_bookings:
-            if b.get('status') == 'cancelled':
-                weekly_revenue += b.get('cancellation_fee', 0)
-            else:
-                weekly_revenue += b.get('total_amount', 0)
-        
-        # Passenger count excludes cancelled bookings
-        weekly_passengers = sum(len(b.get('seat_numbers', [])) for b in weekly_bookings if b.get('status') != 'cancelled')
-        
-        # Calculate average occupancy
-        total_schedules = mongo.db.busschedules.count_documents({})
-        total_capacity = total_schedules * 45  # Assuming 45 seats per bus
-        total_booked = mongo.db.bookings.count_documents({'status': {'$ne': 'cancelled'}})
-        avg_occupancy = round((total_booked / total_capacity * 100)) if total_capacity > 0 else 0
-        
-        # Generate booking trends (last 7 days)
-        booking_trends = []
-        for i in range(7):
-            day = today - timedelta(days=6-i)
-            day_end = day + timedelta(days=1)
-            
-            # Get ALL bookings for the day (including cancelled)
-            day_bookings = list(mongo.db.bookings.find({
-                'created_at': {'$gte': day, '$lt': day_end}
-            }))
-            
-            # Calculate revenue (full amount + cancellation fees)
-            day_revenue = 0
-            for b in day_bookings:
-                if b.get('status') == 'cancelled':
-                    day_revenue += b.get('cancellation_fee', 0)
-                else:
-                    day_revenue += b.get('total_amount', 0)
-            
-            booking_trends.append({
-                'date': day.strftime('%a'),
-                'bookings': len(day_bookings),
-                'revenue': day_revenue
-            })
-        
-        # Route performance - try multiple approaches
-        route_performance = []
+        # Average occupancy over all departures
+        average_occupancy = round(seat_occupancy_rate())
         
-        # First try: Group by departure_city and arrival_city
-        routes_pipeline = [
-            {'$match': {
-                'status': {'$ne': 'cancelled'},
-                'departure_city': {'$exists': True, '$ne': None, '$ne': ''},
-                'arrival_city': {'$exists': True, '$ne': None, '$ne': ''}
-            }},
-            {'$group': {
-                '_id': {
-                    'departure': '$departure_city',
-                    'arrival': '$arrival_city'
-                },
-                'bookings': {'$sum': 1},
-                'revenue': {'$sum': '$total_amount'}
-            }},
-            {'$sort': {'bookings': -1}},
-            {'$limit': 10}
+        # Generate booking trends (last 7 days, including cancelled bookings)
+        booking_trends = [
+            {
+                'date': trend_day.strftime('%a'),
+                'bookings': totals['bookings'],
+                'revenue': totals['revenue']
+            }
+            for trend_day, totals in daily_series(today - timedelta(days=6), 7)
         ]
         
-        try:
-            for route in mongo.db.bookings.aggregate(routes_pipeline):
-                if route['_id']['departure'] and route['_id']['arrival']:
-                    route_name = f"{route['_id']['departure']} - {route['_id']['arrival']}"
-                    route_performance.append({
-                        'routeName': route_name,
-                        'bookings': route['bookings'],
-                        'revenue': route['revenue'],
-                        'occupancyRate': round((route['bookings'] / 45) * 100) if route['bookings'] > 0 else 0
-                    })
-        except Exception as e:
-            print(f"⚠️ Route aggregation error: {e}")
-        
-        # If no routes found, try alternative: use routeName field directly
-        if len(route_performance) == 0:
-            print("📊 Trying alternative route grouping by routeName field...")
-            alt_pipeline = [
-                {'$match': {
-                    'status': {'$ne': 'cancelled'},
-                    'routeName': {'$exists': True, '$ne': None, '$ne': ''}
-                }},
-                {'$group': {
-                    '_id': '$routeName',
-                    'bookings': {'$sum': 1},
-                    'revenue': {'$sum': '$total_amount'}
-                }},
-                {'$sort': {'bookings': -1}},
-                {'$limit': 10}
-            ]
-            
-            try:
-                for route in mongo.db.bookings.aggregate(alt_pipeline):
-                    route_performance.append({
-                        'routeName': route['_id'],
-                        'bookings': route['bookings'],
-                        'revenue': route['revenue'],
-                        'occupancyRate': round((route['bookings'] / 45) * 100) if route['bookings'] > 0 else 0
-                    })
-            except Exception as e:
-                print(f"⚠️ Alternative route aggregation error: {e}")
+        # Route performance over all rollups (active bookings only)
+        route_performance = []
+        all_routes = rollup_series('0000-01-01', '9999-12-31', group_by='route')
+        ranked_routes = sorted(
+            ((name, totals) for name, totals in all_routes.items()
+             if totals['bookings'] - totals['cancelled'] > 0 and not name.startswith('Unknown - ')),
+            key=lambda item: item[1]['bookings'] - item[1]['cancelled'],
+            reverse=True
+        )[:10]
+        for route_name, totals in ranked_routes:
+            active_bookings = totals['bookings'] - totals['cancelled']
+            route_performance.append({
+                'routeName': route_name,
+                'bookings': active_bookings,
+                'revenue': totals['confirmed_amount'],
+                'occupancyRate': round((active_bookings / 45) * 100)
+            })
         
-        print(f"📊 Route performance: {len(route_performance)} routes found")
+        logger.debug("📊 Route performance: %s routes found", len(route_performance))
         
         # Bus performance - aggregate by bus number from bookings
         bus_performance_pipeline = [
@@ -3669,13 +3443,9 @@ def get_reports():
             })
         
         # Calculate cancellation rate for the period
-        total_bookings_in_period = mongo.db.bookings.count_documents({
-            'created_at': {'$gte': start_date, '$lt': end_date}
-        })
-        cancelled_bookings_in_period = mongo.db.bookings.count_documents({
-            'created_at': {'$gte': start_date, '$lt': end_date},
-            'status': 'cancelled'
-        })
+        period_totals = rollup_totals(start_date, end_date)
+        total_bookings_in_period = period_totals['bookings']
+        cancelled_bookings_in_period = period_totals['cancelled']
         cancellation_rate = round((cancelled_bookings_in_period / total_bookings_in_period * 100), 1) if total_bookings_in_period > 0 else 0
         
         # Get most popular route (most bookings) - already sorted by bookings
@@ -3687,16 +3457,16 @@ def get_reports():
                 'bookings': top_route['bookings'],
                 'revenue': top_route['revenue']
             }
-            print(f"🏆 Most popular route: {most_popular_route['routeName']} with {most_popular_route['bookings']} bookings")
+            logger.debug("🏆 Most popular route: %s with %s bookings", most_popular_route['routeName'], most_popular_route['bookings'])
         else:
-            print(f"⚠️ No route performance data available")
+            logger.warning("⚠️ No route performance data available")
         
-        print(f"✅ Report generated successfully")
-        print(f"   - Today's bookings (SOLD today): {len(formatted_today_bookings)}")
-        print(f"   - Tomorrow's bookings (SOLD tomorrow): {len(formatted_tomorrow_bookings)}")
-        print(f"   - Today's revenue (SOLD today): ETB {today_revenue}")
-        print(f"   - Cancellation rate: {cancellation_rate}%")
-        print(f"   - Total routes analyzed: {len(route_performance)}")
+        logger.debug("✅ Report generated successfully")
+        logger.debug("- Today's bookings (SOLD today): %s", len(formatted_today_bookings))
+        logger.debug("- Tomorrow's bookings (SOLD tomorrow): %s", len(formatted_tomorrow_bookings))
+        logger.debug("- Today's revenue (SOLD today): ETB %s", today_revenue)
+        logger.debug("- Cancellation rate: %s%%", cancellation_rate)
+        logger.debug("- Total routes analyzed: %s", len(route_performance))
         
         return jsonify({
             'success': True,
@@ -3705,10 +3475,10 @@ def get_reports():
             'todayPassengerCount': today_passenger_count,
             'tomorrowBookings': formatted_tomorrow_bookings,
             'weeklyStats': {
-                'totalBookings': len(weekly_bookings),
-                'totalRevenue': weekly_revenue,
-                'totalPassengers': weekly_passengers,
-                'averageOccupancy': avg_occupancy
+                'totalBookings': weekly_totals['bookings'],
+                'totalRevenue': weekly_totals['revenue'],
+                'totalPassengers': weekly_totals['passengers'],
+                'averageOccupancy': average_occupancy
             },
             'bookingTrends': booking_trends,
             'routePerformance': route_performance,
@@ -3720,7 +3490,7 @@ def get_reports():
         }), 200
         
     except Exception as e:
-        logger.error(f"Reports error: {e}")
+        logger.error("Reports error: %s", e)
         return jsonify({'error': f'Failed to generate reports: {str(e)}'}), 500
 
 
@@ -3739,17 +3509,8 @@ def get_tariff_rates():
         # Get query parameters
         active_only = request.args.get('active_only', 'true').lower() == 'true'
         
-        query = {}
-        if active_only:
-            query['is_active'] = True
-            # Also check effective dates
-            now = datetime.now()
-            query['$or'] = [
-                {'effective_until': None},
-                {'effective_until': {'$gte': now}}
-            ]
-        
-        tariff_rates = list(mongo.db.tariff_rates.find(query).sort('bus_type', 1))
+        # Active rates whose effective_until has not passed, or everything
+        tariff_rates = find_tariff_rates(active_only=active_only, current_only=active_only)
         
         return jsonify({
             'success': True,
@@ -3758,7 +3519,7 @@ def get_tariff_rates():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get tariff rates error: {e}")
+        logger.error("Get tariff rates error: %s", e)
         return jsonify({'error': f'Failed to fetch tariff rates: {str(e)}'}), 500
 
 
@@ -3769,14 +3530,7 @@ def get_current_tariff_rates():
         now = datetime.now()
         
         # Get active rates that are currently effective
-        tariff_rates = list(mongo.db.tariff_rates.find({
-            'is_active': True,
-            'effective_from': {'$lte': now},
-            '$or': [
-                {'effective_until': None},
-                {'effective_until': {'$gte': now}}
-            ]
-        }).sort('bus_type', 1))
+        tariff_rates = find_tariff_rates(active_only=True, effective_at=now)
         
         # If no rates found, return default rates
         if not tariff_rates:
@@ -3812,7 +3566,7 @@ def get_current_tariff_rates():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get current tariff rates error: {e}")
+        logger.error("Get current tariff rates error: %s", e)
         return jsonify({'error': f'Failed to fetch current tariff rates: {str(e)}'}), 500
 
 
@@ -3890,9 +3644,10 @@ def create_tariff_rate():
         }
         
         result = mongo.db.tariff_rates.insert_one(tariff_rate)
+        config_cache.bump('tariff_rates')
         tariff_rate['_id'] = str(result.inserted_id)
         
-        logger.info(f"Tariff rate created: {data['bus_type']} - {data['rate_per_km']} ETB/km")
+        logger.info("Tariff rate created: %s - %s ETB/km", data['bus_type'], data['rate_per_km'])
         
         return jsonify({
             'success': True,
@@ -3901,7 +3656,7 @@ def create_tariff_rate():
         }), 201
         
     except Exception as e:
-        logger.error(f"Create tariff rate error: {e}")
+        logger.error("Create tariff rate error: %s", e)
         return jsonify({'error': f'Failed to create tariff rate: {str(e)}'}), 500
 
 
@@ -3967,11 +3722,12 @@ def update_tariff_rate(rate_id):
         
         if result.modified_count == 0:
             return jsonify({'error': 'No changes made'}), 400
+        config_cache.bump('tariff_rates')
         
         # Get updated rate
         updated_rate = mongo.db.tariff_rates.find_one({'_id': rate_oid})
         
-        logger.info(f"Tariff rate updated: {rate_id}")
+        logger.info("Tariff rate updated: %s", rate_id)
         
         return jsonify({
             'success': True,
@@ -3982,7 +3738,7 @@ def update_tariff_rate(rate_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Update tariff rate error: {e}")
+        logger.error("Update tariff rate error: %s", e)
         return jsonify({'error': f'Failed to update tariff rate: {str(e)}'}), 500
 
 
@@ -4010,8 +3766,9 @@ def delete_tariff_rate(rate_id):
         
         if result.modified_count == 0:
             return jsonify({'error': 'Tariff rate not found or already deactivated'}), 404
+        config_cache.bump('tariff_rates')
         
-        logger.info(f"Tariff rate deactivated: {rate_id}")
+        logger.info("Tariff rate deactivated: %s", rate_id)
         
         return jsonify({
             'success': True,
@@ -4021,7 +3778,7 @@ def delete_tariff_rate(rate_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Delete tariff rate error: {e}")
+        logger.error("Delete tariff rate error: %s", e)
         return jsonify({'error': f'Failed to delete tariff rate: {str(e)}'}), 500
 
 
@@ -4039,15 +3796,7 @@ def calculate_tariff():
         
         # Get current rate for bus type
         now = datetime.now()
-        rate_doc = mongo.db.tariff_rates.find_one({
-            'bus_type': bus_type,
-            'is_active': True,
-            'effective_from': {'$lte': now},
-            '$or': [
-                {'effective_until': None},
-                {'effective_until': {'$gte': now}}
-            ]
-        })
+        rate_doc = find_tariff_rate(bus_type, effective_at=now)
         
         # Use default if not found
         default_rates = {
@@ -4083,7 +3832,7 @@ def calculate_tariff():
         }), 200
         
     except Exception as e:
-        logger.error(f"Calculate tariff error: {e}")
+        logger.error("Calculate tariff error: %s", e)
         return jsonify({'error': f'Failed to calculate tariff: {str(e)}'}), 500
 
 
@@ -4114,12 +3863,12 @@ def get_bus_reports():
         if bus_number:
             query['bus_number'] = bus_number
         
-        print(f"📋 Fetching bus reports with query: {query}")
+        logger.debug("📋 Fetching bus reports with query: %s", query)
         
         # Get reports sorted by creation date (newest first)
         reports = list(mongo.db.bus_reports.find(query).sort('created_at', -1))
         
-        print(f"✅ Found {len(reports)} bus reports")
+        logger.debug("✅ Found %s bus reports", len(reports))
         
         # Serialize reports
         serialized_reports = []
@@ -4154,7 +3903,7 @@ def get_bus_reports():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get bus reports error: {e}")
+        logger.error("Get bus reports error: %s", e)
         return jsonify({'error': f'Failed to fetch bus reports: {str(e)}'}), 500
 
 @operator_bp.route('/bus-reports/<report_id>', methods=['PATCH'])
@@ -4197,7 +3946,7 @@ def update_bus_report(report_id):
         # Get updated report
         updated_report = mongo.db.bus_reports.find_one({'_id': report_oid})
         
-        print(f"✅ Bus report updated: {report_id} - Status: {update_data.get('status', 'unchanged')}")
+        logger.debug("✅ Bus report updated: %s - Status: %s", report_id, update_data.get('status', 'unchanged'))
         
         return jsonify({
             'success': True,
@@ -4208,7 +3957,7 @@ def update_bus_report(report_id):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Update bus report error: {e}")
+        logger.error("Update bus report error: %s", e)
         return jsonify({'error': f'Failed to update report: {str(e)}'}), 500
 
 @operator_bp.route('/bus-reports/stats', methods=['GET'])
@@ -4265,5 +4014,5 @@ def get_bus_reports_stats():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get bus reports stats error: {e}")
+        logger.error("Get bus reports stats error: %s", e)
         return jsonify({'error': f'Failed to fetch stats: {str(e)}'}), 500
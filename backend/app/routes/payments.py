@@ -1,6 +1,13 @@
+import logging
 from flask import Blueprint, request, jsonify, current_app, redirect
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import mongo
+from app.logging import PER_ITEM
+from app.utils.booking_commit import BookingConflict, commit_booking
+from app.utils.ids import new_baggage_tag, new_pnr
+from app.utils.outbox import booking_events
+from app.utils.seat_map_cache import seat_map_cache
+from app.utils.schema import canonical_document, schedule_ref
 from bson import ObjectId
 from datetime import datetime
 import requests
@@ -9,6 +16,7 @@ import random
 import string
 
 payments_bp = Blueprint('payments', __name__)
+logger = logging.getLogger(__name__)
 
 def is_valid_object_id(id_string):
     """Check if a string is a valid MongoDB ObjectId"""
@@ -16,16 +24,6 @@ def is_valid_object_id(id_string):
         return False
     return re.match(r'^[a-f\d]{24}$', id_string) is not None
 
-def generate_pnr():
-    """Generate unique PNR number"""
-    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-    return f"ETB{timestamp}"
-
-def generate_baggage_tag():
-    """Generate unique baggage tag"""
-    timestamp = datetime.utcnow().strftime('%H%M%S')
-    return f"BT{timestamp}"
-
 def calculate_baggage_fee(weight_kg):
     """Calculate baggage fee based on weight"""
     if weight_kg <= 15:
@@ -42,12 +40,12 @@ def verify_with_chapa_directly_full(tx_ref):
     try:
         chapa_secret_key = current_app.config.get('CHAPA_SECRET_KEY')
         if not chapa_secret_key:
-            print("❌ Chapa secret key not configured")
+            logger.warning("❌ Chapa secret key not configured")
             return None
         
         headers = {'Authorization': f'Bearer {chapa_secret_key}'}
         
-        print(f"🔍 Checking Chapa API for: {tx_ref}")
+        logger.debug("🔍 Checking Chapa API for: %s", tx_ref)
         
         response = requests.get(
             f"{current_app.config['CHAPA_BASE_URL']}/transaction/verify/{tx_ref}",
@@ -58,7 +56,7 @@ def verify_with_chapa_directly_full(tx_ref):
         if response.status_code == 200:
             data = response.json()
             chapa_status = data.get('data', {}).get('status')
-            print(f"✅ Chapa direct verification: {chapa_status}")
+            logger.debug("✅ Chapa direct verification: %s", chapa_status)
             
             return {
                 'status': chapa_status,
@@ -66,11 +64,11 @@ def verify_with_chapa_directly_full(tx_ref):
                 'full_data': data
             }
         else:
-            print(f"❌ Chapa verification failed: {response.status_code}")
+            logger.warning("❌ Chapa verification failed: %s", response.status_code)
             return None
             
     except Exception as e:
-        print(f"❌ Direct verification error: {str(e)}")
+        logger.error("❌ Direct verification error: %s", str(e))
         return None
 
 def get_schedule_with_cities(schedule_id):
@@ -78,29 +76,29 @@ def get_schedule_with_cities(schedule_id):
     try:
         db = mongo.db
         
-        print(f"🔍 Getting schedule: {schedule_id}")
+        logger.debug("🔍 Getting schedule: %s", schedule_id)
         schedule = db.busschedules.find_one({'_id': ObjectId(schedule_id)})
         
         if not schedule:
-            print(f"❌ Schedule not found: {schedule_id}")
+            logger.warning("❌ Schedule not found: %s", schedule_id)
             return None
         
-        print(f"✅ Schedule found: {schedule.get('_id')}")
-        print(f"📋 Schedule keys: {list(schedule.keys())}")
-        print(f"📋 Schedule sample data: origin_city={schedule.get('origin_city')}, destination_city={schedule.get('destination_city')}")
+        logger.debug("✅ Schedule found: %s", schedule.get('_id'))
+        logger.debug("📋 Schedule keys: %s", list(schedule.keys()))
+        logger.debug("📋 Schedule sample data: origin_city=%s, destination_city=%s", schedule.get('origin_city'), schedule.get('destination_city'))
         
         # FIXED: Get cities from schedule using snake_case field names
         departure_city = schedule.get('origin_city') or schedule.get('departure_city')
         arrival_city = schedule.get('destination_city') or schedule.get('arrival_city')
         
-        print(f"📍 Schedule cities - departure: {departure_city}, arrival: {arrival_city}")
+        logger.debug("📍 Schedule cities - departure: %s, arrival: %s", departure_city, arrival_city)
         
         # If schedule doesn't have direct city fields, get from route
         if not departure_city or not arrival_city:
-            print("🔄 Getting cities from route...")
-            route_id = schedule.get('route_id') or schedule.get('routeId')
+            logger.debug("🔄 Getting cities from route...")
+            route_id = schedule.get('route_id')
             if not route_id:
-                print("❌ No route_id in schedule")
+                logger.warning("❌ No route_id in schedule")
                 return None
             
             try:
@@ -110,24 +108,24 @@ def get_schedule_with_cities(schedule_id):
                 route = db.routes.find_one({'_id': route_id})
                 
             if not route:
-                print(f"❌ Route not found: {route_id}")
+                logger.warning("❌ Route not found: %s", route_id)
                 return None
             
-            print(f"✅ Route found: {route.get('_id')}")
+            logger.debug("✅ Route found: %s", route.get('_id'))
             
             departure_city = route.get('origin_city')
             arrival_city = route.get('destination_city')
-            print(f"📍 Route cities - origin: {departure_city}, destination: {arrival_city}")
+            logger.debug("📍 Route cities - origin: %s, destination: %s", departure_city, arrival_city)
         
         # VALIDATION: Ensure we have both cities
         if not departure_city:
-            print("❌ Missing departure city")
+            logger.warning("❌ Missing departure city")
             return None
         if not arrival_city:
-            print("❌ Missing arrival city")
+            logger.warning("❌ Missing arrival city")
             return None
         
-        print(f"✅ Cities confirmed: {departure_city} → {arrival_city}")
+        logger.debug("✅ Cities confirmed: %s → %s", departure_city, arrival_city)
         
         # Handle travel date - check both formats
         travel_date_obj = schedule.get('departure_date') or schedule.get('departure_date')
@@ -142,10 +140,10 @@ def get_schedule_with_cities(schedule_id):
         
         # Validate required fields
         if not travel_date:
-            print("❌ Missing travel date")
+            logger.warning("❌ Missing travel date")
             return None
         if not departure_time:
-            print("❌ Missing departure time")
+            logger.warning("❌ Missing departure time")
             return None
         
         return {
@@ -161,27 +159,27 @@ def get_schedule_with_cities(schedule_id):
         }
         
     except Exception as e:
-        print(f"❌ Error getting schedule: {str(e)}")
+        logger.error("❌ Error getting schedule: %s", str(e))
         return None
 
 def create_booking_from_payment(booking_data, user_id, tx_ref, payment_method='chapa'):
     """Create booking record after successful payment - SET STATUS TO PENDING"""
     try:
-        pnr_number = generate_pnr()
+        pnr_number = new_pnr()
         has_baggage = booking_data.get('has_baggage', False)
         baggage_weight = booking_data.get('baggage_weight', 0)
-        baggage_tag = generate_baggage_tag() if has_baggage and baggage_weight > 0 else None
+        baggage_tag = new_baggage_tag() if has_baggage and baggage_weight > 0 else None
         
         # Get schedule with city information
         schedule_id = booking_data.get('schedule_id')
         schedule_info = get_schedule_with_cities(schedule_id)
         
         if not schedule_info:
-            print(f"❌ Failed to get route information for schedule: {schedule_id}")
+            logger.warning("❌ Failed to get route information for schedule: %s", schedule_id)
             return None
         
-        print(f"📍 Route Info: {schedule_info['departure_city']} → {schedule_info['arrival_city']}")
-        print(f"📅 Schedule Info: {schedule_info['travel_date']} at {schedule_info['departure_time']}")
+        logger.debug("📍 Route Info: %s → %s", schedule_info['departure_city'], schedule_info['arrival_city'])
+        logger.debug("📅 Schedule Info: %s at %s", schedule_info['travel_date'], schedule_info['departure_time'])
         
         # Calculate baggage fee if needed
         baggage_fee = 0
@@ -199,21 +197,21 @@ def create_booking_from_payment(booking_data, user_id, tx_ref, payment_method='c
         # Use the discounted total_amount from frontend if provided, otherwise calculate
         if 'total_amount' in booking_data and loyalty_discount_amount > 0:
             total_amount = booking_data['total_amount']
-            print(f"💰 Using discounted amount from frontend: {total_amount} ETB (saved {loyalty_discount_amount} ETB)")
+            logger.debug("💰 Using discounted amount from frontend: %s ETB (saved %s ETB)", total_amount, loyalty_discount_amount)
         else:
             total_amount = base_total
-            print(f"💰 No discount applied")
+            logger.debug("💰 No discount applied")
         
         # FIXED: Set status to 'confirmed' for paid bookings
         booking_status = 'confirmed'  # Set to confirmed when payment is completed
         payment_status = 'paid'       # Payment is completed
         
-        print(f"🎯 STATUS SETTINGS: booking='{booking_status}', payment='{payment_status}'")
+        logger.debug("🎯 STATUS SETTINGS: booking='%s', payment='%s'", booking_status, payment_status)
         
         # Create booking record
         booking_record = {
             'user_id': ObjectId(user_id),
-            'schedule_id': ObjectId(schedule_id) if schedule_id and is_valid_object_id(schedule_id) else None,
+            'schedule_id': schedule_ref(schedule_id),
             'seat_numbers': booking_data.get('seat_numbers', []),
             'passenger_name': booking_data.get('passenger_name', ''),
             'passenger_phone': booking_data.get('passenger_phone', ''),
@@ -261,68 +259,38 @@ def create_booking_from_payment(booking_data, user_id, tx_ref, payment_method='c
             'updated_at': datetime.utcnow()
         }
         
-        # Insert the booking
-        result = mongo.db.bookings.insert_one(booking_record)
-        
-        # Update schedule booked seats count
-        num_seats = len(booking_data.get('seat_numbers', []))
-        if num_seats > 0:
-            print(f"🔄 Updating schedule {schedule_id} with {num_seats} seats...")
-            
-            update_result = mongo.db.busschedules.update_one(
-                {'_id': ObjectId(schedule_id)},
-                {
-                    '$inc': {
-                        'booked_seats': num_seats,
-                        'available_seats': -num_seats
-                    }
-                }
-            )
-            
-            if update_result.modified_count > 0:
-                print(f"✅ Schedule updated successfully! Modified: {update_result.modified_count}")
-            else:
-                print(f"⚠️  Schedule NOT updated! Matched: {update_result.matched_count}, Modified: {update_result.modified_count}")
+        # The payment turns into exactly one booking, even when the callback
+        # and the verify endpoint both get here
+        payment_guard = {
+            'collection': 'payments',
+            'filter': {'tx_ref': tx_ref, 'booking_created': {'$ne': True}},
+            'update': {'$set': {'booking_created': True, 'booking_id': str(booking_record.setdefault('_id', ObjectId()))}},
+            'conflict': 'A booking was already created for this payment',
+            'undo': {'$unset': {'booking_created': '', 'booking_id': ''}}
+        }
         
-        # Award loyalty points for the booking (100 points per booking)
+        # Seats, booking and its outbox events (loyalty points, search counts,
+        # rollups, broadcast) in one transaction
+        loyalty_points_earned = 100
         try:
-            loyalty_points_earned = 100
-            user_update = mongo.db.users.update_one(
-                {'_id': ObjectId(user_id)},
-                {
-                    '$inc': {
-                        'loyalty_points': loyalty_points_earned,
-                        'total_bookings': 1
-                    }
-                }
+            booking_id = commit_booking(
+                booking_record,
+                [payment_guard],
+                lambda booking_id: booking_events(booking_id, booking_record, loyalty_points=loyalty_points_earned)
             )
-            if user_update.modified_count > 0:
-                print(f"🎁 Awarded {loyalty_points_earned} loyalty points to user {user_id}")
-                
-                # Update user's loyalty tier based on new points
-                user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
-                if user:
-                    from app.utils.loyalty import get_loyalty_tier
-                    new_points = user.get('loyalty_points', 0)
-                    new_tier = get_loyalty_tier(new_points)
-                    mongo.db.users.update_one(
-                        {'_id': ObjectId(user_id)},
-                        {'$set': {'loyalty_tier': new_tier}}
-                    )
-                    print(f"🏆 Updated loyalty tier to: {new_tier}")
-            else:
-                print(f"⚠️ Failed to award loyalty points to user {user_id}")
-        except Exception as loyalty_error:
-            print(f"⚠️ Error awarding loyalty points: {str(loyalty_error)}")
+        except BookingConflict as conflict:
+            logger.error("❌ Booking not created for payment %s: %s", tx_ref, conflict)
+            return None
+        seat_map_cache.booking_added(booking_record)
         
-        print(f"✅ Booking created successfully: {result.inserted_id}")
-        print(f"📋 Booking details: {schedule_info['departure_city']} → {schedule_info['arrival_city']} on {schedule_info['travel_date']}")
-        print(f"💰 Payment method: {payment_method}")
-        print(f"✅ Booking status set to: {booking_status}")
-        print(f"✅ Payment status set to: {payment_status}")
+        logger.debug("✅ Booking created successfully: %s", booking_id)
+        logger.debug("📋 Booking details: %s → %s on %s", schedule_info['departure_city'], schedule_info['arrival_city'], schedule_info['travel_date'])
+        logger.debug("💰 Payment method: %s", payment_method)
+        logger.debug("✅ Booking status set to: %s", booking_status)
+        logger.debug("✅ Payment status set to: %s", payment_status)
         
         return {
-            'booking_id': str(result.inserted_id),
+            'booking_id': booking_id,
             'pnr_number': pnr_number,
             'baggage_tag': baggage_tag,
             'route': f"{schedule_info['departure_city']} → {schedule_info['arrival_city']}",
@@ -334,9 +302,8 @@ def create_booking_from_payment(booking_data, user_id, tx_ref, payment_method='c
         }
         
     except Exception as e:
-        print(f"❌ Error creating booking: {str(e)}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
+        logger.error("❌ Error creating booking: %s", str(e))
+        logger.error("❌ Traceback", exc_info=True)
         return None
 
 @payments_bp.route('/chapa/initialize', methods=['POST'])
@@ -353,7 +320,7 @@ def initialize_chapa_payment():
         data = request.get_json()
         user_id = get_jwt_identity()
         
-        print(f"🔄 Initializing Chapa payment for user {user_id}")
+        logger.debug("🔄 Initializing Chapa payment for user %s", user_id)
         
         # Generate unique transaction reference
         tx_ref = data.get('tx_ref', f"ethiobus-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{user_id[-6:]}")
@@ -372,8 +339,8 @@ def initialize_chapa_payment():
             'created_at': datetime.utcnow()
         }
         
-        mongo.db.payments.insert_one(payment_record)
-        print(f"💾 Stored payment record with tx_ref: {tx_ref}")
+        mongo.db.payments.insert_one(canonical_document('payments', payment_record))
+        logger.debug("💾 Stored payment record with tx_ref: %s", tx_ref)
 
         # Get URLs
         base_url = request.host_url.rstrip('/')
@@ -406,9 +373,9 @@ def initialize_chapa_payment():
             }
         }
         
-        print(f"📤 Making request to Chapa API with tx_ref: {tx_ref}")
-        print(f"📋 Chapa data: email={chapa_data['email']}, first_name={chapa_data['first_name']}, amount={chapa_data['amount']}, phone={chapa_data['phone_number']}")
-        print(f"📋 Full Chapa request: {chapa_data}")
+        logger.debug("📤 Making request to Chapa API with tx_ref: %s", tx_ref)
+        logger.debug("📋 Chapa data: email=%s, first_name=%s, amount=%s, phone=%s", chapa_data['email'], chapa_data['first_name'], chapa_data['amount'], chapa_data['phone_number'])
+        logger.debug("📋 Full Chapa request: %s", chapa_data)
         
         headers = {
             'Authorization': f'Bearer {chapa_secret_key}',
@@ -423,7 +390,7 @@ def initialize_chapa_payment():
         )
         
         response_data = response.json()
-        print(f"📥 Chapa API response: {response.status_code}")
+        logger.debug("📥 Chapa API response: %s", response.status_code)
         
         if response.status_code == 200 and response_data['status'] == 'success':
             # Update payment record with checkout URL
@@ -445,7 +412,7 @@ def initialize_chapa_payment():
             }), 200
         else:
             error_msg = response_data.get('message', 'Failed to initialize payment')
-            print(f"❌ Chapa API error: {error_msg}")
+            logger.warning("❌ Chapa API error: %s", error_msg)
             
             mongo.db.payments.update_one(
                 {'tx_ref': tx_ref},
@@ -461,50 +428,49 @@ def initialize_chapa_payment():
             }), 400
             
     except Exception as e:
-        print(f"❌ Internal server error: {str(e)}")
+        logger.error("❌ Internal server error: %s", str(e))
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
 @payments_bp.route('/chapa/callback', methods=['GET', 'POST'])
 def chapa_callback():
     """Handle Chapa payment callback - both return_url (GET) and webhook (POST)"""
     try:
-        print("=" * 50)
-        print("🔄 CHAPA CALLBACK RECEIVED")
-        print(f"📨 Method: {request.method}")
-        print(f"📍 URL: {request.url}")
+        logger.debug("🔄 CHAPA CALLBACK RECEIVED")
+        logger.debug("📨 Method: %s", request.method)
+        logger.debug("📍 URL: %s", request.url)
         
         # Get data based on method
         if request.method == 'GET':
             data = request.args.to_dict()
-            print("📨 GET Parameters:", data)
+            logger.debug("📨 GET Parameters: %s", data)
         else:
             data = request.get_json() or request.form.to_dict()
-            print("📨 POST Data:", data)
+            logger.debug("📨 POST Data: %s", data)
         
         tx_ref = data.get('tx_ref')
         status = data.get('status')
         
-        print(f"🔍 Extracted - tx_ref: {tx_ref}, status: {status}")
+        logger.debug("🔍 Extracted - tx_ref: %s, status: %s", tx_ref, status)
         
         if not tx_ref:
-            print("❌ No tx_ref in callback")
+            logger.warning("❌ No tx_ref in callback")
             return redirect(f"{current_app.config.get('FRONTEND_URL', 'http://localhost:3000')}/payment-failed?error=no_tx_ref")
         
         # Find payment record
         payment = mongo.db.payments.find_one({'tx_ref': tx_ref})
         if not payment:
-            print(f"❌ Payment not found: {tx_ref}")
+            logger.warning("❌ Payment not found: %s", tx_ref)
             return redirect(f"{current_app.config.get('FRONTEND_URL', 'http://localhost:3000')}/payment-failed?error=payment_not_found")
         
         # If status is not provided or is pending, verify with Chapa directly
         if not status or status == 'pending':
-            print("🔄 Status missing or pending, verifying with Chapa...")
+            logger.debug("🔄 Status missing or pending, verifying with Chapa...")
             chapa_result = verify_with_chapa_directly_full(tx_ref)
             if chapa_result and chapa_result.get('status'):
                 status = chapa_result['status']
-                print(f"🔄 Updated status to: {status}")
+                logger.debug("🔄 Updated status to: %s", status)
         
-        print(f"📊 Final status: {status}")
+        logger.debug("📊 Final status: %s", status)
         
         # Update payment record
         update_data = {
@@ -528,28 +494,27 @@ def chapa_callback():
                 if booking_result:
                     update_data['booking_created'] = True
                     update_data['booking_id'] = booking_result['booking_id']
-                    print(f"✅ Booking created with status: {booking_result['status']}")
+                    logger.debug("✅ Booking created with status: %s", booking_result['status'])
         
         mongo.db.payments.update_one(
             {'tx_ref': tx_ref},
             {'$set': update_data}
         )
         
-        print(f"✅ Callback processed - tx_ref: {tx_ref}, status: {status}")
+        logger.debug("✅ Callback processed - tx_ref: %s, status: %s", tx_ref, status)
         
         # Redirect to frontend
         if request.method == 'GET':
             frontend_url = current_app.config.get('FRONTEND_URL', 'http://localhost:3000')
             redirect_url = f"{frontend_url}/payment-callback?tx_ref={tx_ref}&status={status}"
-            print(f"🔀 Redirecting to: {redirect_url}")
+            logger.debug("🔀 Redirecting to: %s", redirect_url)
             return redirect(redirect_url)
         else:
             return jsonify({'status': 'success', 'message': 'Webhook processed'}), 200
         
     except Exception as e:
-        print(f"❌ Callback error: {str(e)}")
-        import traceback
-        print(f"🐛 Stack trace: {traceback.format_exc()}")
+        logger.error("❌ Callback error: %s", str(e))
+        logger.error("🐛 Stack trace", exc_info=True)
         
         if request.method == 'GET':
             return redirect(f"{current_app.config.get('FRONTEND_URL', 'http://localhost:3000')}/payment-failed?error=callback_error")
@@ -561,7 +526,7 @@ def verify_payment(tx_ref):
     """Verify payment status and create booking if successful"""
     try:
         user_id = get_jwt_identity()
-        print(f"🔍 Verifying payment for tx_ref: {tx_ref}, user: {user_id}")
+        logger.debug("🔍 Verifying payment for tx_ref: %s, user: %s", tx_ref, user_id)
         
         # Find payment record
         payment = mongo.db.payments.find_one({
@@ -570,7 +535,7 @@ def verify_payment(tx_ref):
         })
         
         if not payment:
-            print(f"❌ Payment not found for tx_ref: {tx_ref}")
+            logger.warning("❌ Payment not found for tx_ref: %s", tx_ref)
             return jsonify({
                 'success': False,
                 'message': 'Payment not found',
@@ -578,16 +543,16 @@ def verify_payment(tx_ref):
             }), 404
         
         payment_status = payment.get('status', 'unknown')
-        print(f"📊 Payment status in DB: {payment_status}")
+        logger.debug("📊 Payment status in DB: %s", payment_status)
         
         # If payment is pending, check with Chapa directly
         if payment_status == 'pending':
-            print("🔄 Payment is pending, checking with Chapa directly...")
+            logger.debug("🔄 Payment is pending, checking with Chapa directly...")
             chapa_result = verify_with_chapa_directly_full(tx_ref)
             
             if chapa_result and chapa_result.get('status') and chapa_result['status'] != 'pending':
                 new_status = chapa_result['status']
-                print(f"🔄 Updating status from {payment_status} to {new_status}")
+                logger.debug("🔄 Updating status from %s to %s", payment_status, new_status)
                 payment_status = new_status
                 
                 # Update database with Chapa's actual status
@@ -611,7 +576,7 @@ def verify_payment(tx_ref):
         
         # If payment is successful, create booking
         if payment_status == 'success':
-            print(f"✅ Payment successful, creating booking...")
+            logger.debug("✅ Payment successful, creating booking...")
             
             # Create booking if not already created
             if not payment.get('booking_created') and 'booking_data' in payment:
@@ -623,7 +588,7 @@ def verify_payment(tx_ref):
                 )
                 
                 if booking_result:
-                    print(f"✅ Booking created: {booking_result}")
+                    logger.debug("✅ Booking created: %s", booking_result)
                     # Update payment record
                     mongo.db.payments.update_one(
                         {'tx_ref': tx_ref},
@@ -643,7 +608,7 @@ def verify_payment(tx_ref):
                         'baggage_tag': booking_result.get('baggage_tag')
                     })
                 else:
-                    print(f"❌ Failed to create booking for tx_ref: {tx_ref}")
+                    logger.warning("❌ Failed to create booking for tx_ref: %s", tx_ref)
                     return jsonify({
                         'success': False,
                         'message': 'Payment successful but booking creation failed',
@@ -669,9 +634,8 @@ def verify_payment(tx_ref):
             })
             
     except Exception as e:
-        print(f"❌ Verification error: {str(e)}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
+        logger.error("❌ Verification error: %s", str(e))
+        logger.error("❌ Traceback", exc_info=True)
         
         return jsonify({
             'success': False,
@@ -686,8 +650,8 @@ def create_telebirr_payment():
         data = request.get_json()
         user_id = get_jwt_identity()
         
-        print(f"📱 Creating Telebirr booking for user {user_id}")
-        print(f"📦 Booking data: {data}")
+        logger.debug("📱 Creating Telebirr booking for user %s", user_id)
+        logger.debug("📦 Booking data: %s", data)
         
         # Required fields validation
         required_fields = ['schedule_id', 'seat_numbers', 'base_fare']
@@ -701,7 +665,7 @@ def create_telebirr_payment():
         passenger_phone = data.get('passenger_phone')
         requested_seats = data['seat_numbers']
         
-        print(f"🔍 DEBUG - Passengers data: {passengers_data}")
+        logger.debug("🔍 DEBUG - Passengers data: %s", passengers_data)
         
         # Build passengers list
         passengers_list = []
@@ -744,9 +708,9 @@ def create_telebirr_payment():
         if not passengers_list:
             return jsonify({'error': 'At least one passenger with name and phone is required'}), 400
         
-        print(f"✅ Parsed {len(passengers_list)} passengers:")
+        logger.debug("✅ Parsed %s passengers:", len(passengers_list))
         for i, p in enumerate(passengers_list):
-            print(f"  Passenger {i+1}: {p['name']} ({p['phone']}) - Seat {p['seat_number']}")
+            logger.debug("Passenger %s: %s (%s) - Seat %s", i+1, p['name'], p['phone'], p['seat_number'], extra=PER_ITEM)
         
         # Use first passenger as primary contact
         primary_passenger = passengers_list[0]
@@ -761,12 +725,12 @@ def create_telebirr_payment():
         if not schedule_info:
             return jsonify({'error': 'Could not retrieve complete schedule information. Missing route data.'}), 400
         
-        print(f"✅ Schedule info retrieved: {schedule_info['departure_city']} → {schedule_info['arrival_city']}")
+        logger.debug("✅ Schedule info retrieved: %s → %s", schedule_info['departure_city'], schedule_info['arrival_city'])
         
-        pnr_number = generate_pnr()
+        pnr_number = new_pnr()
         has_baggage = data.get('has_baggage', False)
         baggage_weight = data.get('baggage_weight', 0)
-        baggage_tag = generate_baggage_tag() if has_baggage and baggage_weight > 0 else None
+        baggage_tag = new_baggage_tag() if has_baggage and baggage_weight > 0 else None
         
         # Calculate baggage fee if needed
         baggage_fee = 0
@@ -784,23 +748,23 @@ def create_telebirr_payment():
         # Use the discounted total_amount from frontend if provided, otherwise calculate
         if 'total_amount' in data and loyalty_discount_amount > 0:
             total_amount = data['total_amount']
-            print(f"💰 Using discounted amount from frontend: {total_amount} ETB (saved {loyalty_discount_amount} ETB)")
+            logger.debug("💰 Using discounted amount from frontend: %s ETB (saved %s ETB)", total_amount, loyalty_discount_amount)
         else:
             total_amount = base_total
-            print(f"💰 No discount applied")
+            logger.debug("💰 No discount applied")
         
-        print(f"💰 Pricing - Base: {base_fare}, Baggage: {baggage_fee}, Discount: {loyalty_discount_amount}, Total: {total_amount}")
+        logger.debug("💰 Pricing - Base: %s, Baggage: %s, Discount: %s, Total: %s", base_fare, baggage_fee, loyalty_discount_amount, total_amount)
         
         # FIXED: Set status to 'confirmed' for Telebirr payments
         booking_status = 'confirmed'
         payment_status = 'paid'
         
-        print(f"🎯 TELEBIRR PAYMENT STATUS: booking='{booking_status}', payment='{payment_status}'")
+        logger.debug("🎯 TELEBIRR PAYMENT STATUS: booking='%s', payment='%s'", booking_status, payment_status)
         
         # Create booking record
         booking_record = {
             'user_id': ObjectId(user_id),
-            'schedule_id': ObjectId(schedule_id),
+            'schedule_id': schedule_ref(schedule_id),
             'seat_numbers': data['seat_numbers'],
             'passenger_name': passenger_name,  # Primary passenger
             'passenger_phone': passenger_phone,  # Primary passenger
@@ -848,20 +812,16 @@ def create_telebirr_payment():
             'updated_at': datetime.utcnow()
         }
         
-        print(f"📝 Final booking record:")
-        print(f"   Route: {booking_record['departure_city']} → {booking_record['arrival_city']}")
-        print(f"   Date: {booking_record['travel_date']} at {booking_record['departure_time']}")
-        print(f"   Bus: {booking_record['bus_type']} {booking_record['bus_number']}")
-        print(f"   Status: {booking_record['status']}")
-        print(f"   Payment Status: {booking_record['payment_status']}")
+        logger.debug("📝 Final booking record:")
+        logger.debug("Route: %s → %s", booking_record['departure_city'], booking_record['arrival_city'])
+        logger.debug("Date: %s at %s", booking_record['travel_date'], booking_record['departure_time'])
+        logger.debug("Bus: %s %s", booking_record['bus_type'], booking_record['bus_number'])
+        logger.debug("Status: %s", booking_record['status'])
+        logger.debug("Payment Status: %s", booking_record['payment_status'])
         
-        # Insert the booking
-        result = mongo.db.bookings.insert_one(booking_record)
-        booking_id = str(result.inserted_id)
-        
-        # Create payment record in payments collection
-        try:
-            payment_record = {
+        # Payment record, linked to the booking id assigned by commit_booking
+        def payment_record(booking_id):
+            return canonical_document('payments', {
                 'user_id': ObjectId(user_id),
                 'booking_id': booking_id,
                 'amount': total_amount,
@@ -874,74 +834,34 @@ def create_telebirr_payment():
                 'tx_ref': f"telebirr-{booking_id}",
                 'booking_data': {
                     'schedule_id': schedule_id,
-                    'passenger_name': data['passenger_name'],
-                    'passenger_phone': data['passenger_phone'],
+                    'passenger_name': passenger_name,
+                    'passenger_phone': passenger_phone,
                     'seat_numbers': data['seat_numbers'],
                     'base_fare': base_fare
                 },
                 'created_at': datetime.utcnow(),
                 'updated_at': datetime.utcnow(),
                 'paid_at': datetime.utcnow()
-            }
-            
-            payment_result = mongo.db.payments.insert_one(payment_record)
-            print(f"✅ Payment record created: {payment_result.inserted_id}")
-        except Exception as payment_error:
-            print(f"⚠️  Failed to create payment record: {str(payment_error)}")
-            import traceback
-            print(f"⚠️  Payment error traceback: {traceback.format_exc()}")
-        
-        # Update schedule booked seats count
-        num_seats = len(data['seat_numbers'])
-        print(f"🔄 Updating schedule {schedule_id} with {num_seats} seats...")
-        
-        update_result = mongo.db.busschedules.update_one(
-            {'_id': ObjectId(schedule_id)},
-            {
-                '$inc': {
-                    'booked_seats': num_seats,
-                    'available_seats': -num_seats
-                }
-            }
-        )
-        
-        if update_result.modified_count > 0:
-            print(f"✅ Schedule updated successfully! Modified: {update_result.modified_count}")
-        else:
-            print(f"⚠️  Schedule NOT updated! Matched: {update_result.matched_count}, Modified: {update_result.modified_count}")
+            })
         
-        # Award loyalty points for the booking (100 points per booking)
+        # Seats, booking, payment record and outbox events (loyalty points,
+        # search counts, rollups, broadcast) in one transaction
+        loyalty_points_earned = 100
         try:
-            loyalty_points_earned = 100
-            user_update = mongo.db.users.update_one(
-                {'_id': ObjectId(user_id)},
-                {
-                    '$inc': {
-                        'loyalty_points': loyalty_points_earned,
-                        'total_bookings': 1
-                    }
-                }
+            booking_id = commit_booking(
+                booking_record,
+                events=lambda booking_id: booking_events(
+                    booking_id, booking_record, loyalty_points=loyalty_points_earned
+                ),
+                payment=payment_record
             )
-            if user_update.modified_count > 0:
-                print(f"🎁 Awarded {loyalty_points_earned} loyalty points to user {user_id}")
-                
-                # Update user's loyalty tier based on new points
-                user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
-                if user:
-                    from app.utils.loyalty import get_loyalty_tier
-                    new_points = user.get('loyalty_points', 0)
-                    new_tier = get_loyalty_tier(new_points)
-                    mongo.db.users.update_one(
-                        {'_id': ObjectId(user_id)},
-                        {'$set': {'loyalty_tier': new_tier}}
-                    )
-                    print(f"🏆 Updated loyalty tier to: {new_tier}")
-            else:
-                print(f"⚠️ Failed to award loyalty points to user {user_id}")
-        except Exception as loyalty_error:
-            print(f"⚠️ Error awarding loyalty points: {str(loyalty_error)}")
+        except BookingConflict as conflict:
+            logger.warning("⚠️ Booking conflict on schedule %s: %s", schedule_id, conflict)
+            seat_map_cache.invalidate(schedule_id)
+            return jsonify({'success': False, 'error': str(conflict), 'conflict': True}), 409
+        seat_map_cache.booking_added(booking_record)
         
-        print(f"✅ Telebirr booking created: {booking_id}")
+        logger.debug("✅ Telebirr booking created: %s", booking_id)
         
         return jsonify({
             'success': True,
@@ -960,9 +880,8 @@ def create_telebirr_payment():
         }), 200
         
     except Exception as e:
-        print(f"❌ Telebirr booking error: {str(e)}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
+        logger.error("❌ Telebirr booking error: %s", str(e))
+        logger.error("❌ Traceback", exc_info=True)
         return jsonify({'error': f'Telebirr booking failed: {str(e)}'}), 500
 
 @payments_bp.route('/methods', methods=['GET'])
@@ -1006,7 +925,7 @@ def debug_schedule(schedule_id):
     try:
         db = mongo.db
         
-        print(f"🔍 Debugging schedule: {schedule_id}")
+        logger.debug("🔍 Debugging schedule: %s", schedule_id)
         schedule = db.busschedules.find_one({'_id': ObjectId(schedule_id)})
         
         if not schedule:
@@ -1014,7 +933,7 @@ def debug_schedule(schedule_id):
         
         # Get route information
         route = None
-        route_id = schedule.get('routeId')
+        route_id = schedule.get('route_id')
         if route_id:
             route = db.routes.find_one({'_id': ObjectId(route_id)})
         
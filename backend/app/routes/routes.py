@@ -1,19 +1,17 @@
+import logging
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from bson import ObjectId
 from datetime import datetime, timedelta
 from app import mongo
+from app.logging import PER_ITEM
+from app.utils.authz import is_admin
+from app.utils.query_budget import query_budget
+from app.utils.schedule_occupancy import booking_counts
+from app.utils.schedule_search import buses_by_ref, sync_route
 
 routes_bp = Blueprint('routes', __name__)
-
-def is_admin():
-    """Check if current user is admin"""
-    try:
-        current_user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
-        return user and user.get('role') == 'admin'
-    except:
-        return False
+logger = logging.getLogger(__name__)
 
 def is_schedule_completed(schedule):
     """Check if schedule has already departed (past date/time)"""
@@ -49,7 +47,7 @@ def is_schedule_completed(schedule):
         return departure_datetime < now
         
     except Exception as e:
-        print(f"❌ Error checking schedule completion: {e}")
+        logger.error("❌ Error checking schedule completion: %s", e)
         return True  # Consider error cases as completed for safety
 
 def is_bus_under_maintenance(schedule, bus_data=None):
@@ -78,49 +76,47 @@ def is_bus_under_maintenance(schedule, bus_data=None):
         return False
         
     except Exception as e:
-        print(f"❌ Error checking bus maintenance: {e}")
+        logger.error("❌ Error checking bus maintenance: %s", e)
         return False  # Assume not under maintenance on error
 
 def filter_valid_schedules(schedules):
     """Filter out completed schedules and buses under maintenance"""
     try:
-        db = mongo.db
         valid_schedules = []
         filtered_count = 0
+        # Every schedule's bus in one query
+        buses = buses_by_ref(schedule.get('bus_id') for schedule in schedules)
         
         for schedule in schedules:
             # Check if schedule has departed
             if is_schedule_completed(schedule):
-                print(f"⏰ Schedule {schedule.get('_id')} filtered out: Already departed")
+                logger.debug("⏰ Schedule %s filtered out: Already departed", schedule.get('_id'), extra=PER_ITEM)
                 filtered_count += 1
                 continue
             
             # Check bus maintenance status
-            bus_id = schedule.get('busId')
+            bus_id = schedule.get('bus_id')
             bus_data = None
             
             if bus_id:
-                try:
-                    bus_data = db.buses.find_one({'_id': ObjectId(bus_id)})
-                except:
-                    # If bus_id is not a valid ObjectId, try as string
-                    bus_data = db.buses.find_one({'bus_number': bus_id})
+                bus_data = buses.get(str(bus_id))
             
             if is_bus_under_maintenance(schedule, bus_data):
-                print(f"🔧 Schedule {schedule.get('_id')} filtered out: Bus under maintenance")
+                logger.debug("🔧 Schedule %s filtered out: Bus under maintenance", schedule.get('_id'), extra=PER_ITEM)
                 filtered_count += 1
                 continue
             
             valid_schedules.append(schedule)
         
-        print(f"✅ Filtered {len(valid_schedules)} valid schedules from {len(schedules)} total (filtered out: {filtered_count})")
+        logger.debug("✅ Filtered %s valid schedules from %s total (filtered out: %s)", len(valid_schedules), len(schedules), filtered_count)
         return valid_schedules
         
     except Exception as e:
-        print(f"❌ Error filtering schedules: {e}")
+        logger.error("❌ Error filtering schedules: %s", e)
         return schedules  # Return original list on error
 
 @routes_bp.route('/', methods=['GET'])
+@query_budget(3)
 def get_routes():
     """Get all active routes with schedule counts"""
     try:
@@ -133,29 +129,31 @@ def get_routes():
         
         routes_cursor = mongo.db.routes.find(query)
         routes = list(routes_cursor)
+        route_ids = [str(route['_id']) for route in routes]
+        
+        # Scheduled departures of every route in one query
+        schedules = list(mongo.db.busschedules.find({
+            'route_id': {'$in': route_ids},
+            'status': 'scheduled'
+        }))
+        schedule_counts = {}
+        for schedule in schedules:
+            schedule_counts[schedule['route_id']] = schedule_counts.get(schedule['route_id'], 0) + 1
+        
+        # Valid (non-completed, non-maintenance) schedules per route
+        available_counts = {}
+        for schedule in filter_valid_schedules(schedules):
+            available_counts[schedule['route_id']] = available_counts.get(schedule['route_id'], 0) + 1
         
         # Enrich routes with schedule counts and availability info
         enriched_routes = []
         for route in routes:
             route['_id'] = str(route['_id'])
+            available = available_counts.get(route['_id'], 0)
             
-            # Get active schedules count for this route
-            schedule_count = mongo.db.busschedules.count_documents({
-                'routeId': route['_id'],
-                'status': 'scheduled'
-            })
-            
-            # Get valid (non-completed, non-maintenance) schedules
-            schedules = list(mongo.db.busschedules.find({
-                'routeId': route['_id'],
-                'status': 'scheduled'
-            }))
-            
-            valid_schedules = filter_valid_schedules(schedules)
-            
-            route['schedule_count'] = schedule_count
-            route['available_schedules'] = len(valid_schedules)
-            route['has_available_schedules'] = len(valid_schedules) > 0
+            route['schedule_count'] = schedule_counts.get(route['_id'], 0)
+            route['available_schedules'] = available
+            route['has_available_schedules'] = available > 0
             
             enriched_routes.append(route)
         
@@ -235,7 +233,7 @@ def get_route(route_id):
         
         # Get schedules for this route
         schedules = list(mongo.db.busschedules.find({
-            'routeId': route_id,
+            'route_id': route_id,
             'status': 'scheduled'
         }))
         
@@ -286,6 +284,9 @@ def update_route(route_id):
         if result.matched_count == 0:
             return jsonify({'error': 'Route not found'}), 404
         
+        # Cities, stops and details are copied onto every departure's search document
+        sync_route(route_id)
+        
         return jsonify({'message': 'Route updated successfully'}), 200
         
     except Exception as e:
@@ -313,7 +314,7 @@ def deactivate_route(route_id):
         
         # Cancel future schedules for this route
         future_schedules = mongo.db.busschedules.find({
-            'routeId': route_id,
+            'route_id': route_id,
             'departure_date': {'$gte': datetime.utcnow().strftime('%Y-%m-%d')},
             'status': 'scheduled'
         })
@@ -330,6 +331,9 @@ def deactivate_route(route_id):
             )
             cancelled_count += 1
         
+        if cancelled_count:
+            sync_route(route_id)
+        
         return jsonify({
             'message': 'Route deactivated successfully',
             'cancelled_schedules': cancelled_count
@@ -427,7 +431,7 @@ def search_routes():
             # Check availability if requested
             if check_availability:
                 schedules = list(mongo.db.busschedules.find({
-                    'routeId': route['_id'],
+                    'route_id': str(route['_id']),
                     'status': 'scheduled'
                 }))
                 
@@ -460,6 +464,7 @@ def search_routes():
         return jsonify({'error': str(e)}), 500
 
 @routes_bp.route('/<route_id>/schedules', methods=['GET'])
+@query_budget(4)
 def get_route_schedules(route_id):
     """Get all schedules for a specific route with filtering options"""
     try:
@@ -470,7 +475,7 @@ def get_route_schedules(route_id):
         date_to = request.args.get('date_to')
         
         # Build query
-        query = {'routeId': route_id, 'status': 'scheduled'}
+        query = {'route_id': route_id, 'status': 'scheduled'}
         
         # Add date range filter
         if date_from:
@@ -484,6 +489,12 @@ def get_route_schedules(route_id):
         schedules_cursor = mongo.db.busschedules.find(query).sort('departure_date', 1)
         schedules = list(schedules_cursor)
         
+        # Buses and booking counts for every schedule up front
+        buses = buses_by_ref(schedule.get('bus_id') for schedule in schedules)
+        bookings_per_schedule = booking_counts(
+            (schedule['_id'] for schedule in schedules), ['confirmed', 'checked_in', 'pending']
+        )
+        
         # Apply filtering if not including all
         if not include_completed or not include_maintenance:
             filtered_schedules = []
@@ -494,13 +505,8 @@ def get_route_schedules(route_id):
                 
                 # Check if we should include maintenance schedules
                 if not include_maintenance:
-                    bus_id = schedule.get('busId')
-                    bus_data = None
-                    if bus_id:
-                        try:
-                            bus_data = mongo.db.buses.find_one({'_id': ObjectId(bus_id)})
-                        except:
-                            bus_data = mongo.db.buses.find_one({'bus_number': bus_id})
+                    bus_id = schedule.get('bus_id')
+                    bus_data = buses.get(str(bus_id)) if bus_id else None
                     
                     if is_bus_under_maintenance(schedule, bus_data):
                         continue
@@ -512,19 +518,9 @@ def get_route_schedules(route_id):
         # Enrich with bus information
         enriched_schedules = []
         for schedule in schedules:
-            bus = None
-            bus_id = schedule.get('busId')
-            if bus_id:
-                try:
-                    bus = mongo.db.buses.find_one({'_id': ObjectId(bus_id)})
-                except:
-                    bus = mongo.db.buses.find_one({'bus_number': bus_id})
-            
-            # Get booking count
-            booking_count = mongo.db.bookings.count_documents({
-                'schedule_id': str(schedule['_id']),
-                'status': {'$in': ['confirmed', 'checked_in', 'pending']}
-            })
+            bus_id = schedule.get('bus_id')
+            bus = buses.get(str(bus_id)) if bus_id else None
+            booking_count = bookings_per_schedule.get(str(schedule['_id']), 0)
             
             enriched_schedule = {
                 '_id': str(schedule['_id']),
@@ -583,7 +579,7 @@ def get_route_availability(route_id):
     try:
         # Get upcoming schedules
         schedules = list(mongo.db.busschedules.find({
-            'routeId': route_id,
+            'route_id': route_id,
             'status': 'scheduled',
             'departure_date': {'$gte': datetime.utcnow().strftime('%Y-%m-%d')}
         }).sort('departure_date', 1))
@@ -628,7 +624,7 @@ def get_route_stats():
         
         for route in all_routes:
             schedules = list(mongo.db.busschedules.find({
-                'routeId': str(route['_id']),
+                'route_id': str(route['_id']),
                 'status': 'scheduled'
             }))
             
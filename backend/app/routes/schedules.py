@@ -1,9 +1,16 @@
+import logging
 from flask import Blueprint, request, jsonify, make_response
 from bson import ObjectId
-from datetime import datetime, timedelta
+from datetime import datetime
 from app import mongo
+from app.logging import PER_ITEM
+from app.utils.presence import presence
+from app.utils.query_budget import query_budget
+from app.utils.schedule_occupancy import booked_seat_counts
+from app.utils.schedule_search import RESPONSE_PROJECTION, buses_by_ref
 
 schedules_bp = Blueprint('schedules', __name__)
+logger = logging.getLogger(__name__)
 
 # CORS headers function - REMOVED (Flask-CORS handles this globally)
 # This function is no longer needed since CORS is configured in app/__init__.py
@@ -21,7 +28,7 @@ def is_schedule_completed(schedule):
         departure_time = schedule.get('departure_time', '00:00')
         
         if not departure_date:
-            print(f"❌ No departure date for schedule {schedule.get('_id')}")
+            logger.warning("❌ No departure date for schedule %s", schedule.get('_id'))
             return False  # Don't filter out schedules without dates
         
         # Parse departure datetime - handle various formats
@@ -40,7 +47,7 @@ def is_schedule_completed(schedule):
             try:
                 departure_datetime = datetime.strptime(str(departure_date).split(' ')[0], '%Y-%m-%d')
             except:
-                print(f"❌ Could not parse date: {departure_date}")
+                logger.error("❌ Could not parse date: %s", departure_date)
                 return False  # Don't filter out on date parsing errors
         
         # Add time if available
@@ -52,21 +59,21 @@ def is_schedule_completed(schedule):
                 pass  # Keep the date without time
         
         if not departure_datetime:
-            print(f"❌ Could not create datetime for schedule {schedule.get('_id')}")
+            logger.warning("❌ Could not create datetime for schedule %s", schedule.get('_id'))
             return False
         
         # Check if departure time has passed
         is_completed = departure_datetime < now
         
         if is_completed:
-            print(f"⏰ Schedule {schedule.get('_id')} marked as completed: {departure_datetime} < {now}")
+            logger.debug("⏰ Schedule %s marked as completed: %s < %s", schedule.get('_id'), departure_datetime, now)
         else:
-            print(f"✅ Schedule {schedule.get('_id')} is still available: {departure_datetime} >= {now}")
+            logger.debug("✅ Schedule %s is still available: %s >= %s", schedule.get('_id'), departure_datetime, now)
         
         return is_completed
         
     except Exception as e:
-        print(f"❌ Error checking schedule completion for {schedule.get('_id')}: {e}")
+        logger.error("❌ Error checking schedule completion for %s: %s", schedule.get('_id'), e)
         return False  # Don't filter out on errors
 
 def is_bus_under_maintenance(schedule, bus_data=None):
@@ -95,20 +102,21 @@ def is_bus_under_maintenance(schedule, bus_data=None):
         return False
         
     except Exception as e:
-        print(f"❌ Error checking bus maintenance: {e}")
+        logger.error("❌ Error checking bus maintenance: %s", e)
         return False  # Assume not under maintenance on error
 
 def filter_valid_schedules(schedules):
     """Filter out completed schedules and buses under maintenance - LESS RESTRICTIVE"""
     try:
-        db = mongo.db
         valid_schedules = []
         filtered_count = 0
+        # Every schedule's bus in one query
+        buses = buses_by_ref(schedule.get('bus_id') for schedule in schedules)
         
         for schedule in schedules:
             # Check if schedule has departed - be more lenient
             if is_schedule_completed(schedule):
-                print(f"⏰ Schedule {schedule.get('_id')} filtered out: Already departed")
+                logger.debug("⏰ Schedule %s filtered out: Already departed", schedule.get('_id'), extra=PER_ITEM)
                 filtered_count += 1
                 continue
             
@@ -117,24 +125,20 @@ def filter_valid_schedules(schedules):
             bus_data = None
             
             if bus_id:
-                try:
-                    bus_data = db.buses.find_one({'_id': ObjectId(bus_id)})
-                except:
-                    # If bus_id is not a valid ObjectId, try as string
-                    bus_data = db.buses.find_one({'bus_number': bus_id})
+                bus_data = buses.get(str(bus_id))
             
             if is_bus_under_maintenance(schedule, bus_data):
-                print(f"🔧 Schedule {schedule.get('_id')} filtered out: Bus under maintenance")
+                logger.debug("🔧 Schedule %s filtered out: Bus under maintenance", schedule.get('_id'), extra=PER_ITEM)
                 filtered_count += 1
                 continue
             
             valid_schedules.append(schedule)
         
-        print(f"✅ Filtered {len(valid_schedules)} valid schedules from {len(schedules)} total (filtered out: {filtered_count})")
+        logger.debug("✅ Filtered %s valid schedules from %s total (filtered out: %s)", len(valid_schedules), len(schedules), filtered_count)
         return valid_schedules
         
     except Exception as e:
-        print(f"❌ Error filtering schedules: {e}")
+        logger.error("❌ Error filtering schedules: %s", e)
         return schedules  # Return original list on errorr
 
 # Health check route
@@ -165,17 +169,18 @@ def schedules_health():
 
 # Get all available cities
 @schedules_bp.route('/cities', methods=['GET'])
+@query_budget(4)
 def get_available_cities():
     """Get all unique cities from schedules"""
     try:
-        print("🏙️ Fetching available cities from schedules...")
+        logger.debug("🏙️ Fetching available cities from schedules...")
         
         # Get unique cities from schedules (both origin and destination)
         origin_cities = list(mongo.db.busschedules.distinct('origin_city'))
         destination_cities = list(mongo.db.busschedules.distinct('destination_city'))
         
-        print(f"📍 Raw origin cities: {origin_cities}")
-        print(f"📍 Raw destination cities: {destination_cities}")
+        logger.debug("📍 Raw origin cities: %s", origin_cities)
+        logger.debug("📍 Raw destination cities: %s", destination_cities)
         
         # Also get from routes collection as fallback
         route_origins = list(mongo.db.routes.distinct('origin_city'))
@@ -204,7 +209,7 @@ def get_available_cities():
         # Get unique cities and sort
         unique_cities = sorted(list(unique_cities_map.values()))
         
-        print(f"✅ Found {len(unique_cities)} unique cities: {unique_cities}")
+        logger.debug("✅ Found %s unique cities: %s", len(unique_cities), unique_cities)
         
         response = jsonify({
             "success": True,
@@ -213,9 +218,7 @@ def get_available_cities():
         })
         return add_cors_headers(response)
     except Exception as e:
-        print(f"❌ Error fetching cities: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error("❌ Error fetching cities: %s", e, exc_info=True)
         response = jsonify({
             "success": False,
             "error": str(e),
@@ -224,14 +227,15 @@ def get_available_cities():
         return add_cors_headers(response), 500
 
 @schedules_bp.route('/dates', methods=['GET'])
+@query_budget(3)
 def get_available_dates():
     """Get available dates for a specific route - FIXED VERSION"""
     try:
         origin_city = request.args.get('origin_city') or request.args.get('originCity')
         destination_city = request.args.get('destination_city') or request.args.get('destinationCity')
         
-        print(f"🔍=== DATES ENDPOINT CALLED ===")
-        print(f"📅 Searching dates for '{origin_city}' → '{destination_city}'")
+        logger.debug("🔍=== DATES ENDPOINT CALLED ===")
+        logger.debug("📅 Searching dates for '%s' → '%s'", origin_city, destination_city)
         
         if not origin_city or not destination_city:
             response = jsonify({
@@ -253,39 +257,36 @@ def get_available_dates():
             'departure_date': {'$gte': today}  # Only future/today schedules
         }
         
-        print(f"🔍 Direct schedules query: {schedules_query}")
+        logger.debug("🔍 Direct schedules query: %s", schedules_query)
         
         schedules = list(mongo.db.busschedules.find(schedules_query))
-        print(f"📊 Direct schedules found: {len(schedules)}")
+        logger.debug("📊 Direct schedules found: %s", len(schedules))
         
         # Filter schedules that have available seats
+        # Booked seats for every schedule come back from one aggregation
+        booked_counts = booked_seat_counts(schedule['_id'] for schedule in schedules)
         schedules_with_seats = []
         for schedule in schedules:
             schedule_id = str(schedule['_id'])
             total_seats = schedule.get('total_seats', 45)
-            
-            # Count confirmed bookings
-            booked_count = mongo.db.bookings.count_documents({
-                'schedule_id': schedule_id,
-                'status': {'$in': ['confirmed', 'checked_in']}
-            })
+            booked_count = booked_counts.get(schedule_id, 0)
             
             available = total_seats - booked_count
             if available > 0:
                 schedules_with_seats.append(schedule)
-                print(f"   ✅ Schedule {schedule_id}: {available}/{total_seats} seats available")
+                logger.debug("✅ Schedule %s: %s/%s seats available", schedule_id, available, total_seats, extra=PER_ITEM)
             else:
-                print(f"   ❌ Schedule {schedule_id}: FULL ({booked_count}/{total_seats})")
+                logger.debug("❌ Schedule %s: FULL (%s/%s)", schedule_id, booked_count, total_seats, extra=PER_ITEM)
         
         schedules = schedules_with_seats
-        print(f"📊 Schedules with available seats: {len(schedules)}")
+        logger.debug("📊 Schedules with available seats: %s", len(schedules))
         
         for schedule in schedules:
-            print(f"   Schedule: {schedule['_id']}, Date: {schedule.get('departure_date')}, Seats: {schedule.get('availableSeats')}")
+            logger.debug("Schedule: %s, Date: %s, Seats: %s", schedule['_id'], schedule.get('departure_date'), schedule.get('availableSeats'), extra=PER_ITEM)
         
         # Filter out completed schedules and maintenance buses
         valid_schedules = filter_valid_schedules(schedules)
-        print(f"✅ Valid schedules after filtering: {len(valid_schedules)}")
+        logger.debug("✅ Valid schedules after filtering: %s", len(valid_schedules))
         
         # Extract unique dates from valid schedules
         dates = set()
@@ -309,14 +310,14 @@ def get_available_dates():
                         date_str = str(departure_date).split(' ')[0]
                     
                     dates.add(date_str)
-                    print(f"📅 Added date: {date_str} from {departure_date}")
+                    logger.debug("📅 Added date: %s from %s", date_str, departure_date, extra=PER_ITEM)
                     
                 except Exception as date_error:
-                    print(f"❌ Date parsing error for {departure_date}: {date_error}")
+                    logger.error("❌ Date parsing error for %s: %s", departure_date, date_error)
                     continue
         
         sorted_dates = sorted(list(dates))
-        print(f"📅 Final dates list: {sorted_dates}")
+        logger.debug("📅 Final dates list: %s", sorted_dates)
         
         response = jsonify({
             "success": True,
@@ -335,9 +336,8 @@ def get_available_dates():
         return add_cors_headers(response)
         
     except Exception as e:
-        print(f"❌ ERROR in get_available_dates: {str(e)}")
-        import traceback
-        print(f"🔍 Stack trace: {traceback.format_exc()}")
+        logger.error("❌ ERROR in get_available_dates: %s", str(e))
+        logger.error("🔍 Stack trace", exc_info=True)
         response = jsonify({
             "success": False,
             "error": str(e)
@@ -354,6 +354,7 @@ def handle_options():
 # Enhanced schedules search endpoint with maintenance and date filtering
 @schedules_bp.route('/', methods=['GET'])
 @schedules_bp.route('', methods=['GET'])  # Handle both with and without trailing slash
+@query_budget(1)
 def get_schedules():
     """Get schedules with filtering for maintenance and past dates"""
     try:
@@ -363,97 +364,22 @@ def get_schedules():
         include_completed = request.args.get('include_completed', 'false').lower() == 'true'
         include_maintenance = request.args.get('include_maintenance', 'false').lower() == 'true'
         
-        print(f"🔍 Search request: {origin_city} -> {destination_city} on {travel_date}")
-        print(f"🔧 Filters - include_completed: {include_completed}, include_maintenance: {include_maintenance}")
-        
-        # Build pipeline for aggregation
-        pipeline = []
-        
-        # FIXED: Match schedules directly by city fields (snake_case)
-        pipeline.append({
-            '$match': {
-                'origin_city': origin_city,
-                'destination_city': destination_city
-            }
-        })
-        
-        # Lookup route information (for additional route details)
-        pipeline.append({
-            '$lookup': {
-                'from': 'routes',
-                'let': {'schedule_route_id': '$route_id'},
-                'pipeline': [
-                    {
-                        '$match': {
-                            '$expr': {
-                                '$or': [
-                                    {'$eq': ['$_id', '$$schedule_route_id']},
-                                    {'$eq': [{'$toString': '$_id'}, '$$schedule_route_id']}
-                                ]
-                            }
-                        }
-                    }
-                ],
-                'as': 'route_info'
-            }
-        })
-        
-        # Unwind the route_info array (preserve null if route not found)
-        pipeline.append({
-            '$unwind': {
-                'path': '$route_info',
-                'preserveNullAndEmptyArrays': True
-            }
-        })
-        
-        # Lookup bus information
-        pipeline.append({
-            '$lookup': {
-                'from': 'buses',
-                'let': {'schedule_bus_id': '$bus_id'},
-                'pipeline': [
-                    {
-                        '$match': {
-                            '$expr': {
-                                '$or': [
-                                    {'$eq': ['$_id', '$$schedule_bus_id']},
-                                    {'$eq': [{'$toString': '$_id'}, '$$schedule_bus_id']},
-                                    {'$eq': ['$bus_number', '$$schedule_bus_id']}
-                                ]
-                            }
-                        }
-                    }
-                ],
-                'as': 'bus_info'
-            }
-        })
-        
-        # Unwind the bus_info array (preserve null for buses not found)
-        pipeline.append({
-            '$unwind': {
-                'path': '$bus_info',
-                'preserveNullAndEmptyArrays': True
-            }
-        })
+        logger.debug("🔍 Search request: %s -> %s on %s", origin_city, destination_city, travel_date)
+        logger.debug("🔧 Filters - include_completed: %s, include_maintenance: %s", include_completed, include_maintenance)
         
-        # Match stage for filtering (using snake_case field names)
-        # Don't filter by available_seats here - it's calculated dynamically from bookings
-        match_stage = {
+        # One indexed find on the schedule_search read model (route, bus and
+        # seat figures are denormalized there, so no $lookup joins)
+        query = {
+            'origin_city': origin_city,
+            'destination_city': destination_city,
             'status': {'$in': ['scheduled', 'boarding', 'active']}
         }
         
-        # Date filtering
+        # Date filtering (read model dates are normalized to YYYY-MM-DD)
         if travel_date:
             try:
-                search_date = datetime.strptime(travel_date, '%Y-%m-%d')
-                start_date = search_date.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_date = start_date + timedelta(days=1)
-                
-                # Match against both string and datetime formats
-                match_stage['$or'] = [
-                    {'departure_date': {'$gte': start_date, '$lt': end_date}},
-                    {'departure_date': travel_date}
-                ]
+                datetime.strptime(travel_date, '%Y-%m-%d')
+                query['departure_date'] = travel_date
             except ValueError as e:
                 response = jsonify({
                     "success": False,
@@ -461,52 +387,8 @@ def get_schedules():
                 })
                 return add_cors_headers(response), 400
         
-        pipeline.append({'$match': match_stage})
-        
-        # Project with proper ObjectId conversion and field mapping
-        pipeline.append({
-            '$project': {
-                '_id': {'$toString': '$_id'},
-                'route_id': {'$toString': '$route_id'},
-                'bus_id': {'$toString': '$bus_id'},
-                'bus_type': '$bus_type',
-                'bus_number': '$bus_number',
-                'plate_number': '$plate_number',
-                'departure_time': '$departure_time',
-                'arrival_time': '$arrival_time',
-                'departure_date': '$departure_date',
-                'available_seats': '$available_seats',
-                'total_seats': '$total_seats',
-                'booked_seats': '$booked_seats',
-                'fare_birr': '$fare_birr',
-                'status': 1,
-                'amenities': 1,
-                'boarding_points': '$boarding_points',
-                'dropping_points': '$dropping_points',
-                'driver_name': 1,
-                'driver_id': 1,
-                
-                # City fields - use schedule's own fields first, fallback to route
-                'origin_city': {'$ifNull': ['$origin_city', '$route_info.origin_city']},
-                'destination_city': {'$ifNull': ['$destination_city', '$route_info.destination_city']},
-                
-                # Route information
-                'distance_km': '$route_info.distance_km',
-                'estimated_duration_hours': '$route_info.estimated_duration_hours',
-                'stops': '$route_info.stops',
-                
-                # Bus information
-                'bus_name': '$bus_info.bus_name',
-                'bus_status': '$bus_info.status',
-                'bus_capacity': '$bus_info.capacity',
-                'bus_amenities': '$bus_info.amenities'
-            }
-        })
-        
-        # Execute aggregation
-        schedules_cursor = mongo.db.busschedules.aggregate(pipeline)
-        schedules = list(schedules_cursor)
-        print(f"📊 Found {len(schedules)} schedules before filtering")
+        schedules = list(mongo.db.schedule_search.find(query, RESPONSE_PROJECTION))
+        logger.debug("📊 Found %s schedules before filtering", len(schedules))
         
         # Apply maintenance and date filtering
         if not include_completed or not include_maintenance:
@@ -520,8 +402,8 @@ def get_schedules():
                 if not include_maintenance:
                     bus_data = {
                         'status': schedule.get('bus_status'),
-                        'isActive': schedule.get('bus_isActive', True)
-                    } if schedule.get('bus_status') or schedule.get('bus_isActive') is not None else None
+                        'is_active': schedule.get('bus_is_active', True)
+                    } if schedule.get('bus_status') else None
                     
                     if is_bus_under_maintenance(schedule, bus_data):
                         continue
@@ -529,27 +411,19 @@ def get_schedules():
                 filtered_schedules.append(schedule)
             
             schedules = filtered_schedules
-            print(f"✅ After filtering: {len(schedules)} schedules")
+            logger.debug("✅ After filtering: %s schedules", len(schedules))
         
-        # Format schedules for response and calculate available seats
+        # Format schedules for response; seat counts are kept current in the read model
         formatted_schedules = []
         for schedule in schedules:
             try:
-                # Calculate available seats from bookings
                 schedule_id = schedule.get('_id')
-                total_seats = schedule.get('total_seats', 45)
-                
-                # Count confirmed bookings for this schedule
-                booked_count = mongo.db.bookings.count_documents({
-                    'schedule_id': schedule_id,
-                    'status': {'$in': ['confirmed', 'checked_in']}
-                })
-                
-                available_seats = total_seats - booked_count
+                booked_count = schedule.get('booked_seats', 0)
+                available_seats = schedule.get('available_seats', schedule.get('total_seats', 45) - booked_count)
                 
                 # Skip schedules with no available seats
                 if available_seats <= 0:
-                    print(f"   ⏭️ Skipping full schedule {schedule_id}")
+                    logger.debug("⏭️ Skipping full schedule %s", schedule_id, extra=PER_ITEM)
                     continue
                 
                 # Update schedule with calculated values
@@ -580,7 +454,7 @@ def get_schedules():
                 
                 formatted_schedules.append(schedule)
             except Exception as e:
-                print(f"⚠️ Error formatting schedule: {e}")
+                logger.error("⚠️ Error formatting schedule: %s", e)
                 continue
         
         response = jsonify({
@@ -605,7 +479,7 @@ def get_schedules():
         return add_cors_headers(response)
         
     except Exception as e:
-        print(f"❌ ERROR in get_schedules: {str(e)}")
+        logger.error("❌ ERROR in get_schedules: %s", str(e))
         response = jsonify({
             "success": False,
             "error": str(e),
@@ -613,6 +487,23 @@ def get_schedules():
         })
         return add_cors_headers(response), 500
 
+@schedules_bp.route('/viewers', methods=['GET'])
+def get_viewer_counts():
+    """Live viewer counts for several schedules: ?ids=a,b,c (all watched schedules without ids)"""
+    try:
+        ids = [schedule_id.strip() for schedule_id in request.args.get('ids', '').split(',') if schedule_id.strip()]
+        return jsonify({'viewers': presence.viewer_counts(ids or None)}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@schedules_bp.route('/<schedule_id>/viewers', methods=['GET'])
+def get_schedule_viewers(schedule_id):
+    """How many people are looking at this schedule's seat map right now"""
+    try:
+        return jsonify({'schedule_id': schedule_id, 'viewers': presence.viewer_count(schedule_id)}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Enhanced schedule validation endpoint
 @schedules_bp.route('/<schedule_id>/validate', methods=['GET'])
 def validate_schedule(schedule_id):
@@ -634,7 +525,7 @@ def validate_schedule(schedule_id):
         
         # Get bus information
         bus_data = None
-        bus_id = schedule.get('busId')
+        bus_id = schedule.get('bus_id')
         if bus_id:
             try:
                 bus_data = mongo.db.buses.find_one({'_id': ObjectId(bus_id)})
@@ -668,7 +559,7 @@ def validate_schedule(schedule_id):
         
         # Get route information
         route = None
-        route_id = schedule.get('routeId')
+        route_id = schedule.get('route_id')
         if route_id:
             try:
                 route = mongo.db.routes.find_one({'_id': ObjectId(route_id)})
@@ -689,7 +580,7 @@ def validate_schedule(schedule_id):
         return add_cors_headers(response)
         
     except Exception as e:
-        print(f"❌ Error validating schedule: {e}")
+        logger.error("❌ Error validating schedule: %s", e)
         response = jsonify({
             "success": False,
             "valid": False,
@@ -699,6 +590,7 @@ def validate_schedule(schedule_id):
 
 # Get schedule by ID
 @schedules_bp.route('/<schedule_id>', methods=['GET'])
+@query_budget(2)
 def get_schedule_by_id(schedule_id):
     """Get a specific schedule by ID with maintenance status"""
     try:
@@ -714,7 +606,7 @@ def get_schedule_by_id(schedule_id):
         
         # Get bus information
         bus_data = None
-        bus_id = schedule.get('busId')
+        bus_id = schedule.get('bus_id')
         if bus_id:
             try:
                 bus_data = mongo.db.buses.find_one({'_id': ObjectId(bus_id)})
@@ -771,17 +663,17 @@ def test_schedules():
         bus_data = None
         
         if schedule:
-            if schedule.get('routeId'):
+            if schedule.get('route_id'):
                 try:
-                    route = mongo.db.routes.find_one({"_id": ObjectId(schedule['routeId'])})
+                    route = mongo.db.routes.find_one({"_id": ObjectId(schedule['route_id'])})
                 except:
                     route = None
             
-            if schedule.get('busId'):
+            if schedule.get('bus_id'):
                 try:
-                    bus_data = mongo.db.buses.find_one({'_id': ObjectId(schedule['busId'])})
+                    bus_data = mongo.db.buses.find_one({'_id': ObjectId(schedule['bus_id'])})
                 except:
-                    bus_data = mongo.db.buses.find_one({'bus_number': schedule.get('busId')})
+                    bus_data = mongo.db.buses.find_one({'bus_number': schedule.get('bus_id')})
         
         # Test filtering
         test_schedules = list(mongo.db.busschedules.find().limit(5))
@@ -793,7 +685,7 @@ def test_schedules():
             "route_count": route_count,
             "sample_schedule": {
                 "_id": str(schedule['_id']) if schedule else None,
-                "routeId": schedule.get('routeId') if schedule else None,
+                "routeId": schedule.get('route_id') if schedule else None,
                 "busNumber": schedule.get('busNumber') if schedule else None,
                 "departure_date": schedule.get('departure_date').strftime('%Y-%m-%d') if schedule and schedule.get('departure_date') else None,
                 "is_completed": is_schedule_completed(schedule) if schedule else None,
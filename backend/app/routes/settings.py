@@ -1,19 +1,13 @@
+import logging
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from bson import ObjectId
 from datetime import datetime
 from app import mongo
+from app.utils.authz import is_admin
+from app.utils.config_cache import config_cache, get_system_settings
 
 settings_bp = Blueprint('settings', __name__)
-
-def is_admin():
-    """Check if current user is admin"""
-    try:
-        current_user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
-        return user and user.get('role') == 'admin'
-    except:
-        return False
+logger = logging.getLogger(__name__)
 
 # Default settings structure
 DEFAULT_SETTINGS = {
@@ -119,8 +113,8 @@ def get_settings():
         if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
-        # Get settings from database
-        settings = mongo.db.settings.find_one({'type': 'system_settings'})
+        # Get settings from the configuration cache
+        settings = get_system_settings()
         
         if not settings:
             # Initialize with default settings if not exists
@@ -131,6 +125,7 @@ def get_settings():
                 'updated_at': datetime.utcnow()
             }
             mongo.db.settings.insert_one(settings)
+            config_cache.bump('settings')
         
         # Convert ObjectId to string
         settings['_id'] = str(settings['_id'])
@@ -138,7 +133,7 @@ def get_settings():
         return jsonify(settings), 200
         
     except Exception as e:
-        print(f"❌ Error getting settings: {e}")
+        logger.error("❌ Error getting settings: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @settings_bp.route('/', methods=['PUT', 'OPTIONS'], strict_slashes=False)
@@ -158,7 +153,7 @@ def update_settings():
             return jsonify({'error': 'No data provided'}), 400
         
         # Get current settings
-        current_settings = mongo.db.settings.find_one({'type': 'system_settings'})
+        current_settings = get_system_settings()
         
         if not current_settings:
             # Create new settings
@@ -169,6 +164,7 @@ def update_settings():
                 'updated_at': datetime.utcnow()
             }
             mongo.db.settings.insert_one(settings)
+            config_cache.bump('settings')
             current_settings = settings
         
         # Update settings
@@ -210,9 +206,10 @@ def update_settings():
         
         if result.matched_count == 0:
             return jsonify({'error': 'Settings not found'}), 404
+        config_cache.bump('settings')
         
         # Get updated settings
-        updated_settings = mongo.db.settings.find_one({'type': 'system_settings'})
+        updated_settings = get_system_settings()
         updated_settings['_id'] = str(updated_settings['_id'])
         
         return jsonify({
@@ -221,7 +218,7 @@ def update_settings():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error updating settings: {e}")
+        logger.error("❌ Error updating settings: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @settings_bp.route('/reset', methods=['POST', 'OPTIONS'])
@@ -249,6 +246,7 @@ def reset_settings():
         }
         
         mongo.db.settings.insert_one(settings)
+        config_cache.bump('settings')
         settings['_id'] = str(settings['_id'])
         
         return jsonify({
@@ -257,7 +255,7 @@ def reset_settings():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error resetting settings: {e}")
+        logger.error("❌ Error resetting settings: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @settings_bp.route('/policy/<policy_name>', methods=['GET', 'OPTIONS'])
@@ -272,7 +270,7 @@ def get_policy(policy_name):
         if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
-        settings = mongo.db.settings.find_one({'type': 'system_settings'})
+        settings = get_system_settings()
         
         if not settings:
             return jsonify({'error': 'Settings not found'}), 404
@@ -299,7 +297,7 @@ def get_policy(policy_name):
         }), 200
         
     except Exception as e:
-        print(f"❌ Error getting policy: {e}")
+        logger.error("❌ Error getting policy: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @settings_bp.route('/validate-booking', methods=['POST'])
@@ -312,7 +310,7 @@ def validate_booking_limits():
         departure_datetime = data.get('departure_datetime')
         
         # Get settings
-        settings = mongo.db.settings.find_one({'type': 'system_settings'})
+        settings = get_system_settings()
         if not settings:
             settings = DEFAULT_SETTINGS
         
@@ -364,7 +362,7 @@ def validate_booking_limits():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error validating booking: {e}")
+        logger.error("❌ Error validating booking: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @settings_bp.route('/calculate-refund', methods=['POST'])
@@ -379,7 +377,7 @@ def calculate_refund():
             return jsonify({'error': 'Departure datetime required'}), 400
         
         # Get settings
-        settings = mongo.db.settings.find_one({'type': 'system_settings'})
+        settings = get_system_settings()
         if not settings:
             settings = DEFAULT_SETTINGS
         
@@ -424,5 +422,5 @@ def calculate_refund():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error calculating refund: {e}")
+        logger.error("❌ Error calculating refund: %s", e)
         return jsonify({'error': str(e)}), 500
@@ -3,22 +3,14 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 from bson import ObjectId
 from app import mongo
+from app.utils.authz import is_admin
+from app.utils.config_cache import config_cache, find_tariff_rate, find_tariff_rates
 import logging
 
 tariff_bp = Blueprint('tariff', __name__)
 logger = logging.getLogger(__name__)
 
 # Utility Functions
-def is_admin():
-    """Check if current user is admin"""
-    try:
-        current_user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
-        return user and user.get('role') == 'admin'
-    except Exception as e:
-        logger.error(f"Admin check error: {e}")
-        return False
-
 def serialize_document(doc):
     """Serialize MongoDB document for JSON response"""
     if not doc:
@@ -52,9 +44,9 @@ def get_tariff_rates():
         
         # Admin can see all rates, others only see active rates
         if user.get('role') == 'admin':
-            rates = list(mongo.db.tariff_rates.find().sort('bus_type', 1))
+            rates = find_tariff_rates()
         else:
-            rates = list(mongo.db.tariff_rates.find({'is_active': True}).sort('bus_type', 1))
+            rates = find_tariff_rates(active_only=True)
         
         return jsonify({
             'success': True,
@@ -63,7 +55,7 @@ def get_tariff_rates():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get tariff rates error: {e}")
+        logger.error("Get tariff rates error: %s", e)
         return jsonify({'error': f'Failed to fetch tariff rates: {str(e)}'}), 500
 
 @tariff_bp.route('/rates/current', methods=['GET'])
@@ -71,7 +63,7 @@ def get_current_rates():
     """Get current active tariff rates (Public endpoint)"""
     try:
         # Get all active rates
-        rates = list(mongo.db.tariff_rates.find({'is_active': True}).sort('bus_type', 1))
+        rates = find_tariff_rates(active_only=True)
         
         # Format for easy lookup
         rate_map = {}
@@ -90,7 +82,7 @@ def get_current_rates():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get current rates error: {e}")
+        logger.error("Get current rates error: %s", e)
         return jsonify({'error': f'Failed to fetch current rates: {str(e)}'}), 500
 
 @tariff_bp.route('/rates', methods=['POST'])
@@ -117,10 +109,7 @@ def create_tariff_rate():
             return jsonify({'error': 'Minimum fare cannot be negative'}), 400
         
         # Check if rate already exists for this bus type
-        existing = mongo.db.tariff_rates.find_one({
-            'bus_type': data['bus_type'],
-            'is_active': True
-        })
+        existing = find_tariff_rate(data['bus_type'])
         
         if existing:
             return jsonify({
@@ -143,9 +132,10 @@ def create_tariff_rate():
         }
         
         result = mongo.db.tariff_rates.insert_one(rate_data)
+        config_cache.bump('tariff_rates')
         rate_data['_id'] = str(result.inserted_id)
         
-        logger.info(f"Tariff rate created: {data['bus_type']} - {data['rate_per_km']} ETB/km by user {current_user_id}")
+        logger.info("Tariff rate created: %s - %s ETB/km by user %s", data['bus_type'], data['rate_per_km'], current_user_id)
         
         return jsonify({
             'success': True,
@@ -154,7 +144,7 @@ def create_tariff_rate():
         }), 201
         
     except Exception as e:
-        logger.error(f"Create tariff rate error: {e}")
+        logger.error("Create tariff rate error: %s", e)
         return jsonify({'error': f'Failed to create tariff rate: {str(e)}'}), 500
 
 @tariff_bp.route('/rates/<rate_id>', methods=['PUT'])
@@ -208,12 +198,13 @@ def update_tariff_rate(rate_id):
         
         if result.modified_count == 0:
             return jsonify({'error': 'No changes made'}), 400
+        config_cache.bump('tariff_rates')
         
         # Get updated rate
         updated_rate = mongo.db.tariff_rates.find_one({'_id': ObjectId(rate_id)})
         
         current_user_id = get_jwt_identity()
-        logger.info(f"Tariff rate updated: {rate['bus_type']} by user {current_user_id}")
+        logger.info("Tariff rate updated: %s by user %s", rate['bus_type'], current_user_id)
         
         return jsonify({
             'success': True,
@@ -222,7 +213,7 @@ def update_tariff_rate(rate_id):
         }), 200
         
     except Exception as e:
-        logger.error(f"Update tariff rate error: {e}")
+        logger.error("Update tariff rate error: %s", e)
         return jsonify({'error': f'Failed to update tariff rate: {str(e)}'}), 500
 
 @tariff_bp.route('/rates/<rate_id>', methods=['DELETE'])
@@ -248,9 +239,10 @@ def delete_tariff_rate(rate_id):
                 }
             }
         )
+        config_cache.bump('tariff_rates')
         
         current_user_id = get_jwt_identity()
-        logger.info(f"Tariff rate deactivated: {rate['bus_type']} by user {current_user_id}")
+        logger.info("Tariff rate deactivated: %s by user %s", rate['bus_type'], current_user_id)
         
         return jsonify({
             'success': True,
@@ -258,7 +250,7 @@ def delete_tariff_rate(rate_id):
         }), 200
         
     except Exception as e:
-        logger.error(f"Delete tariff rate error: {e}")
+        logger.error("Delete tariff rate error: %s", e)
         return jsonify({'error': f'Failed to deactivate tariff rate: {str(e)}'}), 500
 
 @tariff_bp.route('/rates/history', methods=['GET'])
@@ -271,12 +263,9 @@ def get_tariff_history():
         
         bus_type = request.args.get('bus_type')
         
-        query = {}
-        if bus_type:
-            query['bus_type'] = bus_type
-        
         # Get all rates (active and inactive) sorted by date
-        rates = list(mongo.db.tariff_rates.find(query).sort('created_at', -1))
+        rates = find_tariff_rates(bus_type=bus_type or None)
+        rates.sort(key=lambda rate: rate.get('created_at') or datetime.min, reverse=True)
         
         return jsonify({
             'success': True,
@@ -285,7 +274,7 @@ def get_tariff_history():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get tariff history error: {e}")
+        logger.error("Get tariff history error: %s", e)
         return jsonify({'error': f'Failed to fetch tariff history: {str(e)}'}), 500
 
 # ==================== CALCULATION ENDPOINT ====================
@@ -303,10 +292,7 @@ def calculate_fare():
             return jsonify({'error': 'Distance must be positive'}), 400
         
         # Get current rate for bus type
-        rate = mongo.db.tariff_rates.find_one({
-            'bus_type': bus_type,
-            'is_active': True
-        })
+        rate = find_tariff_rate(bus_type)
         
         if not rate:
             return jsonify({'error': f'No active tariff rate found for {bus_type}'}), 404
@@ -329,7 +315,7 @@ def calculate_fare():
         }), 200
         
     except Exception as e:
-        logger.error(f"Calculate fare error: {e}")
+        logger.error("Calculate fare error: %s", e)
         return jsonify({'error': f'Failed to calculate fare: {str(e)}'}), 500
 
 # ==================== INITIALIZATION ====================
@@ -398,8 +384,9 @@ def initialize_default_rates():
             })
         
         result = mongo.db.tariff_rates.insert_many(default_rates)
+        config_cache.bump('tariff_rates')
         
-        logger.info(f"Default tariff rates initialized by user {current_user_id}")
+        logger.info("Default tariff rates initialized by user %s", current_user_id)
         
         return jsonify({
             'success': True,
@@ -408,5 +395,5 @@ def initialize_default_rates():
         }), 201
         
     except Exception as e:
-        logger.error(f"Initialize rates error: {e}")
+        logger.error("Initialize rates error: %s", e)
         return jsonify({'error': f'Failed to initialize rates: {str(e)}'}), 500
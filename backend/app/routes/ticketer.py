@@ -1,6 +1,16 @@
+import logging
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import mongo
+from app.logging import PER_ITEM
+from app.utils.booking_commit import BookingConflict, commit_booking, release_booking_capacity
+from app.utils.ids import new_pnr
+from app.utils.outbox import booking_events
+from app.utils.rollups import BOOKING_PROJECTION, record_booking_change
+from app.utils.seat_map_cache import seat_map_cache
+from app.utils.seat_set import SeatSet
+from app.utils.schedule_search import RESPONSE_PROJECTION, refresh_seat_counts
+from app.utils.schema import canonical_document, user_ref
 from datetime import datetime, timedelta
 import random
 from bson import ObjectId
@@ -9,6 +19,7 @@ import requests
 import os
 
 ticketer_bp = Blueprint('ticketer', __name__)
+logger = logging.getLogger(__name__)
 
 # Helper function to serialize ObjectId
 def serialize_doc(doc):
@@ -69,7 +80,7 @@ def get_ticketer_dashboard_stats():
         today_datetime = datetime.combine(today, datetime.min.time())
         tomorrow_datetime = today_datetime + timedelta(days=1)
         
-        print(f"📊 Ticketer dashboard stats for {today_str} - Ticketer ID: {current_user_id}")
+        logger.debug("📊 Ticketer dashboard stats for %s - Ticketer ID: %s", today_str, current_user_id)
         
         # Pending check-ins (confirmed bookings for today created by THIS ticketer)
         pending_checkins = mongo.db.bookings.count_documents({
@@ -78,7 +89,7 @@ def get_ticketer_dashboard_stats():
             'created_by': current_user_id  # Filter by ticketer
         })
         
-        print(f"⏳ Pending check-ins (by this ticketer): {pending_checkins}")
+        logger.debug("⏳ Pending check-ins (by this ticketer): %s", pending_checkins)
 
         # Today's revenue - from bookings CREATED today by THIS ticketer
         today_bookings_list = list(mongo.db.bookings.find({
@@ -94,12 +105,12 @@ def get_ticketer_dashboard_stats():
             else:
                 today_revenue += booking.get('total_amount', 0)
         
-        print(f"💰 Today's revenue (by this ticketer): ETB {today_revenue}")
+        logger.debug("💰 Today's revenue (by this ticketer): ETB %s", today_revenue)
 
         # Today's bookings count - bookings CREATED today by THIS ticketer
         today_bookings = len([b for b in today_bookings_list if b.get('status') != 'cancelled'])
         
-        print(f"🎫 Today's bookings (by this ticketer): {today_bookings}")
+        logger.debug("🎫 Today's bookings (by this ticketer): %s", today_bookings)
 
         # Active schedules - ALL upcoming schedules (today and future) - this can remain global
         active_schedules = mongo.db.busschedules.count_documents({
@@ -107,7 +118,7 @@ def get_ticketer_dashboard_stats():
             'status': {'$in': ['scheduled', 'boarding', 'departed', 'active']}
         })
         
-        print(f"🚌 Active schedules (upcoming): {active_schedules}")
+        logger.debug("🚌 Active schedules (upcoming): %s", active_schedules)
 
         return jsonify({
             'success': True,
@@ -120,9 +131,7 @@ def get_ticketer_dashboard_stats():
         }), 200
 
     except Exception as e:
-        print(f"❌ Ticketer dashboard error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error("❌ Ticketer dashboard error: %s", str(e), exc_info=True)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # ==================== SCHEDULE MANAGEMENT ====================
@@ -152,93 +161,39 @@ def get_schedules():
             # Default to active trips (scheduled + boarding + departed + active)
             query['status'] = {'$in': ['scheduled', 'boarding', 'departed', 'active']}
         
-        print(f"🔍 Ticketer schedules query: {query}")
-        schedules = list(mongo.db.busschedules.find(query).sort([('departure_date', 1), ('departure_time', 1)]))
-        print(f"📊 Found {len(schedules)} schedules")
+        logger.debug("🔍 Ticketer schedules query: %s", query)
+        # Served from the schedule_search read model: route, bus and seat
+        # counts are already on each document, so there are no per-schedule lookups
+        schedules = list(mongo.db.schedule_search.find(query, RESPONSE_PROJECTION).sort([('departure_date', 1), ('departure_time', 1)]))
+        logger.debug("📊 Found %s schedules", len(schedules))
         
         schedules_data = []
         for schedule in schedules:
             schedule_data = serialize_doc(schedule)
-            
-            # Calculate actual booked seats from bookings
-            # The schedule_id in bookings is stored as ObjectId, so we need to use the ObjectId directly
-            from bson import ObjectId
-            
-            schedule_id_str = str(schedule['_id'])
-            
-            print(f"  🔍 Checking bookings for schedule: {schedule_id_str}")
-            
-            # Try with string format first
-            booked_seats_count = mongo.db.bookings.count_documents({
-                'schedule_id': schedule_id_str,
-                'status': {'$nin': ['cancelled', 'refunded']}
-            })
-            
-            print(f"     String format: {booked_seats_count} bookings")
-            
-            # If no bookings found with string, try ObjectId format
-            if booked_seats_count == 0:
-                try:
-                    schedule_id_obj = ObjectId(schedule_id_str)
-                    booked_seats_count = mongo.db.bookings.count_documents({
-                        'schedule_id': schedule_id_obj,
-                        'status': {'$nin': ['cancelled', 'refunded']}
-                    })
-                    print(f"     ObjectId format: {booked_seats_count} bookings")
-                except Exception as e:
-                    print(f"     Error trying ObjectId: {e}")
-            
-            print(f"  ✅ Total booked seats: {booked_seats_count}")
-            
-            # Get route information
-            route = None
-            if schedule.get('route_id'):
-                route = mongo.db.routes.find_one({'_id': ObjectId(schedule['route_id'])})
-            
-            # Get bus information
-            bus = None
-            if schedule.get('bus_id'):
-                bus = mongo.db.buses.find_one({'_id': ObjectId(schedule['bus_id'])})
+            duration_hours = schedule.get('estimated_duration_hours')
             
             # Enrich schedule data
             schedule_data.update({
-                'booked_seats': booked_seats_count,
-                'available_seats': schedule.get('total_seats', 0) - booked_seats_count,
-                'route_name': schedule.get('route_name', 'Unknown Route'),
-                'origin_city': schedule.get('origin_city', 'Unknown'),
-                'destination_city': schedule.get('destination_city', 'Unknown'),
-                'bus_number': schedule.get('bus_number', 'Unknown'),
-                'bus_type': schedule.get('bus_type', 'standard'),
-                'fare_birr': schedule.get('fare_birr', 0)
+                'route_name': schedule.get('route_name') or 'Unknown Route',
+                'origin_city': schedule.get('origin_city') or 'Unknown',
+                'destination_city': schedule.get('destination_city') or 'Unknown',
+                'bus_number': schedule.get('bus_number') or 'Unknown',
+                'bus_type': schedule.get('bus_type') or 'standard',
+                'fare_birr': schedule.get('fare_birr') or 0,
+                'duration': f"{duration_hours} hours" if duration_hours else None,
+                'bus': {
+                    'name': schedule.get('bus_name') or schedule.get('bus_number'),
+                    'number': schedule.get('bus_number'),
+                    'type': schedule.get('bus_type') or 'standard',
+                    'capacity': schedule.get('bus_capacity') or schedule.get('total_seats', 45)
+                }
             })
             
-            # Add route details if available
-            if route:
-                distance = route.get('distance_km') or route.get('distanceKm') or route.get('distance')
-                duration_hours = route.get('estimated_duration_hours') or route.get('estimatedDurationHours') or route.get('duration')
-                
-                schedule_data.update({
-                    'distance_km': distance,
-                    'duration': f"{duration_hours} hours" if duration_hours else None,
-                    'route_description': route.get('description', '')
-                })
-            
-            # Add bus details if available
-            if bus:
-                schedule_data.update({
-                    'bus': {
-                        'name': bus.get('name', bus.get('bus_number')),
-                        'number': bus.get('bus_number', bus.get('number')),
-                        'type': bus.get('type', 'standard'),
-                        'capacity': bus.get('capacity', schedule.get('total_seats', 45))
-                    }
-                })
-            
             schedules_data.append(schedule_data)
         
-        print(f"✅ Returning {len(schedules_data)} schedules to ticketer")
+        logger.debug("✅ Returning %s schedules to ticketer", len(schedules_data))
         if schedules_data:
-            print(f"📋 Sample schedule: {schedules_data[0].get('route_name')} on {schedules_data[0].get('departure_date')}")
+            logger.debug("📋 Sample schedule: %s on %s", schedules_data[0].get('route_name'), schedules_data[0].get('departure_date'))
         
         return jsonify({
             'success': True,
@@ -247,45 +202,16 @@ def get_schedules():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error in ticketer get_schedules: {str(e)}")
+        logger.error("❌ Error in ticketer get_schedules: %s", str(e))
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @ticketer_bp.route('/schedules/<string:schedule_id>/occupied-seats', methods=['GET'])
 def get_occupied_seats(schedule_id):
     try:
-        print(f"🔍 Looking for bookings with schedule_id: {schedule_id}")
+        # Booked seats (string or ObjectId schedule_id) come from the seat map cache
+        occupied_seats = seat_map_cache.get(schedule_id).occupied_seats()
         
-        # Try both string and ObjectId formats
-        from bson import ObjectId
-        
-        # First try as string (most common)
-        bookings = list(mongo.db.bookings.find({
-            'schedule_id': schedule_id,
-            'status': {'$nin': ['cancelled', 'refunded']}
-        }))
-        
-        print(f"📊 Found {len(bookings)} bookings using string format")
-        
-        # If no bookings found, try with ObjectId
-        if len(bookings) == 0:
-            try:
-                bookings = list(mongo.db.bookings.find({
-                    'schedule_id': ObjectId(schedule_id),
-                    'status': {'$nin': ['cancelled', 'refunded']}
-                }))
-                print(f"📊 Found {len(bookings)} bookings using ObjectId format")
-            except Exception as e:
-                print(f"⚠️ Could not try ObjectId format: {e}")
-        
-        # Extract all seat numbers from bookings
-        occupied_seats = []
-        for booking in bookings:
-            if 'seat_numbers' in booking and isinstance(booking['seat_numbers'], list):
-                occupied_seats.extend(booking['seat_numbers'])
-            elif 'seat_number' in booking:
-                occupied_seats.append(booking['seat_number'])
-        
-        print(f"🪑 Occupied seats: {occupied_seats}")
+        logger.debug("🪑 Occupied seats: %s", occupied_seats)
         
         return jsonify({
             'success': True,
@@ -293,9 +219,7 @@ def get_occupied_seats(schedule_id):
         }), 200
         
     except Exception as e:
-        print(f"❌ Error getting occupied seats: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error("❌ Error getting occupied seats: %s", e, exc_info=True)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # ==================== ROUTE MANAGEMENT ====================
@@ -341,26 +265,35 @@ def create_quick_booking():
         seat_numbers = data['seat_numbers']
         if not isinstance(seat_numbers, list):
             seat_numbers = [seat_numbers]
-
-        # Check if seats are available
-        for seat in seat_numbers:
-            existing_booking = mongo.db.bookings.find_one({
+        requested, invalid_seats = SeatSet.parse(seat_numbers)
+        if invalid_seats:
+            return jsonify({'success': False, 'error': f'Invalid seat numbers: {invalid_seats}'}), 400
+        seat_numbers = requested.to_list()
+
+        # Check if seats are available - one query for every requested seat
+        occupied = SeatSet()
+        for booking in mongo.db.bookings.find(
+            {
                 'schedule_id': data['schedule_id'],
                 '$or': [
-                    {'seat_numbers': seat},
-                    {'seat_number': seat}
+                    {'seat_numbers': {'$in': seat_numbers}},
+                    {'seat_number': {'$in': seat_numbers}}
                 ],
                 'status': {'$in': ['confirmed', 'checked_in']}
-            })
-            
-            if existing_booking:
-                return jsonify({
-                    'success': False, 
-                    'error': f'Seat {seat} is already occupied'
-                }), 400
+            },
+            {'seat_numbers': 1, 'seat_number': 1}
+        ):
+            occupied |= SeatSet.parse(booking.get('seat_numbers') or [booking.get('seat_number')])[0]
+        
+        taken = requested & occupied
+        if taken:
+            return jsonify({
+                'success': False, 
+                'error': f'Seat {taken.to_list()[0]} is already occupied'
+            }), 400
 
         # Generate PNR
-        pnr_number = f"ETB{datetime.now().strftime('%Y%m%d')}{random.randint(1000, 9999)}"
+        pnr_number = new_pnr()
 
         # Calculate total amount
         num_seats = len(seat_numbers)
@@ -391,9 +324,9 @@ def create_quick_booking():
             )
             if user:
                 user_id = user['_id']
-                print(f"✅ Linked booking to existing customer: {user.get('name')} ({user_id})")
+                logger.debug("✅ Linked booking to existing customer: %s (%s)", user.get('name'), user_id)
             else:
-                print(f"ℹ️  No existing customer found for phone/email - booking will be unlinked")
+                logger.debug("ℹ️  No existing customer found for phone/email - booking will be unlinked")
         
         # Create booking document matching your data structure
         booking_data = {
@@ -431,38 +364,36 @@ def create_quick_booking():
             'updated_at': datetime.now()
         }
 
-        # Insert booking
-        result = mongo.db.bookings.insert_one(booking_data)
-        booking_id = result.inserted_id
-
-        # Create payment record
-        payment_data = {
-            'booking_id': str(booking_id),
-            'user_id': data.get('user_id'),
-            'amount': total_amount,
-            'currency': 'ETB',
-            'payment_method': data.get('payment_method', 'cash'),
-            'status': 'success',
-            'tx_ref': f"ethiobus-{int(datetime.now().timestamp())}{random.randint(100, 999)}",
-            'booking_created': True,
-            # NEW: Track who processed this payment
-            'processed_by': current_ticketer_id,
-            'booking_source': 'counter',
-            'created_at': datetime.now(),
-            'updated_at': datetime.now()
-        }
-        mongo.db.payments.insert_one(payment_data)
+        # Create payment record, linked to the booking id assigned by commit_booking
+        def payment_record(booking_id):
+            return canonical_document('payments', {
+                'booking_id': booking_id,
+                'user_id': data.get('user_id'),
+                'amount': total_amount,
+                'currency': 'ETB',
+                'payment_method': data.get('payment_method', 'cash'),
+                'status': 'success',
+                'tx_ref': f"ethiobus-{int(datetime.now().timestamp())}{random.randint(100, 999)}",
+                'booking_created': True,
+                # NEW: Track who processed this payment
+                'processed_by': current_ticketer_id,
+                'booking_source': 'counter',
+                'created_at': datetime.now(),
+                'updated_at': datetime.now()
+            })
 
-        # Update schedule booked seats count
-        mongo.db.busschedules.update_one(
-            {'_id': ObjectId(data['schedule_id'])},
-            {
-                '$inc': {
-                    'booked_seats': num_seats,
-                    'available_seats': -num_seats
-                }
-            }
-        )
+        # Seats, booking, payment record and outbox events (search counts,
+        # rollups, broadcast) in one transaction
+        try:
+            booking_id = commit_booking(
+                booking_data,
+                events=lambda booking_id: booking_events(booking_id, booking_data),
+                payment=payment_record
+            )
+        except BookingConflict as conflict:
+            seat_map_cache.invalidate(data['schedule_id'])
+            return jsonify({'success': False, 'error': str(conflict), 'conflict': True}), 409
+        seat_map_cache.booking_added(booking_data)
 
         # Get enriched booking data for response
         enriched_booking = serialize_doc(booking_data)
@@ -580,6 +511,7 @@ def checkin_passenger(booking_id):
             {'_id': ObjectId(booking_id)},
             {'$set': update_data}
         )
+        record_booking_change(booking)
         
         return jsonify({
             'success': True, 
@@ -601,6 +533,7 @@ def bulk_checkin():
         object_ids = [ObjectId(bid) for bid in booking_ids]
         
         # Bulk update only confirmed bookings
+        confirmed = list(mongo.db.bookings.find({'_id': {'$in': object_ids}, 'status': 'confirmed'}, BOOKING_PROJECTION))
         result = mongo.db.bookings.update_many(
             {
                 '_id': {'$in': object_ids},
@@ -615,6 +548,8 @@ def bulk_checkin():
                 }
             }
         )
+        for booking in confirmed:
+            record_booking_change(booking, dict(booking, status='checked_in'))
         
         return jsonify({
             'success': True, 
@@ -632,8 +567,8 @@ def mark_no_show(booking_id):
             return jsonify({'success': False, 'error': 'Booking not found'}), 404
         
         # Update booking status to no_show
-        mongo.db.bookings.update_one(
-            {'_id': ObjectId(booking_id)},
+        result = mongo.db.bookings.update_one(
+            {'_id': ObjectId(booking_id), 'status': booking.get('status')},
             {
                 '$set': {
                     'status': 'no_show',
@@ -641,6 +576,12 @@ def mark_no_show(booking_id):
                 }
             }
         )
+        if result.modified_count == 0:
+            return jsonify({'success': False, 'error': 'Booking was changed by another request'}), 409
+        record_booking_change(booking)
+        release_booking_capacity(booking)
+        seat_map_cache.booking_released(booking)
+        refresh_seat_counts(booking.get('schedule_id'))
         
         return jsonify({
             'success': True, 
@@ -768,8 +709,7 @@ def get_customers():
             # PRIMARY: Match by user_id (this should be the main way after migration)
             # FALLBACK: Also match by phone/email for bookings not yet migrated
             match_conditions = [
-                {'user_id': customer_id},  # ObjectId format (PRIMARY)
-                {'user_id': str(customer_id)}  # String format (legacy)
+                {'user_id': customer_id}
             ]
             
             # Fallback matching for unmigrated bookings
@@ -805,7 +745,7 @@ def get_customers():
             
             # Debug logging
             if len(all_bookings) > 0:
-                print(f"✅ Customer {customer.get('name')}: Found {len(all_bookings)} bookings")
+                logger.debug("✅ Customer %s: Found %s bookings", customer.get('name'), len(all_bookings), extra=PER_ITEM)
             
             # Use stored values from user document (source of truth)
             # These are updated in real-time when bookings are created/completed
@@ -834,9 +774,7 @@ def get_customers():
         }), 200
 
     except Exception as e:
-        print(f"❌ Error in get_customers: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error("❌ Error in get_customers: %s", str(e), exc_info=True)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @ticketer_bp.route('/customer/<string:customer_id>/bookings', methods=['GET'])
@@ -855,8 +793,7 @@ def get_customer_bookings(customer_id):
         
         try:
             if len(customer_id) == 24:
-                match_conditions.append({'user_id': ObjectId(customer_id)})
-                match_conditions.append({'user_id': customer_id})  # String format (legacy)
+                match_conditions.append({'user_id': user_ref(customer_id)})
         except:
             pass
         
@@ -1087,12 +1024,12 @@ def get_bookings():
         if date_str:
             query['travel_date'] = date_str
         
-        print(f"📋 Fetching bookings for ticketer {current_user_id} with query: {query}")
+        logger.debug("📋 Fetching bookings for ticketer %s with query: %s", current_user_id, query)
             
         bookings = list(mongo.db.bookings.find(query).sort('created_at', -1).skip(skip).limit(limit))
         total = mongo.db.bookings.count_documents(query)
         
-        print(f"📊 Found {total} bookings for this ticketer")
+        logger.debug("📊 Found %s bookings for this ticketer", total)
         
         bookings_data = []
         for booking in bookings:
@@ -1252,7 +1189,7 @@ def initialize_chapa_payment():
                 'created_at': datetime.now(),
                 'updated_at': datetime.now()
             }
-            mongo.db.payments.insert_one(payment_record)
+            mongo.db.payments.insert_one(canonical_document('payments', payment_record))
             
             return jsonify({
                 'success': True,
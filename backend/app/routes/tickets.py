@@ -1,11 +1,20 @@
+import logging
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from datetime import datetime, timedelta
 import json
 import re
+from app.utils.booking_commit import (
+    BookingConflict, claim_capacity, commit_booking, release_booking_capacity, release_capacity
+)
+from app.utils.outbox import booking_events
+from app.utils.rollups import record_booking_change
+from app.utils.schedule_search import refresh_seat_counts
+from app.utils.seat_map_cache import OCCUPIED_BOOKING_STATUSES, seat_map_cache
 
 ticket_bp = Blueprint('tickets', __name__)
+logger = logging.getLogger(__name__)
 
 class JSONEncoder(json.JSONEncoder):
     def default(self, o):
@@ -251,6 +260,15 @@ def create_manual_booking():
         if travel_date.date() < datetime.now().date():
             return jsonify({"error": "Travel date cannot be in the past"}), 400
         
+        # The bus's departure that day holds the seats
+        schedule = db.busschedules.find_one({
+            "bus_id": data['bus_id'],
+            "departure_date": data['travel_date'],
+            "status": {"$nin": ["cancelled", "completed"]}
+        }, {"_id": 1})
+        if not schedule:
+            return jsonify({"error": "This bus has no departure on that date"}), 404
+        
         # Check seat availability
         selected_seats = data['seats']
         if not selected_seats:
@@ -309,37 +327,47 @@ def create_manual_booking():
             "payment_method": "cash",
             "booked_by": ObjectId(current_user['id']),
             "booking_type": "manual",
+            "schedule_id": str(schedule['_id']),
+            "seat_numbers": selected_seats,
             "created_at": datetime.now(),
             "updated_at": datetime.now()
         }
         
-        result = db.bookings.insert_one(booking_data)
-        booking_id = str(result.inserted_id)
-        
         # Create payment record in payments collection
-        payment_record = {
-            'user_id': ObjectId(current_user['id']),
-            'booking_id': booking_id,
-            'amount': total_amount,
-            'currency': 'ETB',
-            'payment_method': 'cash',
-            'status': 'success',
-            'payment_status': 'paid',
-            'booking_created': True,
-            'booking_source': 'counter',
-            'tx_ref': f"manual-{booking_id}",
-            'processed_by': ObjectId(current_user['id']),
-            'created_at': datetime.now(),
-            'updated_at': datetime.now(),
-            'paid_at': datetime.now()
-        }
+        def payment_record(booking_id):
+            return {
+                'user_id': ObjectId(current_user['id']),
+                'booking_id': booking_id,
+                'amount': total_amount,
+                'currency': 'ETB',
+                'payment_method': 'cash',
+                'status': 'success',
+                'payment_status': 'paid',
+                'booking_created': True,
+                'booking_source': 'counter',
+                'tx_ref': f"manual-{booking_id}",
+                'processed_by': ObjectId(current_user['id']),
+                'created_at': datetime.now(),
+                'updated_at': datetime.now(),
+                'paid_at': datetime.now()
+            }
         
-        db.payments.insert_one(payment_record)
-        print(f"✅ Payment record created for manual booking: {booking_id}")
+        # Seats, booking, payment record and outbox events in one transaction
+        try:
+            booking_id = commit_booking(
+                booking_data,
+                events=lambda booking_id: booking_events(booking_id, booking_data),
+                payment=payment_record
+            )
+        except BookingConflict as conflict:
+            seat_map_cache.invalidate(booking_data['schedule_id'])
+            return jsonify({"error": str(conflict), "conflict": True}), 409
+        seat_map_cache.booking_added(booking_data)
+        logger.debug("✅ Payment record created for manual booking: %s", booking_id)
         
         # Get the complete booking with populated data
         new_booking = db.bookings.aggregate([
-            {"$match": {"_id": result.inserted_id}},
+            {"$match": {"_id": ObjectId(booking_id)}},
             {"$lookup": {
                 "from": "users",
                 "localField": "passenger_id",
@@ -403,9 +431,19 @@ def update_booking_status(booking_id):
         if not booking:
             return jsonify({"error": "Booking not found or access denied"}), 404
         
+        # Seats are taken back from, or given back to, the schedule with the status
+        was_occupying = booking.get('status') in OCCUPIED_BOOKING_STATUSES
+        occupies = new_status in OCCUPIED_BOOKING_STATUSES
+        schedule_id = booking.get('schedule_id')
+        seat_count = len(booking.get('seat_numbers') or [])
+        reclaims = occupies and not was_occupying and bool(schedule_id) and seat_count > 0
+        if reclaims:
+            if claim_capacity(schedule_id, seat_count) is None:
+                return jsonify({"error": "Not enough seats left on this schedule", "conflict": True}), 409
+        
         # Update booking
         result = db.bookings.update_one(
-            {"_id": ObjectId(booking_id)},
+            {"_id": ObjectId(booking_id), "status": booking.get('status')},
             {
                 "$set": {
                     "status": new_status,
@@ -415,8 +453,17 @@ def update_booking_status(booking_id):
         )
         
         if result.modified_count == 0:
+            if reclaims:
+                release_capacity(schedule_id, seat_count)
             return jsonify({"error": "Failed to update booking status"}), 400
         
+        record_booking_change(booking)
+        if was_occupying and not occupies:
+            release_booking_capacity(booking)
+        if schedule_id and was_occupying != occupies:
+            seat_map_cache.invalidate(schedule_id)
+            refresh_seat_counts(schedule_id)
+        
         return jsonify({"message": f"Booking status updated to {new_status}"}), 200
         
     except Exception as e:
@@ -465,13 +512,18 @@ def cancel_booking(booking_id):
         }
         
         result = db.bookings.update_one(
-            {"_id": ObjectId(booking_id)},
+            {"_id": ObjectId(booking_id), "status": booking['status']},
             {"$set": update_data}
         )
         
         if result.modified_count == 0:
             return jsonify({"error": "Failed to cancel booking"}), 400
         
+        record_booking_change(booking)
+        release_booking_capacity(booking)
+        seat_map_cache.booking_released(booking)
+        refresh_seat_counts(booking.get('schedule_id'))
+        
         # Add to refunds collection if refund was processed
         if refund_amount > 0:
             db.refunds.insert_one({
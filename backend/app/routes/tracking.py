@@ -10,6 +10,9 @@ from datetime import datetime, timedelta
 import logging
 
 from app import mongo
+from app.utils.authz import current_user_record, has_role, role_required
+from app.utils.query_budget import query_budget
+from app.utils.schedule_search import sync_schedule
 from app.routes.operator import serialize_document
 
 tracking_bp = Blueprint('tracking', __name__)
@@ -62,21 +65,16 @@ def get_bus_stops():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get bus stops error: {e}")
+        logger.error("Get bus stops error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @tracking_bp.route('/driver/my-route-stops', methods=['GET'])
-@jwt_required()
+@role_required('driver', error='Driver access required')
 def get_my_route_stops():
     """Get route stops for driver's current assignment"""
     try:
         current_user = get_jwt_identity()
         
-        # Verify user is a driver
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user)})
-        if not user or user.get('role') != 'driver':
-            return jsonify({'error': 'Driver access required'}), 403
-        
         schedule_id = request.args.get('schedule_id')
         if not schedule_id:
             return jsonify({'error': 'Schedule ID is required'}), 400
@@ -91,42 +89,42 @@ def get_my_route_stops():
             return jsonify({'error': 'You are not assigned to this schedule'}), 403
         
         # Get route to fetch stops - handle multiple field name variations
-        route_id = schedule.get('route_id') or schedule.get('routeId') or schedule.get('route')
+        route_id = schedule.get('route_id') or schedule.get('route')
         route = None
         
-        logger.info(f"🔍 DEBUG - Schedule fields: {list(schedule.keys())}")
-        logger.info(f"🔍 DEBUG - Looking for route with ID: {route_id} (type: {type(route_id)})")
+        logger.debug("🔍 DEBUG - Schedule fields: %s", list(schedule.keys()))
+        logger.debug("🔍 DEBUG - Looking for route with ID: %s (type: %s)", route_id, type(route_id))
         
         if route_id:
             try:
                 # Try to find route by ObjectId
                 route = mongo.db.routes.find_one({'_id': ObjectId(route_id)})
                 if route:
-                    logger.info(f"✅ Found route by ObjectId: {route.get('name')}")
+                    logger.debug("✅ Found route by ObjectId: %s", route.get('name'))
             except Exception as e:
-                logger.info(f"⚠️ Could not find route by ObjectId: {e}")
+                logger.debug("⚠️ Could not find route by ObjectId: %s", e)
                 # If that fails, try as string
                 try:
                     route = mongo.db.routes.find_one({'_id': route_id})
                     if route:
-                        logger.info(f"✅ Found route by string ID: {route.get('name')}")
+                        logger.debug("✅ Found route by string ID: %s", route.get('name'))
                 except Exception as e2:
-                    logger.info(f"⚠️ Could not find route by string ID: {e2}")
+                    logger.debug("⚠️ Could not find route by string ID: %s", e2)
         
         # If no route_id in schedule, try to find route by matching origin and destination
         if not route and schedule.get('origin_city') and schedule.get('destination_city'):
-            logger.info(f"🔍 DEBUG - Trying to find route by cities: {schedule.get('origin_city')} -> {schedule.get('destination_city')}")
+            logger.debug("🔍 DEBUG - Trying to find route by cities: %s -> %s", schedule.get('origin_city'), schedule.get('destination_city'))
             route = mongo.db.routes.find_one({
                 'origin_city': schedule.get('origin_city'),
                 'destination_city': schedule.get('destination_city')
             })
             if route:
-                logger.info(f"✅ Found route by city match: {route.get('name')}")
+                logger.debug("✅ Found route by city match: %s", route.get('name'))
                 route_id = str(route['_id'])
         
         if not route:
-            logger.warning(f"❌ Route not found for schedule {schedule_id}. Route ID was: {route_id}")
-            logger.warning(f"   Schedule origin: {schedule.get('origin_city')}, destination: {schedule.get('destination_city')}")
+            logger.warning("❌ Route not found for schedule %s. Route ID was: %s", schedule_id, route_id)
+            logger.warning("Schedule origin: %s, destination: %s", schedule.get('origin_city'), schedule.get('destination_city'))
         
         # Get stops from route document (stored as array in route)
         intermediate_stops = route.get('stops', []) if route else []
@@ -136,20 +134,20 @@ def get_my_route_stops():
         bus_stops = intermediate_stops if intermediate_stops else []
         
         # Log for debugging
-        logger.info(f"🔍 DEBUG - Schedule ID: {schedule_id}")
-        logger.info(f"🔍 DEBUG - Route ID from schedule: {route_id}")
-        logger.info(f"🔍 DEBUG - Route found: {route is not None}")
+        logger.debug("🔍 DEBUG - Schedule ID: %s", schedule_id)
+        logger.debug("🔍 DEBUG - Route ID from schedule: %s", route_id)
+        logger.debug("🔍 DEBUG - Route found: %s", route is not None)
         if route:
-            logger.info(f"🔍 DEBUG - Route _id: {route.get('_id')}")
-            logger.info(f"🔍 DEBUG - Route name: {route.get('name')}")
-            logger.info(f"🔍 DEBUG - Route origin: {route.get('origin_city')}")
-            logger.info(f"🔍 DEBUG - Route destination: {route.get('destination_city')}")
-            logger.info(f"🔍 DEBUG - Route stops field: {route.get('stops', [])}")
-            logger.info(f"🔍 DEBUG - Route stops type: {type(route.get('stops', []))}")
+            logger.debug("🔍 DEBUG - Route _id: %s", route.get('_id'))
+            logger.debug("🔍 DEBUG - Route name: %s", route.get('name'))
+            logger.debug("🔍 DEBUG - Route origin: %s", route.get('origin_city'))
+            logger.debug("🔍 DEBUG - Route destination: %s", route.get('destination_city'))
+            logger.debug("🔍 DEBUG - Route stops field: %s", route.get('stops', []))
+            logger.debug("🔍 DEBUG - Route stops type: %s", type(route.get('stops', [])))
         else:
-            logger.warning(f"❌ No route found - cannot fetch stops")
-        logger.info(f"🔍 DEBUG - Total intermediate stops: {len(bus_stops)}")
-        logger.info(f"🔍 DEBUG - Stops list: {bus_stops}")
+            logger.warning("❌ No route found - cannot fetch stops")
+        logger.debug("🔍 DEBUG - Total intermediate stops: %s", len(bus_stops))
+        logger.debug("🔍 DEBUG - Stops list: %s", bus_stops)
         
         # Get checked stops from schedule
         checked_stops = schedule.get('checked_stops', [])
@@ -229,21 +227,16 @@ def get_my_route_stops():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get my route stops error: {e}")
+        logger.error("Get my route stops error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @tracking_bp.route('/bus-stops', methods=['POST'])
-@jwt_required()
+@role_required('operator', 'admin', error='Operator access required')
 def create_bus_stop():
     """Create a new bus stop"""
     try:
         current_user = get_jwt_identity()
         
-        # Check if user is operator/admin
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user)})
-        if not user or user.get('role') not in ['operator', 'admin']:
-            return jsonify({'error': 'Operator access required'}), 403
-        
         data = request.get_json()
         
         bus_stop = {
@@ -268,7 +261,7 @@ def create_bus_stop():
         }), 201
         
     except Exception as e:
-        logger.error(f"Create bus stop error: {e}")
+        logger.error("Create bus stop error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 # ==================== BUS LOCATION TRACKING ====================
@@ -282,9 +275,9 @@ def update_bus_location():
         data = request.get_json()
         
         # Verify user is a driver
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user)})
-        if not user or user.get('role') != 'driver':
+        if not has_role('driver'):
             return jsonify({'error': 'Driver access required'}), 403
+        user = current_user_record()
         
         schedule_id = data.get('schedule_id')
         bus_stop_id = data.get('bus_stop_id')
@@ -299,7 +292,7 @@ def update_bus_location():
         
         # Verify driver is assigned to this schedule
         schedule_driver_id = schedule.get('driver_id')
-        print(f"🔍 Check-in verification: schedule_driver_id={schedule_driver_id} (type: {type(schedule_driver_id)}), current_user={current_user} (type: {type(current_user)})")
+        logger.debug("🔍 Check-in verification: schedule_driver_id=%s (type: %s), current_user=%s (type: %s)", schedule_driver_id, type(schedule_driver_id), current_user, type(current_user))
         
         if str(schedule_driver_id) != str(current_user):
             return jsonify({'error': f'You are not assigned to this schedule'}), 403
@@ -324,7 +317,7 @@ def update_bus_location():
             stop_order = bus_stop.get('stop_order')
         else:
             # Not in busstops collection, get from route stops
-            route_id = schedule.get('route_id') or schedule.get('routeId')
+            route_id = schedule.get('route_id')
             route = None
             if route_id:
                 try:
@@ -334,20 +327,20 @@ def update_bus_location():
             
             # If no route_id, try to find by cities
             if not route and schedule.get('origin_city') and schedule.get('destination_city'):
-                logger.info(f"🔍 Check-in DEBUG - Trying to find route by cities: {schedule.get('origin_city')} -> {schedule.get('destination_city')}")
+                logger.debug("🔍 Check-in DEBUG - Trying to find route by cities: %s -> %s", schedule.get('origin_city'), schedule.get('destination_city'))
                 route = mongo.db.routes.find_one({
                     'origin_city': schedule.get('origin_city'),
                     'destination_city': schedule.get('destination_city')
                 })
                 if route:
-                    logger.info(f"✅ Check-in DEBUG - Found route by city match: {route.get('name')}")
+                    logger.debug("✅ Check-in DEBUG - Found route by city match: %s", route.get('name'))
                     route_id = str(route['_id'])
             
-            logger.info(f"🔍 Check-in DEBUG - Route ID: {route_id}, Route found: {route is not None}")
+            logger.debug("🔍 Check-in DEBUG - Route ID: %s, Route found: %s", route_id, route is not None)
             
             if route:
                 intermediate_stops = route.get('stops', [])
-                logger.info(f"🔍 Check-in DEBUG - Intermediate stops: {intermediate_stops}")
+                logger.debug("🔍 Check-in DEBUG - Intermediate stops: %s", intermediate_stops)
                 
                 # ONLY use intermediate stops - origin and destination are not checkable stops
                 complete_stops = intermediate_stops
@@ -355,7 +348,7 @@ def update_bus_location():
                 # Extract stop info from bus_stop_id (format: stop_0, stop_1, etc.)
                 if bus_stop_id.startswith('stop_'):
                     stop_index = int(bus_stop_id.split('_')[1])
-                    logger.info(f"🔍 Check-in DEBUG - Stop index: {stop_index}, Total stops: {len(complete_stops)}")
+                    logger.debug("🔍 Check-in DEBUG - Stop index: %s, Total stops: %s", stop_index, len(complete_stops))
                     
                     if stop_index < len(complete_stops):
                         stop_data = complete_stops[stop_index]
@@ -366,10 +359,10 @@ def update_bus_location():
                             stop_name = stop_data.get('name') or stop_data.get('stop_name')
                             stop_order = stop_data.get('order') or stop_data.get('stop_order') or (stop_index + 1)
                         
-                        logger.info(f"✅ Check-in DEBUG - Found stop: {stop_name}, order: {stop_order}")
+                        logger.debug("✅ Check-in DEBUG - Found stop: %s, order: %s", stop_name, stop_order)
         
         if not stop_name:
-            logger.error(f"❌ Check-in ERROR - Bus stop not found: {bus_stop_id}")
+            logger.error("❌ Check-in ERROR - Bus stop not found: %s", bus_stop_id)
             return jsonify({'error': f'Bus stop not found: {bus_stop_id}'}), 404
         
         # Calculate distance information
@@ -378,7 +371,7 @@ def update_bus_location():
         total_route_distance = 0
         
         # Get route to calculate distances
-        route_id = schedule.get('route_id') or schedule.get('routeId')
+        route_id = schedule.get('route_id')
         if route_id:
             try:
                 route = mongo.db.routes.find_one({'_id': ObjectId(route_id)})
@@ -420,7 +413,7 @@ def update_bus_location():
         }
         
         # Determine if this is the final stop
-        route_id = schedule.get('routeId')
+        route_id = schedule.get('route_id')
         total_stops = 0
         
         # Get total stops count - check both busstops collection and route stops
@@ -441,7 +434,7 @@ def update_bus_location():
         # Check if this is the final stop (destination)
         is_final_stop = stop_order == total_stops if total_stops > 0 else False
         
-        print(f"🔍 Stop check: stop_order={stop_order}, total_stops={total_stops}, is_final={is_final_stop}")
+        logger.debug("🔍 Stop check: stop_order=%s, total_stops=%s, is_final=%s", stop_order, total_stops, is_final_stop)
         
         if is_final_stop:
             checkin_data['status'] = 'arrived'
@@ -461,15 +454,17 @@ def update_bus_location():
         if is_final_stop:
             schedule_update['status'] = 'completed'
             schedule_update['actual_arrival_time'] = datetime.utcnow()
-            print(f"🎉 SCHEDULE COMPLETED! Marking schedule {schedule_id} as completed")
+            logger.debug("🎉 SCHEDULE COMPLETED! Marking schedule %s as completed", schedule_id)
         
         mongo.db.busschedules.update_one(
             {'_id': ObjectId(schedule_id)},
             {'$set': schedule_update}
         )
+        if is_final_stop:
+            sync_schedule(schedule_id)
         
         if is_final_stop:
-            print(f"✅ Schedule status updated to 'completed' in database")
+            logger.debug("✅ Schedule status updated to 'completed' in database")
         
         # Mark the stop as checked in the schedule
         mongo.db.busschedules.update_one(
@@ -486,12 +481,12 @@ def update_bus_location():
             }
         )
         
-        print(f"✅ Driver checked in at stop: {stop_name}")
-        print(f"   - Schedule: {schedule_id}")
-        print(f"   - Stop Order: {stop_order}/{total_stops}")
-        print(f"   - Final Stop: {is_final_stop}")
+        logger.debug("✅ Driver checked in at stop: %s", stop_name)
+        logger.debug("- Schedule: %s", schedule_id)
+        logger.debug("- Stop Order: %s/%s", stop_order, total_stops)
+        logger.debug("- Final Stop: %s", is_final_stop)
         if is_final_stop:
-            print(f"   - 🎉 Journey completed! Schedule marked as 'completed'")
+            logger.debug("- 🎉 Journey completed! Schedule marked as 'completed'")
         
         return jsonify({
             'success': True,
@@ -509,7 +504,7 @@ def update_bus_location():
         }), 200
         
     except Exception as e:
-        logger.error(f"Check-in error: {e}")
+        logger.error("Check-in error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @tracking_bp.route('/bus-location/<schedule_id>', methods=['GET'])
@@ -540,61 +535,81 @@ def get_bus_location(schedule_id):
         }), 200
         
     except Exception as e:
-        logger.error(f"Get bus location error: {e}")
+        logger.error("Get bus location error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @tracking_bp.route('/active-buses', methods=['GET'])
-@jwt_required()
+@query_budget(4)
+@role_required('operator', 'admin', error='Operator access required')
 def get_active_buses():
     """Get all active buses with their current locations based on stop check-ins (Operator view)"""
     try:
-        current_user = get_jwt_identity()
-        
-        # Check if user is operator/admin
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user)})
-        if not user or user.get('role') not in ['operator', 'admin']:
-            return jsonify({'error': 'Operator access required'}), 403
-        
         # Get active schedules (today and upcoming)
         today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
         today_str = today.strftime('%Y-%m-%d')
         
-        # Query for both string and datetime formats, show all upcoming schedules
+        # Show all upcoming schedules (departure_date is a 'YYYY-MM-DD' string)
         active_schedules = list(mongo.db.busschedules.find({
-            '$or': [
-                # String format (most common)
-                {
-                    'departure_date': {'$gte': today_str},
-                    'status': {'$in': ['scheduled', 'boarding', 'active', 'departed']}
-                },
-                # Datetime format (legacy)
-                {
-                    'departure_date': {'$gte': today},
-                    'status': {'$in': ['scheduled', 'boarding', 'active', 'departed']}
-                }
-            ]
+            'departure_date': {'$gte': today_str},
+            'status': {'$in': ['scheduled', 'boarding', 'active', 'departed']}
         }).sort('departure_date', 1))
         
-        print(f"🚌 Found {len(active_schedules)} active/upcoming schedules")
+        logger.debug("🚌 Found %s active/upcoming schedules", len(active_schedules))
+        
+        # Stop counts, latest check-ins and drivers for all schedules at once
+        route_ids = list({schedule.get('route_id') for schedule in active_schedules})
+        stop_counts = {}
+        if route_ids:
+            stop_counts = {
+                row['_id']: row['count']
+                for row in mongo.db.busstops.aggregate([
+                    {'$match': {'route_id': {'$in': route_ids}}},
+                    {'$group': {'_id': '$route_id', 'count': {'$sum': 1}}}
+                ])
+            }
+        
+        schedule_ids = [str(schedule['_id']) for schedule in active_schedules]
+        latest_checkins = {}
+        if schedule_ids:
+            latest_checkins = {
+                row['_id']: row['checkin']
+                for row in mongo.db.bus_locations.aggregate([
+                    {'$match': {'schedule_id': {'$in': schedule_ids}, 'location_type': 'bus_stop'}},
+                    {'$sort': {'schedule_id': 1, 'timestamp': -1}},
+                    {'$group': {'_id': '$schedule_id', 'checkin': {'$first': '$$ROOT'}}}
+                ])
+            }
+        
+        driver_ids = {
+            ObjectId(str(schedule['driver_id'])) for schedule in active_schedules
+            if not schedule.get('driver_name') and schedule.get('driver_id')
+            and ObjectId.is_valid(str(schedule['driver_id']))
+        }
+        drivers = {}
+        if driver_ids:
+            drivers = {
+                str(driver['_id']): driver
+                for driver in mongo.db.users.find(
+                    {'_id': {'$in': list(driver_ids)}},
+                    {'full_name': 1, 'name': 1, 'phone': 1, 'phone_number': 1}
+                )
+            }
         
         # Enrich with tracking data based on checked stops
         buses_with_tracking = []
         for schedule in active_schedules:
             schedule_id = str(schedule['_id'])
-            route_id = schedule.get('routeId')
+            route_id = schedule.get('route_id')
             
-            # Get total stops for this route
-            total_stops = mongo.db.busstops.count_documents({'route_id': route_id})
+            # Total stops for this route
+            total_stops = stop_counts.get(route_id, 0)
             
             # Get checked stops from schedule
             checked_stops = schedule.get('checked_stops', [])
             checked_count = len(checked_stops)
             
-            # Get latest check-in
-            latest_checkin = mongo.db.bus_locations.find_one(
-                {'schedule_id': schedule_id, 'location_type': 'bus_stop'},
-                sort=[('timestamp', -1)]
-            )
+            # Latest check-in
+            latest_checkin = latest_checkins.get(schedule_id)
             
             bus_data = serialize_document(schedule)
             
@@ -621,20 +636,10 @@ def get_active_buses():
                 bus_data['driver_phone'] = schedule.get('driver_phone') or None
             else:
                 # Otherwise, try to fetch from users collection using driver_id
-                driver_id = schedule.get('driver_id')
-                if driver_id:
-                    try:
-                        driver = mongo.db.users.find_one({'_id': ObjectId(driver_id)})
-                        if driver:
-                            bus_data['driver_name'] = driver.get('full_name') or driver.get('name') or 'Unknown Driver'
-                            bus_data['driver_phone'] = driver.get('phone') or driver.get('phone_number') or None
-                        else:
-                            bus_data['driver_name'] = 'Not assigned'
-                            bus_data['driver_phone'] = None
-                    except Exception as e:
-                        logger.error(f"Error fetching driver info: {e}")
-                        bus_data['driver_name'] = 'Not assigned'
-                        bus_data['driver_phone'] = None
+                driver = drivers.get(str(schedule.get('driver_id')))
+                if driver:
+                    bus_data['driver_name'] = driver.get('full_name') or driver.get('name') or 'Unknown Driver'
+                    bus_data['driver_phone'] = driver.get('phone') or driver.get('phone_number') or None
                 else:
                     bus_data['driver_name'] = 'Not assigned'
                     bus_data['driver_phone'] = None
@@ -700,23 +705,16 @@ def get_active_buses():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get active buses error: {e}")
+        logger.error("Get active buses error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 # ==================== TRACKING SIMULATOR ====================
 
 @tracking_bp.route('/simulator/generate-location', methods=['POST'])
-@jwt_required()
+@role_required('operator', 'admin', error='Operator access required')
 def simulate_bus_location():
     """Simulate bus location updates for testing (Operator/Admin only)"""
     try:
-        current_user = get_jwt_identity()
-        
-        # Check if user is operator/admin
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user)})
-        if not user or user.get('role') not in ['operator', 'admin']:
-            return jsonify({'error': 'Operator access required'}), 403
-        
         data = request.get_json()
         schedule_id = data.get('schedule_id')
         
@@ -780,8 +778,8 @@ def simulate_bus_location():
             }
         )
         
-        print(f"🎮 Simulated location for schedule {schedule_id}")
-        print(f"   - Type: {simulation_type}")
+        logger.debug("🎮 Simulated location for schedule %s", schedule_id)
+        logger.debug("- Type: %s", simulation_type)
         
         return jsonify({
             'success': True,
@@ -790,21 +788,14 @@ def simulate_bus_location():
         }), 200
         
     except Exception as e:
-        logger.error(f"Simulate location error: {e}")
+        logger.error("Simulate location error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @tracking_bp.route('/simulator/auto-track/<schedule_id>', methods=['POST'])
-@jwt_required()
+@role_required('operator', 'admin', error='Operator access required')
 def auto_track_bus(schedule_id):
     """Start automatic tracking simulation for a bus"""
     try:
-        current_user = get_jwt_identity()
-        
-        # Check if user is operator/admin
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user)})
-        if not user or user.get('role') not in ['operator', 'admin']:
-            return jsonify({'error': 'Operator access required'}), 403
-        
         # Get schedule
         schedule = mongo.db.busschedules.find_one({'_id': ObjectId(schedule_id)})
         if not schedule:
@@ -858,7 +849,7 @@ def auto_track_bus(schedule_id):
             }
         )
         
-        print(f"🎮 Auto-tracked schedule {schedule_id} with {len(locations_created)} stops")
+        logger.debug("🎮 Auto-tracked schedule %s with %s stops", schedule_id, len(locations_created))
         
         return jsonify({
             'success': True,
@@ -868,22 +859,18 @@ def auto_track_bus(schedule_id):
         }), 200
         
     except Exception as e:
-        logger.error(f"Auto track error: {e}")
+        logger.error("Auto track error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
 # ==================== ADMIN: CREATE DEFAULT BUS STOPS ====================
 
 @tracking_bp.route('/admin/create-default-stops/<route_id>', methods=['POST'])
-@jwt_required()
+@role_required('admin', 'operator', error='Admin/Operator access required')
 def create_default_stops_for_route(route_id):
     """Create default bus stops for a route (Admin/Operator only)"""
     try:
         current_user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
-        
-        if not user or user.get('role') not in ['admin', 'operator']:
-            return jsonify({'error': 'Admin/Operator access required'}), 403
         
         # Get route details
         route = mongo.db.routes.find_one({'_id': ObjectId(route_id)})
@@ -952,8 +939,8 @@ def create_default_stops_for_route(route_id):
         
         result = mongo.db.busstops.insert_many(default_stops)
         
-        print(f"✅ Created {len(result.inserted_ids)} default stops for route {route_id}")
-        print(f"   Route: {origin} → {destination}")
+        logger.debug("✅ Created %s default stops for route %s", len(result.inserted_ids), route_id)
+        logger.debug("Route: %s → %s", origin, destination)
         
         return jsonify({
             'success': True,
@@ -963,20 +950,14 @@ def create_default_stops_for_route(route_id):
         }), 201
         
     except Exception as e:
-        logger.error(f"Create default stops error: {e}")
+        logger.error("Create default stops error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @tracking_bp.route('/admin/routes-without-stops', methods=['GET'])
-@jwt_required()
+@role_required('admin', 'operator', error='Admin/Operator access required')
 def get_routes_without_stops():
     """Get all routes that don't have bus stops configured"""
     try:
-        current_user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
-        
-        if not user or user.get('role') not in ['admin', 'operator']:
-            return jsonify({'error': 'Admin/Operator access required'}), 403
-        
         # Get all routes
         all_routes = list(mongo.db.routes.find({}))
         
@@ -1001,23 +982,18 @@ def get_routes_without_stops():
         }), 200
         
     except Exception as e:
-        logger.error(f"Get routes without stops error: {e}")
+        logger.error("Get routes without stops error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 # ==================== QUICK SETUP FOR ROUTES ====================
 
 @tracking_bp.route('/setup/create-default-stops/<schedule_id>', methods=['POST'])
-@jwt_required()
+@role_required('operator', 'admin', 'driver', error='Operator access required')
 def create_default_stops_for_schedule(schedule_id):
     """Create default bus stops for a schedule based on its route"""
     try:
         current_user = get_jwt_identity()
         
-        # Check if user is operator/admin
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user)})
-        if not user or user.get('role') not in ['operator', 'admin', 'driver']:
-            return jsonify({'error': 'Operator access required'}), 403
-        
         # Get schedule
         schedule = mongo.db.busschedules.find_one({'_id': ObjectId(schedule_id)})
         if not schedule:
@@ -1025,7 +1001,7 @@ def create_default_stops_for_schedule(schedule_id):
         
         origin = schedule.get('origin_city') or schedule.get('departure_city') or 'Origin'
         destination = schedule.get('destination_city') or schedule.get('arrival_city') or 'Destination'
-        route_id = schedule.get('routeId') or schedule_id
+        route_id = schedule.get('route_id') or schedule_id
         
         # Check if stops already exist
         existing_stops = mongo.db.busstops.count_documents({'route_id': route_id})
@@ -1069,8 +1045,8 @@ def create_default_stops_for_schedule(schedule_id):
         # Insert stops
         result = mongo.db.busstops.insert_many(default_stops)
         
-        print(f"✅ Created {len(default_stops)} default stops for route {route_id}")
-        print(f"   - {origin} → {destination}")
+        logger.debug("✅ Created %s default stops for route %s", len(default_stops), route_id)
+        logger.debug("- %s → %s", origin, destination)
         
         return jsonify({
             'success': True,
@@ -1080,6 +1056,6 @@ def create_default_stops_for_schedule(schedule_id):
         }), 201
         
     except Exception as e:
-        logger.error(f"Create default stops error: {e}")
+        logger.error("Create default stops error: %s", e)
         return jsonify({'error': str(e)}), 500
 
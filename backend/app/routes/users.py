@@ -1,26 +1,16 @@
+import logging
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from datetime import datetime, timedelta
 from app import mongo
+from app.utils.authz import is_admin, user_changed
 import bcrypt
 
 users_bp = Blueprint('users', __name__)
+logger = logging.getLogger(__name__)
 
 
-def is_admin():
-    """Check if current user is admin"""
-    try:
-        current_user_id = get_jwt_identity()
-        user = mongo.db.users.find_one(
-            {'_id': ObjectId(current_user_id)}, 
-            {'role': 1, 'is_active': 1}
-        )
-        return user and user.get('role') == 'admin' and user.get('is_active', True)
-    except Exception as e:
-        print(f"❌ Error in is_admin check: {e}")
-        return False
-    
 def get_current_user():
     """Get current user details"""
     try:
@@ -30,7 +20,7 @@ def get_current_user():
             {'password': 0}
         )
     except Exception as e:
-        print(f"❌ Error getting current user: {e}")
+        logger.error("❌ Error getting current user: %s", e)
         return None
 
 @users_bp.route('/profile', methods=['GET'])
@@ -52,7 +42,7 @@ def get_current_user_profile():
         return jsonify(current_user), 200
         
     except Exception as e:
-        print(f"❌ Error in get_current_user_profile: {e}")
+        logger.error("❌ Error in get_current_user_profile: %s", e)
         return jsonify({'error': 'Failed to fetch user profile'}), 500
 
 @users_bp.route('/profile', methods=['PUT'])
@@ -122,7 +112,7 @@ def update_current_user_profile():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error in update_current_user_profile: {e}")
+        logger.error("❌ Error in update_current_user_profile: %s", e)
         return jsonify({'error': 'Failed to update profile'}), 500
 
 def hash_password(password):
@@ -134,7 +124,7 @@ def verify_password(password, hashed):
     try:
         return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
     except Exception as e:
-        print(f"❌ Error verifying password: {e}")
+        logger.error("❌ Error verifying password: %s", e)
         return False
 
 @users_bp.route('/password', methods=['PUT'])
@@ -183,7 +173,7 @@ def change_password():
         return jsonify({'message': 'Password updated successfully'}), 200
         
     except Exception as e:
-        print(f"❌ Error in change_password: {e}")
+        logger.error("❌ Error in change_password: %s", e)
         return jsonify({'error': 'Failed to change password'}), 500
 
 @users_bp.route('/<user_id>', methods=['PUT'])
@@ -220,8 +210,7 @@ def update_user(user_id):
                     return jsonify({'error': 'Email already taken'}), 400
         else:
             # Admin updating another user - check permissions
-            current_user = get_current_user()
-            if not current_user or current_user.get('role') != 'admin':
+            if not is_admin():
                 return jsonify({'error': 'Admin access required'}), 403
             
             # Admin can update more fields
@@ -238,6 +227,8 @@ def update_user(user_id):
         
         if result.matched_count == 0:
             return jsonify({'error': 'User not found'}), 404
+        # Admins may change role, station or is_active here
+        user_changed(user_id)
         
         # Return updated user data
         updated_user = mongo.db.users.find_one(
@@ -258,7 +249,7 @@ def update_user(user_id):
         }), 200
         
     except Exception as e:
-        print(f"❌ Error in update_user: {e}")
+        logger.error("❌ Error in update_user: %s", e)
         return jsonify({'error': 'Failed to update user'}), 500
 
 
@@ -293,7 +284,7 @@ def get_drivers():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error in get_drivers: {e}")
+        logger.error("❌ Error in get_drivers: %s", e)
         return jsonify({'error': 'Failed to fetch drivers'}), 500
 
 @users_bp.route('/<user_id>/deactivate', methods=['PUT'])
@@ -319,11 +310,12 @@ def deactivate_user(user_id):
         
         if result.matched_count == 0:
             return jsonify({'error': 'User not found'}), 404
+        user_changed(user_id)
         
         return jsonify({'message': 'User deactivated successfully'}), 200
         
     except Exception as e:
-        print(f"❌ Error in deactivate_user: {e}")
+        logger.error("❌ Error in deactivate_user: %s", e)
         return jsonify({'error': 'Failed to deactivate user'}), 500
 
 @users_bp.route('/<user_id>/activate', methods=['PUT'])
@@ -344,11 +336,12 @@ def activate_user(user_id):
         
         if result.matched_count == 0:
             return jsonify({'error': 'User not found'}), 404
+        user_changed(user_id)
         
         return jsonify({'message': 'User activated successfully'}), 200
         
     except Exception as e:
-        print(f"❌ Error in activate_user: {e}")
+        logger.error("❌ Error in activate_user: %s", e)
         return jsonify({'error': 'Failed to activate user'}), 500
 
 @users_bp.route('/<user_id>/role', methods=['PUT'])
@@ -384,11 +377,12 @@ def update_user_role(user_id):
         
         if result.matched_count == 0:
             return jsonify({'error': 'User not found'}), 404
+        user_changed(user_id)
         
         return jsonify({'message': f'User role updated to {new_role}'}), 200
         
     except Exception as e:
-        print(f"❌ Error in update_user_role: {e}")
+        logger.error("❌ Error in update_user_role: %s", e)
         return jsonify({'error': 'Failed to update user role'}), 500
 
 @users_bp.route('/stats', methods=['GET'])
@@ -420,7 +414,7 @@ def get_user_stats():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error in get_user_stats: {e}")
+        logger.error("❌ Error in get_user_stats: %s", e)
         return jsonify({'error': 'Failed to fetch user statistics'}), 500
 # Add to users.py after existing routes
 
@@ -460,7 +454,7 @@ def get_ticketers():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error in get_ticketers: {e}")
+        logger.error("❌ Error in get_ticketers: %s", e)
         return jsonify({'error': 'Failed to fetch ticketers'}), 500
 
 @users_bp.route('/stations', methods=['GET'])
@@ -476,7 +470,7 @@ def get_stations():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error in get_stations: {e}")
+        logger.error("❌ Error in get_stations: %s", e)
         return jsonify({'error': 'Failed to fetch stations'}), 500
     
 @users_bp.route('/health', methods=['GET'])
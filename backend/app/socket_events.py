@@ -1,32 +1,32 @@
 """
 WebSocket Event Handlers for Real-Time Seat Updates
 """
+import logging
 from flask_socketio import emit, join_room, leave_room
 from flask import request
-from app import socketio, mongo
-from app.utils.seat_lock import get_locked_seats, cleanup_expired_locks
+from app import socketio
+from app.utils.seat_broadcast import seat_broadcaster
+from app.utils.seat_events import current_seq, events_since, server_time
+from app.utils.presence import presence
+from app.utils.seat_map_cache import seat_map_cache
+from app.utils.seat_set import SeatSet
 from bson import ObjectId
 
-# Store connected users per schedule
-connected_users = {}
+logger = logging.getLogger(__name__)
 
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection"""
-    print(f"🔌 Client connected: {request.sid}")
+    logger.debug("🔌 Client connected: %s", request.sid)
     emit('connection_response', {'status': 'connected', 'sid': request.sid})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection and cleanup their locks"""
-    print(f"🔌 Client disconnected: {request.sid}")
+    logger.debug("🔌 Client disconnected: %s", request.sid)
     
     # Clean up any rooms this client was in
-    for schedule_id, users in list(connected_users.items()):
-        if request.sid in users:
-            users.remove(request.sid)
-            if not users:
-                del connected_users[schedule_id]
+    presence.disconnect(request.sid)
 
 @socketio.on('join_schedule')
 def handle_join_schedule(data):
@@ -45,41 +45,17 @@ def handle_join_schedule(data):
     join_room(schedule_id)
     
     # Track connected users
-    if schedule_id not in connected_users:
-        connected_users[schedule_id] = []
-    if request.sid not in connected_users[schedule_id]:
-        connected_users[schedule_id].append(request.sid)
+    presence.join(request.sid, schedule_id)
     
-    print(f"👥 User {user_id} joined schedule room: {schedule_id}")
+    logger.debug("👥 User %s joined schedule room: %s", user_id, schedule_id)
     
     # Send current seat status
     try:
-        # Clean up expired locks first
-        cleanup_expired_locks(schedule_id)
-        
-        # Get occupied seats from bookings
-        db = mongo.db
-        bookings = db.bookings.find({
-            'schedule_id': schedule_id,
-            'status': {'$in': ['confirmed', 'checked_in', 'completed']}
-        })
-        
-        occupied_seats = []
-        for booking in bookings:
-            occupied_seats.extend(booking.get('seat_numbers', []))
-        
-        # Get locked seats
-        locked_seats = get_locked_seats(schedule_id)
-        
-        emit('seat_status_update', {
-            'schedule_id': schedule_id,
-            'occupied_seats': list(set(occupied_seats)),
-            'locked_seats': locked_seats,
-            'timestamp': str(mongo.db.command('serverStatus')['localTime'])
-        })
+        emit('seat_status_update', seat_status(schedule_id))
+        emit('viewer_count', {'schedule_id': schedule_id, 'viewers': presence.viewer_count(schedule_id)})
         
     except Exception as e:
-        print(f"❌ Error sending seat status: {e}")
+        logger.error("❌ Error sending seat status: %s", e)
         emit('error', {'message': str(e)})
 
 @socketio.on('leave_schedule')
@@ -94,12 +70,9 @@ def handle_leave_schedule(data):
         leave_room(schedule_id)
         
         # Remove from connected users
-        if schedule_id in connected_users and request.sid in connected_users[schedule_id]:
-            connected_users[schedule_id].remove(request.sid)
-            if not connected_users[schedule_id]:
-                del connected_users[schedule_id]
+        presence.leave(request.sid, schedule_id)
         
-        print(f"👋 Client left schedule room: {schedule_id}")
+        logger.debug("👋 Client left schedule room: %s", schedule_id)
 
 @socketio.on('lock_seats')
 def handle_lock_seats(data):
@@ -132,15 +105,10 @@ def handle_lock_seats(data):
     })
     
     if success:
-        # Broadcast to all clients in this schedule room
-        emit('seats_locked', {
-            'schedule_id': schedule_id,
-            'seat_numbers': locked_seats,
-            'user_id': user_id,
-            'timestamp': str(mongo.db.command('serverStatus')['localTime'])
-        }, room=schedule_id, include_self=False)
+        # Broadcast to all clients in this schedule room (merged with other changes in the window)
+        seat_broadcaster.seats_locked(schedule_id, locked_seats, user_id)
         
-        print(f"🔒 Seats {locked_seats} locked for user {user_id} in schedule {schedule_id}")
+        logger.debug("🔒 Seats %s locked for user %s in schedule %s", locked_seats, user_id, schedule_id)
 
 @socketio.on('unlock_seats')
 def handle_unlock_seats(data):
@@ -162,6 +130,7 @@ def handle_unlock_seats(data):
         return
     
     # Unlock the seats
+    seat_numbers = SeatSet.parse(seat_numbers)[0].to_list()
     success, message = unlock_seats(schedule_id, seat_numbers, user_id)
     
     # Send response to requesting client
@@ -171,15 +140,10 @@ def handle_unlock_seats(data):
     })
     
     if success:
-        # Broadcast to all clients in this schedule room
-        emit('seats_unlocked', {
-            'schedule_id': schedule_id,
-            'seat_numbers': seat_numbers,
-            'user_id': user_id,
-            'timestamp': str(mongo.db.command('serverStatus')['localTime'])
-        }, room=schedule_id, include_self=False)
+        # Broadcast to all clients in this schedule room (merged with other changes in the window)
+        seat_broadcaster.seats_unlocked(schedule_id, seat_numbers, user_id)
         
-        print(f"🔓 Seats {seat_numbers} unlocked for user {user_id} in schedule {schedule_id}")
+        logger.debug("🔓 Seats %s unlocked for user %s in schedule %s", seat_numbers, user_id, schedule_id)
 
 @socketio.on('refresh_seats')
 def handle_refresh_seats(data):
@@ -194,47 +158,69 @@ def handle_refresh_seats(data):
         return
     
     try:
-        # Clean up expired locks
-        cleanup_expired_locks(schedule_id)
+        # Broadcast current seat status to all clients in this schedule room
+        emit('seat_status_update', seat_status(schedule_id), room=schedule_id)
         
-        # Get current seat status
-        db = mongo.db
-        bookings = db.bookings.find({
-            'schedule_id': schedule_id,
-            'status': {'$in': ['confirmed', 'checked_in', 'completed']}
-        })
-        
-        occupied_seats = []
-        for booking in bookings:
-            occupied_seats.extend(booking.get('seat_numbers', []))
+        logger.debug("🔄 Refreshed seat status for schedule %s", schedule_id)
         
-        locked_seats = get_locked_seats(schedule_id)
+    except Exception as e:
+        logger.error("❌ Error refreshing seats: %s", e)
+        emit('error', {'message': str(e)})
+
+@socketio.on('replay_seat_events')
+def handle_replay_seat_events(data):
+    """
+    Send a client the seat events it missed
+    data: {'schedule_id': 'xxx', 'since_seq': 41} (the last seq the client applied)
+    Answers with seat_events_replay, or a seat_status_update snapshot when
+    the missed events are no longer kept.
+    """
+    schedule_id = data.get('schedule_id')
+    since_seq = data.get('since_seq')
+    
+    if not schedule_id or not isinstance(since_seq, int):
+        emit('error', {'message': 'schedule_id and since_seq are required'})
+        return
+    
+    try:
+        events, seq = events_since(schedule_id, since_seq)
+        if events is None:
+            emit('seat_status_update', seat_status(schedule_id))
+            logger.debug("🔄 Seat events after %s expired for %s; sent snapshot", since_seq, schedule_id)
+            return
         
-        # Broadcast to all clients in this schedule room
-        emit('seat_status_update', {
+        emit('seat_events_replay', {
             'schedule_id': schedule_id,
-            'occupied_seats': list(set(occupied_seats)),
-            'locked_seats': locked_seats,
-            'timestamp': str(mongo.db.command('serverStatus')['localTime'])
-        }, room=schedule_id)
-        
-        print(f"🔄 Refreshed seat status for schedule {schedule_id}")
+            'events': events,
+            'seq': seq,
+            'timestamp': server_time()
+        })
         
     except Exception as e:
-        print(f"❌ Error refreshing seats: {e}")
+        logger.error("❌ Error replaying seat events: %s", e)
         emit('error', {'message': str(e)})
 
+def seat_status(schedule_id):
+    """Seat snapshot for a schedule, current to the seq it carries"""
+    # Read the seq first: events after it are newer than (or already in) the snapshot
+    seq = current_seq(schedule_id)
+    seat_map = seat_map_cache.get(schedule_id)
+    return {
+        'schedule_id': schedule_id,
+        'occupied_seats': seat_map.occupied_seats(),
+        'locked_seats': seat_map.locked_seats(),
+        'seq': seq,
+        'timestamp': server_time()
+    }
+
 def broadcast_seat_booked(schedule_id, seat_numbers):
     """
     Broadcast that seats have been booked (called from booking route)
     """
     try:
-        socketio.emit('seats_booked', {
-            'schedule_id': schedule_id,
-            'seat_numbers': seat_numbers,
-            'timestamp': str(mongo.db.command('serverStatus')['localTime'])
-        }, room=schedule_id)
+        seat_numbers = SeatSet.parse(seat_numbers)[0].to_list()
+        seat_broadcaster.seats_booked(schedule_id, seat_numbers)
         
-        print(f"📢 Broadcasted seat booking: {seat_numbers} for schedule {schedule_id}")
+        logger.debug("📢 Broadcasted seat booking: %s for schedule %s", seat_numbers, schedule_id)
     except Exception as e:
-        print(f"❌ Error broadcasting seat booking: {e}")
+        logger.error("❌ Error broadcasting seat booking: %s", e)
@@ -0,0 +1,148 @@
+"""
+Authorization
+Role checks without a users query per request. Tokens carry the user's role
+and station as claims (see token_claims, used at login); the account itself
+is confirmed from a bounded in-process TTL/LRU cache, so a deactivated or
+re-roled user loses access as soon as the cache learns of the change.
+users.py calls user_changed() after role and activation changes, which drops
+the entry here and bumps the 'users' version in the configuration cache so
+other workers drop their copies too.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from bson import ObjectId
+from flask import jsonify
+from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+# Fields kept per cached user (never the password hash)
+USER_PROJECTION = {'role': 1, 'is_active': 1, 'station': 1, 'name': 1, 'full_name': 1, 'email': 1}
+
+DEFAULT_MAX_USERS = 10000
+DEFAULT_TTL_SECONDS = 60
+
+class UserCache:
+    """
+    Thread-safe user_id -> user (USER_PROJECTION fields) cache, least recently
+    used entries evicted beyond max_size and entries reloaded after ttl_seconds
+    """
+
+    def __init__(self, enabled=True, max_size=DEFAULT_MAX_USERS, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.enabled = enabled
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # user_id -> (loaded_at, user or None)
+        self._version = None
+        self._guard = threading.Lock()
+
+    def configure(self, enabled=True, max_size=DEFAULT_MAX_USERS, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.enabled = enabled
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.invalidate()
+
+    def load(self, user_id):
+        try:
+            return mongo.db.users.find_one({'_id': ObjectId(user_id)}, USER_PROJECTION)
+        except Exception:
+            # Not an ObjectId: no such user
+            return None
+
+    def _sync_version(self):
+        """Drop everything when another worker reported a user change"""
+        from app.utils.config_cache import config_cache
+        version = config_cache.version('users')
+        if version != self._version:
+            with self._guard:
+                self._entries.clear()
+                self._version = version
+
+    def get(self, user_id):
+        """The user's cached fields, or None for an unknown user"""
+        user_id = str(user_id)
+        if not self.enabled:
+            return self.load(user_id)
+
+        self._sync_version()
+        now = time.monotonic()
+        with self._guard:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[0] < self.ttl_seconds:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        user = self.load(user_id)
+        with self._guard:
+            self._entries[user_id] = (now, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id=None):
+        """Drop one user (or everyone) so the next check reloads them"""
+        with self._guard:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(user_id), None)
+
+# Shared instance used by the authorization helpers and the JWT user loader
+user_cache = UserCache()
+
+def user_changed(user_id):
+    """Call after changing a user's role, station or active flag"""
+    from app.utils.config_cache import config_cache
+    user_cache.invalidate(user_id)
+    config_cache.bump('users')
+
+def token_claims(user):
+    """Claims embedded in a user's access token"""
+    return {
+        'email': user.get('email'),
+        'role': user.get('role'),
+        'station': user.get('station')
+    }
+
+def current_user_record():
+    """Cached fields of the user making the request, or None"""
+    user_id = get_jwt_identity()
+    return user_cache.get(user_id) if user_id else None
+
+def has_role(*roles):
+    """
+    True when the request's user is active and has one of roles
+    The token's role claim must still match the account, so a token issued
+    before a role change stops working; tokens issued before role claims
+    existed are checked against the account alone.
+    """
+    try:
+        user = current_user_record()
+        if not user or not user.get('is_active', True) or user.get('role') not in roles:
+            return False
+        claimed_role = get_jwt().get('role')
+        return claimed_role is None or claimed_role == user.get('role')
+    except Exception as e:
+        logger.error("❌ Role check error: %s", e)
+        return False
+
+def is_admin():
+    """Check if current user is admin"""
+    return has_role('admin')
+
+def role_required(*roles, error='Access denied'):
+    """Require a valid token whose user has one of roles, else 403 {'error': error}"""
+    def decorator(view):
+        @wraps(view)
+        @jwt_required()
+        def wrapper(*args, **kwargs):
+            if not has_role(*roles):
+                return jsonify({'error': error}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
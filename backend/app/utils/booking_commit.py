@@ -0,0 +1,230 @@
+"""
+Booking Commit
+Writes a new booking in one multi-document transaction together with what
+must hold for it to exist: the schedule's seat counters, the seat check, any
+guard updates (a free trip being spent, a payment being turned into its one
+booking), the booking's payment record, so the payment can be verified as soon
+as the booking is returned, and the booking's outbox events (app.utils.outbox),
+which apply the remaining side effects after the response has been sent.
+The schedule update is conditional on enough seats being left, so it is the
+capacity gate, and because every booking for a schedule writes that one
+document, concurrent commits for the same schedule conflict and retry instead
+of both passing the seat check. A commit that loses raises BookingConflict.
+Without a replica set (no transactions) the same writes run in order, after
+the seats are claimed in seat_claims, whose unique (schedule, seat) index lets
+only one concurrent commit per seat through; the claims are dropped once the
+booking is inserted (or the commit fails), and a failure before the insert
+gives the seats back, reverses the guards already applied and removes the
+payment record. The outbox events are then written idempotently with
+retries (app.utils.outbox.insert_events).
+"""
+import logging
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from app import mongo
+from app.utils.outbox import OUTBOX_COLLECTION, insert_events, outbox_dispatcher
+from app.utils.seat_map_cache import OCCUPIED_BOOKING_STATUSES
+from app.utils.schema import canonical_document
+
+logger = logging.getLogger(__name__)
+
+# Capacity assumed for schedules stored without total_seats
+DEFAULT_TOTAL_SEATS = 45
+
+SEAT_CLAIMS_COLLECTION = 'seat_claims'
+
+# Seconds before a claim left behind by a crashed commit expires (TTL index)
+SEAT_CLAIM_TTL_SECONDS = 60
+
+_transactions_supported = None
+
+class BookingConflict(Exception):
+    """The booking lost a race for its seats (or its free trip)"""
+
+def transactions_supported():
+    """True when connected to a replica set member or mongos (checked once)"""
+    global _transactions_supported
+    if _transactions_supported is None:
+        try:
+            hello = mongo.cx.admin.command('hello')
+            _transactions_supported = bool(hello.get('setName')) or hello.get('msg') == 'isdbgrid'
+        except Exception as e:
+            logger.warning("⚠️ Could not detect transaction support: %s", e)
+            _transactions_supported = False
+    return _transactions_supported
+
+def available_seats_expression():
+    """available_seats, falling back to total_seats - booked_seats for older schedules"""
+    return {'$ifNull': ['$available_seats', {'$subtract': [
+        {'$ifNull': ['$total_seats', DEFAULT_TOTAL_SEATS]},
+        {'$ifNull': ['$booked_seats', 0]}
+    ]}]}
+
+def claim_capacity(schedule_id, seat_count, session=None):
+    """
+    Take seat_count seats off a schedule if at least that many are left
+    Returns the updated schedule, or None when there is not enough capacity.
+    """
+    return mongo.db.busschedules.find_one_and_update(
+        {'_id': ObjectId(schedule_id), '$expr': {'$gte': [available_seats_expression(), seat_count]}},
+        [{'$set': {
+            'available_seats': {'$subtract': [available_seats_expression(), seat_count]},
+            'booked_seats': {'$add': [{'$ifNull': ['$booked_seats', 0]}, seat_count]}
+        }}],
+        projection={'available_seats': 1, 'booked_seats': 1},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+
+def ensure_seat_claim_indexes():
+    collection = mongo.db[SEAT_CLAIMS_COLLECTION]
+    return [
+        collection.create_index([('schedule_id', 1), ('seat_number', 1)], name='schedule_seat_unique', unique=True),
+        collection.create_index([('claimed_at', 1)], name='claimed_ttl', expireAfterSeconds=SEAT_CLAIM_TTL_SECONDS)
+    ]
+
+def claim_seats(schedule_id, seat_numbers, booking_id):
+    """
+    Hold seats for one commit that runs without a transaction
+    Raises BookingConflict when another commit holds one of them.
+    """
+    now = datetime.utcnow()
+    try:
+        mongo.db[SEAT_CLAIMS_COLLECTION].insert_many([
+            {'schedule_id': schedule_id, 'seat_number': seat, 'booking_id': booking_id, 'claimed_at': now}
+            for seat in seat_numbers
+        ])
+    except BulkWriteError as e:
+        release_seats(booking_id)
+        duplicates = [error for error in e.details.get('writeErrors', []) if error.get('code') == 11000]
+        if not duplicates:
+            raise
+        raise BookingConflict(f"Seat {duplicates[0]['op']['seat_number']} was just booked by another passenger")
+
+def release_seats(booking_id):
+    mongo.db[SEAT_CLAIMS_COLLECTION].delete_many({'booking_id': booking_id})
+
+def release_capacity(schedule_id, seat_count, session=None):
+    mongo.db.busschedules.update_one(
+        {'_id': ObjectId(schedule_id)},
+        {'$inc': {'booked_seats': -seat_count, 'available_seats': seat_count}},
+        session=session
+    )
+
+def release_booking_capacity(booking, session=None):
+    """
+    Give a booking's seats back to its schedule once it stops occupying them
+    booking: the booking as it was before the update that moved it out of
+    OCCUPIED_BOOKING_STATUSES (cancelled, no-show); nothing is released when
+    it did not occupy seats. Callers make that update conditional on the old
+    status, so the seats are given back once.
+    """
+    schedule_id = booking.get('schedule_id')
+    seat_count = len(booking.get('seat_numbers') or [])
+    if booking.get('status') not in OCCUPIED_BOOKING_STATUSES or not seat_count:
+        return
+    if not schedule_id or not ObjectId.is_valid(str(schedule_id)):
+        return
+    release_capacity(str(schedule_id), seat_count, session)
+
+def _commit_writes(booking, guards, events, payment=None, session=None):
+    """
+    The writes of one booking, gate first; raises BookingConflict when a check fails
+    Outside a transaction the seats are claimed first, and a failure before the
+    booking insert gives the seats back, undoes the guards already applied and
+    removes the payment record.
+    """
+    db = mongo.db
+    schedule_id = booking['schedule_id']
+    seat_numbers = booking['seat_numbers']
+    booking_id = str(booking['_id'])
+    payment_id = None
+    applied = []
+
+    if session is None:
+        claim_seats(schedule_id, seat_numbers, booking_id)
+    try:
+        if claim_capacity(schedule_id, len(seat_numbers), session) is None:
+            raise BookingConflict('Not enough seats left on this schedule')
+
+        try:
+            taken = db.bookings.find_one({
+                'schedule_id': schedule_id,
+                'seat_numbers': {'$in': seat_numbers},
+                'status': {'$in': OCCUPIED_BOOKING_STATUSES}
+            }, {'seat_numbers': 1}, session=session)
+            if taken:
+                seat = sorted(set(taken['seat_numbers']) & set(seat_numbers))[0]
+                raise BookingConflict(f'Seat {seat} was just booked by another passenger')
+
+            for guard in guards:
+                guarded = db[guard['collection']].find_one_and_update(
+                    guard['filter'], guard['update'], projection={'_id': 1}, session=session
+                )
+                if guarded is None:
+                    raise BookingConflict(guard['conflict'])
+                applied.append((guard, guarded['_id']))
+
+            if payment:
+                written = db.payments.update_one(
+                    {'tx_ref': payment['tx_ref']}, {'$setOnInsert': payment}, upsert=True, session=session
+                )
+                payment_id = written.upserted_id
+
+            db.bookings.insert_one(booking, session=session)
+        except Exception:
+            if session is None:
+                if payment_id is not None:
+                    db.payments.delete_one({'_id': payment_id})
+                for guard, document_id in reversed(applied):
+                    if guard.get('undo'):
+                        db[guard['collection']].update_one({'_id': document_id}, guard['undo'])
+                release_capacity(schedule_id, len(seat_numbers))
+            raise
+    finally:
+        # Once inserted, the booking itself fails the seat check of later commits
+        if session is None:
+            release_seats(booking_id)
+
+    if events:
+        if session is None:
+            insert_events(events)
+        else:
+            db[OUTBOX_COLLECTION].insert_many(events, ordered=False, session=session)
+
+def commit_booking(booking, guards=None, events=None, payment=None):
+    """
+    Insert a booking with its seat claim, guards, payment and outbox events, all or nothing
+    booking: the booking document (an _id is assigned if missing, so events
+        can reference it before the insert)
+    guards: [{'collection', 'filter', 'update', 'conflict', 'undo'}] updates that
+        must match, e.g. {'free_trips_remaining': {'$gt': 0}}; one that no longer
+        matches fails the booking with its conflict message. undo is the update
+        that reverses it, applied to the same document when a later write fails
+        outside a transaction
+    events: outbox documents, or a callable taking the booking id that returns them
+    payment: the payment record (inserted unless one with its tx_ref exists),
+        or a callable taking the booking id that returns it
+    Returns the booking id as str. Raises BookingConflict when the seats (or a
+    guard) were lost to a concurrent request.
+    """
+    booking.setdefault('_id', ObjectId())
+    booking = canonical_document('bookings', booking)
+    booking_id = str(booking['_id'])
+    if callable(events):
+        events = events(booking_id)
+    if callable(payment):
+        payment = payment(booking_id)
+    if payment:
+        payment = canonical_document('payments', payment)
+    guards = guards or []
+
+    if transactions_supported():
+        with mongo.cx.start_session() as session:
+            session.with_transaction(lambda s: _commit_writes(booking, guards, events, payment, s))
+    else:
+        _commit_writes(booking, guards, events, payment)
+    outbox_dispatcher.notify()
+    return booking_id
@@ -0,0 +1,249 @@
+"""
+Configuration Cache
+In-process cache of rarely changing configuration: system settings (refund,
+booking and other policies), tariff rates and the loyalty policy.
+Each section has a version number in the `config_versions` collection. Code
+that writes a section calls bump(), which increments its version; readers
+compare versions - pushed by a change stream where available, otherwise read
+with one small query every check_seconds by the same background thread - and
+reload a section only when its version moved. Every worker therefore sees an
+admin's change within check_seconds instead of serving its own copy until it
+expires. on_change() callbacks run when a section's version moves, so state
+derived from a section (e.g. log levels) needs no per-request check.
+"""
+import copy
+import logging
+import threading
+import time
+from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+CONFIG_VERSIONS_COLLECTION = 'config_versions'
+
+# Default seconds between version checks when no change stream is available
+DEFAULT_CHECK_SECONDS = 1.0
+
+class ConfigCache:
+    """
+    Thread-safe section name -> value cache, reloaded when the section's version changes
+    With enabled=False every read goes to MongoDB (used for benchmarking).
+    """
+
+    def __init__(self, enabled=True, check_seconds=DEFAULT_CHECK_SECONDS):
+        self.enabled = enabled
+        self.check_seconds = check_seconds
+        self._loaders = {}
+        self._entries = {}   # name -> (version, value)
+        self._versions = {}  # name -> latest version known
+        self._checked_at = None
+        self._stale = True
+        self._guard = threading.Lock()
+        self._watcher = None
+        self._watching = False
+        self._polling = False
+        self._listeners = {}  # name -> [callback()]
+
+    def configure(self, enabled=True, check_seconds=DEFAULT_CHECK_SECONDS):
+        self.enabled = enabled
+        self.check_seconds = check_seconds
+        self.invalidate()
+
+    def register(self, name, loader):
+        """Serve section `name` from loader() (called with an app context)"""
+        self._loaders[name] = loader
+
+    def on_change(self, name, callback):
+        """Call callback() whenever section `name` gets a new version (on any worker)"""
+        callbacks = self._listeners.setdefault(name, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+    def _set_versions(self, versions, complete=False):
+        """Record known versions (all of them when complete) and notify on_change() callbacks"""
+        with self._guard:
+            previous = self._versions
+            self._versions = dict(versions) if complete else dict(previous, **versions)
+            changed = [name for name in set(previous) | set(self._versions)
+                       if previous.get(name, 0) != self._versions.get(name, 0)]
+        for name in changed:
+            for callback in self._listeners.get(name, []):
+                try:
+                    callback()
+                except Exception as e:
+                    logger.warning("⚠️ Config change callback for %s failed: %s", name, e)
+
+    # ------------------------------------------------------------------ reads
+
+    def check_versions(self, force=False):
+        """Read every section's version (one query), unless pushed or checked recently"""
+        now = time.monotonic()
+        if not force and not self._stale:
+            if self._watching or self._polling:
+                return
+            if self._checked_at is not None and now - self._checked_at < self.check_seconds:
+                return
+        versions = {
+            document['_id']: document.get('version', 0)
+            for document in mongo.db[CONFIG_VERSIONS_COLLECTION].find({}, {'version': 1})
+        }
+        with self._guard:
+            self._checked_at = now
+            self._stale = False
+        self._set_versions(versions, complete=True)
+
+    def get(self, name):
+        """A private copy of section `name`, reloaded only when its version changed"""
+        loader = self._loaders[name]
+        if not self.enabled:
+            return loader()
+
+        self.check_versions()
+        version = self._versions.get(name, 0)
+        entry = self._entries.get(name)
+        if entry is None or entry[0] != version:
+            # Loaded after reading the version: a concurrent bump only causes another reload
+            value = loader()
+            with self._guard:
+                self._entries[name] = (version, value)
+        else:
+            value = entry[1]
+        return copy.deepcopy(value)
+
+    def version(self, name):
+        """Latest known version of `name`, for caches kept elsewhere (e.g. the user cache)"""
+        self.check_versions()
+        return self._versions.get(name, 0)
+
+    # ----------------------------------------------------------------- writes
+
+    def bump(self, name):
+        """Record that section `name` was written; every process reloads it on next read"""
+        document = mongo.db[CONFIG_VERSIONS_COLLECTION].find_one_and_update(
+            {'_id': name},
+            {'$inc': {'version': 1}, '$set': {'updated_at': datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        with self._guard:
+            self._entries.pop(name, None)
+        self._set_versions({name: document['version']})
+
+    def invalidate(self, name=None):
+        """Drop one section (or everything) so the next read reloads it"""
+        with self._guard:
+            if name is None:
+                self._entries.clear()
+                self._stale = True
+            else:
+                self._entries.pop(name, None)
+
+    # ----------------------------------------------------------- change stream
+
+    def _handle_change(self, change):
+        document = change.get('fullDocument')
+        if change.get('operationType') in ('insert', 'update', 'replace') and document:
+            self._set_versions({document['_id']: document.get('version', 0)})
+        else:
+            # Deletes, drops: re-read all versions on the next access
+            self.invalidate()
+
+    def watch(self, app):
+        """Consume the config_versions change stream; once it fails, poll versions every check_seconds"""
+        with app.app_context():
+            try:
+                with mongo.db[CONFIG_VERSIONS_COLLECTION].watch(full_document='updateLookup') as stream:
+                    self._watching = True
+                    # Versions may have moved before the stream opened
+                    self.check_versions(force=True)
+                    logger.info("👀 Config cache watching config_versions change stream")
+                    for change in stream:
+                        self._handle_change(change)
+            except PyMongoError as e:
+                logger.warning("⚠️ Config change stream unavailable, checking versions every %ss: %s", self.check_seconds, e)
+            finally:
+                self._watching = False
+
+            self._polling = True
+            while True:
+                try:
+                    self.check_versions(force=True)
+                except PyMongoError as e:
+                    logger.warning("⚠️ Config version check failed: %s", e)
+                time.sleep(self.check_seconds)
+
+    def start_watcher(self, app):
+        """Start the change stream consumer (or version poller) in a daemon thread, once per process"""
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self.watch, args=(app,), daemon=True)
+        self._watcher.start()
+
+# Shared instance used by the settings, tariff, operator and loyalty code
+config_cache = ConfigCache()
+
+# --------------------------------------------------------------- sections
+
+def _load_settings():
+    return mongo.db.settings.find_one({'type': 'system_settings'})
+
+def _load_tariff_rates():
+    return list(mongo.db.tariff_rates.find().sort('bus_type', 1))
+
+def _load_loyalty_policy():
+    stored_policy = mongo.db.loyalty_policy.find_one({'_id': 'current_policy'})
+    if stored_policy and 'policy' in stored_policy:
+        return stored_policy['policy']
+    return None
+
+config_cache.register('settings', _load_settings)
+config_cache.register('tariff_rates', _load_tariff_rates)
+config_cache.register('loyalty_policy', _load_loyalty_policy)
+
+def get_system_settings():
+    """The system_settings document, or None when it was never saved"""
+    return config_cache.get('settings')
+
+def get_loyalty_policy():
+    """The stored loyalty policy, or None when the defaults apply"""
+    return config_cache.get('loyalty_policy')
+
+def _in_effect(rate, now):
+    """effective_from <= now <= effective_until, matching the MongoDB filter the routes used"""
+    effective_from = rate.get('effective_from')
+    effective_until = rate.get('effective_until')
+    if not isinstance(effective_from, datetime) or effective_from > now:
+        return False
+    return effective_until is None or (isinstance(effective_until, datetime) and effective_until >= now)
+
+def find_tariff_rates(active_only=False, bus_type=None, effective_at=None, current_only=False):
+    """
+    Tariff rates sorted by bus_type
+    active_only: is_active rates
+    bus_type: rates for one bus type
+    effective_at: rates whose effective_from/effective_until range contains this time
+    current_only: rates without an effective_until in the past
+    """
+    rates = config_cache.get('tariff_rates')
+    if active_only:
+        rates = [rate for rate in rates if rate.get('is_active') is True]
+    if bus_type is not None:
+        rates = [rate for rate in rates if rate.get('bus_type') == bus_type]
+    if effective_at is not None:
+        rates = [rate for rate in rates if _in_effect(rate, effective_at)]
+    if current_only:
+        now = datetime.now()
+        rates = [
+            rate for rate in rates
+            if rate.get('effective_until') is None
+            or (isinstance(rate['effective_until'], datetime) and rate['effective_until'] >= now)
+        ]
+    return rates
+
+def find_tariff_rate(bus_type, effective_at=None):
+    """The active tariff rate for a bus type (optionally in effect at a time), or None"""
+    rates = find_tariff_rates(active_only=True, bus_type=bus_type, effective_at=effective_at)
+    return rates[0] if rates else None
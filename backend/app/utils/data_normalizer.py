@@ -48,7 +48,8 @@ def normalize_booking(booking):
         'id': str(booking.get('_id')),
         'pnr_number': booking.get('pnr_number'),
         'schedule_id': booking.get('schedule_id'),
-        'user_id': booking.get('user_id'),
+        # Stored as an ObjectId (see app/utils/schema.py)
+        'user_id': str(booking['user_id']) if booking.get('user_id') else None,
         # Passenger info
         'passenger_name': booking.get('passenger_name'),
         'passenger_phone': booking.get('passenger_phone'),
@@ -0,0 +1,117 @@
+"""
+Identifier Service
+Short, human-friendly codes for PNRs, baggage tags and referral codes.
+Each kind of code has a sequence in the `counters` collection; a process
+reserves a block of BLOCK_SIZE numbers with one $inc and hands them out from
+memory, so issuing a code needs no uniqueness query. Numbers are shuffled
+within the code space (so consecutive codes do not look consecutive - this
+is not a secret) and written in Crockford base32, which leaves out I, L, O
+and U, followed by a check character that catches any single mistyped
+character and most swapped pairs.
+"""
+import os
+import threading
+from pymongo import ReturnDocument
+from app import mongo
+
+COUNTERS_COLLECTION = 'counters'
+
+# Numbers reserved per round trip to the counters collection
+BLOCK_SIZE = 1000
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+# Commonly misread characters, mapped to what they stand for
+_READ_AS = {'I': '1', 'L': '1', 'O': '0'}
+
+class Sequence:
+    """Block-allocated numbers from one counters document, thread and fork safe"""
+
+    def __init__(self, name, width):
+        self.name = name
+        self.width = width      # code characters before the check character
+        self.bits = 5 * width
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._pid = None
+
+    def _reserve_block(self):
+        counter = mongo.db[COUNTERS_COLLECTION].find_one_and_update(
+            {'_id': self.name},
+            {'$inc': {'value': BLOCK_SIZE}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._end = counter['value']
+        self._next = self._end - BLOCK_SIZE
+        self._pid = os.getpid()
+
+    def next_number(self):
+        with self._lock:
+            # A forked worker must not reuse the block its parent was handed
+            if self._next >= self._end or self._pid != os.getpid():
+                self._reserve_block()
+            number = self._next
+            self._next += 1
+        if number >= 1 << self.bits:
+            raise OverflowError(f"{self.name} sequence exhausted ({self.width} characters)")
+        return number
+
+    def next_code(self):
+        code = encode(scramble(self.next_number(), self.bits), self.width)
+        return code + check_character(code)
+
+def scramble(number, bits):
+    """Bijective shuffle of [0, 2**bits): an xor, odd multiplications and an xorshift"""
+    mask = (1 << bits) - 1
+    number = ((number ^ 0x2545F491) * 0x5BD1E995) & mask
+    number ^= number >> (bits // 2)
+    return (number * 0x1B873593) & mask
+
+def encode(number, width):
+    characters = []
+    for _ in range(width):
+        number, digit = divmod(number, 32)
+        characters.append(ALPHABET[digit])
+    return ''.join(reversed(characters))
+
+def check_character(code):
+    """Luhn mod 32 check character for a base32 code"""
+    total = 0
+    factor = 2
+    for character in reversed(code):
+        addend = factor * ALPHABET.index(character)
+        total += addend // 32 + addend % 32
+        factor = 1 if factor == 2 else 2
+    return ALPHABET[(32 - total % 32) % 32]
+
+def normalize_code(code):
+    """Upper-case a typed code and map I/L/O to 1/1/0"""
+    code = (code or '').strip().upper().replace('-', '')
+    return ''.join(_READ_AS.get(character, character) for character in code)
+
+def is_valid_code(code):
+    """True when the code's last character is its check character"""
+    code = normalize_code(code)
+    if len(code) < 2 or any(character not in ALPHABET for character in code):
+        return False
+    return check_character(code[:-1]) == code[-1]
+
+# 7 + 1 characters, the length of customer portal PNRs (34 billion numbers)
+_pnr_sequence = Sequence('pnr', 7)
+# BT + 6 + 1 characters (1 billion numbers)
+_baggage_tag_sequence = Sequence('baggage_tag', 6)
+# name prefix + 5 + 1 characters (33 million numbers)
+_referral_sequence = Sequence('referral_code', 5)
+
+def new_pnr():
+    return _pnr_sequence.next_code()
+
+def new_baggage_tag():
+    return f"BT{_baggage_tag_sequence.next_code()}"
+
+def new_referral_code(user_name=''):
+    """Up to 6 letters of the user's name, then a unique code"""
+    name_part = ''.join(filter(str.isalpha, (user_name or '').upper()))[:6]
+    return f"{name_part}{_referral_sequence.next_code()}"
@@ -0,0 +1,124 @@
+"""
+Index Registry
+Declarative list of the secondary indexes the API's queries rely on, applied
+idempotently at startup and by the CLI below. seat_locks and schedule_search
+manage their own indexes (app.utils.seat_lock, app.utils.schedule_search)
+because building them may first need data clean-up or a backfill.
+
+Usage:
+    python -m app.utils.indexes            # create missing indexes
+    python -m app.utils.indexes --list     # show registry vs. existing indexes
+"""
+import argparse
+import logging
+import sys
+from pymongo.errors import OperationFailure
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+# collection -> index definitions ({'keys': [...], 'name': ..., plus create_index options})
+INDEXES = {
+    'bookings': [
+        {'keys': [('schedule_id', 1), ('status', 1)], 'name': 'schedule_status'},
+        {'keys': [('pnr_number', 1)], 'name': 'pnr_number'},
+        {'keys': [('user_id', 1), ('created_at', -1)], 'name': 'user_created'},
+        {'keys': [('travel_date', 1), ('status', 1)], 'name': 'travel_date_status'},
+        {'keys': [('created_at', -1)], 'name': 'created_at'},
+        {'keys': [('payment_tx_ref', 1)], 'name': 'payment_tx_ref', 'sparse': True}
+    ],
+    'busschedules': [
+        {'keys': [('driver_id', 1), ('departure_date', 1)], 'name': 'driver_date'},
+        {'keys': [('route_id', 1), ('departure_date', 1)], 'name': 'route_date'},
+        {'keys': [('bus_id', 1), ('departure_date', 1)], 'name': 'bus_date'},
+        {'keys': [('departure_date', 1), ('status', 1)], 'name': 'date_status'}
+    ],
+    'payments': [
+        {'keys': [('tx_ref', 1)], 'name': 'tx_ref'},
+        {'keys': [('booking_id', 1)], 'name': 'booking_id'},
+        {'keys': [('user_id', 1), ('created_at', -1)], 'name': 'user_created'}
+    ],
+    'bus_locations': [
+        {'keys': [('schedule_id', 1), ('timestamp', -1)], 'name': 'schedule_timestamp'},
+        {'keys': [('schedule_id', 1), ('location_type', 1), ('timestamp', -1)], 'name': 'schedule_type_timestamp'}
+    ],
+    'busstops': [
+        {'keys': [('route_id', 1), ('stop_order', 1)], 'name': 'route_stop_order'}
+    ],
+    'users': [
+        {'keys': [('email', 1)], 'name': 'email'},
+        {'keys': [('phone', 1)], 'name': 'phone'},
+        {'keys': [('role', 1), ('is_active', 1)], 'name': 'role_active'},
+        {'keys': [('referral_code', 1)], 'name': 'referral_code', 'sparse': True}
+    ],
+    'buses': [
+        {'keys': [('bus_number', 1)], 'name': 'bus_number'},
+        {'keys': [('plate_number', 1)], 'name': 'plate_number'}
+    ],
+    'driver_assignments': [
+        {'keys': [('driver_id', 1), ('status', 1)], 'name': 'driver_status'}
+    ]
+}
+
+def _existing_index(collection, keys):
+    """Name of an existing index on exactly these keys, if any"""
+    for name, spec in collection.index_information().items():
+        if list(spec.get('key', [])) == list(keys):
+            return name
+    return None
+
+def apply_indexes(registry=None):
+    """
+    Create every registry index that does not exist yet
+    An index already present on the same keys (e.g. created by hand under
+    another name) counts as present. Returns: {collection: [index names]}
+    """
+    db = mongo.db
+    applied = {}
+    for collection_name, definitions in (registry or INDEXES).items():
+        collection = db[collection_name]
+        names = applied.setdefault(collection_name, [])
+        for definition in definitions:
+            options = dict(definition)
+            keys = options.pop('keys')
+            existing = _existing_index(collection, keys)
+            if existing:
+                names.append(existing)
+                continue
+            try:
+                names.append(collection.create_index(keys, **options))
+                logger.info("🆕 Created index %s.%s", collection_name, options.get('name'))
+            except OperationFailure as e:
+                logger.warning("⚠️ Could not create index %s.%s: %s", collection_name, options.get('name'), e)
+    return applied
+
+def missing_indexes(registry=None):
+    """Registry entries with no index on the same keys: [(collection, name)]"""
+    db = mongo.db
+    missing = []
+    for collection_name, definitions in (registry or INDEXES).items():
+        for definition in definitions:
+            if not _existing_index(db[collection_name], definition['keys']):
+                missing.append((collection_name, definition['name']))
+    return missing
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Create the indexes declared in app.utils.indexes.INDEXES')
+    parser.add_argument('--list', action='store_true', help='Show registry indexes and whether they exist')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    with create_app().app_context():
+        if args.list:
+            for collection_name, definitions in INDEXES.items():
+                for definition in definitions:
+                    existing = _existing_index(mongo.db[collection_name], definition['keys'])
+                    state = f"✅ {existing}" if existing else "❌ missing"
+                    print(f"   {collection_name}.{definition['name']:<26} {state}")
+            return 0
+        applied = apply_indexes()
+        print(f"✅ {sum(len(names) for names in applied.values())} registry indexes in place")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
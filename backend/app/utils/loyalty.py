@@ -6,64 +6,87 @@ Handles tier calculations, benefits, and rewards
 from datetime import datetime, timedelta
 from typing import Dict, Any
 
-# Cache for policy to avoid repeated database calls
-_policy_cache = None
-_policy_cache_time = None
-CACHE_DURATION = 300  # 5 minutes in seconds
-
 def get_stored_policy():
-    """Get policy from database with caching"""
-    global _policy_cache, _policy_cache_time
-    
-    # Check if cache is valid
-    if _policy_cache and _policy_cache_time:
-        if (datetime.utcnow() - _policy_cache_time).total_seconds() < CACHE_DURATION:
-            return _policy_cache
-    
+    """Get policy from the shared configuration cache"""
     # Import here to avoid circular dependency
-    from app import mongo
-    
-    # Fetch from database
-    stored_policy = mongo.db.loyalty_policy.find_one({'_id': 'current_policy'})
-    
-    if stored_policy and 'policy' in stored_policy:
-        _policy_cache = stored_policy['policy']
-        _policy_cache_time = datetime.utcnow()
-        return _policy_cache
-    
-    return None
+    from app.utils.config_cache import get_loyalty_policy
+    return get_loyalty_policy()
 
 def clear_policy_cache():
-    """Clear the policy cache (call this after updating policy)"""
-    global _policy_cache, _policy_cache_time
-    _policy_cache = None
-    _policy_cache_time = None
+    """Reload the policy in every process (call this after updating policy)"""
+    from app.utils.config_cache import config_cache
+    config_cache.bump('loyalty_policy')
+
+# Tier thresholds used when no policy is stored, highest tier first
+DEFAULT_TIER_THRESHOLDS = [('gold', 5000), ('silver', 2000), ('bronze', 500)]
+
+def get_tier_thresholds():
+    """[(tier, threshold)] highest first, from the cached policy or the defaults"""
+    stored_policy = get_stored_policy()
+    if not stored_policy:
+        return DEFAULT_TIER_THRESHOLDS
+    return [
+        (tier, stored_policy.get(tier, {}).get('threshold', default))
+        for tier, default in DEFAULT_TIER_THRESHOLDS
+    ]
 
 def get_loyalty_tier(points: int) -> str:
     """Determine loyalty tier based on points"""
-    # Try to get thresholds from stored policy
-    stored_policy = get_stored_policy()
-    
-    if stored_policy:
-        # Use stored thresholds
-        if points >= stored_policy.get('gold', {}).get('threshold', 5000):
-            return 'gold'
-        elif points >= stored_policy.get('silver', {}).get('threshold', 2000):
-            return 'silver'
-        elif points >= stored_policy.get('bronze', {}).get('threshold', 500):
-            return 'bronze'
-        else:
-            return 'member'
-    
-    # Fallback to default thresholds
-    if points >= 5000:
-        return 'gold'
-    elif points >= 2000:
-        return 'silver'
-    elif points >= 500:
-        return 'bronze'
-    else:
-        return 'member'
+    for tier, threshold in get_tier_thresholds():
+        if points >= threshold:
+            return tier
+    return 'member'
+
+def tier_expression(points_expression) -> Dict[str, Any]:
+    """Aggregation expression giving the tier for points_expression (same rules as get_loyalty_tier)"""
+    return {'$switch': {
+        'branches': [
+            {'case': {'$gte': [points_expression, threshold]}, 'then': tier}
+            for tier, threshold in get_tier_thresholds()
+        ],
+        'default': 'member'
+    }}
+
+def accrue_points(user_id, points: int, match: Dict[str, Any] = None, inc: Dict[str, int] = None,
+                  set_fields: Dict[str, Any] = None, session=None) -> Dict[str, Any]:
+    """
+    Add points to a user (negative to deduct, never below 0) and recompute their
+    tier in one pipeline update, so there is no read-modify-write between
+    concurrent accruals for the same user.
+    match: extra filter conditions; the accrual is skipped when they do not hold
+    inc: other counters to change in the same write, e.g. {'total_bookings': 1}
+    set_fields: other fields to set in the same write
+    Returns {'previous_points', 'loyalty_points', 'loyalty_tier'}, or None when
+    no user matched.
+    """
+    # Import here to avoid circular dependency
+    from app import mongo
+    from bson import ObjectId
+    from pymongo import ReturnDocument
+
+    new_points = {'$max': [0, {'$add': [{'$ifNull': ['$loyalty_points', 0]}, points]}]}
+    fields = {'loyalty_points': new_points}
+    for field, amount in (inc or {}).items():
+        fields[field] = {'$add': [{'$ifNull': [f'${field}', 0]}, amount]}
+    for field, value in (set_fields or {}).items():
+        fields[field] = {'$literal': value}
+
+    before = mongo.db.users.find_one_and_update(
+        {'_id': ObjectId(user_id), **(match or {})},
+        [{'$set': fields}, {'$set': {'loyalty_tier': tier_expression('$loyalty_points')}}],
+        projection={'loyalty_points': 1},
+        return_document=ReturnDocument.BEFORE,
+        session=session
+    )
+    if before is None:
+        return None
+    previous_points = before.get('loyalty_points') or 0
+    current_points = max(0, previous_points + points)
+    return {
+        'previous_points': previous_points,
+        'loyalty_points': current_points,
+        'loyalty_tier': get_loyalty_tier(current_points)
+    }
 
 def get_tier_benefits(tier: str) -> Dict[str, Any]:
     """Get benefits for a specific tier"""
@@ -288,11 +311,10 @@ def can_claim_birthday_bonus(user_data: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 def generate_referral_code(user_name: str, user_id: str) -> str:
-    """Generate a unique referral code for user"""
-    # Create code from name and ID
-    name_part = ''.join(filter(str.isalnum, user_name.upper()))[:6]
-    id_part = str(user_id)[-4:]
-    return f"{name_part}{id_part}"
+    """Generate a unique referral code for user (name prefix + sequence code)"""
+    # Import here to avoid circular dependency
+    from app.utils.ids import new_referral_code
+    return new_referral_code(user_name)
 
 def calculate_referral_bonus(referrer_tier: str) -> int:
     """Calculate referral bonus points based on referrer's tier"""
@@ -0,0 +1,353 @@
+"""
+Booking Outbox
+Side effects of a new booking (loyalty credit, seat lock confirmation, read
+model and rollup updates, the seats_booked broadcast) are
+written as outbox events in the same commit as the booking, and applied by a
+background dispatcher so the booking response does not wait for them.
+
+The dispatcher claims due events in batches (safe with several workers),
+runs each event's handler and marks it done; a failing event is retried with
+backoff and marked failed - and logged - after MAX_ATTEMPTS. Handlers are
+idempotent, except those registered with exactly_once=True ($inc-style
+writes), which run in one transaction with marking the event done when the
+server supports transactions, and are marked done before running otherwise.
+
+Usage:
+    python -m app.utils.outbox --status     # events per status
+    python -m app.utils.outbox --drain      # apply every due event now
+    python -m app.utils.outbox --retry      # requeue failed events
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, PyMongoError
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_COLLECTION = 'outbox'
+
+# Events claimed per batch
+BATCH_SIZE = 100
+
+# Seconds a claim is held before another dispatcher may take the event over
+CLAIM_SECONDS = 60
+
+MAX_ATTEMPTS = 8
+
+# Days done events are kept (TTL index on done_at)
+DONE_RETENTION_DAYS = 7
+
+# Tries at writing a booking's events when they cannot share its transaction
+INSERT_ATTEMPTS = 3
+
+# type -> (handler(payload, session), exactly_once)
+HANDLERS = {}
+
+class StaleClaim(Exception):
+    """Another dispatcher took the event over while it was being applied"""
+
+def handler(event_type, exactly_once=False):
+    """Register the function that applies events of event_type"""
+    def register(function):
+        HANDLERS[event_type] = (function, exactly_once)
+        return function
+    return register
+
+def outbox_event(booking_id, event_type, payload):
+    """An outbox document for one side effect of a booking (one per type per booking)"""
+    now = datetime.utcnow()
+    return {
+        '_id': f"{booking_id}:{event_type}",
+        'type': event_type,
+        'booking_id': str(booking_id),
+        'payload': payload,
+        'status': 'pending',
+        'attempts': 0,
+        'available_at': now,
+        'created_at': now
+    }
+
+def insert_events(events, attempts=INSERT_ATTEMPTS):
+    """
+    Write outbox events outside a transaction, retrying on errors
+    Event _ids are fixed per booking and type, so a retry skips the events an
+    earlier try already wrote. Returns True once every event is stored.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            mongo.db[OUTBOX_COLLECTION].insert_many(events, ordered=False)
+            return True
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if all(error.get('code') == 11000 for error in errors) and not e.details.get('writeConcernErrors'):
+                return True
+            error = e
+        except PyMongoError as e:
+            error = e
+        logger.warning("⚠️ Outbox insert for %s failed (attempt %s): %s", events[0]['booking_id'], attempt, error)
+        time.sleep(0.1 * attempt)
+    logger.error("❌ Outbox events %s were not written; their side effects are lost", [event['_id'] for event in events])
+    return False
+
+def ensure_outbox_indexes():
+    collection = mongo.db[OUTBOX_COLLECTION]
+    return [
+        collection.create_index([('status', 1), ('available_at', 1)], name='status_available'),
+        collection.create_index([('claimed_by', 1)], name='claimed_by', sparse=True),
+        collection.create_index([('done_at', 1)], name='done_ttl',
+                                expireAfterSeconds=DONE_RETENTION_DAYS * 86400)
+    ]
+
+# ------------------------------------------------------------------ handlers
+
+@handler('payment_record')
+def apply_payment_record(payload, session=None):
+    """
+    Insert a booking's payment record (keyed by tx_ref)
+    Payments are now written by commit_booking(); this applies events queued before that.
+    """
+    payment = payload['payment']
+    mongo.db.payments.update_one(
+        {'tx_ref': payment['tx_ref']},
+        {'$setOnInsert': payment},
+        upsert=True,
+        session=session
+    )
+
+@handler('loyalty_credit', exactly_once=True)
+def apply_loyalty_credit(payload, session=None):
+    """Award booking points, count the booking and recompute the tier in one write"""
+    from app.utils.loyalty import accrue_points
+    accrue_points(payload['user_id'], payload['points'], inc={'total_bookings': 1}, session=session)
+
+@handler('seat_locks_confirmed')
+def apply_seat_locks_confirmed(payload, session=None):
+    """Mark the booker's seat locks confirmed"""
+    mongo.db.seat_locks.update_many(
+        {
+            'schedule_id': payload['schedule_id'],
+            'seat_number': {'$in': payload['seat_numbers']},
+            'user_id': payload['user_id'],
+            'status': 'locked'
+        },
+        {'$set': {'status': 'confirmed', 'confirmed_at': datetime.utcnow()}},
+        session=session
+    )
+
+@handler('schedule_search_refresh')
+def apply_schedule_search_refresh(payload, session=None):
+    from app.utils.schedule_search import refresh_seat_counts
+    refresh_seat_counts(payload['schedule_id'])
+
+@handler('rollup', exactly_once=True)
+def apply_rollup(payload, session=None):
+    """Add the booking, as it was when created, to the daily rollups"""
+    from app.utils.rollups import apply_booking_created
+    apply_booking_created(payload.get('booking_id'), payload['booking'], session=session)
+
+@handler('seats_booked_broadcast')
+def apply_seats_booked_broadcast(payload, session=None):
+    from app.socket_events import broadcast_seat_booked
+    broadcast_seat_booked(payload['schedule_id'], payload['seat_numbers'])
+
+def booking_events(booking_id, booking, loyalty_points=0):
+    """The outbox events for a new booking document"""
+    from app.utils.rollups import BOOKING_PROJECTION
+    schedule_id = str(booking['schedule_id'])
+    seat_numbers = booking.get('seat_numbers', [])
+    events = []
+    if loyalty_points and booking.get('user_id'):
+        events.append(outbox_event(booking_id, 'loyalty_credit', {
+            'user_id': str(booking['user_id']), 'points': loyalty_points
+        }))
+    if booking.get('user_id'):
+        events.append(outbox_event(booking_id, 'seat_locks_confirmed', {
+            'schedule_id': schedule_id, 'seat_numbers': seat_numbers, 'user_id': str(booking['user_id'])
+        }))
+    events.append(outbox_event(booking_id, 'schedule_search_refresh', {'schedule_id': schedule_id}))
+    events.append(outbox_event(booking_id, 'rollup', {
+        'booking_id': str(booking_id),
+        'booking': {field: booking[field] for field in BOOKING_PROJECTION if field in booking}
+    }))
+    events.append(outbox_event(booking_id, 'seats_booked_broadcast', {
+        'schedule_id': schedule_id, 'seat_numbers': seat_numbers
+    }))
+    return events
+
+# ------------------------------------------------------------------ dispatcher
+
+def _due_filter(now):
+    return {'$or': [
+        {'status': 'pending', 'available_at': {'$lte': now}},
+        {'status': 'processing', 'claimed_until': {'$lt': now}}
+    ]}
+
+def _retry_delay(attempts):
+    return timedelta(seconds=min(2 ** attempts, 600))
+
+class OutboxDispatcher:
+    """Applies outbox events from a daemon thread (one per process)"""
+
+    def __init__(self, batch_size=BATCH_SIZE, poll_seconds=1.0):
+        self.enabled = True
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._worker = None
+
+    def configure(self, enabled=True, poll_seconds=1.0):
+        self.enabled = enabled
+        self.poll_seconds = poll_seconds
+
+    def notify(self):
+        """Wake the dispatcher now (called after a booking commits)"""
+        self._wake.set()
+
+    def claim_batch(self):
+        """Claim up to batch_size due events; returns them oldest first"""
+        collection = mongo.db[OUTBOX_COLLECTION]
+        now = datetime.utcnow()
+        candidates = [event['_id'] for event in collection.find(_due_filter(now), {'_id': 1})
+                      .sort('available_at', 1).limit(self.batch_size)]
+        if not candidates:
+            return None, []
+        token = str(ObjectId())
+        collection.update_many(
+            {'_id': {'$in': candidates}, **_due_filter(now)},
+            {'$set': {'status': 'processing', 'claimed_by': token,
+                      'claimed_until': now + timedelta(seconds=CLAIM_SECONDS)},
+             '$inc': {'attempts': 1}}
+        )
+        return token, list(collection.find({'claimed_by': token, 'status': 'processing'}).sort('created_at', 1))
+
+    def _mark_done(self, event_ids, token, session=None):
+        return mongo.db[OUTBOX_COLLECTION].update_many(
+            {'_id': {'$in': event_ids}, 'claimed_by': token, 'status': 'processing'},
+            {'$set': {'status': 'done', 'done_at': datetime.utcnow()}, '$unset': {'claimed_until': ''}},
+            session=session
+        )
+
+    def _apply_exactly_once(self, function, event, token):
+        from app.utils.booking_commit import transactions_supported
+
+        def apply_and_mark(session=None):
+            if self._mark_done([event['_id']], token, session).modified_count == 0:
+                raise StaleClaim(event['_id'])
+            function(event['payload'], session)
+
+        if transactions_supported():
+            with mongo.cx.start_session() as session:
+                session.with_transaction(apply_and_mark)
+        else:
+            # At most once: a failure after marking done is logged, not retried
+            try:
+                apply_and_mark()
+            except StaleClaim:
+                raise
+            except Exception:
+                logger.exception("❌ Outbox event %s failed after it was marked done; not retried", event['_id'])
+                raise StaleClaim(event['_id'])
+
+    def _failed(self, event, token, error):
+        collection = mongo.db[OUTBOX_COLLECTION]
+        attempts = event.get('attempts', 1)
+        if attempts >= MAX_ATTEMPTS:
+            update = {'status': 'failed', 'last_error': error, 'failed_at': datetime.utcnow()}
+            logger.error("❌ Outbox event %s failed after %s attempts: %s", event['_id'], attempts, error)
+        else:
+            update = {'status': 'pending', 'last_error': error,
+                      'available_at': datetime.utcnow() + _retry_delay(attempts)}
+            logger.warning("⚠️ Outbox event %s failed (attempt %s), retrying: %s", event['_id'], attempts, error)
+        collection.update_one({'_id': event['_id'], 'claimed_by': token},
+                              {'$set': update, '$unset': {'claimed_by': '', 'claimed_until': ''}})
+
+    def run_once(self):
+        """Apply one batch of due events; returns how many were claimed"""
+        token, events = self.claim_batch()
+        done = []
+        for event in events:
+            function, exactly_once = HANDLERS.get(event['type'], (None, False))
+            try:
+                if function is None:
+                    raise ValueError(f"no handler for outbox event type {event['type']!r}")
+                if exactly_once:
+                    self._apply_exactly_once(function, event, token)
+                else:
+                    function(event['payload'], None)
+                    done.append(event['_id'])
+            except StaleClaim:
+                continue
+            except Exception as e:
+                self._failed(event, token, f"{type(e).__name__}: {e}")
+        if done:
+            self._mark_done(done, token)
+        return len(events)
+
+    def drain(self):
+        """Apply batches until nothing is due; returns the number of events claimed"""
+        total = 0
+        while True:
+            claimed = self.run_once()
+            total += claimed
+            if claimed == 0:
+                return total
+
+    def _run(self, app):
+        with app.app_context():
+            logger.info("📤 Outbox dispatcher started")
+            while True:
+                try:
+                    if self.run_once() >= self.batch_size:
+                        continue
+                except Exception as e:
+                    logger.error("⚠️ Outbox dispatcher error: %s", e, exc_info=True)
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def start(self, app):
+        """Start the dispatcher in a daemon thread (once per process)"""
+        if not self.enabled or self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run, args=(app,), name='outbox-dispatcher', daemon=True)
+        self._worker.start()
+
+# Shared instance started by create_app() and woken by the booking routes
+outbox_dispatcher = OutboxDispatcher()
+
+def outbox_status():
+    counts = {row['_id']: row['count'] for row in mongo.db[OUTBOX_COLLECTION].aggregate([
+        {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+    ])}
+    return {status: counts.get(status, 0) for status in ('pending', 'processing', 'done', 'failed')}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inspect or drain the booking outbox')
+    parser.add_argument('--status', action='store_true', help='Show events per status')
+    parser.add_argument('--drain', action='store_true', help='Apply every due event now')
+    parser.add_argument('--retry', action='store_true', help='Requeue failed events')
+    args = parser.parse_args(argv)
+
+    # This process drains by hand; do not also start the background dispatcher
+    os.environ['OUTBOX_DISPATCHER_ENABLED'] = 'false'
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        if args.retry:
+            result = mongo.db[OUTBOX_COLLECTION].update_many(
+                {'status': 'failed'},
+                {'$set': {'status': 'pending', 'attempts': 0, 'available_at': datetime.utcnow()}}
+            )
+            print(f"🔁 Requeued {result.modified_count} failed events")
+        if args.drain:
+            print(f"✅ Applied {outbox_dispatcher.drain()} events")
+        print(outbox_status())
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
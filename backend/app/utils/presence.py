@@ -0,0 +1,176 @@
+"""
+Presence
+Who is looking at which schedule. Each process keeps sid -> rooms and
+room -> sids sets, so joining, leaving and disconnecting are O(1) per room.
+Every interval_seconds a background task
+  - publishes this process's per-room counts to the `presence` collection
+    (one document per process) and reads the other processes' counts, so
+    viewer counts cover every worker
+  - broadcasts viewer_count {'schedule_id', 'viewers'} to rooms whose count
+    changed. With a shared message queue one process (the live one with the
+    smallest id) broadcasts for every room; otherwise each process
+    broadcasts to its own rooms.
+viewer_counts() answers from memory (this process's live counts plus the
+other processes' last published counts) and never queries MongoDB.
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from app import mongo, socketio
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_COLLECTION = 'presence'
+
+DEFAULT_INTERVAL_SECONDS = 5
+
+# A process whose document is older than this many intervals is treated as gone
+STALE_INTERVALS = 3
+
+def ensure_presence_indexes():
+    return [
+        mongo.db[PRESENCE_COLLECTION].create_index(
+            [('updated_at', 1)], name='updated_ttl', expireAfterSeconds=DEFAULT_INTERVAL_SECONDS * 60
+        )
+    ]
+
+class PresenceRegistry:
+    """Per-process viewer sets, with counts shared through MongoDB"""
+
+    def __init__(self, interval_seconds=DEFAULT_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.shared = True
+        self.message_queue = False
+        self.process_id = None
+        self._rooms_by_sid = {}   # sid -> set of rooms
+        self._sids_by_room = {}   # room -> set of sids
+        self._remote_counts = {}  # room -> viewers on other processes
+        self._broadcast_counts = {}
+        self._guard = threading.Lock()
+        self._worker = None
+
+    def configure(self, interval_seconds=DEFAULT_INTERVAL_SECONDS, shared=True, message_queue=False):
+        self.interval_seconds = interval_seconds
+        self.shared = shared
+        self.message_queue = message_queue
+
+    # ------------------------------------------------------------ membership
+
+    def join(self, sid, room):
+        with self._guard:
+            self._rooms_by_sid.setdefault(sid, set()).add(room)
+            self._sids_by_room.setdefault(room, set()).add(sid)
+
+    def leave(self, sid, room):
+        with self._guard:
+            self._discard(sid, room)
+            rooms = self._rooms_by_sid.get(sid)
+            if rooms is not None:
+                rooms.discard(room)
+                if not rooms:
+                    del self._rooms_by_sid[sid]
+
+    def disconnect(self, sid):
+        """Remove a sid from every room it joined; returns those rooms"""
+        with self._guard:
+            rooms = self._rooms_by_sid.pop(sid, set())
+            for room in rooms:
+                self._discard(sid, room)
+        return rooms
+
+    def _discard(self, sid, room):
+        sids = self._sids_by_room.get(room)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self._sids_by_room[room]
+
+    # ---------------------------------------------------------------- counts
+
+    def local_counts(self):
+        with self._guard:
+            return {room: len(sids) for room, sids in self._sids_by_room.items()}
+
+    def viewer_counts(self, rooms=None):
+        """Viewers per schedule across processes (as of the last interval for other processes)"""
+        counts = dict(self._remote_counts)
+        for room, viewers in self.local_counts().items():
+            counts[room] = counts.get(room, 0) + viewers
+        if rooms is not None:
+            return {room: counts.get(room, 0) for room in rooms}
+        return counts
+
+    def viewer_count(self, room):
+        return self.viewer_counts([room])[room]
+
+    # ------------------------------------------------------------ background
+
+    def sync(self):
+        """
+        Publish this process's counts and collect the others'
+        Returns True when this process should broadcast for every room.
+        """
+        if self.process_id is None:
+            self.process_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        collection = mongo.db[PRESENCE_COLLECTION]
+        now = datetime.utcnow()
+        # Published even when empty: the document is also this process's heartbeat
+        collection.update_one(
+            {'_id': self.process_id},
+            {'$set': {
+                'rooms': [{'room': room, 'viewers': viewers} for room, viewers in self.local_counts().items()],
+                'updated_at': now
+            }},
+            upsert=True
+        )
+
+        remote = {}
+        live_processes = [self.process_id]
+        cutoff = now - timedelta(seconds=self.interval_seconds * STALE_INTERVALS)
+        for document in collection.find({'updated_at': {'$gte': cutoff}}):
+            if document['_id'] == self.process_id:
+                continue
+            live_processes.append(document['_id'])
+            for entry in document.get('rooms', []):
+                remote[entry['room']] = remote.get(entry['room'], 0) + entry['viewers']
+        self._remote_counts = remote
+        return self.process_id == min(live_processes)
+
+    def broadcast_changes(self, all_rooms):
+        """Send viewer_count to rooms whose count changed since the last broadcast"""
+        counts = self.viewer_counts() if all_rooms else self.viewer_counts(self.local_counts())
+        previous = self._broadcast_counts
+        for room, viewers in counts.items():
+            if previous.get(room) != viewers:
+                socketio.emit('viewer_count', {'schedule_id': room, 'viewers': viewers}, room=room)
+        # Rooms everyone left get no message; they have no one to tell
+        self._broadcast_counts = counts
+
+    def tick(self):
+        leader = self.sync() if self.shared else True
+        if not self.message_queue:
+            # A room broadcast only reaches this process's clients
+            self.broadcast_changes(all_rooms=False)
+        elif leader:
+            self.broadcast_changes(all_rooms=True)
+
+    def _run(self, app):
+        with app.app_context():
+            while True:
+                socketio.sleep(self.interval_seconds)
+                try:
+                    self.tick()
+                except Exception as e:
+                    logger.error("⚠️ Presence update error: %s", e, exc_info=True)
+
+    def start(self, app):
+        """Start the periodic publish/broadcast task (once per process)"""
+        if self.interval_seconds <= 0 or self._worker is not None:
+            return
+        self._worker = socketio.start_background_task(self._run, app)
+
+# Shared instance used by the socket handlers and the viewer count API
+presence = PresenceRegistry()
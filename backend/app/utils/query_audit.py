@@ -0,0 +1,137 @@
+"""
+Query Plan Auditor (development)
+A pymongo CommandListener that notes every find/count/aggregate/update/delete
+issued while a Flask request is being served, explains each new
+(endpoint, collection, filter shape) once on a background thread, and logs
+the ones whose winning plan is a COLLSCAN.
+Enable with QUERY_AUDIT_ENABLED=true (on by default when FLASK_ENV=development).
+"""
+import logging
+import queue
+import threading
+from flask import has_request_context, request
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Commands whose filter decides the plan, and where the filter lives
+FILTER_FIELDS = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+    'delete': 'deletes',
+    'update': 'updates'
+}
+AUDITED_COMMANDS = set(FILTER_FIELDS) | {'aggregate'}
+
+# Pending explain() jobs kept before new ones are dropped
+MAX_PENDING = 1000
+
+def filter_shape(value):
+    """Filter with every literal replaced by its type name, e.g. {'status': {'$in': 'list'}}"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and value and all(isinstance(item, dict) for item in value):
+        return [filter_shape(item) for item in value]
+    return type(value).__name__
+
+def command_filter(command_name, command):
+    """The query filter of an audited command ({} when it has none)"""
+    if command_name == 'aggregate':
+        pipeline = command.get('pipeline') or []
+        if pipeline and '$match' in pipeline[0]:
+            return pipeline[0]['$match']
+        return {}
+    value = command.get(FILTER_FIELDS[command_name]) or {}
+    if command_name in ('delete', 'update'):
+        return value[0].get('q', {}) if value else {}
+    return value
+
+def plan_stages(plan):
+    """Every stage name in an explain() winning plan (classic or SBE)"""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(plan_stages(item))
+    return stages
+
+class QueryPlanAuditor(monitoring.CommandListener):
+    """Collects request queries and reports collection scans"""
+
+    def __init__(self):
+        self.seen = set()
+        self.collscans = []
+        self.jobs = queue.Queue(maxsize=MAX_PENDING)
+        self.client = None
+        self.lock = threading.Lock()
+        self.worker = None
+
+    def start(self, client):
+        """Begin explaining queued queries with the given MongoClient"""
+        self.client = client
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._run, name='query-plan-audit', daemon=True)
+            self.worker.start()
+
+    # ------------------------------------------------------------ listener
+
+    def started(self, event):
+        if event.command_name not in AUDITED_COMMANDS or not has_request_context():
+            return
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str) or collection.startswith('system.'):
+            return
+        query = command_filter(event.command_name, event.command)
+        endpoint = request.endpoint or request.path
+        key = (endpoint, event.database_name, collection, repr(filter_shape(query)))
+        with self.lock:
+            if key in self.seen:
+                return
+            self.seen.add(key)
+        try:
+            self.jobs.put_nowait((endpoint, event.database_name, collection, query))
+        except queue.Full:
+            pass
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    # ------------------------------------------------------------ explain
+
+    def explain(self, endpoint, database_name, collection, query):
+        """Explain one filter; records and logs it if the plan is a COLLSCAN"""
+        result = self.client[database_name].command(
+            'explain', {'find': collection, 'filter': query}, verbosity='queryPlanner'
+        )
+        stages = plan_stages(result.get('queryPlanner', {}).get('winningPlan', {}))
+        if 'COLLSCAN' in stages:
+            finding = {
+                'endpoint': endpoint,
+                'collection': collection,
+                'filter_shape': filter_shape(query)
+            }
+            self.collscans.append(finding)
+            logger.warning("🐢 COLLSCAN in %s: %s %s", endpoint, collection, finding['filter_shape'])
+        return stages
+
+    def _run(self):
+        while True:
+            endpoint, database_name, collection, query = self.jobs.get()
+            try:
+                self.explain(endpoint, database_name, collection, query)
+            except Exception as e:
+                logger.warning("⚠️ Query audit explain failed for %s: %s", collection, e)
+            finally:
+                self.jobs.task_done()
+
+# Registered in create_app() before the MongoClient is created
+query_plan_auditor = QueryPlanAuditor()
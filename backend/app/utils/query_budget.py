@@ -0,0 +1,121 @@
+"""
+Query Budgets
+Declare how many MongoDB operations an endpoint may issue per request, and
+check it from tests and benchmarks:
+
+    @schedules_bp.route('/', methods=['GET'])
+    @query_budget(5)
+    def get_schedules(): ...
+
+    monitoring.register(query_counter)       # before create_app()
+    result = check_query_budget(client, 'GET', '/schedules/?origin_city=A&destination_city=B')
+    assert result['ok'], result
+
+The decorator only records the number on the view, so it costs nothing at
+request time. query_counter is a CommandListener that counts, per thread,
+the commands sent while count_queries() is active; the Flask test client
+serves a request on the calling thread, so everything the view (and its
+before/after_request hooks) sends is counted. getMore/killCursors are not
+counted: they continue an operation that was already counted.
+"""
+import threading
+from contextlib import contextmanager
+from flask import current_app
+from pymongo import monitoring
+
+# Driver housekeeping and cursor continuations
+UNCOUNTED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'saslStart', 'saslContinue', 'endSessions',
+                      'buildInfo', 'getMore', 'killCursors'}
+
+class QueryBudgetExceeded(AssertionError):
+    """An endpoint issued more MongoDB operations than its budget"""
+
+    def __init__(self, endpoint, budget, count, commands):
+        self.endpoint = endpoint
+        self.budget = budget
+        self.count = count
+        self.commands = commands
+        super().__init__(f"{endpoint} issued {count} MongoDB operations (budget {budget}): {commands}")
+
+def query_budget(max_queries):
+    """Declare the most MongoDB operations one request to this view may issue"""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+def budget_for(endpoint, app=None):
+    """The declared budget of a Flask endpoint name, or None"""
+    view = (app or current_app).view_functions.get(endpoint)
+    return getattr(view, 'query_budget', None)
+
+class QueryCounter(monitoring.CommandListener):
+    """Counts the commands each thread sends inside count_queries()"""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def started(self, event):
+        counted = getattr(self.local, 'counted', None)
+        if counted is None or event.command_name in UNCOUNTED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        key = f"{event.command_name} {collection}" if isinstance(collection, str) else event.command_name
+        counted.commands[key] = counted.commands.get(key, 0) + 1
+        counted.total += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+class CountedQueries:
+    def __init__(self):
+        self.total = 0
+        self.commands = {}  # "find bookings" -> count
+
+# Register with pymongo.monitoring.register() (or pass to the MongoClient) before it is created
+query_counter = QueryCounter()
+
+@contextmanager
+def count_queries(counter=query_counter):
+    """Count the MongoDB commands this thread sends inside the block"""
+    previous = getattr(counter.local, 'counted', None)
+    counted = CountedQueries()
+    counter.local.counted = counted
+    try:
+        yield counted
+    finally:
+        counter.local.counted = previous
+
+def check_query_budget(client, method, url, budget=None, strict=False, **kwargs):
+    """
+    Send one request through a Flask test client and compare its MongoDB operations with the budget
+    budget defaults to the one declared on the view with @query_budget.
+    Returns {'endpoint', 'status', 'queries', 'budget', 'ok', 'commands'};
+    strict=True raises QueryBudgetExceeded instead of returning ok=False.
+    """
+    app = client.application
+    adapter = app.url_map.bind('localhost')
+    try:
+        endpoint, _args = adapter.match(url.split('?', 1)[0], method=method)
+    except Exception:
+        endpoint = None
+    if budget is None and endpoint is not None:
+        budget = budget_for(endpoint, app)
+
+    with count_queries() as counted:
+        response = client.open(url, method=method, **kwargs)
+
+    result = {
+        'endpoint': endpoint,
+        'status': response.status_code,
+        'queries': counted.total,
+        'budget': budget,
+        'ok': budget is None or counted.total <= budget,
+        'commands': dict(sorted(counted.commands.items()))
+    }
+    if strict and not result['ok']:
+        raise QueryBudgetExceeded(endpoint or url, budget, counted.total, result['commands'])
+    return result
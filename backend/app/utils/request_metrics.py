@@ -0,0 +1,329 @@
+"""
+Request Metrics
+Per-endpoint latency, MongoDB query counts and response sizes, kept in
+memory by each process.
+
+A before/after_request pair times every HTTP request, and a pymongo
+CommandListener adds each command's duration to the request that issued it
+(commands run on the request's thread). Commands issued outside a request
+(socket handlers, the outbox dispatcher, presence) are counted under the
+route "(background)". Each endpoint (method + URL rule) keeps histograms of
+  - request duration (seconds)
+  - MongoDB commands per request
+  - MongoDB time per request (seconds)
+  - response body size (bytes)
+plus counters per status code and per (command, collection).
+
+prometheus_text() renders them in the Prometheus text format for /metrics;
+endpoint_summaries() gives p50/p95/p99 per endpoint for the admin view.
+"""
+import threading
+import time
+from flask import g, has_request_context, request
+from pymongo import monitoring
+
+BACKGROUND_ROUTE = '(background)'
+UNMATCHED_ROUTE = '(unmatched)'
+
+LATENCY_BUCKETS = (0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 0.75, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Driver chatter that says nothing about an endpoint
+IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'saslStart', 'saslContinue', 'endSessions', 'buildInfo'}
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style) with quantile estimates"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            running += count
+            yield bound, running
+
+    def quantile(self, q):
+        """Linear interpolation inside the bucket holding the q-th observation (like histogram_quantile)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower = 0.0
+        previous = 0
+        for bound, running in self.cumulative():
+            if running >= rank:
+                if bound == float('inf'):
+                    return self.buckets[-1]
+                inside = running - previous
+                return lower + (bound - lower) * ((rank - previous) / inside if inside else 0)
+            lower, previous = bound, running
+        return self.buckets[-1]
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+class EndpointStats:
+    def __init__(self):
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_time = Histogram(LATENCY_BUCKETS)
+        self.response_bytes = Histogram(BYTES_BUCKETS)
+        self.statuses = {}   # status code -> requests
+        self.commands = {}   # (command, collection) -> [count, seconds, failures]
+        self.documents = 0
+
+class RequestMetrics(monitoring.CommandListener):
+    """Request timing middleware plus the MongoDB command listener that feeds it"""
+
+    def __init__(self):
+        self.enabled = True
+        self.endpoints = {}   # (method, route) -> EndpointStats
+        self.started_at = time.time()
+        self._collections = {}  # command request_id -> collection, between started and succeeded
+        self._guard = threading.Lock()
+
+    def init_app(self, app, enabled=True):
+        """Register the timing hooks (the listener is passed to the MongoClient separately)"""
+        self.enabled = enabled
+        if not enabled:
+            return
+
+        @app.before_request
+        def start_request_timer():
+            g._request_metrics = {'started': time.perf_counter(), 'queries': 0, 'db_seconds': 0.0,
+                                  'documents': 0, 'commands': {}}
+
+        @app.after_request
+        def record_request_metrics(response):
+            self.record_request(response)
+            return response
+
+    # ---------------------------------------------------------------- requests
+
+    def _stats(self, method, route):
+        key = (method, route)
+        stats = self.endpoints.get(key)
+        if stats is None:
+            with self._guard:
+                stats = self.endpoints.setdefault(key, EndpointStats())
+        return stats
+
+    def record_request(self, response):
+        current = g.pop('_request_metrics', None)
+        if current is None:
+            return
+        elapsed = time.perf_counter() - current['started']
+        route = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+        size = response.calculate_content_length() if not response.is_streamed else None
+        stats = self._stats(request.method, route)
+        with self._guard:
+            stats.duration.observe(elapsed)
+            stats.queries.observe(current['queries'])
+            stats.db_time.observe(current['db_seconds'])
+            if size is not None:
+                stats.response_bytes.observe(size)
+            stats.statuses[response.status_code] = stats.statuses.get(response.status_code, 0) + 1
+            stats.documents += current['documents']
+            for key, (count, seconds, failures) in current['commands'].items():
+                totals = stats.commands.setdefault(key, [0, 0.0, 0])
+                totals[0] += count
+                totals[1] += seconds
+                totals[2] += failures
+
+    # ---------------------------------------------------------------- listener
+
+    def started(self, event):
+        if not self.enabled or event.command_name in IGNORED_COMMANDS:
+            return
+        collection = event.command.get('collection') if event.command_name == 'getMore' \
+            else event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else '-'
+
+    def succeeded(self, event):
+        self._record_command(event, failed=False)
+
+    def failed(self, event):
+        self._record_command(event, failed=True)
+
+    def _record_command(self, event, failed):
+        collection = self._collections.pop(event.request_id, None)
+        if collection is None:
+            return
+        seconds = event.duration_micros / 1e6
+        documents = 0
+        if not failed:
+            cursor = event.reply.get('cursor') if isinstance(event.reply, dict) else None
+            if isinstance(cursor, dict):
+                documents = len(cursor.get('firstBatch') or cursor.get('nextBatch') or [])
+        key = (event.command_name, collection)
+
+        current = g.get('_request_metrics') if has_request_context() else None
+        if current is not None:
+            # Only this request's thread touches it; merged into the endpoint in after_request
+            current['queries'] += 1
+            current['db_seconds'] += seconds
+            current['documents'] += documents
+            totals = current['commands'].setdefault(key, [0, 0.0, 0])
+        else:
+            stats = self._stats('-', BACKGROUND_ROUTE)
+            with self._guard:
+                stats.documents += documents
+                totals = stats.commands.setdefault(key, [0, 0.0, 0])
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] += int(failed)
+
+    # ----------------------------------------------------------------- reports
+
+    def endpoint_summaries(self, sort='total_time', limit=None):
+        """Per-endpoint percentiles (ms), queries per request and the busiest commands"""
+        with self._guard:
+            items = list(self.endpoints.items())
+            summaries = []
+            for (method, route), stats in items:
+                requests = stats.duration.count
+                commands = sorted(stats.commands.items(), key=lambda item: item[1][1], reverse=True)
+                summaries.append({
+                    'method': method,
+                    'route': route,
+                    'requests': requests,
+                    'errors': sum(count for status, count in stats.statuses.items() if status >= 500),
+                    'statuses': {str(status): count for status, count in sorted(stats.statuses.items())},
+                    'total_time_s': round(stats.duration.total, 3),
+                    'latency_ms': _percentiles_ms(stats.duration),
+                    'queries_per_request': {
+                        'mean': _rounded(stats.queries.mean()),
+                        'p95': _rounded(stats.queries.quantile(0.95)),
+                        'max_bucket': _max_bucket(stats.queries)
+                    },
+                    'db_time_ms': _percentiles_ms(stats.db_time),
+                    'response_bytes': {
+                        'mean': _rounded(stats.response_bytes.mean(), 0),
+                        'p95': _rounded(stats.response_bytes.quantile(0.95), 0)
+                    },
+                    'documents_returned': stats.documents,
+                    'top_commands': [
+                        {'command': command, 'collection': collection, 'count': count,
+                         'total_ms': round(seconds * 1000, 2), 'failures': failures}
+                        for (command, collection), (count, seconds, failures) in commands[:10]
+                    ]
+                })
+        sort_keys = {
+            'total_time': lambda entry: entry['total_time_s'],
+            'p95': lambda entry: entry['latency_ms']['p95'] or 0,
+            'queries': lambda entry: entry['queries_per_request']['mean'] or 0,
+            'requests': lambda entry: entry['requests']
+        }
+        summaries.sort(key=sort_keys.get(sort, sort_keys['total_time']), reverse=True)
+        return summaries[:limit] if limit else summaries
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._guard:
+            items = sorted(self.endpoints.items())
+            _family(lines, 'ethiobus_http_request_duration_seconds', 'histogram',
+                    'HTTP request duration by endpoint')
+            for (method, route), stats in items:
+                if stats.duration.count:
+                    _histogram(lines, 'ethiobus_http_request_duration_seconds', {'method': method, 'route': route},
+                               stats.duration)
+            _family(lines, 'ethiobus_http_request_db_queries', 'histogram',
+                    'MongoDB commands issued per HTTP request')
+            for (method, route), stats in items:
+                if stats.queries.count:
+                    _histogram(lines, 'ethiobus_http_request_db_queries', {'method': method, 'route': route},
+                               stats.queries)
+            _family(lines, 'ethiobus_http_request_db_seconds', 'histogram',
+                    'MongoDB time per HTTP request')
+            for (method, route), stats in items:
+                if stats.db_time.count:
+                    _histogram(lines, 'ethiobus_http_request_db_seconds', {'method': method, 'route': route},
+                               stats.db_time)
+            _family(lines, 'ethiobus_http_response_bytes', 'histogram', 'HTTP response body size')
+            for (method, route), stats in items:
+                if stats.response_bytes.count:
+                    _histogram(lines, 'ethiobus_http_response_bytes', {'method': method, 'route': route},
+                               stats.response_bytes)
+            _family(lines, 'ethiobus_http_requests_total', 'counter', 'HTTP requests by endpoint and status')
+            for (method, route), stats in items:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(_sample('ethiobus_http_requests_total',
+                                         {'method': method, 'route': route, 'status': str(status)}, count))
+            command_families = (
+                ('ethiobus_mongodb_commands_total', 'MongoDB commands by endpoint', 0),
+                ('ethiobus_mongodb_command_seconds_total', 'MongoDB command time by endpoint', 1),
+                ('ethiobus_mongodb_command_failures_total', 'Failed MongoDB commands by endpoint', 2)
+            )
+            for name, description, field in command_families:
+                _family(lines, name, 'counter', description)
+                for (method, route), stats in items:
+                    for (command, collection), totals in sorted(stats.commands.items()):
+                        labels = {'method': method, 'route': route, 'command': command, 'collection': collection}
+                        lines.append(_sample(name, labels, totals[field]))
+        _family(lines, 'ethiobus_metrics_start_time_seconds', 'gauge', 'When this process started collecting')
+        lines.append(_sample('ethiobus_metrics_start_time_seconds', {}, self.started_at))
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._guard:
+            self.endpoints = {}
+            self.started_at = time.time()
+
+def _rounded(value, digits=2):
+    return round(value, digits) if value is not None else None
+
+def _percentiles_ms(histogram):
+    return {
+        'p50': _rounded(_ms(histogram.quantile(0.50))),
+        'p95': _rounded(_ms(histogram.quantile(0.95))),
+        'p99': _rounded(_ms(histogram.quantile(0.99))),
+        'mean': _rounded(_ms(histogram.mean()))
+    }
+
+def _ms(seconds):
+    return seconds * 1000 if seconds is not None else None
+
+def _max_bucket(histogram):
+    """Upper bound of the highest non-empty bucket ('+Inf' past the last one)"""
+    for index in range(len(histogram.counts) - 1, -1, -1):
+        if histogram.counts[index]:
+            return histogram.buckets[index] if index < len(histogram.buckets) else '+Inf'
+    return None
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _sample(name, labels, value):
+    if labels:
+        rendered = ','.join(f'{key}="{_escape(item)}"' for key, item in labels.items())
+        return f"{name}{{{rendered}}} {value}"
+    return f"{name} {value}"
+
+def _family(lines, name, kind, description):
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} {kind}")
+
+def _histogram(lines, name, labels, histogram):
+    for bound, running in histogram.cumulative():
+        lines.append(_sample(f"{name}_bucket", {**labels, 'le': '+Inf' if bound == float('inf') else str(bound)},
+                             running))
+    lines.append(_sample(f"{name}_sum", labels, histogram.total))
+    lines.append(_sample(f"{name}_count", labels, histogram.count))
+
+# Shared instance: hooks registered and listener passed to the MongoClient in create_app()
+request_metrics = RequestMetrics()
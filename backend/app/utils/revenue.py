@@ -0,0 +1,35 @@
+"""
+Booking Revenue
+The refund-aware revenue rule for a booking, as Python and as an aggregation
+expression, so dashboards can $sum it server-side instead of looping bookings.
+A cancelled booking (or one with an approved cancellation) earns only its
+cancellation fee: total_amount minus the refund, where a missing refund is
+estimated from expected_refund_percentage. Every other booking earns total_amount.
+"""
+
+def booking_revenue(booking):
+    """Revenue earned from one booking document"""
+    total_amount = booking.get('total_amount', 0) or 0
+    if booking.get('status') == 'cancelled' or booking.get('cancellation_status') == 'approved':
+        refund_amount = booking.get('refund_amount', 0) or 0
+        expected_pct = booking.get('expected_refund_percentage', 0) or 0
+        if refund_amount == 0 and expected_pct > 0:
+            refund_amount = total_amount * (expected_pct / 100)
+        return total_amount - refund_amount
+    return total_amount
+
+def revenue_expression():
+    """Aggregation expression equal to booking_revenue() for the current document"""
+    total_amount = {'$ifNull': ['$total_amount', 0]}
+    refund_amount = {'$ifNull': ['$refund_amount', 0]}
+    expected_pct = {'$ifNull': ['$expected_refund_percentage', 0]}
+    refund = {'$cond': [
+        {'$and': [{'$eq': [refund_amount, 0]}, {'$gt': [expected_pct, 0]}]},
+        {'$multiply': [total_amount, {'$divide': [expected_pct, 100]}]},
+        refund_amount
+    ]}
+    cancelled = {'$or': [
+        {'$eq': ['$status', 'cancelled']},
+        {'$eq': ['$cancellation_status', 'approved']}
+    ]}
+    return {'$cond': [cancelled, {'$subtract': [total_amount, refund]}, total_amount]}
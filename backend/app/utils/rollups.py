@@ -0,0 +1,496 @@
+"""
+Daily Rollups
+Pre-aggregated booking figures per (date, route, bus_type, booking_source),
+where date is the day the booking was made. Booking writes apply the change
+in a booking's contribution with $inc, and rebuild_rollups() backfills from
+history with a $group/$merge aggregation, so dashboards sum a few documents
+per day shown instead of reading every booking. Revenue follows
+app.utils.revenue.booking_revenue(); the aggregation mirrors rollup_key() and
+booking_metrics().
+
+A rebuild records a watermark (an ObjectId) in rollup_state and counts only
+bookings created before it; the outbox rollup events of those bookings are
+skipped, and later ones are applied as usual. While it runs, incremental
+changes are journaled in rollup_journal instead of being applied to documents
+the rebuild is replacing. Afterwards the groups of counted bookings that
+changed meanwhile are recomputed and the other journaled changes applied.
+
+Usage (backfill):
+    python -m app.utils.rollups                               # all history
+    python -m app.utils.rollups --from 2025-01-01 --to 2025-02-01
+"""
+import argparse
+import logging
+import sys
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app import mongo
+from app.utils.revenue import booking_revenue, revenue_expression
+from app.utils.schema import day, day_span
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS_COLLECTION = 'daily_rollups'
+ROLLUP_STATE_COLLECTION = 'rollup_state'
+ROLLUP_JOURNAL_COLLECTION = 'rollup_journal'
+
+# Minutes a rebuild defers incremental updates before they apply directly
+# again (so a crashed rebuild does not hold them forever)
+REBUILD_LEASE_MINUTES = 30
+
+# Times the groups of bookings changed during a rebuild are recomputed before it finishes
+RECOMPUTE_PASSES = 3
+
+# Seconds a rebuild waits past its watermark before reading bookings, so
+# bookings given an _id below it have been inserted
+WATERMARK_SETTLE_SECONDS = 1
+
+# Grouping fields of a rollup document
+DIMENSIONS = ['date', 'route', 'bus_type', 'booking_source']
+
+# Summed fields of a rollup document
+METRICS = [
+    'bookings',              # bookings made (any status)
+    'cancelled',
+    'pending',               # confirmed or pending, awaiting check-in
+    'checked_in',            # checked_in or completed
+    'completed',
+    'passengers',            # seats on bookings that are not cancelled
+    'gross_amount',          # total_amount of every booking
+    'confirmed_amount',      # total_amount of bookings that are not cancelled
+    'refunds',               # refunded on cancelled bookings
+    'cancellation_fees',     # kept on cancelled bookings
+    'revenue',               # confirmed_amount + cancellation_fees
+    'paid_bookings',         # paid bookings (any status)
+    'paid_active_bookings',  # paid bookings that are not cancelled
+    'paid_passengers',
+    'paid_revenue'
+]
+
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+BOOKING_PROJECTION = {
+    'created_at': 1, 'booked_at': 1, 'travel_date': 1,
+    'departure_city': 1, 'arrival_city': 1, 'bus_type': 1, 'booking_source': 1,
+    'status': 1, 'payment_status': 1, 'cancellation_status': 1,
+    'total_amount': 1, 'refund_amount': 1, 'expected_refund_percentage': 1,
+    'seat_numbers': 1, 'seat_number': 1
+}
+
+def rollup_key(booking):
+    """Dimension values for a booking"""
+    created = booking.get('created_at') or booking.get('booked_at') or booking.get('travel_date')
+    try:
+        date = day(created)
+    except ValueError:
+        date = None
+    return {
+        'date': date or 'unknown',
+        'route': f"{booking.get('departure_city') or 'Unknown'} - {booking.get('arrival_city') or 'Unknown'}",
+        'bus_type': booking.get('bus_type') or 'unknown',
+        'booking_source': booking.get('booking_source') or 'online'
+    }
+
+def rollup_id(key):
+    return '|'.join(str(key[dimension]) for dimension in DIMENSIONS)
+
+def booking_metrics(booking):
+    """What one booking adds to its rollup document"""
+    status = booking.get('status')
+    total_amount = booking.get('total_amount', 0) or 0
+    is_cancelled = status == 'cancelled' or booking.get('cancellation_status') == 'approved'
+    is_paid = booking.get('payment_status') == 'paid'
+    revenue = booking_revenue(booking)
+    seats = 0 if is_cancelled else len(booking.get('seat_numbers') or ([1] if booking.get('seat_number') else []))
+
+    return {
+        'bookings': 1,
+        'cancelled': 1 if status == 'cancelled' else 0,
+        'pending': 1 if status in ('confirmed', 'pending') else 0,
+        'checked_in': 1 if status in ('checked_in', 'completed') else 0,
+        'completed': 1 if status == 'completed' else 0,
+        'passengers': seats,
+        'gross_amount': total_amount,
+        'confirmed_amount': 0 if is_cancelled else total_amount,
+        'refunds': total_amount - revenue if is_cancelled else 0,
+        'cancellation_fees': revenue if is_cancelled else 0,
+        'revenue': revenue,
+        'paid_bookings': 1 if is_paid else 0,
+        'paid_active_bookings': 1 if is_paid and not is_cancelled else 0,
+        'paid_passengers': seats if is_paid else 0,
+        'paid_revenue': revenue if is_paid else 0
+    }
+
+def _increment(before, after, session=None):
+    changes = {}
+    for booking, sign in ((before, -1), (after, 1)):
+        if not booking:
+            continue
+        key = rollup_key(booking)
+        entry = changes.setdefault(rollup_id(key), {'key': key, 'metrics': {}})
+        for metric, value in booking_metrics(booking).items():
+            entry['metrics'][metric] = entry['metrics'].get(metric, 0) + sign * value
+
+    for document_id, entry in changes.items():
+        increments = {metric: value for metric, value in entry['metrics'].items() if value}
+        if not increments:
+            continue
+        mongo.db[ROLLUPS_COLLECTION].update_one(
+            {'_id': document_id},
+            {'$inc': increments, '$setOnInsert': entry['key'], '$set': {'updated_at': datetime.utcnow()}},
+            upsert=True,
+            session=session
+        )
+
+def _rebuild_state(session=None):
+    return mongo.db[ROLLUP_STATE_COLLECTION].find_one({'_id': 'rebuild'}, session=session)
+
+def _rebuilding(state):
+    return bool(state and state.get('running_until') and state['running_until'] > datetime.utcnow())
+
+def _counted_by_rebuild(booking_id, booking, state):
+    """True when the rebuild in state counted this booking from the bookings collection"""
+    if not state or booking_id is None or not booking:
+        return False
+    # The rebuild counts ObjectId bookings before its watermark and every other _id
+    if isinstance(booking_id, ObjectId) or ObjectId.is_valid(str(booking_id)):
+        if ObjectId(str(booking_id)) >= state['watermark']:
+            return False
+    date = rollup_key(booking)['date']
+    return (not state.get('start') or date >= state['start']) and (not state.get('end') or date < state['end'])
+
+def _apply(before, after, booking_id, state, session=None):
+    if _rebuilding(state):
+        mongo.db[ROLLUP_JOURNAL_COLLECTION].insert_one({
+            'booking_id': booking_id, 'before': before, 'after': after, 'at': datetime.utcnow()
+        }, session=session)
+    else:
+        _increment(before, after, session)
+
+def apply_booking_change(before, after, session=None, booking_id=None):
+    """$inc rollups by the difference between two states of a booking (either may be None)"""
+    _apply(before, after, booking_id, _rebuild_state(session), session)
+
+def apply_booking_created(booking_id, booking, session=None):
+    """Add a new booking to the rollups, unless a rebuild already counted it"""
+    state = _rebuild_state(session)
+    if _counted_by_rebuild(booking_id, booking, state):
+        return
+    _apply(None, booking, booking_id, state, session)
+
+def record_booking_change(before, after=None):
+    """
+    Hook for booking writes: call with the booking as it was before the write
+    (None for inserts) and, for updates, nothing else - the current document
+    is re-read. Failures are logged; rebuild_rollups() repairs any drift.
+    """
+    try:
+        if after is None and before and before.get('_id') is not None:
+            after = mongo.db.bookings.find_one({'_id': before['_id']}, BOOKING_PROJECTION)
+        booking_id = (before or {}).get('_id', (after or {}).get('_id'))
+        apply_booking_change(before, after, booking_id=booking_id)
+    except Exception as e:
+        logger.warning("⚠️ Failed to update daily rollups: %s", e)
+
+def ensure_rollup_indexes():
+    return mongo.db[ROLLUPS_COLLECTION].create_index([('date', 1), ('route', 1)], name='date_route')
+
+# ------------------------------------------------------------------ rebuild
+
+def _or(expression, default):
+    """Aggregation form of `value or default` for missing, null and empty-string values"""
+    return {'$cond': [{'$in': [{'$ifNull': [expression, '']}, ['', 0, False]]}, default, expression]}
+
+def _day_expression(value):
+    """Aggregation form of app.utils.schema.day(); null where day() would raise"""
+    gmt_parts = {'$split': [value, ' ']}
+    month = {'$arrayElemAt': [
+        [''] + [f"{number:02d}" for number in range(1, 13)],
+        {'$add': [{'$indexOfArray': [MONTH_NAMES, {'$arrayElemAt': [gmt_parts, 2]}]}, 1]}
+    ]}
+    gmt_day = {'$dateToString': {'format': '%Y-%m-%d', 'date': {'$dateFromString': {
+        'dateString': {'$concat': [
+            {'$arrayElemAt': [gmt_parts, 3]}, '-', month, '-', {'$arrayElemAt': [gmt_parts, 1]}
+        ]},
+        'format': '%Y-%m-%d',
+        'onError': None
+    }}}}
+    text_day = {'$arrayElemAt': [{'$split': [{'$arrayElemAt': [{'$split': [value, 'T']}, 0]}, ' ']}, 0]}
+    return {'$switch': {
+        'branches': [
+            {'case': {'$eq': [{'$type': value}, 'date']},
+             'then': {'$dateToString': {'format': '%Y-%m-%d', 'date': value}}},
+            {'case': {'$ne': [{'$type': value}, 'string']}, 'then': None},
+            {'case': {'$regexMatch': {'input': value, 'regex': 'GMT'}}, 'then': gmt_day}
+        ],
+        'default': text_day
+    }}
+
+def rollup_key_expression():
+    """Aggregation form of rollup_key()"""
+    created = _or('$created_at', _or('$booked_at', '$travel_date'))
+    return {
+        'date': _or(_day_expression(created), 'unknown'),
+        'route': {'$concat': [
+            _or('$departure_city', 'Unknown'), ' - ', _or('$arrival_city', 'Unknown')
+        ]},
+        'bus_type': _or('$bus_type', 'unknown'),
+        'booking_source': _or('$booking_source', 'online')
+    }
+
+def booking_metrics_expression():
+    """Aggregation form of booking_metrics(), over the fields rollup_pipeline() adds"""
+    def count(condition):
+        return {'$cond': [condition, 1, 0]}
+
+    def unless_cancelled(value):
+        return {'$cond': ['$_cancelled', 0, value]}
+
+    def when_paid(value):
+        return {'$cond': ['$_paid', value, 0]}
+
+    status_in = lambda *statuses: {'$in': ['$status', list(statuses)]}
+    return {
+        'bookings': 1,
+        'cancelled': count({'$eq': ['$status', 'cancelled']}),
+        'pending': count(status_in('confirmed', 'pending')),
+        'checked_in': count(status_in('checked_in', 'completed')),
+        'completed': count({'$eq': ['$status', 'completed']}),
+        'passengers': '$_seats',
+        'gross_amount': '$_total',
+        'confirmed_amount': unless_cancelled('$_total'),
+        'refunds': {'$cond': ['$_cancelled', {'$subtract': ['$_total', '$_revenue']}, 0]},
+        'cancellation_fees': {'$cond': ['$_cancelled', '$_revenue', 0]},
+        'revenue': '$_revenue',
+        'paid_bookings': count('$_paid'),
+        'paid_active_bookings': count({'$and': ['$_paid', {'$eq': ['$_cancelled', False]}]}),
+        'paid_passengers': when_paid('$_seats'),
+        'paid_revenue': when_paid('$_revenue')
+    }
+
+def rollup_pipeline(start=None, end=None, updated_at=None, watermark=None, rollup_ids=None):
+    """
+    Aggregation over bookings yielding rollup documents, for all dates or for [start, end) days
+    watermark: only bookings with an ObjectId _id below it (and every other _id)
+    rollup_ids: only these rollup documents
+    """
+    seat_count = {'$cond': [
+        {'$gt': [{'$size': {'$cond': [{'$isArray': '$seat_numbers'}, '$seat_numbers', []]}}, 0]},
+        {'$size': '$seat_numbers'},
+        {'$cond': [{'$in': [{'$ifNull': ['$seat_number', '']}, ['', 0, False]]}, 0, 1]}
+    ]}
+    cancelled = {'$or': [{'$eq': ['$status', 'cancelled']}, {'$eq': ['$cancellation_status', 'approved']}]}
+    pipeline = []
+    if watermark is not None:
+        pipeline.append({'$match': {'$or': [
+            {'_id': {'$lt': watermark}},
+            {'_id': {'$not': {'$type': 'objectId'}}}
+        ]}})
+    pipeline += [
+        {'$project': dict(BOOKING_PROJECTION, _id=0)},
+        {'$addFields': {
+            '_key': rollup_key_expression(),
+            '_cancelled': cancelled,
+            '_paid': {'$eq': ['$payment_status', 'paid']},
+            '_total': {'$ifNull': ['$total_amount', 0]},
+            '_revenue': revenue_expression()
+        }},
+        {'$addFields': {'_seats': {'$cond': ['$_cancelled', 0, seat_count]}}}
+    ]
+
+    date_range = {}
+    if start:
+        date_range['$gte'] = day(start)
+    if end:
+        date_range['$lt'] = day(end)
+    if rollup_ids is not None:
+        date_range['$in'] = sorted({rollup_id.split('|', 1)[0] for rollup_id in rollup_ids})
+    if date_range:
+        pipeline.append({'$match': {'_key.date': date_range}})
+
+    group = {'_id': '$_key'}
+    for metric, expression in booking_metrics_expression().items():
+        group[metric] = {'$sum': expression}
+    rollup_id_parts = []
+    for dimension in DIMENSIONS:
+        rollup_id_parts += ['|', f"$_id.{dimension}"]
+    document = {'_id': {'$concat': rollup_id_parts[1:]}}
+    for dimension in DIMENSIONS:
+        document[dimension] = f"$_id.{dimension}"
+    for metric in METRICS:
+        document[metric] = 1
+    document['updated_at'] = {'$literal': updated_at or datetime.utcnow()}
+    pipeline += [{'$group': group}, {'$project': document}]
+    if rollup_ids is not None:
+        pipeline.append({'$match': {'_id': {'$in': list(rollup_ids)}}})
+    return pipeline
+
+def _merge_rollups(state, rollup_ids=None):
+    """Replace rollup documents with counts of the bookings before the watermark; returns (written, removed)"""
+    db = mongo.db
+    now = datetime.utcnow()
+    pipeline = rollup_pipeline(state.get('start'), state.get('end'), now, state['watermark'], rollup_ids)
+    pipeline.append({'$merge': {
+        'into': ROLLUPS_COLLECTION,
+        'on': '_id',
+        'whenMatched': 'replace',
+        'whenNotMatched': 'insert'
+    }})
+    db.bookings.aggregate(pipeline, allowDiskUse=True)
+
+    # Groups that no longer have bookings were not rewritten by this run
+    stale = {'updated_at': {'$lt': now}}
+    if state.get('start') or state.get('end'):
+        stale['date'] = {}
+        if state.get('start'):
+            stale['date']['$gte'] = state['start']
+        if state.get('end'):
+            stale['date']['$lt'] = state['end']
+    if rollup_ids is not None:
+        stale['_id'] = {'$in': list(rollup_ids)}
+    removed = db[ROLLUPS_COLLECTION].delete_many(stale).deleted_count
+    return db[ROLLUPS_COLLECTION].count_documents({'updated_at': now}), removed
+
+def _skip_counted_events(state):
+    """Mark the queued rollup events of bookings the rebuild counts as done"""
+    from app.utils.outbox import OUTBOX_COLLECTION
+    outbox = mongo.db[OUTBOX_COLLECTION]
+    queued = outbox.find({'type': 'rollup', 'status': {'$in': ['pending', 'failed']}},
+                         {'booking_id': 1, 'payload.booking': 1})
+    counted = [event['_id'] for event in queued
+               if _counted_by_rebuild(event.get('booking_id'), event['payload']['booking'], state)]
+    if counted:
+        outbox.update_many(
+            {'_id': {'$in': counted}, 'status': {'$in': ['pending', 'failed']}},
+            {'$set': {'status': 'done', 'done_at': datetime.utcnow(), 'skipped': 'counted by rollup rebuild'}}
+        )
+    return len(counted)
+
+def _replay_journal(state, recompute_only=False):
+    """
+    Apply changes journaled during the rebuild: recompute the groups of counted
+    bookings, $inc the rest (unless recompute_only). Returns the entries handled.
+    """
+    journal = mongo.db[ROLLUP_JOURNAL_COLLECTION]
+    recompute, handled = set(), []
+    for entry in journal.find({}).sort('at', 1):
+        booking = entry.get('after') or entry.get('before')
+        if _counted_by_rebuild(entry.get('booking_id'), booking, state):
+            recompute.update(rollup_id(rollup_key(state_of)) for state_of in (entry.get('before'), entry.get('after'))
+                             if state_of)
+        elif recompute_only:
+            continue
+        else:
+            _increment(entry.get('before'), entry.get('after'))
+        handled.append(entry['_id'])
+    if recompute:
+        _merge_rollups(state, recompute)
+    if handled:
+        journal.delete_many({'_id': {'$in': handled}})
+    return len(handled)
+
+def rebuild_rollups(start=None, end=None):
+    """
+    Recompute rollups from bookings, for all dates or for [start, end) days
+    Returns the number of rollup documents written.
+    """
+    db = mongo.db
+    now = datetime.utcnow()
+    # ObjectIds carry whole seconds: every booking made before now is below the next one
+    watermark_at = now.replace(microsecond=0) + timedelta(seconds=1)
+    state = {
+        '_id': 'rebuild',
+        'watermark': ObjectId.from_datetime(watermark_at),
+        'start': day(start) if start else None,
+        'end': day(end) if end else None,
+        'started_at': now,
+        'running_until': now + timedelta(minutes=REBUILD_LEASE_MINUTES)
+    }
+    db[ROLLUP_STATE_COLLECTION].replace_one({'_id': 'rebuild'}, state, upsert=True)
+    settle = watermark_at + timedelta(seconds=WATERMARK_SETTLE_SECONDS) - datetime.utcnow()
+    if settle.total_seconds() > 0:
+        time.sleep(settle.total_seconds())
+    try:
+        skipped = _skip_counted_events(state)
+        written, removed = _merge_rollups(state)
+        for _ in range(RECOMPUTE_PASSES):
+            if not _replay_journal(state, recompute_only=True):
+                break
+    finally:
+        db[ROLLUP_STATE_COLLECTION].update_one(
+            {'_id': 'rebuild', 'watermark': state['watermark']},
+            {'$set': {'running_until': None, 'finished_at': datetime.utcnow()}}
+        )
+    _replay_journal(state)
+
+    logger.info("✅ daily_rollups rebuilt: %s documents, %s stale removed, %s queued events skipped",
+                written, removed, skipped)
+    return written
+
+def ensure_rollups():
+    """Startup hook: index, plus a backfill when there are bookings but no rollups yet"""
+    index_name = ensure_rollup_indexes()
+    db = mongo.db
+    if db[ROLLUPS_COLLECTION].estimated_document_count() == 0 and db.bookings.estimated_document_count() > 0:
+        rebuild_rollups()
+    return index_name
+
+# ------------------------------------------------------------------ reads
+
+def _empty_metrics():
+    return {metric: 0 for metric in METRICS}
+
+def rollup_series(start, end, group_by='date', match=None):
+    """
+    Summed metrics per group_by value (a dimension) for dates in [start, end)
+    start/end are datetimes or 'YYYY-MM-DD'; an end later than midnight
+    includes its day (see app.utils.schema.day_span).
+    """
+    query = dict(match or {})
+    query['date'] = day_span(start, end)
+    group = {'_id': f"${group_by}"}
+    for metric in METRICS:
+        group[metric] = {'$sum': f"${metric}"}
+    series = {}
+    for row in mongo.db[ROLLUPS_COLLECTION].aggregate([{'$match': query}, {'$group': group}]):
+        series[row.pop('_id')] = row
+    return series
+
+def rollup_totals(start=None, end=None, match=None):
+    """Summed metrics over [start, end) (all dates when both are None)"""
+    query = dict(match or {})
+    if start is not None and end is not None:
+        query['date'] = day_span(start, end)
+    group = {'_id': None}
+    for metric in METRICS:
+        group[metric] = {'$sum': f"${metric}"}
+    row = next(mongo.db[ROLLUPS_COLLECTION].aggregate([{'$match': query}, {'$group': group}]), None)
+    totals = _empty_metrics()
+    if row:
+        row.pop('_id')
+        totals.update(row)
+    return totals
+
+def daily_series(start, days):
+    """[(date, metrics)] for `days` consecutive days from start, zero-filled"""
+    series = rollup_series(start, start + timedelta(days=days))
+    return [
+        (start + timedelta(days=offset), series.get(day(start + timedelta(days=offset))) or _empty_metrics())
+        for offset in range(days)
+    ]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rebuild daily_rollups from bookings')
+    parser.add_argument('--from', dest='start', help='First day to rebuild (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='end', help='Day after the last to rebuild (YYYY-MM-DD)')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    with create_app().app_context():
+        ensure_rollup_indexes()
+        rebuild_rollups(args.start, args.end)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""
+Schedule Occupancy
+Booked-seat and booking counts for many schedules in one aggregation
+Search endpoints call these once per request instead of count_documents per schedule.
+"""
+from app import mongo
+
+# Booking statuses counted against a schedule's capacity in search results
+SEARCH_OCCUPANCY_STATUSES = ['confirmed', 'checked_in']
+
+def booked_seat_counts(schedule_ids, statuses=None):
+    """
+    Booked seats per schedule, keyed by str(schedule_id)
+    Bookings store schedule_id as a string (app.utils.schema); a booking holds
+    len(seat_numbers) seats (a legacy seat_number is one).
+    Schedules without bookings are returned with 0.
+    """
+    keys = [str(schedule_id) for schedule_id in schedule_ids if schedule_id]
+    counts = {key: 0 for key in keys}
+    if not keys:
+        return counts
+
+    pipeline = [
+        {'$match': {
+            'schedule_id': {'$in': keys},
+            'status': {'$in': statuses or SEARCH_OCCUPANCY_STATUSES}
+        }},
+        {'$group': {
+            '_id': '$schedule_id',
+            'seats': {'$sum': {'$max': [{'$size': {'$ifNull': ['$seat_numbers', []]}}, 1]}}
+        }}
+    ]
+    for row in mongo.db.bookings.aggregate(pipeline):
+        counts[row['_id']] = counts.get(row['_id'], 0) + row['seats']
+    return counts
+
+def booking_counts(schedule_ids, statuses):
+    """Bookings (not seats) per schedule with one of statuses, keyed by str(schedule_id)"""
+    keys = [str(schedule_id) for schedule_id in schedule_ids if schedule_id]
+    counts = {key: 0 for key in keys}
+    if not keys:
+        return counts
+
+    pipeline = [
+        {'$match': {'schedule_id': {'$in': keys}, 'status': {'$in': statuses}}},
+        {'$group': {'_id': '$schedule_id', 'bookings': {'$sum': 1}}}
+    ]
+    for row in mongo.db.bookings.aggregate(pipeline):
+        counts[row['_id']] = row['bookings']
+    return counts
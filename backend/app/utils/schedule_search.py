@@ -0,0 +1,309 @@
+"""
+Schedule Search Read Model
+One schedule_search document per departure with the route, bus and seat
+figures that search results need, so searches are a single indexed find
+instead of $lookup joins on $toString comparisons.
+Documents are rebuilt when operators change a schedule and their seat
+counts are refreshed when bookings change; rebuild_schedule_search() backfills.
+
+Usage (backfill):
+    python -m app.utils.schedule_search
+"""
+import logging
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReplaceOne
+from app import mongo
+from app.utils.schedule_occupancy import booked_seat_counts
+from app.utils.schema import day, day_span
+from app.utils.seat_map_cache import OCCUPIED_BOOKING_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Compound index that serves route + date searches
+ROUTE_DATE_INDEX = 'origin_destination_date'
+
+# Schedules per batch when backfilling
+REBUILD_BATCH_SIZE = 500
+
+# Bookkeeping fields left out of API responses
+RESPONSE_PROJECTION = {'synced_at': 0}
+
+def _id_values(value):
+    """A reference stored as str or ObjectId, in both forms"""
+    if value is None:
+        return []
+    values = [value, str(value)]
+    if ObjectId.is_valid(str(value)):
+        values.append(ObjectId(str(value)))
+    return values
+
+def _find_route(db, schedule):
+    route_ref = schedule.get('route_id')
+    if not route_ref:
+        return None
+    return db.routes.find_one({'_id': {'$in': _id_values(route_ref)}})
+
+def _find_bus(db, schedule):
+    bus_ref = schedule.get('bus_id')
+    if bus_ref:
+        bus = db.buses.find_one({'_id': {'$in': _id_values(bus_ref)}})
+        if bus:
+            return bus
+        return db.buses.find_one({'bus_number': str(bus_ref)})
+    if schedule.get('bus_number'):
+        return db.buses.find_one({'bus_number': schedule['bus_number']})
+    return None
+
+def buses_by_ref(bus_refs):
+    """
+    Buses for many schedules' bus_id values in one query, keyed by str(bus_id)
+    An ObjectId hex is looked up by _id, anything else by bus_number.
+    """
+    object_ids, numbers = set(), set()
+    for ref in bus_refs:
+        if not ref:
+            continue
+        if ObjectId.is_valid(str(ref)):
+            object_ids.add(ObjectId(str(ref)))
+        else:
+            numbers.add(str(ref))
+    clauses = []
+    if object_ids:
+        clauses.append({'_id': {'$in': list(object_ids)}})
+    if numbers:
+        clauses.append({'bus_number': {'$in': list(numbers)}})
+    if not clauses:
+        return {}
+
+    buses = {}
+    for bus in mongo.db.buses.find({'$or': clauses}):
+        if bus['_id'] in object_ids:
+            buses[str(bus['_id'])] = bus
+        if bus.get('bus_number') in numbers:
+            buses[bus['bus_number']] = bus
+    return buses
+
+def build_search_document(schedule, route=None, bus=None, booked_seats=0):
+    """Read model document for one busschedules document"""
+    route = route or {}
+    bus = bus or {}
+    total_seats = schedule.get('total_seats', 45)
+    route_ref = schedule.get('route_id')
+    bus_ref = schedule.get('bus_id')
+
+    return {
+        '_id': str(schedule['_id']),
+        'route_id': str(route_ref) if route_ref else None,
+        'route_name': route.get('name') or schedule.get('route_name'),
+        'origin_city': route.get('origin_city') or schedule.get('origin_city'),
+        'destination_city': route.get('destination_city') or schedule.get('destination_city'),
+        'distance_km': route.get('distance_km') or route.get('distanceKm') or schedule.get('route_distance'),
+        'estimated_duration_hours': route.get('estimated_duration_hours') or route.get('estimatedDurationHours'),
+        'stops': route.get('stops'),
+        'route_description': route.get('description', ''),
+
+        'departure_date': day(schedule.get('departure_date')),
+        'departure_time': schedule.get('departure_time'),
+        'arrival_time': schedule.get('arrival_time'),
+
+        'bus_id': str(bus_ref) if bus_ref else (str(bus['_id']) if bus.get('_id') else None),
+        'bus_number': schedule.get('bus_number') or bus.get('bus_number'),
+        'bus_type': schedule.get('bus_type') or bus.get('type'),
+        'plate_number': schedule.get('plate_number') or bus.get('plate_number'),
+        'bus_name': bus.get('bus_name') or bus.get('name'),
+        'bus_status': bus.get('status', 'active'),
+        'bus_is_active': bus.get('is_active', bus.get('isActive', True)),
+        'bus_capacity': bus.get('capacity', total_seats),
+        'bus_amenities': bus.get('amenities', []),
+
+        'fare_birr': schedule.get('fare_birr', schedule.get('fareBirr')),
+        'total_seats': total_seats,
+        'booked_seats': booked_seats,
+        'available_seats': total_seats - booked_seats,
+
+        'status': schedule.get('status', 'scheduled'),
+        'amenities': schedule.get('amenities', []),
+        'boarding_points': schedule.get('boarding_points'),
+        'dropping_points': schedule.get('dropping_points'),
+        'driver_id': schedule.get('driver_id'),
+        'driver_name': schedule.get('driver_name'),
+        'synced_at': datetime.utcnow()
+    }
+
+def ensure_schedule_search_indexes():
+    """Create the route/date and departure-order indexes; returns their names"""
+    collection = mongo.db.schedule_search
+    return [
+        collection.create_index(
+            [('origin_city', 1), ('destination_city', 1), ('departure_date', 1)],
+            name=ROUTE_DATE_INDEX
+        ),
+        collection.create_index([('departure_date', 1), ('departure_time', 1)], name='departure_order')
+    ]
+
+def sync_schedule(schedule_id):
+    """Rebuild (or remove) the read model document for one schedule"""
+    try:
+        db = mongo.db
+        key = str(schedule_id)
+        schedule = db.busschedules.find_one({'_id': {'$in': _id_values(key)}})
+        if not schedule:
+            db.schedule_search.delete_one({'_id': key})
+            return None
+
+        booked = booked_seat_counts([key], OCCUPIED_BOOKING_STATUSES).get(key, 0)
+        document = build_search_document(schedule, _find_route(db, schedule), _find_bus(db, schedule), booked)
+        db.schedule_search.replace_one({'_id': key}, document, upsert=True)
+        return document
+    except Exception as e:
+        logger.warning("⚠️ Failed to sync schedule_search for %s: %s", schedule_id, e)
+        return None
+
+def refresh_seat_counts(schedule_id):
+    """Recount booked seats for a schedule after one of its bookings changed"""
+    try:
+        if not schedule_id:
+            return
+        key = str(schedule_id)
+        booked = booked_seat_counts([key], OCCUPIED_BOOKING_STATUSES).get(key, 0)
+        result = mongo.db.schedule_search.update_one({'_id': key}, [
+            {'$set': {
+                'booked_seats': booked,
+                'available_seats': {'$subtract': ['$total_seats', booked]},
+                'synced_at': datetime.utcnow()
+            }}
+        ])
+        if result.matched_count == 0:
+            sync_schedule(key)
+    except Exception as e:
+        logger.warning("⚠️ Failed to refresh schedule_search seats for %s: %s", schedule_id, e)
+
+def sync_route(route_id):
+    """Rebuild the read model documents of every departure on a route; returns documents written"""
+    try:
+        db = mongo.db
+        route = db.routes.find_one({'_id': {'$in': _id_values(route_id)}})
+        if not route:
+            return 0
+        schedules = list(db.busschedules.find({'route_id': {'$in': _id_values(route['_id'])}}))
+        if not schedules:
+            return 0
+
+        counts = booked_seat_counts([schedule['_id'] for schedule in schedules], OCCUPIED_BOOKING_STATUSES)
+        buses = buses_by_ref(schedule.get('bus_id') or schedule.get('bus_number') for schedule in schedules)
+        operations = []
+        for schedule in schedules:
+            key = str(schedule['_id'])
+            bus = buses.get(str(schedule.get('bus_id') or schedule.get('bus_number')))
+            document = build_search_document(schedule, route, bus, counts.get(key, 0))
+            operations.append(ReplaceOne({'_id': key}, document, upsert=True))
+        db.schedule_search.bulk_write(operations, ordered=False)
+        return len(operations)
+    except Exception as e:
+        logger.warning("⚠️ Failed to sync schedule_search for route %s: %s", route_id, e)
+        return 0
+
+def sync_bus(bus_id):
+    """Copy a bus's current status/details onto every departure that uses it"""
+    try:
+        db = mongo.db
+        bus = db.buses.find_one({'_id': {'$in': _id_values(bus_id)}})
+        if not bus:
+            return
+        match = [{'bus_id': str(bus['_id'])}]
+        if bus.get('bus_number'):
+            match.append({'bus_number': bus['bus_number']})
+        db.schedule_search.update_many({'$or': match}, {'$set': {
+            'bus_name': bus.get('bus_name') or bus.get('name'),
+            'bus_status': bus.get('status', 'active'),
+            'bus_is_active': bus.get('is_active', bus.get('isActive', True)),
+            'bus_amenities': bus.get('amenities', []),
+            'synced_at': datetime.utcnow()
+        }})
+    except Exception as e:
+        logger.warning("⚠️ Failed to sync schedule_search for bus %s: %s", bus_id, e)
+
+def rebuild_schedule_search(batch_size=REBUILD_BATCH_SIZE):
+    """Backfill the whole read model from busschedules; returns documents written"""
+    db = mongo.db
+    routes = {}
+    for route in db.routes.find():
+        routes[str(route['_id'])] = route
+    buses = {}
+    for bus in db.buses.find():
+        buses[str(bus['_id'])] = bus
+        if bus.get('bus_number'):
+            buses.setdefault(bus['bus_number'], bus)
+
+    written = 0
+    seen = set()
+    batch = []
+
+    def flush():
+        nonlocal written
+        counts = booked_seat_counts([schedule['_id'] for schedule in batch], OCCUPIED_BOOKING_STATUSES)
+        operations = []
+        for schedule in batch:
+            key = str(schedule['_id'])
+            route = routes.get(str(schedule.get('route_id')))
+            bus = buses.get(str(schedule.get('bus_id') or schedule.get('bus_number')))
+            document = build_search_document(schedule, route, bus, counts.get(key, 0))
+            operations.append(ReplaceOne({'_id': key}, document, upsert=True))
+        db.schedule_search.bulk_write(operations, ordered=False)
+        written += len(operations)
+        batch.clear()
+
+    for schedule in db.busschedules.find():
+        seen.add(str(schedule['_id']))
+        batch.append(schedule)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    # Drop documents whose schedule no longer exists
+    stale = [doc['_id'] for doc in db.schedule_search.find({}, {'_id': 1}) if doc['_id'] not in seen]
+    if stale:
+        db.schedule_search.delete_many({'_id': {'$in': stale}})
+
+    logger.info("✅ schedule_search rebuilt: %s schedules, %s stale removed", written, len(stale))
+    return written
+
+def occupancy_by_day(start=None, end=None):
+    """
+    {departure_date: {'booked_seats', 'total_seats'}} summed over departures,
+    booked seats capped at each departure's capacity; all dates when start/end are None
+    """
+    match = {'departure_date': day_span(start, end)} if start is not None and end is not None else {}
+    rows = mongo.db.schedule_search.aggregate([
+        {'$match': match},
+        {'$group': {
+            '_id': '$departure_date',
+            'booked_seats': {'$sum': {'$min': ['$booked_seats', '$total_seats']}},
+            'total_seats': {'$sum': '$total_seats'}
+        }}
+    ])
+    return {row.pop('_id'): row for row in rows}
+
+def seat_occupancy_rate(start=None, end=None):
+    """Booked seats as a percentage of capacity over the departures in range"""
+    days = occupancy_by_day(start, end).values()
+    total_seats = sum(row['total_seats'] for row in days)
+    booked_seats = sum(row['booked_seats'] for row in days)
+    return round(booked_seats / total_seats * 100, 1) if total_seats > 0 else 0
+
+def ensure_schedule_search():
+    """Startup hook: indexes, plus a backfill when the read model is still empty"""
+    index_names = ensure_schedule_search_indexes()
+    db = mongo.db
+    if db.schedule_search.estimated_document_count() == 0 and db.busschedules.estimated_document_count() > 0:
+        rebuild_schedule_search()
+    return index_names
+
+if __name__ == '__main__':
+    from app import create_app
+
+    with create_app().app_context():
+        ensure_schedule_search_indexes()
+        rebuild_schedule_search()
@@ -0,0 +1,184 @@
+"""
+Canonical Field Types
+One stored type per reference/date field in bookings, busschedules, payments
+and seat_locks, plus the helpers routes use to build queries against them.
+`python -m app.migrate` rewrites older documents to these types; once it has
+run, a query needs one equality on the canonical form instead of an $or over
+str/ObjectId or string/datetime variants.
+"""
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app import mongo
+
+# Field kinds
+STR_ID = 'str_id'          # ObjectId reference stored as its 24-char hex string
+OBJECT_ID = 'object_id'    # ObjectId reference stored as ObjectId
+DAY = 'day'                # calendar date stored as 'YYYY-MM-DD'
+
+# collection -> {field: kind}
+CANONICAL_FIELDS = {
+    'bookings': {
+        'schedule_id': STR_ID,
+        'user_id': OBJECT_ID,
+        'travel_date': DAY
+    },
+    'busschedules': {
+        'route_id': STR_ID,
+        'bus_id': STR_ID,
+        'departure_date': DAY
+    },
+    'payments': {
+        'schedule_id': STR_ID,
+        'user_id': OBJECT_ID,
+        'booking_id': STR_ID
+    },
+    'seat_locks': {
+        'schedule_id': STR_ID,
+        'user_id': STR_ID
+    }
+}
+
+# collection -> {legacy camelCase field: canonical field}
+FIELD_ALIASES = {
+    'bookings': {
+        'scheduleId': 'schedule_id',
+        'userId': 'user_id',
+        'travelDate': 'travel_date'
+    },
+    'busschedules': {
+        'routeId': 'route_id',
+        'busId': 'bus_id',
+        'departureDate': 'departure_date'
+    },
+    'payments': {
+        'scheduleId': 'schedule_id',
+        'userId': 'user_id',
+        'bookingId': 'booking_id'
+    },
+    'seat_locks': {}
+}
+
+# Progress/completion documents written by app.migrate
+MIGRATIONS_COLLECTION = 'schema_migrations'
+MIGRATION_NAME = 'canonical_fields_v1'
+
+# ------------------------------------------------------------------ converters
+
+def str_id(value):
+    """Reference as a hex string (None stays None)"""
+    if value is None or value == '':
+        return None
+    return str(value)
+
+def object_id(value):
+    """Reference as an ObjectId when it is one; other values are returned unchanged"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, ObjectId):
+        return value
+    text = str(value)
+    return ObjectId(text) if ObjectId.is_valid(text) else value
+
+def day(value):
+    """Calendar date as 'YYYY-MM-DD' from a datetime/date, ISO, GMT or plain string"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    text = str(value).strip()
+    if 'GMT' in text:
+        return datetime.strptime(text, '%a, %d %b %Y %H:%M:%S GMT').strftime('%Y-%m-%d')
+    if 'T' in text:
+        return text.split('T')[0]
+    return text.split(' ')[0]
+
+CONVERTERS = {
+    STR_ID: str_id,
+    OBJECT_ID: object_id,
+    DAY: day
+}
+
+def canonical_value(collection, field, value):
+    """Convert one value to the canonical type of collection.field"""
+    kind = CANONICAL_FIELDS.get(collection, {}).get(field)
+    return CONVERTERS[kind](value) if kind else value
+
+def canonical_document(collection, document):
+    """
+    Bring a document about to be written to its canonical form, in place
+    Known fields are converted and camelCase aliases folded into their
+    snake_case field; the same dict is returned so insert_one can still set _id.
+    """
+    for alias, field in FIELD_ALIASES.get(collection, {}).items():
+        if alias in document:
+            value = document.pop(alias)
+            if document.get(field) is None:
+                document[field] = value
+    for field in CANONICAL_FIELDS.get(collection, {}):
+        if document.get(field) is not None:
+            document[field] = canonical_value(collection, field, document[field])
+    return document
+
+def canonical_changes(collection, document, drop_aliases=False):
+    """
+    ($set, $unset) that bring a stored document to its canonical form
+    Aliases are unset only when drop_aliases is True.
+    """
+    to_set, to_unset = {}, {}
+    for alias, field in FIELD_ALIASES.get(collection, {}).items():
+        if alias in document:
+            if document.get(field) is None and document[alias] is not None:
+                to_set[field] = canonical_value(collection, field, document[alias])
+            if drop_aliases:
+                to_unset[alias] = ''
+    for field in CANONICAL_FIELDS.get(collection, {}):
+        value = document.get(field)
+        if value is None or field in to_set:
+            continue
+        converted = canonical_value(collection, field, value)
+        if converted != value or type(converted) is not type(value):
+            to_set[field] = converted
+    return to_set, to_unset
+
+# --------------------------------------------------------------- query helpers
+
+def schedule_ref(schedule_id):
+    """schedule_id as stored in bookings, payments and seat_locks"""
+    return str_id(schedule_id)
+
+def user_ref(user_id):
+    """user_id as stored in bookings and payments"""
+    return object_id(user_id)
+
+def day_range(start, days=1):
+    """{'$gte', '$lt'} over canonical day strings covering `days` days from start"""
+    if isinstance(start, str):
+        start = datetime.strptime(day(start), '%Y-%m-%d')
+    start = datetime(start.year, start.month, start.day)
+    return {'$gte': day(start), '$lt': day(start + timedelta(days=days))}
+
+def day_span(start, end):
+    """
+    Canonical day-string condition for departures in [start, end)
+    An end at midnight is exclusive; an end later in a day includes that day.
+    """
+    condition = {'$gte': day(start)}
+    if isinstance(end, datetime) and end.time() != datetime.min.time():
+        condition['$lte'] = day(end)
+    else:
+        condition['$lt'] = day(end)
+    return condition
+
+def migration_status():
+    """Per-collection checkpoint documents of the canonical field migration"""
+    return {
+        doc['collection']: doc
+        for doc in mongo.db[MIGRATIONS_COLLECTION].find({'migration': MIGRATION_NAME})
+    }
+
+def pending_collections():
+    """Collections the canonical field migration has not completed yet"""
+    status = migration_status()
+    return [name for name in CANONICAL_FIELDS if not status.get(name, {}).get('completed')]
@@ -0,0 +1,139 @@
+"""
+Seat Broadcast Coalescer
+Seat changes (locks, unlocks, bookings) for a schedule room are buffered for
+window_ms and sent as one seat_delta event per window instead of one
+broadcast per click:
+    {'schedule_id', 'seq', 'timestamp', 'changes',
+     'booked': [seats], 'unlocked': [seats],
+     'locked': [{'user_id', 'seat_numbers'}]}
+Within a window the last change to a seat wins, except that a booked seat
+stays booked and a seat locked in the window is only unlocked by its owner. Each delta is one numbered seat event (app.utils.seat_events),
+so gap detection and replay work as for single events. With window_ms=0
+every change is broadcast on its own as seats_locked / seats_unlocked /
+seats_booked, as before coalescing existed.
+"""
+import logging
+import threading
+import time
+from app import socketio
+from app.utils.seat_events import record_seat_event
+from app.utils.seat_set import SeatSet
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_MS = 50
+
+class SeatBroadcastCoalescer:
+    """Per-room seat change buffer flushed by one background task per process"""
+
+    def __init__(self, window_ms=DEFAULT_WINDOW_MS):
+        self.window_ms = window_ms
+        self._app = None
+        self._pending = {}  # schedule_id -> (flush_at, {seat: (state, user_id)}, changes)
+        self._guard = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+        self.stats = {'changes': 0, 'broadcasts': 0}
+
+    def configure(self, app, window_ms=DEFAULT_WINDOW_MS):
+        self._app = app
+        self.window_ms = window_ms
+
+    # ----------------------------------------------------------------- changes
+
+    def seats_locked(self, schedule_id, seat_numbers, user_id):
+        self._add(schedule_id, 'locked', seat_numbers, user_id)
+
+    def seats_unlocked(self, schedule_id, seat_numbers, user_id=None):
+        self._add(schedule_id, 'unlocked', seat_numbers, user_id)
+
+    def seats_booked(self, schedule_id, seat_numbers):
+        self._add(schedule_id, 'booked', seat_numbers)
+
+    def _add(self, schedule_id, state, seat_numbers, user_id=None):
+        schedule_id = str(schedule_id)
+        seat_numbers = SeatSet.parse(seat_numbers)[0].to_list()
+        if not seat_numbers:
+            return
+        self.stats['changes'] += 1
+        if self.window_ms <= 0:
+            self._emit_single(schedule_id, state, seat_numbers, user_id)
+            return
+
+        with self._guard:
+            flush_at, seats, changes = self._pending.get(schedule_id) or (
+                time.monotonic() + self.window_ms / 1000.0, {}, 0
+            )
+            for seat in seat_numbers:
+                pending_state, pending_user = seats.get(seat, (None, None))
+                if pending_state == 'booked':
+                    continue
+                if (state == 'unlocked' and pending_state == 'locked' and user_id is not None
+                        and str(pending_user) != str(user_id)):
+                    continue
+                seats[seat] = (state, user_id)
+            self._pending[schedule_id] = (flush_at, seats, changes + 1)
+        self._ensure_worker()
+        self._wake.set()
+
+    # ---------------------------------------------------------------- emitting
+
+    def _emit_single(self, schedule_id, state, seat_numbers, user_id):
+        event = f"seats_{state}"
+        payload = {'seat_numbers': seat_numbers}
+        if state != 'booked':
+            payload['user_id'] = user_id
+        socketio.emit(event, record_seat_event(schedule_id, event, payload), room=schedule_id)
+        self.stats['broadcasts'] += 1
+
+    def _emit_delta(self, schedule_id, seats, changes):
+        locked = {}
+        for seat, (state, user_id) in seats.items():
+            if state == 'locked':
+                locked.setdefault(user_id, []).append(seat)
+        delta = {
+            'booked': sorted(seat for seat, (state, _user) in seats.items() if state == 'booked'),
+            'locked': [{'user_id': user_id, 'seat_numbers': sorted(seat_list)}
+                       for user_id, seat_list in locked.items()],
+            'unlocked': sorted(seat for seat, (state, _user) in seats.items() if state == 'unlocked'),
+            'changes': changes
+        }
+        socketio.emit('seat_delta', record_seat_event(schedule_id, 'seat_delta', delta), room=schedule_id)
+        self.stats['broadcasts'] += 1
+
+    def flush(self, force=False):
+        """Send every delta whose window has closed (or all of them); returns seconds to the next one"""
+        now = time.monotonic()
+        with self._guard:
+            due = [schedule_id for schedule_id, (flush_at, _seats, _changes) in self._pending.items()
+                   if force or flush_at <= now]
+            batches = [(schedule_id, self._pending.pop(schedule_id)) for schedule_id in due]
+            next_at = min((entry[0] for entry in self._pending.values()), default=None)
+        for schedule_id, (_flush_at, seats, changes) in batches:
+            try:
+                self._emit_delta(schedule_id, seats, changes)
+            except Exception as e:
+                logger.error("❌ Error broadcasting seat delta for %s: %s", schedule_id, e)
+        return None if next_at is None else max(0.0, next_at - time.monotonic())
+
+    def _run(self):
+        with self._app.app_context():
+            while True:
+                try:
+                    wait = self.flush()
+                except Exception as e:
+                    logger.error("⚠️ Seat broadcast coalescer error: %s", e, exc_info=True)
+                    wait = self.window_ms / 1000.0
+                self._wake.wait(wait)
+                self._wake.clear()
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._guard:
+            if self._worker is None:
+                # A Socket.IO background task, so it is a green thread under eventlet/gevent
+                self._worker = socketio.start_background_task(self._run)
+
+# Shared instance configured by create_app() and used by the socket handlers
+seat_broadcaster = SeatBroadcastCoalescer()
@@ -0,0 +1,80 @@
+"""
+Seat Events
+Sequence numbers for the seat events broadcast to a schedule's room
+(seats_locked, seats_unlocked, seats_booked). Each schedule has one document
+in `seat_events` holding its latest sequence number and its last
+RECENT_EVENTS events; recording an event increments the number and appends
+the event in the same update, so the numbers are gapless and shared by
+every worker. A client that sees a gap asks for the events after the last
+number it applied (replay_seat_events) instead of a full seat snapshot.
+Snapshots (seat_status_update) carry the sequence number they are current to.
+"""
+from datetime import datetime
+from pymongo import ReturnDocument
+from app import mongo
+
+SEAT_EVENTS_COLLECTION = 'seat_events'
+
+# Events kept per schedule for replay; older gaps get a full snapshot
+RECENT_EVENTS = 200
+
+# Days a schedule's event log is kept after its last event (TTL on updated_at)
+RETENTION_DAYS = 2
+
+def ensure_seat_event_indexes():
+    return [
+        mongo.db[SEAT_EVENTS_COLLECTION].create_index(
+            [('updated_at', 1)], name='updated_ttl', expireAfterSeconds=RETENTION_DAYS * 86400
+        )
+    ]
+
+def server_time():
+    """The timestamp sent with seat events (this server's UTC clock, ISO 8601)"""
+    return datetime.utcnow().isoformat() + 'Z'
+
+def record_seat_event(schedule_id, event, payload):
+    """
+    Number a seat event and keep it for replay
+    Returns the payload to broadcast: payload plus schedule_id, seq and timestamp.
+    """
+    schedule_id = str(schedule_id)
+    entry = {'event': event, 'schedule_id': schedule_id, **payload, 'timestamp': server_time()}
+    document = mongo.db[SEAT_EVENTS_COLLECTION].find_one_and_update(
+        {'_id': schedule_id},
+        {
+            '$inc': {'seq': 1},
+            # One event per update, so the last entry is the one numbered seq
+            '$push': {'events': {'$each': [entry], '$slice': -RECENT_EVENTS}},
+            '$set': {'updated_at': datetime.utcnow()}
+        },
+        projection={'seq': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    entry['seq'] = document['seq']
+    entry.pop('event')
+    return entry
+
+def current_seq(schedule_id):
+    """The number of the schedule's latest seat event (0 before the first)"""
+    document = mongo.db[SEAT_EVENTS_COLLECTION].find_one({'_id': str(schedule_id)}, {'seq': 1})
+    return document.get('seq', 0) if document else 0
+
+def events_since(schedule_id, since_seq):
+    """
+    The schedule's events numbered after since_seq, oldest first, plus the latest number
+    Returns (None, seq) when some of them are no longer kept (or since_seq is
+    ahead of the log), in which case the client needs a full snapshot.
+    """
+    document = mongo.db[SEAT_EVENTS_COLLECTION].find_one({'_id': str(schedule_id)})
+    if not document:
+        return ([], 0) if since_seq == 0 else (None, 0)
+    seq = document.get('seq', 0)
+    kept = document.get('events', [])
+    first_kept = seq - len(kept) + 1
+    if since_seq > seq or since_seq + 1 < first_kept:
+        return None, seq
+    events = []
+    for offset, entry in enumerate(kept[since_seq + 1 - first_kept:]):
+        events.append({**entry, 'seq': since_seq + 1 + offset})
+    return events, seq
@@ -1,84 +1,207 @@
 """
 Seat Locking Utility
 Handles temporary seat reservations with automatic expiration
+Expired locks are removed by a TTL index on expires_at, so reads never write
 """
+import logging
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from app import mongo
+from app.utils.seat_map_cache import seat_map_cache
+from app.utils.seat_set import SeatSet
+
+logger = logging.getLogger(__name__)
 
 # Lock duration in minutes
 LOCK_DURATION_MINUTES = 10
 
+# MongoDB error code raised when the unique seat index rejects a claim
+DUPLICATE_KEY_ERROR = 11000
+
+def _ensure_unique_seat_index(db):
+    """
+    Create the unique (schedule_id, seat_number) index that makes a seat claim atomic.
+    A plain index with the same keys (see DEPLOYMENT_GUIDE.md) is replaced, and
+    duplicate lock rows left behind by the old per-user upsert are purged first.
+    """
+    keys = [('schedule_id', 1), ('seat_number', 1)]
+    
+    for name, spec in db.seat_locks.index_information().items():
+        if spec.get('key') == keys:
+            if spec.get('unique'):
+                return name
+            db.seat_locks.drop_index(name)
+            logger.info("🔁 Dropped non-unique seat lock index: %s", name)
+    
+    # Keep the newest row per seat so the unique index can be built
+    duplicates = db.seat_locks.aggregate([
+        {'$sort': {'locked_at': -1}},
+        {'$group': {
+            '_id': {'schedule_id': '$schedule_id', 'seat_number': '$seat_number'},
+            'ids': {'$push': '$_id'},
+            'count': {'$sum': 1}
+        }},
+        {'$match': {'count': {'$gt': 1}}}
+    ])
+    stale_ids = []
+    for group in duplicates:
+        stale_ids.extend(group['ids'][1:])
+    if stale_ids:
+        db.seat_locks.delete_many({'_id': {'$in': stale_ids}})
+        logger.info("🧹 Removed %s duplicate seat lock rows", len(stale_ids))
+    
+    return db.seat_locks.create_index(keys, unique=True, name='schedule_seat_unique')
+
+def _ensure_expiry_ttl_index(db):
+    """
+    Create the TTL index that lets MongoDB delete locks once expires_at passes.
+    A plain expires_at index is dropped and rebuilt as TTL; a TTL index with a
+    different delay is switched to expire-at-the-stored-time with collMod.
+    """
+    keys = [('expires_at', 1)]
+    
+    for name, spec in db.seat_locks.index_information().items():
+        if spec.get('key') != keys:
+            continue
+        ttl = spec.get('expireAfterSeconds')
+        if ttl == 0:
+            return name
+        if ttl is None:
+            db.seat_locks.drop_index(name)
+            logger.info("🔁 Dropped non-TTL seat lock index: %s", name)
+            break
+        db.command('collMod', 'seat_locks', index={'name': name, 'expireAfterSeconds': 0})
+        logger.info("🔁 Seat lock TTL index %s changed from %ss to 0s", name, ttl)
+        return name
+    
+    return db.seat_locks.create_index(keys, expireAfterSeconds=0, name='expires_at_ttl')
+
+def ensure_seat_lock_indexes():
+    """
+    Startup index bootstrapper for the seat_locks collection
+    Creates the unique seat claim index and the expiry TTL index, then checks
+    both are in place. Raises RuntimeError if either is missing afterwards.
+    Returns: dict of index role -> index name
+    """
+    db = mongo.db
+    names = {
+        'unique_seat': _ensure_unique_seat_index(db),
+        'expiry_ttl': _ensure_expiry_ttl_index(db)
+    }
+    
+    indexes = db.seat_locks.index_information()
+    unique_ok = indexes.get(names['unique_seat'], {}).get('unique', False)
+    ttl_ok = indexes.get(names['expiry_ttl'], {}).get('expireAfterSeconds') == 0
+    if not (unique_ok and ttl_ok):
+        raise RuntimeError(f"seat_locks indexes not in place: {names}")
+    
+    return names
+
+def _claim_operation(schedule_id, seat_number, user_id, claim_id, now, expires_at):
+    """
+    Build the upsert that claims one seat.
+    The filter only matches a row this user already holds or an expired row, so a
+    live lock held by someone else makes the upsert insert a duplicate and fail
+    with E11000 instead of overwriting it.
+    """
+    return UpdateOne(
+        {
+            'schedule_id': schedule_id,
+            'seat_number': seat_number,
+            '$or': [
+                {'user_id': user_id, 'status': 'locked'},
+                {'expires_at': {'$lte': now}}
+            ]
+        },
+        [
+            {'$set': {
+                # Refreshing our own lock keeps its original claim id so a failed
+                # call only rolls back the seats it newly acquired
+                'claim_id': {'$cond': [
+                    {'$and': [
+                        {'$eq': ['$user_id', {'$literal': user_id}]},
+                        {'$eq': ['$status', 'locked']}
+                    ]},
+                    '$claim_id',
+                    claim_id
+                ]},
+                'schedule_id': {'$literal': schedule_id},
+                'seat_number': seat_number,
+                'user_id': {'$literal': user_id},
+                'locked_at': now,
+                'expires_at': expires_at,
+                'status': 'locked'
+            }}
+        ],
+        upsert=True
+    )
+
 def lock_seats(schedule_id, seat_numbers, user_id):
     """
     Lock seats for a user temporarily
+    All seats are claimed in one unordered bulk write against the unique
+    (schedule_id, seat_number) index; if any seat is taken the seats newly
+    claimed by this call are released again, so the claim is all-or-nothing.
     Returns: (success, message, locked_seats)
     """
     try:
         db = mongo.db
         now = datetime.utcnow()
         expires_at = now + timedelta(minutes=LOCK_DURATION_MINUTES)
+        requested, invalid = SeatSet.parse(seat_numbers)
         
-        # First, clean up expired locks for this schedule
-        cleanup_expired_locks(schedule_id)
+        if invalid:
+            return False, f"Invalid seat numbers: {', '.join(map(str, invalid))}", []
+        if not requested:
+            return False, "No seats requested", []
+        seat_numbers = requested.to_list()
         
-        # Check if any seats are already locked or booked
-        locked_seats = []
-        unavailable_seats = []
-        
-        for seat_number in seat_numbers:
-            # Check if seat is already booked
-            existing_booking = db.bookings.find_one({
+        # Seats already sold cannot be locked
+        booked = SeatSet()
+        for booking in db.bookings.find(
+            {
                 'schedule_id': schedule_id,
-                'seat_numbers': seat_number,
+                'seat_numbers': {'$in': seat_numbers},
                 'status': {'$in': ['confirmed', 'checked_in', 'completed']}
-            })
-            
-            if existing_booking:
-                unavailable_seats.append(seat_number)
-                continue
-            
-            # Check if seat is locked by another user
-            existing_lock = db.seat_locks.find_one({
-                'schedule_id': schedule_id,
-                'seat_number': seat_number,
-                'user_id': {'$ne': user_id},
-                'expires_at': {'$gt': now},
-                'status': 'locked'
-            })
-            
-            if existing_lock:
-                unavailable_seats.append(seat_number)
-                continue
-            
-            # Lock the seat
-            db.seat_locks.update_one(
-                {
-                    'schedule_id': schedule_id,
-                    'seat_number': seat_number,
-                    'user_id': user_id
-                },
-                {
-                    '$set': {
-                        'schedule_id': schedule_id,
-                        'seat_number': seat_number,
-                        'user_id': user_id,
-                        'locked_at': now,
-                        'expires_at': expires_at,
-                        'status': 'locked'
-                    }
-                },
-                upsert=True
-            )
-            locked_seats.append(seat_number)
+            },
+            {'seat_numbers': 1}
+        ):
+            booked |= SeatSet.parse(booking.get('seat_numbers'))[0]
+        unavailable_seats = (requested & booked).to_list()
         
         if unavailable_seats:
-            return False, f"Seats {', '.join(map(str, unavailable_seats))} are no longer available", locked_seats
+            return False, f"Seats {', '.join(map(str, unavailable_seats))} are no longer available", []
         
-        return True, f"Seats locked successfully until {expires_at.strftime('%H:%M:%S')}", locked_seats
+        claim_id = ObjectId()
+        operations = [
+            _claim_operation(schedule_id, seat_number, user_id, claim_id, now, expires_at)
+            for seat_number in seat_numbers
+        ]
+        
+        try:
+            db.seat_locks.bulk_write(operations, ordered=False)
+        except BulkWriteError as bwe:
+            write_errors = bwe.details.get('writeErrors', [])
+            if any(error.get('code') != DUPLICATE_KEY_ERROR for error in write_errors):
+                raise
+            unavailable_seats = sorted(seat_numbers[error['index']] for error in write_errors)
+        
+        if unavailable_seats:
+            # Roll back the part of the claim that did succeed
+            db.seat_locks.delete_many({
+                'schedule_id': schedule_id,
+                'user_id': user_id,
+                'claim_id': claim_id
+            })
+            return False, f"Seats {', '.join(map(str, unavailable_seats))} are no longer available", []
+        
+        seat_map_cache.mark_locked(schedule_id, seat_numbers, user_id, expires_at)
+        return True, f"Seats locked successfully until {expires_at.strftime('%H:%M:%S')}", seat_numbers
         
     except Exception as e:
-        print(f"❌ Error locking seats: {e}")
+        logger.error("❌ Error locking seats: %s", e)
         return False, str(e), []
 
 def unlock_seats(schedule_id, seat_numbers, user_id):
@@ -87,14 +210,16 @@ def unlock_seats(schedule_id, seat_numbers, user_id):
     """
     try:
         db = mongo.db
+        seat_numbers = SeatSet.parse(seat_numbers)[0].to_list()
         result = db.seat_locks.delete_many({
             'schedule_id': schedule_id,
             'seat_number': {'$in': seat_numbers},
             'user_id': user_id
         })
+        seat_map_cache.mark_unlocked(schedule_id, seat_numbers, user_id)
         return True, f"Unlocked {result.deleted_count} seats"
     except Exception as e:
-        print(f"❌ Error unlocking seats: {e}")
+        logger.error("❌ Error unlocking seats: %s", e)
         return False, str(e)
 
 def confirm_seat_locks(schedule_id, seat_numbers, user_id):
@@ -103,6 +228,7 @@ def confirm_seat_locks(schedule_id, seat_numbers, user_id):
     """
     try:
         db = mongo.db
+        seat_numbers = SeatSet.parse(seat_numbers)[0].to_list()
         result = db.seat_locks.update_many(
             {
                 'schedule_id': schedule_id,
@@ -117,14 +243,19 @@ def confirm_seat_locks(schedule_id, seat_numbers, user_id):
                 }
             }
         )
+        # Confirmed locks no longer count as locked; the booking now holds the seats
+        seat_map_cache.mark_unlocked(schedule_id, seat_numbers, user_id)
         return True, f"Confirmed {result.modified_count} seat locks"
     except Exception as e:
-        print(f"❌ Error confirming seat locks: {e}")
+        logger.error("❌ Error confirming seat locks: %s", e)
         return False, str(e)
 
 def cleanup_expired_locks(schedule_id=None):
     """
-    Remove expired seat locks
+    Remove expired seat locks immediately
+    Expiry is normally handled by the TTL index on expires_at (the TTL monitor
+    runs about once a minute); this is only for scripts and tests that need
+    the rows gone right away. Nothing on the request path calls it.
     """
     try:
         db = mongo.db
@@ -141,36 +272,34 @@ def cleanup_expired_locks(schedule_id=None):
         result = db.seat_locks.delete_many(query)
         
         if result.deleted_count > 0:
-            print(f"🧹 Cleaned up {result.deleted_count} expired seat locks")
+            logger.debug("🧹 Cleaned up %s expired seat locks", result.deleted_count)
         
         return result.deleted_count
     except Exception as e:
-        print(f"❌ Error cleaning up expired locks: {e}")
+        logger.error("❌ Error cleaning up expired locks: %s", e)
         return 0
 
 def get_locked_seats(schedule_id):
     """
     Get all currently locked seats for a schedule
+    Read-only: expired rows the TTL monitor has not removed yet are filtered out
     Returns list of seat numbers
     """
     try:
         db = mongo.db
         now = datetime.utcnow()
         
-        # Clean up expired locks first
-        cleanup_expired_locks(schedule_id)
-        
         # Get active locks
         locks = db.seat_locks.find({
             'schedule_id': schedule_id,
             'expires_at': {'$gt': now},
             'status': 'locked'
-        })
+        }, {'seat_number': 1})
         
         locked_seats = [lock['seat_number'] for lock in locks]
         return locked_seats
     except Exception as e:
-        print(f"❌ Error getting locked seats: {e}")
+        logger.error("❌ Error getting locked seats: %s", e)
         return []
 
 def get_user_locked_seats(schedule_id, user_id):
@@ -190,7 +319,26 @@ def get_user_locked_seats(schedule_id, user_id):
         
         return [lock['seat_number'] for lock in locks]
     except Exception as e:
-        print(f"❌ Error getting user locked seats: {e}")
+        logger.error("❌ Error getting user locked seats: %s", e)
+        return []
+
+def get_seats_locked_by_others(schedule_id, seat_numbers, user_id):
+    """
+    Of seat_numbers, the seats currently locked by someone other than user_id
+    One read instead of get_locked_seats() plus get_user_locked_seats()
+    """
+    try:
+        db = mongo.db
+        locks = db.seat_locks.find({
+            'schedule_id': schedule_id,
+            'seat_number': {'$in': SeatSet.parse(seat_numbers)[0].to_list()},
+            'user_id': {'$ne': user_id},
+            'expires_at': {'$gt': datetime.utcnow()},
+            'status': 'locked'
+        }, {'seat_number': 1})
+        return sorted(lock['seat_number'] for lock in locks)
+    except Exception as e:
+        logger.error("❌ Error getting seats locked by others: %s", e)
         return []
 
 def extend_lock(schedule_id, seat_numbers, user_id, additional_minutes=5):
@@ -199,6 +347,7 @@ def extend_lock(schedule_id, seat_numbers, user_id, additional_minutes=5):
     """
     try:
         db = mongo.db
+        seat_numbers = SeatSet.parse(seat_numbers)[0].to_list()
         now = datetime.utcnow()
         new_expires_at = now + timedelta(minutes=additional_minutes)
         
@@ -216,7 +365,8 @@ def extend_lock(schedule_id, seat_numbers, user_id, additional_minutes=5):
             }
         )
         
+        seat_map_cache.invalidate(schedule_id)
         return True, f"Extended lock for {result.modified_count} seats"
     except Exception as e:
-        print(f"❌ Error extending lock: {e}")
+        logger.error("❌ Error extending lock: %s", e)
         return False, str(e)
@@ -0,0 +1,297 @@
+"""
+Seat Map Cache
+In-process, per-schedule cache of booked and locked seats
+Booked seats are kept as a SeatSet bitmask (bit n set = seat n taken); locks keep
+their owner and expiry so expired locks drop out on read without a write.
+Entries are patched in place by the booking, cancellation and seat lock code
+in this process, and invalidated by a MongoDB change stream when one is
+available (replica sets / Atlas) so writes from other workers are picked up.
+Every change bumps the schedule's version, and a map loaded while its version
+moved is not cached, since the change may have landed after it was read.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from pymongo.errors import PyMongoError
+from app import mongo
+from app.logging import PER_ITEM
+from app.utils.seat_set import SeatSet
+
+logger = logging.getLogger(__name__)
+
+# Booking statuses that hold a seat
+OCCUPIED_BOOKING_STATUSES = ['pending', 'confirmed', 'checked_in', 'completed']
+
+# Default seconds before an entry is reloaded even without an invalidation
+DEFAULT_MAX_AGE_SECONDS = 30
+
+# Loads tried on a miss before a schedule that keeps changing is served uncached
+LOAD_ATTEMPTS = 2
+
+def _schedule_key(schedule_id):
+    """Cache key for a schedule id stored as str or ObjectId"""
+    return str(schedule_id)
+
+def _seat_set(seats):
+    """SeatSet from stored seat numbers, skipping anything that is not a seat number"""
+    seat_set, invalid = SeatSet.parse(seats)
+    if invalid:
+        logger.debug("⚠️ Ignoring invalid seat numbers in seat map: %r", invalid, extra=PER_ITEM)
+    return seat_set
+
+def _booking_seats(booking):
+    """Seats held by a booking document (seat_numbers, or legacy seat_number)"""
+    if booking.get('seat_numbers'):
+        return _seat_set(booking['seat_numbers'])
+    if booking.get('seat_number') is not None:
+        return _seat_set([booking['seat_number']])
+    return SeatSet()
+
+class SeatMap:
+    """Snapshot of one schedule's seat occupancy"""
+
+    def __init__(self, booked=None, locks=None, booking_count=0, loaded_at=None):
+        self.booked = booked or SeatSet()
+        self.locks = locks or {}  # seat -> (user_id, expires_at, lock_id)
+        self.booking_count = booking_count
+        self.loaded_at = loaded_at if loaded_at is not None else time.monotonic()
+
+    def copy(self):
+        return SeatMap(self.booked, dict(self.locks), self.booking_count, self.loaded_at)
+
+    def locked(self, now=None, user_id=None):
+        """SeatSet of live locks, optionally only those held by user_id"""
+        now = now or datetime.utcnow()
+        return SeatSet(
+            seat for seat, (owner, expires_at, _lock_id) in self.locks.items()
+            if expires_at > now and (user_id is None or owner == user_id)
+        )
+
+    def occupied_seats(self):
+        return self.booked.to_list()
+
+    def locked_seats(self, now=None):
+        return self.locked(now).to_list()
+
+    def user_locked_seats(self, user_id, now=None):
+        return self.locked(now, user_id).to_list()
+
+class SeatMapCache:
+    """
+    Thread-safe schedule_id -> SeatMap cache
+    With enabled=False every read goes to MongoDB (used for benchmarking).
+    """
+
+    def __init__(self, enabled=True, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        self.enabled = enabled
+        self.max_age_seconds = max_age_seconds
+        self._entries = {}
+        self._versions = {}  # schedule key -> changes seen, to detect one during a load
+        self._generation = 0  # bumped when everything is invalidated
+        self._lock_owners = {}  # seat_locks _id -> schedule key, for change stream deletes
+        self._guard = threading.Lock()
+        self._watcher = None
+
+    def configure(self, enabled=True, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        self.enabled = enabled
+        self.max_age_seconds = max_age_seconds
+        self.invalidate()
+
+    # ------------------------------------------------------------------ reads
+
+    def load(self, schedule_id):
+        """Build a SeatMap from MongoDB (one bookings query, one seat_locks query)"""
+        db = mongo.db
+        schedule_key = _schedule_key(schedule_id)
+
+        booked = SeatSet()
+        booking_count = 0
+        bookings = db.bookings.find(
+            {
+                'schedule_id': schedule_key,
+                'status': {'$in': OCCUPIED_BOOKING_STATUSES}
+            },
+            {'seat_numbers': 1, 'seat_number': 1}
+        )
+        for booking in bookings:
+            booking_count += 1
+            booked |= _booking_seats(booking)
+
+        locks = {}
+        active_locks = db.seat_locks.find(
+            {
+                'schedule_id': schedule_key,
+                'expires_at': {'$gt': datetime.utcnow()},
+                'status': 'locked'
+            },
+            {'seat_number': 1, 'user_id': 1, 'expires_at': 1}
+        )
+        for lock in active_locks:
+            for seat in _seat_set([lock.get('seat_number')]):
+                locks[seat] = (lock.get('user_id'), lock['expires_at'], lock['_id'])
+
+        return SeatMap(booked, locks, booking_count)
+
+    def get(self, schedule_id):
+        """SeatMap for a schedule, loading it on a miss or when too old"""
+        if not self.enabled:
+            return self.load(schedule_id)
+
+        key = _schedule_key(schedule_id)
+        for _attempt in range(LOAD_ATTEMPTS):
+            with self._guard:
+                entry = self._entries.get(key)
+                if entry and time.monotonic() - entry.loaded_at < self.max_age_seconds:
+                    return entry.copy()
+                version = self._version(key)
+
+            entry = self.load(schedule_id)
+            with self._guard:
+                # A change applied during the load may be missing from it
+                if self._version(key) != version:
+                    continue
+                self._forget_locks(self._entries.get(key))
+                self._entries[key] = entry
+                for _owner, _expires_at, lock_id in entry.locks.values():
+                    if lock_id is not None:
+                        self._lock_owners[lock_id] = key
+            return entry.copy()
+        # Still changing: serve the latest load without caching it
+        return entry.copy()
+
+    def _version(self, key):
+        """Changes seen for a schedule (guard held)"""
+        return self._generation, self._versions.get(key, 0)
+
+    def _bump(self, key):
+        """Record a change to a schedule, cached or not (guard held)"""
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _forget_locks(self, entry):
+        """Drop the lock id -> schedule mapping of an entry being replaced (guard held)"""
+        if entry:
+            for _owner, _expires_at, lock_id in entry.locks.values():
+                self._lock_owners.pop(lock_id, None)
+
+    # ----------------------------------------------------- incremental updates
+
+    def _update(self, schedule_id, apply):
+        """Apply a change to a cached entry; nothing to do if it is not cached"""
+        if not self.enabled:
+            return
+        key = _schedule_key(schedule_id)
+        with self._guard:
+            self._bump(key)
+            entry = self._entries.get(key)
+            if entry:
+                apply(entry)
+
+    def mark_booked(self, schedule_id, seats, bookings=1):
+        seat_set = _seat_set(seats)
+
+        def apply(entry):
+            entry.booked |= seat_set
+            entry.booking_count += bookings
+            for seat in seat_set:
+                entry.locks.pop(seat, None)
+        self._update(schedule_id, apply)
+
+    def mark_released(self, schedule_id, seats, bookings=1):
+        seat_set = _seat_set(seats)
+
+        def apply(entry):
+            entry.booked -= seat_set
+            entry.booking_count = max(0, entry.booking_count - bookings)
+        self._update(schedule_id, apply)
+
+    def mark_locked(self, schedule_id, seats, user_id, expires_at):
+        seat_set = _seat_set(seats)
+
+        def apply(entry):
+            for seat in seat_set:
+                entry.locks[seat] = (user_id, expires_at, None)
+        self._update(schedule_id, apply)
+
+    def mark_unlocked(self, schedule_id, seats, user_id):
+        seat_set = _seat_set(seats)
+
+        def apply(entry):
+            for seat in seat_set:
+                lock = entry.locks.get(seat)
+                if lock and lock[0] == user_id:
+                    del entry.locks[seat]
+        self._update(schedule_id, apply)
+
+    def booking_added(self, booking):
+        """Record a newly inserted booking document"""
+        if booking.get('status') in OCCUPIED_BOOKING_STATUSES and booking.get('schedule_id'):
+            self.mark_booked(booking['schedule_id'], _booking_seats(booking))
+
+    def booking_released(self, booking):
+        """Record that a booking document no longer holds its seats"""
+        if booking.get('schedule_id'):
+            self.mark_released(booking['schedule_id'], _booking_seats(booking))
+
+    def invalidate(self, schedule_id=None):
+        """Drop one schedule (or everything) so the next read reloads it"""
+        with self._guard:
+            if schedule_id is None:
+                self._generation += 1
+                self._versions.clear()
+                self._entries.clear()
+                self._lock_owners.clear()
+            else:
+                key = _schedule_key(schedule_id)
+                self._bump(key)
+                self._forget_locks(self._entries.pop(key, None))
+
+    # ----------------------------------------------------------- change stream
+
+    def _handle_change(self, change):
+        collection = change.get('ns', {}).get('coll')
+        operation = change.get('operationType')
+        document = change.get('fullDocument') or {}
+
+        if operation in ('drop', 'rename', 'dropDatabase', 'invalidate'):
+            self.invalidate()
+            return
+
+        if collection == 'seat_locks' and operation == 'delete':
+            # TTL and unlock deletes carry only the _id
+            lock_id = change.get('documentKey', {}).get('_id')
+            with self._guard:
+                key = self._lock_owners.pop(lock_id, None)
+            if key:
+                self.invalidate(key)
+            return
+
+        if document.get('schedule_id') is not None:
+            self.invalidate(document['schedule_id'])
+        elif collection == 'bookings':
+            # Deleted booking without a post-image: cannot tell which schedule
+            self.invalidate()
+
+    def watch(self, app):
+        """Consume the bookings/seat_locks change stream until it fails"""
+        pipeline = [{'$match': {'ns.coll': {'$in': ['bookings', 'seat_locks']}}}]
+        try:
+            with app.app_context():
+                with mongo.db.watch(pipeline, full_document='updateLookup') as stream:
+                    logger.info("👀 Seat map cache watching bookings/seat_locks change stream")
+                    for change in stream:
+                        self._handle_change(change)
+        except PyMongoError as e:
+            logger.warning("⚠️ Seat map change stream unavailable, relying on %ss max age: %s", self.max_age_seconds, e)
+        finally:
+            self._watcher = None
+
+    def start_watcher(self, app):
+        """Start the change stream consumer in a daemon thread (once per process)"""
+        if not self.enabled or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self.watch, args=(app,), daemon=True)
+        self._watcher.start()
+
+# Shared instance used by routes, socket handlers and the seat lock engine
+seat_map_cache = SeatMapCache()
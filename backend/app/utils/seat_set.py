@@ -0,0 +1,125 @@
+"""
+Seat Set
+Compact set of seat numbers backed by an int bitmask (bit n set = seat n)
+Membership is a shift-and-mask, union/intersection are single int operations,
+and the whole set encodes to a few bytes of BSON binary. JSON responses still
+use plain sorted lists via to_list().
+"""
+from bson.binary import Binary
+
+# User-defined BSON binary subtype for encoded seat sets
+SEAT_SET_BINARY_SUBTYPE = 0x80
+
+# Upper bound on seat numbers so untrusted input cannot build a huge bitmask
+MAX_SEAT_NUMBER = 1024
+
+def _seat_number(seat):
+    """Seat number as an int in 0..MAX_SEAT_NUMBER; raises ValueError otherwise"""
+    if isinstance(seat, bool):
+        raise ValueError(f"Invalid seat number: {seat!r}")
+    number = int(seat)
+    if not 0 <= number <= MAX_SEAT_NUMBER:
+        raise ValueError(f"Invalid seat number: {seat!r}")
+    return number
+
+class SeatSet:
+    """Immutable-by-convention set of seat numbers"""
+
+    __slots__ = ('mask',)
+
+    def __init__(self, seats=()):
+        mask = 0
+        for seat in seats:
+            # Plain in-range ints (the common case) skip the conversion call
+            if type(seat) is int and 0 <= seat <= MAX_SEAT_NUMBER:
+                mask |= 1 << seat
+            else:
+                mask |= 1 << _seat_number(seat)
+        self.mask = mask
+
+    @classmethod
+    def from_mask(cls, mask):
+        seat_set = cls()
+        seat_set.mask = mask
+        return seat_set
+
+    @classmethod
+    def parse(cls, seats):
+        """
+        Build a set from untrusted input, skipping values that are not seat numbers
+        Returns: (seat_set, invalid_values)
+        """
+        mask = 0
+        invalid = []
+        for seat in seats or []:
+            if type(seat) is int and 0 <= seat <= MAX_SEAT_NUMBER:
+                mask |= 1 << seat
+                continue
+            try:
+                mask |= 1 << _seat_number(seat)
+            except (TypeError, ValueError):
+                invalid.append(seat)
+        return cls.from_mask(mask), invalid
+
+    # ------------------------------------------------------------ set protocol
+
+    def __contains__(self, seat):
+        try:
+            return bool(self.mask >> _seat_number(seat) & 1)
+        except (TypeError, ValueError):
+            return False
+
+    def __iter__(self):
+        mask = self.mask
+        while mask:
+            low_bit = mask & -mask
+            yield low_bit.bit_length() - 1
+            mask ^= low_bit
+
+    def __len__(self):
+        return bin(self.mask).count('1')
+
+    def __bool__(self):
+        return self.mask != 0
+
+    def __eq__(self, other):
+        return isinstance(other, SeatSet) and self.mask == other.mask
+
+    def __hash__(self):
+        return hash(self.mask)
+
+    def __or__(self, other):
+        return SeatSet.from_mask(self.mask | other.mask)
+
+    def __and__(self, other):
+        return SeatSet.from_mask(self.mask & other.mask)
+
+    def __sub__(self, other):
+        return SeatSet.from_mask(self.mask & ~other.mask)
+
+    def __xor__(self, other):
+        return SeatSet.from_mask(self.mask ^ other.mask)
+
+    def __repr__(self):
+        return f"SeatSet({self.to_list()})"
+
+    def isdisjoint(self, other):
+        return not self.mask & other.mask
+
+    def issubset(self, other):
+        return not self.mask & ~other.mask
+
+    # ---------------------------------------------------------------- encoding
+
+    def to_list(self):
+        """Sorted list of ints, the shape used in JSON responses and seat_numbers"""
+        return list(self)
+
+    def to_bson(self):
+        """Little-endian bitmask as BSON binary (8 bytes for a 60-seat bus)"""
+        length = max(1, (self.mask.bit_length() + 7) // 8)
+        return Binary(self.mask.to_bytes(length, 'little'), SEAT_SET_BINARY_SUBTYPE)
+
+    @classmethod
+    def from_bson(cls, value):
+        return cls.from_mask(int.from_bytes(bytes(value), 'little'))
@@ -0,0 +1,4 @@
+"""
+Benchmark scripts for EthioBus backend hot paths
+Run from the backend directory, e.g. python -m benchmarks.seat_lock_contention
+"""
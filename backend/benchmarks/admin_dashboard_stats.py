@@ -0,0 +1,130 @@
+"""
+Admin dashboard stats benchmark
+Seeds N bookings (default 500k) spread over the last 90 days, calls
+GET /admin/dashboard/stats as an admin and reports response time and the
+peak Python memory allocated while serving it. Exits non-zero when either
+exceeds its limit, so it can gate changes to the endpoint.
+
+Usage:
+    python -m benchmarks.admin_dashboard_stats --bookings 500000 --max-seconds 2 --max-peak-mb 20
+"""
+import argparse
+import contextlib
+import io
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from benchmarks.common import latency_summary, use_bench_database
+from app import create_app, mongo
+
+INSERT_BATCH_SIZE = 10000
+
+def seed_bookings(count, days=90, seed=42):
+    """Insert `count` bench bookings with a realistic status/payment/refund mix"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    db = mongo.db
+    batch = []
+    for index in range(count):
+        status = rng.choices(['confirmed', 'checked_in', 'completed', 'pending', 'cancelled'], [40, 15, 25, 10, 10])[0]
+        booking = {
+            'pnr_number': f"BENCH{index:07d}",
+            'status': status,
+            'payment_status': 'paid' if status != 'pending' or rng.random() < 0.5 else 'pending',
+            'total_amount': rng.randint(150, 1500),
+            'seat_numbers': [rng.randint(1, 50)],
+            'created_at': now - timedelta(seconds=rng.randint(0, days * 86400)),
+            'bench': True
+        }
+        if status == 'cancelled':
+            booking['expected_refund_percentage'] = rng.choice([0, 50, 70, 90])
+        batch.append(booking)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db.bookings.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db.bookings.insert_many(batch, ordered=False)
+
+def seed_admin():
+    result = mongo.db.users.insert_one({
+        'email': 'bench-admin@example.com',
+        'role': 'admin',
+        'full_name': 'Bench Admin',
+        'bench': True
+    })
+    return create_access_token(identity=str(result.inserted_id))
+
+def clear_seed():
+    db = mongo.db
+    db.bookings.delete_many({'bench': True})
+    db.users.delete_many({'bench': True})
+
+def run_benchmark(bookings=500000, requests=5, max_seconds=2.0, max_peak_mb=20.0, seed=42, keep=False, mongo_uri=None):
+    use_bench_database(mongo_uri)
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_app()
+    client = app.test_client()
+
+    with app.app_context():
+        clear_seed()
+        started = time.perf_counter()
+        seed_bookings(bookings, seed=seed)
+        print(f"🌱 Seeded {bookings} bookings in {time.perf_counter() - started:.1f}s")
+        headers = {'Authorization': f"Bearer {seed_admin()}"}
+
+        try:
+            latencies, peaks = [], []
+            for _ in range(requests):
+                tracemalloc.start()
+                started = time.perf_counter()
+                # The endpoint logs with print(); keep it out of the measurement
+                with contextlib.redirect_stdout(io.StringIO()):
+                    response = client.get('/admin/dashboard/stats', headers=headers)
+                latencies.append(time.perf_counter() - started)
+                _current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                peaks.append(peak)
+                if response.status_code != 200:
+                    raise RuntimeError(f"stats returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+            stats = response.get_json()
+        finally:
+            if not keep:
+                clear_seed()
+
+    summary = latency_summary(latencies)
+    peak_mb = max(peaks) / (1024 * 1024)
+    print("=" * 72)
+    print(f"bookings seeded:      {bookings}")
+    print(f"total_bookings/rev:   {stats['total_bookings']} / {stats['total_revenue']} ETB")
+    print(f"latency p50/max ms:   {summary['p50_ms']} / {round(max(latencies) * 1000, 3)}")
+    print(f"peak allocated:       {peak_mb:.2f} MB")
+    print("=" * 72)
+
+    failures = []
+    if max(latencies) > max_seconds:
+        failures.append(f"slowest response {max(latencies):.2f}s > {max_seconds}s")
+    if peak_mb > max_peak_mb:
+        failures.append(f"peak memory {peak_mb:.2f} MB > {max_peak_mb} MB")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Within limits")
+    return not failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Admin dashboard stats response time and memory')
+    parser.add_argument('--bookings', type=int, default=500000, help='Bookings to seed')
+    parser.add_argument('--requests', type=int, default=5, help='Requests to time')
+    parser.add_argument('--max-seconds', type=float, default=2.0, help='Slowest allowed response')
+    parser.add_argument('--max-peak-mb', type=float, default=20.0, help='Largest allowed peak allocation')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--keep', action='store_true', help='Keep the seeded bookings afterwards')
+    parser.add_argument('--mongo-uri', help='MongoDB URI (default: BENCH_MONGO_URI or local ethiobus_bench)')
+    args = parser.parse_args()
+
+    ok = run_benchmark(args.bookings, args.requests, args.max_seconds, args.max_peak_mb,
+                       args.seed, args.keep, args.mongo_uri)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,211 @@
+"""
+Booking commit benchmark
+Books seats through POST /bookings/ and reports end-to-end latency and the
+MongoDB round trips per booking, then races concurrent bookers for the last
+seats of one schedule and checks nothing was oversold or double booked.
+
+Transactions need a replica set; a single-node one is enough:
+    mongod --replSet rs0 --dbpath /tmp/rs0 &
+    mongosh --eval "rs.initiate()"
+
+Usage:
+    python -m benchmarks.booking_commit --mongo-uri "mongodb://localhost:27017/ethiobus_bench?replicaSet=rs0"
+    python -m benchmarks.booking_commit --bookings 500 --racers 20 --race-seats 5
+
+For before/after numbers run the same command on the commit to compare
+(copy this file there if it does not have it).
+"""
+import argparse
+import contextlib
+import io
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask_jwt_extended import create_access_token
+from pymongo import monitoring
+from benchmarks.common import latency_summary, use_bench_database
+from app import create_app, mongo
+
+SEATS_PER_SCHEDULE = 45
+
+# Driver housekeeping that is not a query from the request
+IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'endSessions', 'buildInfo'}
+
+class RoundTripCounter(monitoring.CommandListener):
+    """Counts commands sent per thread"""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def reset(self):
+        self.local.count = 0
+        self.local.commands = {}
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS or not hasattr(self.local, 'count'):
+            return
+        self.local.count += 1
+        self.local.commands[event.command_name] = self.local.commands.get(event.command_name, 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+def seed(schedules, users):
+    """A route, a bus, `schedules` departures two days out and `users` customers"""
+    db = mongo.db
+    route_id = db.routes.insert_one({'originCity': 'Bench A', 'destinationCity': 'Bench B', 'bench': True}).inserted_id
+    bus_id = db.buses.insert_one({'name': 'Bench Bus', 'status': 'active', 'bench': True}).inserted_id
+    travel_date = (datetime.utcnow() + timedelta(days=2)).strftime('%Y-%m-%d')
+    schedule_ids = [str(result) for result in db.busschedules.insert_many([{
+        'route_id': str(route_id),
+        'bus_id': str(bus_id),
+        'departure_date': travel_date,
+        'departure_time': '08:00',
+        'status': 'scheduled',
+        'total_seats': SEATS_PER_SCHEDULE,
+        'available_seats': SEATS_PER_SCHEDULE,
+        'booked_seats': 0,
+        'bench': True
+    } for _ in range(schedules)]).inserted_ids]
+    user_ids = db.users.insert_many([
+        {'role': 'customer', 'full_name': f'Bench User {index}', 'loyalty_points': 0, 'bench': True}
+        for index in range(users)
+    ]).inserted_ids
+    tokens = [create_access_token(identity=str(user_id)) for user_id in user_ids]
+    return schedule_ids, tokens
+
+def clear_seed():
+    db = mongo.db
+    schedule_ids = [str(schedule['_id']) for schedule in db.busschedules.find({'bench': True}, {'_id': 1})]
+    booking_ids = [str(booking['_id']) for booking in db.bookings.find({'schedule_id': {'$in': schedule_ids}}, {'_id': 1})]
+    db.outbox.delete_many({'booking_id': {'$in': booking_ids}})
+    db.bookings.delete_many({'schedule_id': {'$in': schedule_ids}})
+    db.payments.delete_many({'booking_data.schedule_id': {'$in': schedule_ids}})
+    db.schedule_search.delete_many({'_id': {'$in': schedule_ids}})
+    for collection in ('busschedules', 'routes', 'buses', 'users'):
+        db[collection].delete_many({'bench': True})
+
+def booking_request(client, token, schedule_id, seats):
+    body = {
+        'schedule_id': schedule_id,
+        'seat_numbers': seats,
+        'base_fare': 350,
+        'passenger_name': 'Bench Passenger',
+        'passenger_phone': '0911000000'
+    }
+    # The endpoint logs with print(); keep it out of the measurement
+    with contextlib.redirect_stdout(io.StringIO()):
+        return client.post('/bookings/', json=body, headers={'Authorization': f"Bearer {token}"})
+
+def run_sequential(client, counter, schedule_ids, tokens, bookings):
+    """One seat per booking, filling schedules in order"""
+    latencies, round_trips, commands = [], [], {}
+    for index in range(bookings):
+        schedule_id = schedule_ids[index // SEATS_PER_SCHEDULE]
+        counter.reset()
+        started = time.perf_counter()
+        response = booking_request(client, tokens[index % len(tokens)], schedule_id, [index % SEATS_PER_SCHEDULE + 1])
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 201:
+            raise RuntimeError(f"booking returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        round_trips.append(counter.local.count)
+        for name, count in counter.local.commands.items():
+            commands[name] = commands.get(name, 0) + count
+    return latencies, round_trips, {name: round(count / bookings, 2) for name, count in commands.items()}
+
+def run_race(app, schedule_id, tokens, racers, race_seats):
+    """`racers` threads each try to book one of `race_seats` free seats at once"""
+    db = mongo.db
+    # Leave only race_seats seats on the schedule
+    db.busschedules.update_one({'_id': ObjectId(schedule_id)}, {'$set': {
+        'available_seats': race_seats, 'booked_seats': SEATS_PER_SCHEDULE - race_seats
+    }})
+    statuses = []
+    results_lock = threading.Lock()
+    barrier = threading.Barrier(racers)
+
+    def racer(index):
+        client = app.test_client()
+        barrier.wait()
+        response = booking_request(client, tokens[index % len(tokens)], schedule_id, [index % race_seats + 1])
+        with results_lock:
+            statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=racer, args=(index,)) for index in range(racers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    schedule = db.busschedules.find_one({'_id': ObjectId(schedule_id)})
+    seat_owners = {}
+    for booking in db.bookings.find({'schedule_id': schedule_id}, {'seat_numbers': 1}):
+        for seat in booking.get('seat_numbers', []):
+            seat_owners[seat] = seat_owners.get(seat, 0) + 1
+    return {
+        'booked': statuses.count(201),
+        'conflicts': statuses.count(409),
+        'seat_taken': statuses.count(400),
+        'other_errors': len(statuses) - statuses.count(201) - statuses.count(409) - statuses.count(400),
+        'available_seats_after': schedule.get('available_seats'),
+        'double_booked_seats': sum(1 for owners in seat_owners.values() if owners > 1)
+    }
+
+def run_benchmark(bookings=200, racers=20, race_seats=5, keep=False, mongo_uri=None):
+    use_bench_database(mongo_uri)
+    counter = RoundTripCounter()
+    monitoring.register(counter)
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_app()
+    client = app.test_client()
+
+    try:
+        from app.utils.booking_commit import transactions_supported
+    except ImportError:
+        # Commits before the transactional booking path
+        transactions_supported = lambda: False
+    with app.app_context():
+        clear_seed()
+        schedules = bookings // SEATS_PER_SCHEDULE + 2
+        schedule_ids, tokens = seed(schedules, max(racers, 20))
+        try:
+            transactional = transactions_supported()
+            latencies, round_trips, commands = run_sequential(client, counter, schedule_ids, tokens, bookings)
+            race = run_race(app, schedule_ids[-1], tokens, racers, race_seats)
+        finally:
+            if not keep:
+                clear_seed()
+
+    summary = latency_summary(latencies)
+    print("=" * 72)
+    print(f"transactions:          {'yes' if transactional else 'no (standalone server)'}")
+    print(f"bookings timed:        {bookings}")
+    print(f"latency p50/p95/p99:   {summary['p50_ms']} / {summary['p95_ms']} / {summary['p99_ms']} ms")
+    print(f"round trips/booking:   {sum(round_trips) / len(round_trips):.1f} (max {max(round_trips)})")
+    print(f"commands/booking:      {', '.join(f'{name}={count}' for name, count in sorted(commands.items()))}")
+    print(f"race ({racers} for {race_seats} seats): {race['booked']} booked, {race['conflicts']} lost at commit (409), "
+          f"{race['seat_taken']} rejected before commit (400), {race['other_errors']} other errors")
+    print(f"available_seats after: {race['available_seats_after']}, double-booked seats: {race['double_booked_seats']}")
+    print("=" * 72)
+
+    oversold = (race['available_seats_after'] or 0) < 0 or race['double_booked_seats'] > 0
+    if oversold:
+        print("❌ Seats were oversold")
+    return not oversold
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Booking commit latency, round trips and race safety')
+    parser.add_argument('--bookings', type=int, default=200, help='Sequential bookings to time')
+    parser.add_argument('--racers', type=int, default=20, help='Concurrent bookers in the race')
+    parser.add_argument('--race-seats', type=int, default=5, help='Seats left for the race')
+    parser.add_argument('--keep', action='store_true', help='Keep the seeded data afterwards')
+    parser.add_argument('--mongo-uri', help='MongoDB URI (default: BENCH_MONGO_URI or local ethiobus_bench)')
+    args = parser.parse_args()
+
+    ok = run_benchmark(args.bookings, args.racers, args.race_seats, args.keep, args.mongo_uri)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,32 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+import os
+
+# Benchmarks seed and wipe data, so they default to their own database
+DEFAULT_BENCH_MONGO_URI = 'mongodb://localhost:27017/ethiobus_bench'
+
+def use_bench_database(mongo_uri=None):
+    """Point create_app() at the benchmark database (call before create_app)"""
+    os.environ['MONGO_URI'] = mongo_uri or os.getenv('BENCH_MONGO_URI', DEFAULT_BENCH_MONGO_URI)
+    return os.environ['MONGO_URI']
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def latency_summary(latencies):
+    """p50/p95/p99/mean in milliseconds for a list of durations in seconds"""
+    if not latencies:
+        return {'count': 0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'mean_ms': 0.0}
+    return {
+        'count': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3)
+    }
@@ -0,0 +1,498 @@
+"""
+Customer journey benchmark
+Drives the whole customer booking flow against a data set built with
+benchmarks.dataset: city list, date list, schedule search, seat map, seat
+lock (Socket.IO), booking and payment verification. Every journey picks a
+route, a date and free seats, so concurrent journeys compete for seats the way
+real customers do; a lost race (409 or a refused lock) is counted as a
+conflict, not an error.
+
+Two modes:
+  - in-process (default): the Flask test client and the Flask-SocketIO test
+    client, one pair per --concurrency thread. MongoDB commands are counted
+    per request with app.utils.query_budget.query_counter, and socket events
+    are handled on the calling thread so the lock step is counted too.
+  - --url: a running server over HTTP and Socket.IO. Queries per request are
+    read from the server's GET /metrics before and after the run (pass
+    --metrics-token if METRICS_TOKEN is set); the lock step has none. With
+    several workers, /metrics covers only the one that answers it.
+
+Reports throughput, latency percentiles and queries per request for each
+step, and writes them with the run's settings and git commit to a JSON file
+(benchmarks/results/ by default). --compare prints the change against an
+earlier result file.
+
+Journeys book real seats, so rebuild the data set (--wipe) to start from the
+same state again.
+
+Usage:
+    python -m benchmarks.dataset --scale 1 --wipe
+    python -m benchmarks.customer_journey --journeys 500 --concurrency 8
+    python -m benchmarks.customer_journey --url http://localhost:5000 --journeys 2000 --concurrency 32
+    python -m benchmarks.customer_journey --compare benchmarks/results/customer_journey-in-process-20261017-101500.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import queue
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote
+from benchmarks.common import latency_summary, use_bench_database
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'benchmarks', 'results')
+
+# (step, method, Flask URL rule) - the rule finds the step's queries in /metrics
+STEPS = [
+    ('cities', 'GET', '/schedules/cities'),
+    ('dates', 'GET', '/schedules/dates'),
+    ('search', 'GET', '/schedules/'),
+    ('seat_map', 'GET', '/bookings/occupied-seats/<schedule_id>'),
+    ('lock', 'SOCKET', None),
+    ('booking', 'POST', '/bookings/'),
+    ('payment_verify', 'GET', '/payments/verify/<tx_ref>')
+]
+SOCKET_TIMEOUT_SECONDS = 10.0
+
+class JourneyFailed(Exception):
+    """A step returned something the journey cannot continue from"""
+
+    def __init__(self, step, conflict=False):
+        super().__init__(step)
+        self.step = step
+        self.conflict = conflict
+
+def _deliver_to_test_clients(server):
+    """
+    Flask-SocketIO 5.3.4's test client only receives packets sent with
+    server._send_packet, while python-socketio 5.9 emits through
+    _send_eio_packet; hand test-client packets back to _send_packet
+    """
+    from flask_socketio.test_client import SocketIOTestClient
+    from socketio import packet
+    send_eio_packet = server._send_eio_packet
+
+    def deliver(eio_sid, eio_pkt):
+        if eio_sid in SocketIOTestClient.clients:
+            return server._send_packet(eio_sid, packet.Packet(encoded_packet=eio_pkt.data))
+        return send_eio_packet(eio_sid, eio_pkt)
+
+    server._send_eio_packet = deliver
+
+class InProcessSession:
+    """One thread's test client and Socket.IO test client"""
+
+    def __init__(self, app):
+        from app import socketio
+        self.client = app.test_client()
+        self.socket = socketio.test_client(app, flask_test_client=self.client)
+
+    def request(self, method, url, token=None, body=None):
+        """(status, json body, seconds, MongoDB commands)"""
+        from app.utils.query_budget import count_queries
+        headers = {'Authorization': f"Bearer {token}"} if token else None
+        with count_queries() as counted:
+            started = time.perf_counter()
+            response = self.client.open(url, method=method, headers=headers, json=body)
+            elapsed = time.perf_counter() - started
+        return response.status_code, response.get_json(silent=True), elapsed, counted.total
+
+    def emit(self, event, data, reply_event):
+        """(reply payload, seconds, MongoDB commands); the handler runs on this thread"""
+        from app.utils.query_budget import count_queries
+        with count_queries() as counted:
+            started = time.perf_counter()
+            self.socket.emit(event, data)
+            elapsed = time.perf_counter() - started
+        replies = [message['args'][0] for message in self.socket.get_received() if message['name'] == reply_event]
+        return (replies[-1] if replies else None), elapsed, counted.total
+
+    def close(self):
+        self.socket.disconnect()
+
+class LiveSession:
+    """One thread's HTTP session and Socket.IO connection to a running server"""
+
+    def __init__(self, url):
+        import requests
+        import socketio
+        self.url = url.rstrip('/')
+        self.http = requests.Session()
+        self.replies = queue.Queue()
+        self.socket = socketio.Client(reconnection=False)
+        for reply_event in ('lock_response', 'unlock_response'):
+            self.socket.on(reply_event, lambda data, name=reply_event: self.replies.put((name, data)))
+        self.socket.connect(self.url)
+
+    def request(self, method, url, token=None, body=None):
+        headers = {'Authorization': f"Bearer {token}"} if token else None
+        started = time.perf_counter()
+        response = self.http.request(method, self.url + url, headers=headers, json=body, timeout=30)
+        elapsed = time.perf_counter() - started
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        return response.status_code, payload, elapsed, None
+
+    def emit(self, event, data, reply_event):
+        started = time.perf_counter()
+        self.socket.emit(event, data)
+        deadline = started + SOCKET_TIMEOUT_SECONDS
+        while True:
+            try:
+                name, payload = self.replies.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                return None, time.perf_counter() - started, None
+            if name == reply_event:
+                return payload, time.perf_counter() - started, None
+
+    def close(self):
+        self.socket.disconnect()
+        self.http.close()
+
+class StepStats:
+    def __init__(self):
+        self.latencies = []
+        self.queries = []
+        self.errors = 0
+        self.conflicts = 0
+        self.statuses = {}
+
+    def record(self, status, seconds, queries):
+        self.latencies.append(seconds)
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        if queries is not None:
+            self.queries.append(queries)
+
+class Recorder:
+    """Per-step samples from every journey thread"""
+
+    def __init__(self):
+        self.steps = {step: StepStats() for step, _method, _rule in STEPS}
+        self.journeys = 0
+        self.completed = 0
+        self.guard = threading.Lock()
+
+    def record(self, step, status, seconds, queries):
+        with self.guard:
+            self.steps[step].record(status, seconds, queries)
+
+    def count(self, step, field):
+        with self.guard:
+            setattr(self.steps[step], field, getattr(self.steps[step], field) + 1)
+
+    def finished(self, completed):
+        with self.guard:
+            self.journeys += 1
+            self.completed += completed
+
+def run_journey(session, customer, pairs, recorder, rng):
+    """One customer booking one to two seats; raises JourneyFailed when a step cannot go on"""
+    token, user_id = customer['token'], customer['user_id']
+
+    def call(step, method, url, body=None, expected=(200,)):
+        status, payload, seconds, queries = session.request(method, url, token, body)
+        recorder.record(step, status, seconds, queries)
+        if status in expected:
+            return payload
+        conflict = step == 'booking' and status in (400, 409)
+        recorder.count(step, 'conflicts' if conflict else 'errors')
+        raise JourneyFailed(step, conflict)
+
+    call('cities', 'GET', '/schedules/cities')
+    origin, destination = rng.choice(pairs)
+    query = f"origin_city={quote(origin)}&destination_city={quote(destination)}"
+    dates = (call('dates', 'GET', f"/schedules/dates?{query}") or {}).get('dates') or []
+    if not dates:
+        recorder.count('dates', 'errors')
+        raise JourneyFailed('dates')
+    # Today's departures may have left already; later dates are where customers book
+    travel_date = rng.choice(dates[1:] or dates)
+    schedules = (call('search', 'GET', f"/schedules/?{query}&date={travel_date}") or {}).get('schedules') or []
+    schedules = [schedule for schedule in schedules if schedule.get('is_available', True)
+                 and (schedule.get('available_seats') or 0) >= 2]
+    if not schedules:
+        recorder.count('search', 'conflicts')
+        raise JourneyFailed('search', conflict=True)
+    schedule = rng.choice(schedules)
+    schedule_id = schedule['_id']
+
+    seat_map = call('seat_map', 'GET', f"/bookings/occupied-seats/{schedule_id}") or {}
+    taken = set(seat_map.get('occupiedSeats') or []) | set(seat_map.get('lockedSeats') or [])
+    free = [seat for seat in range(1, int(schedule.get('total_seats') or 0) + 1) if seat not in taken]
+    if len(free) < 2:
+        recorder.count('seat_map', 'conflicts')
+        raise JourneyFailed('seat_map', conflict=True)
+    seats = sorted(rng.sample(free, rng.choice([1, 1, 2])))
+
+    lock_data = {'schedule_id': schedule_id, 'seat_numbers': seats, 'user_id': user_id}
+    reply, seconds, queries = session.emit('lock_seats', lock_data, 'lock_response')
+    recorder.record('lock', 'ok' if reply and reply.get('success') else 'refused', seconds, queries)
+    if reply is None:
+        recorder.count('lock', 'errors')
+        raise JourneyFailed('lock')
+    if not reply.get('success'):
+        recorder.count('lock', 'conflicts')
+        raise JourneyFailed('lock', conflict=True)
+
+    try:
+        booking = call('booking', 'POST', '/bookings/', {
+            'schedule_id': schedule_id,
+            'seat_numbers': seats,
+            'base_fare': schedule.get('fare_birr') or 0,
+            'passenger_name': customer['name'],
+            'passenger_phone': customer['phone'],
+            'payment_method': 'telebirr'
+        }, expected=(201,))
+    except JourneyFailed:
+        session.emit('unlock_seats', lock_data, 'unlock_response')
+        raise
+
+    # The payment record is committed with the booking
+    tx_ref = f"booking-{booking['booking_id']}"
+    status, payload, seconds, queries = session.request('GET', f"/payments/verify/{tx_ref}", token)
+    recorder.record('payment_verify', status, seconds, queries)
+    if status != 200 or not (payload or {}).get('success'):
+        recorder.count('payment_verify', 'errors')
+        raise JourneyFailed('payment_verify')
+
+def login_customers(session, count):
+    """Log in customer1..customerN of the generated data set"""
+    customers = []
+    for index in range(1, count + 1):
+        email = f"customer{index}@example.com"
+        status, payload, _seconds, _queries = session.request('POST', '/auth/login', None,
+                                                              {'email': email, 'password': 'password123'})
+        if status != 200:
+            if not customers:
+                raise SystemExit(f"❌ Cannot log in as {email} ({status}); build the data set first: "
+                                 "python -m benchmarks.dataset --scale 1 --wipe")
+            break
+        user = payload.get('user') or {}
+        customers.append({'token': payload['access_token'], 'user_id': user.get('id'),
+                          'name': user.get('name') or 'Bench Customer', 'phone': user.get('phone') or '0911000000'})
+    return customers
+
+def route_pairs(session):
+    status, payload, _seconds, _queries = session.request('GET', '/routes/')
+    routes = ((payload or {}).get('routes') or []) if status == 200 else []
+    pairs = sorted({(route['origin_city'], route['destination_city']) for route in routes
+                    if route.get('has_available_schedules', True)})
+    if not pairs:
+        raise SystemExit("❌ No routes with upcoming schedules; build the data set first: "
+                         "python -m benchmarks.dataset --scale 1 --wipe")
+    return pairs
+
+_SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+def scrape_query_totals(url, token=None):
+    """{(method, route): (commands, requests)} from a server's /metrics"""
+    import requests
+    headers = {'Authorization': f"Bearer {token}"} if token else None
+    response = requests.get(url.rstrip('/') + '/metrics', headers=headers, timeout=30)
+    if response.status_code != 200:
+        print(f"⚠️ GET /metrics returned {response.status_code}; queries per request will be missing")
+        return None
+    totals = {}
+    for line in response.text.splitlines():
+        match = _SAMPLE.match(line)
+        if not match or not match.group(1).startswith('ethiobus_http_request_db_queries_'):
+            continue
+        suffix = match.group(1).rsplit('_', 1)[1]
+        if suffix not in ('sum', 'count'):
+            continue
+        labels = dict(_LABEL.findall(match.group(2)))
+        key = (labels.get('method'), labels.get('route'))
+        commands, requests_seen = totals.get(key, (0.0, 0.0))
+        if suffix == 'sum':
+            commands = float(match.group(3))
+        else:
+            requests_seen = float(match.group(3))
+        totals[key] = (commands, requests_seen)
+    return totals
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def summarize(recorder, elapsed, live_queries=None):
+    steps = {}
+    for step, method, rule in STEPS:
+        stats = recorder.steps[step]
+        queries = None
+        if stats.queries:
+            queries = {'mean': round(sum(stats.queries) / len(stats.queries), 2), 'max': max(stats.queries)}
+        elif live_queries and (method, rule) in live_queries:
+            queries = {'mean': live_queries[(method, rule)], 'max': None}
+        steps[step] = {
+            'requests': len(stats.latencies),
+            'throughput_rps': round(len(stats.latencies) / elapsed, 2) if elapsed else 0.0,
+            'latency': latency_summary(stats.latencies),
+            'queries_per_request': queries,
+            'errors': stats.errors,
+            'conflicts': stats.conflicts,
+            'statuses': stats.statuses
+        }
+    requests_total = sum(step['requests'] for step in steps.values())
+    return {
+        'journeys': recorder.journeys,
+        'completed_journeys': recorder.completed,
+        'elapsed_s': round(elapsed, 3),
+        'journeys_per_s': round(recorder.completed / elapsed, 2) if elapsed else 0.0,
+        'requests_per_s': round(requests_total / elapsed, 2) if elapsed else 0.0,
+        'steps': steps
+    }
+
+def run_benchmark(journeys=200, concurrency=4, users=20, url=None, seed=42, mongo_uri=None, metrics_token=None):
+    """Run the journeys and return the result document"""
+    started_at = datetime.utcnow().isoformat(timespec='seconds') + 'Z'
+    if url:
+        make_session = lambda: LiveSession(url)
+    else:
+        use_bench_database(mongo_uri)
+        from pymongo import monitoring
+        from app import create_app, socketio
+        from app.utils.query_budget import query_counter
+        monitoring.register(query_counter)
+        with contextlib.redirect_stdout(io.StringIO()):
+            app = create_app()
+        _deliver_to_test_clients(socketio.server)
+        make_session = lambda: InProcessSession(app)
+
+    setup = make_session()
+    customers = login_customers(setup, users)
+    pairs = route_pairs(setup)
+    setup.close()
+    print(f"🧭 {journeys} journeys, {concurrency} threads, {len(customers)} customers, {len(pairs)} routes "
+          f"({'live ' + url if url else 'in-process'})")
+
+    before = scrape_query_totals(url, metrics_token) if url else None
+    recorder = Recorder()
+    work = queue.Queue()
+    for index in range(journeys):
+        work.put(index)
+
+    def worker(thread_index):
+        rng = random.Random(seed * 1000 + thread_index)
+        session = make_session()
+        try:
+            while True:
+                try:
+                    index = work.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    run_journey(session, customers[index % len(customers)], pairs, recorder, rng)
+                    recorder.finished(1)
+                except JourneyFailed:
+                    recorder.finished(0)
+        finally:
+            session.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    live_queries = None
+    if url and before is not None:
+        after = scrape_query_totals(url, metrics_token) or {}
+        live_queries = {}
+        for key, (commands, requests_seen) in after.items():
+            commands_before, requests_before = before.get(key, (0.0, 0.0))
+            if requests_seen > requests_before:
+                live_queries[key] = round((commands - commands_before) / (requests_seen - requests_before), 2)
+
+    return {
+        'benchmark': 'customer_journey',
+        'started_at': started_at,
+        'git_commit': git_commit(),
+        'mode': 'live' if url else 'in-process',
+        'url': url,
+        'settings': {'journeys': journeys, 'concurrency': concurrency, 'users': len(customers), 'seed': seed},
+        'results': summarize(recorder, elapsed, live_queries)
+    }
+
+def print_report(result, previous=None):
+    results = result['results']
+    print("=" * 96)
+    print(f"{'step':<16}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}"
+          f"{'errors':>8}{'conflicts':>10}")
+    for step, stats in results['steps'].items():
+        queries = stats['queries_per_request']
+        latency = stats['latency']
+        print(f"{step:<16}{stats['requests']:>9}{stats['throughput_rps']:>9.1f}{latency['p50_ms']:>9.1f}"
+              f"{latency['p95_ms']:>9.1f}{latency['p99_ms']:>9.1f}{'-' if queries is None else queries['mean']:>9}"
+              f"{stats['errors']:>8}{stats['conflicts']:>10}")
+    print("=" * 96)
+    print(f"✅ {results['completed_journeys']}/{results['journeys']} journeys completed in {results['elapsed_s']}s: "
+          f"{results['journeys_per_s']} journeys/s, {results['requests_per_s']} requests/s")
+
+    if previous:
+        print(f"\nCompared with {previous.get('started_at')} ({previous.get('git_commit')}, {previous.get('mode')}):")
+        print(f"{'step':<16}{'p95 ms':>26}{'req/s':>26}{'queries':>26}")
+        for step, stats in results['steps'].items():
+            old = previous['results']['steps'].get(step)
+            if not old:
+                continue
+            old_queries = (old.get('queries_per_request') or {}).get('mean')
+            new_queries = (stats['queries_per_request'] or {}).get('mean')
+            print(f"{step:<16}{_change(old['latency']['p95_ms'], stats['latency']['p95_ms']):>26}"
+                  f"{_change(old['throughput_rps'], stats['throughput_rps']):>26}"
+                  f"{_change(old_queries, new_queries):>26}")
+
+def _change(old, new):
+    if old is None or new is None:
+        return '-'
+    if not old:
+        return f"{old:g} -> {new:g}"
+    return f"{old:.1f} -> {new:.1f} ({(new - old) / old * 100:+.0f}%)"
+
+def save_result(result, path=None):
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(RESULTS_DIR, f"customer_journey-{result['mode']}-{stamp}.json")
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(result, output, indent=2)
+    return path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='End-to-end customer booking journey benchmark')
+    parser.add_argument('--journeys', type=int, default=200, help='Journeys to run')
+    parser.add_argument('--concurrency', type=int, default=4, help='Journeys running at once')
+    parser.add_argument('--users', type=int, default=20, help='Customers (customer1..N) the journeys rotate through')
+    parser.add_argument('--url', help='Benchmark a running server instead of the in-process test client')
+    parser.add_argument('--metrics-token', help='Bearer token for the server /metrics (METRICS_TOKEN)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for route, date and seat choices')
+    parser.add_argument('--output', help='Result file (default: benchmarks/results/customer_journey-<mode>-<time>.json)')
+    parser.add_argument('--compare', help='Earlier result file to compare with')
+    parser.add_argument('--mongo-uri', help='MongoDB URI for in-process runs (default: BENCH_MONGO_URI or local ethiobus_bench)')
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as earlier:
+            previous = json.load(earlier)
+    result = run_benchmark(args.journeys, args.concurrency, args.users, args.url, args.seed, args.mongo_uri,
+                           args.metrics_token)
+    print_report(result, previous)
+    print(f"💾 Saved {save_result(result, args.output)}")
+    errors = sum(step['errors'] for step in result['results']['steps'].values())
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,465 @@
+"""
+Benchmark Dataset
+Generates a synthetic data set of any size for load tests and the benchmark
+scripts: cities, routes with intermediate stops, buses, staff and customers,
+schedules over a window of days around today, and bookings (with their
+payments) whose status, payment-method and cancellation mix follows what the
+live system sees. The same --seed always gives the same data set.
+
+Documents are written with insert_many in large unordered batches, a few
+batches in flight at once, and every reference/date field already has its
+canonical type (app.utils.schema), so no migration is needed afterwards.
+
+Per --scale step, with the default 30 past and 14 future days: 20 routes,
+30 buses, 2,000 customers, ~2,000 schedules and ~34,000 bookings, each paid
+booking with its payment. --scale 10 is ~340,000 bookings and --scale 100
+~3.4 million (about 7 million documents; generation runs at ~50,000
+documents/s, so mostly bounded by the server's insert rate).
+
+insertFullData.py remains the small hand-written demo data set.
+
+Usage:
+    python -m benchmarks.dataset --scale 1
+    python -m benchmarks.dataset --scale 100 --wipe
+    python -m benchmarks.dataset --scale 10 --past-days 90 --future-days 30 --seed 7 --wipe
+"""
+import argparse
+import calendar
+import contextlib
+import io
+import random
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from bson import ObjectId
+from benchmarks.common import use_bench_database
+from app import create_app, mongo
+from app.utils.schema import CANONICAL_FIELDS, MIGRATION_NAME, MIGRATIONS_COLLECTION
+
+DATASET_COLLECTIONS = ('users', 'routes', 'buses', 'busschedules', 'bookings', 'payments',
+                       'seat_locks', 'schedule_search', 'daily_rollups')
+
+CITIES = ['Addis Ababa', 'Adama', 'Hawassa', 'Bahir Dar', 'Gondar', 'Mekelle', 'Dire Dawa', 'Jimma',
+          'Dessie', 'Harar', 'Arba Minch', 'Debre Markos', 'Shashamane', 'Nekemte', 'Sodo', 'Axum',
+          'Lalibela', 'Woldia', 'Ziway', 'Mojo', 'Bishoftu', 'Debre Birhan', 'Assosa', 'Gambela', 'Jijiga']
+FIRST_NAMES = ['Abraham', 'Meron', 'Dawit', 'Sara', 'Yonas', 'Hana', 'Elias', 'Marta', 'Tewodros',
+               'Selamawit', 'Kaleb', 'Ruth', 'Mesfin', 'Eleni', 'Bereket', 'Tsion', 'Henok', 'Liya']
+LAST_NAMES = ['Worku', 'Tesfaye', 'Bekele', 'Mohammed', 'Tadesse', 'Girma', 'Getachew', 'Assefa',
+              'Getnet', 'Abebe', 'Mesfin', 'Solomon', 'Alemu', 'Haile', 'Kebede', 'Desta']
+
+# type: (capacity, fare multiplier, amenities)
+BUS_TYPES = {
+    'standard': (52, 1.0, ['AC', 'Reclining Seats', 'Reading Lights']),
+    'premium': (45, 1.3, ['WiFi', 'AC', 'Refreshments', 'Charging Ports']),
+    'luxury': (35, 1.7, ['WiFi', 'AC', 'Refreshments', 'Charging Ports', 'Entertainment', 'Toilet'])
+}
+BUS_TYPE_WEIGHTS = [60, 30, 10]
+DEPARTURE_TIMES = ['05:30', '06:00', '06:30', '07:00', '08:00', '09:00', '11:00', '13:00', '14:00', '16:00']
+DEPARTURES_PER_DAY = ([1, 2, 3, 4], [25, 35, 25, 15])
+SEATS_PER_BOOKING = ([1, 2, 3], [60, 30, 10])
+
+# phase -> (schedule statuses, weights) and (booking statuses, weights)
+SCHEDULE_STATUSES = {
+    'past': (['completed', 'cancelled'], [95, 5]),
+    'today': (['scheduled', 'boarding', 'departed', 'active', 'completed'], [30, 20, 20, 20, 10]),
+    'future': (['scheduled'], [1])
+}
+BOOKING_STATUSES = {
+    'past': (['completed', 'cancelled'], [88, 12]),
+    'today': (['confirmed', 'checked_in', 'cancelled'], [45, 45, 10]),
+    'future': (['confirmed', 'pending', 'cancelled'], [80, 12, 8])
+}
+# method: (weight, booking_source)
+PAYMENT_METHODS = {'telebirr': (45, 'online'), 'chapa': (30, 'online'), 'cash': (20, 'counter'), 'bank': (5, 'online')}
+CANCELLATION_REASONS = ['Change of plans', 'Found another trip', 'Illness', 'Trip no longer needed', 'Booked by mistake']
+REFUND_PERCENTAGES = ([100, 70, 50, 30], [50, 25, 15, 10])
+
+def dataset_size(scale, past_days=30, future_days=14):
+    """Rough document counts for a scale (printed before generating)"""
+    days = past_days + future_days + 1
+    schedules = int(20 * scale * days * 2.3)
+    return {'routes': 20 * scale, 'buses': 30 * scale, 'customers': 2000 * scale,
+            'schedules': schedules, 'bookings': schedules * 17}
+
+class ObjectIds:
+    """Deterministic ObjectIds: the document's own timestamp plus a running counter"""
+
+    def __init__(self, seed):
+        self.counter = seed << 32
+
+    def __call__(self, when):
+        self.counter += 1
+        return ObjectId(struct.pack('>IQ', calendar.timegm(when.utctimetuple()) & 0xFFFFFFFF, self.counter & 0xFFFFFFFFFFFFFFFF))
+
+class BatchWriter:
+    """Buffers documents per collection and writes them with unordered insert_many, a few batches at a time"""
+
+    def __init__(self, db, batch_size=10000, workers=4):
+        self.db = db
+        self.batch_size = batch_size
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.max_pending = workers * 2
+        self.pending = []
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, collection, document):
+        buffer = self.buffers.setdefault(collection, [])
+        buffer.append(document)
+        if len(buffer) >= self.batch_size:
+            self._submit(collection, buffer)
+            self.buffers[collection] = []
+
+    def _submit(self, collection, documents):
+        self.counts[collection] = self.counts.get(collection, 0) + len(documents)
+        self.pending.append(self.pool.submit(self.db[collection].insert_many, documents, ordered=False))
+        # Bound memory: wait for the oldest batches once enough are in flight
+        while len(self.pending) > self.max_pending:
+            self.pending.pop(0).result()
+
+    def close(self):
+        for collection, buffer in self.buffers.items():
+            if buffer:
+                self._submit(collection, buffer)
+        self.buffers = {}
+        for future in self.pending:
+            future.result()
+        self.pending = []
+        self.pool.shutdown()
+        return self.counts
+
+def arrival_time(departure_time, duration_hours):
+    hours, minutes = map(int, departure_time.split(':'))
+    total = hours * 60 + minutes + int(duration_hours * 60)
+    return f"{(total // 60) % 24:02d}:{total % 60:02d}"
+
+def baggage_fee(weight_kg):
+    if weight_kg <= 15:
+        return 0
+    if weight_kg <= 25:
+        return 50
+    if weight_kg <= 35:
+        return 100
+    return 150
+
+def city_names(count):
+    """The real city list, then numbered variants of it once a scale needs more"""
+    names = list(CITIES[:count])
+    variant = 2
+    while len(names) < count:
+        names.extend(f"{city} {variant}" for city in CITIES[:count - len(names)])
+        variant += 1
+    return names
+
+def make_users(rng, ids, scale, password, now):
+    """(staff by role, customers) - staff counts grow with the scale too"""
+    staff_counts = {'admin': 1, 'operator': 2 * scale, 'ticketer': 5 * scale, 'driver': 30 * scale}
+    staff = {}
+    for role, count in staff_counts.items():
+        staff[role] = []
+        for index in range(count):
+            user = {'_id': ids(now), 'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                    'email': f"{role}{index + 1}@ethiobus.com", 'password': password,
+                    'phone': f"+2519{rng.randint(10000000, 99999999)}", 'role': role, 'is_active': True,
+                    'created_at': now - timedelta(days=rng.randint(60, 720)), 'updated_at': now}
+            if role == 'driver':
+                user.update({'license_number': f"ET-DL-{index + 1:06d}", 'experience_years': rng.randint(1, 25),
+                             'license_expiry': (now + timedelta(days=rng.randint(30, 1500))).strftime('%Y-%m-%d')})
+            staff[role].append(user)
+    customers = []
+    for index in range(2000 * scale):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        customers.append({'_id': ids(now), 'name': name, 'full_name': name,
+                          'email': f"customer{index + 1}@example.com", 'password': password,
+                          'phone': f"+2519{rng.randint(10000000, 99999999)}", 'birthday': '', 'role': 'customer',
+                          'is_active': True, 'loyalty_points': 0, 'loyalty_tier': 'member', 'total_bookings': 0,
+                          'created_at': now - timedelta(days=rng.randint(1, 720)), 'updated_at': now})
+    return staff, customers
+
+def make_routes(rng, ids, scale, now):
+    """20 routes per scale step between the scale's cities, each with 1-3 intermediate stops"""
+    cities = city_names(max(6, 5 * scale))
+    routes = []
+    for index in range(20 * scale):
+        origin, destination = rng.sample(cities, 2)
+        distance = rng.randint(80, 900)
+        stops = [city for city in rng.sample(cities, 5) if city not in (origin, destination)][:rng.randint(1, 3)]
+        routes.append({'_id': ids(now), 'name': f"{origin} to {destination}", 'origin_city': origin,
+                       'destination_city': destination, 'distance_km': distance,
+                       'estimated_duration_hours': max(2, round(distance / 60)),
+                       'base_fare_birr': int(distance * rng.uniform(0.7, 0.9) / 10) * 10 + 100,
+                       'stops': stops, 'is_active': True,
+                       'created_at': now - timedelta(days=rng.randint(90, 720)), 'updated_at': now})
+    return routes
+
+def make_buses(rng, ids, scale, now):
+    buses = []
+    for index in range(30 * scale):
+        bus_type = rng.choices(list(BUS_TYPES), weights=BUS_TYPE_WEIGHTS)[0]
+        capacity, _multiplier, amenities = BUS_TYPES[bus_type]
+        buses.append({'_id': ids(now), 'bus_number': f"ETB-{index + 1:05d}", 'plate_number': f"3AA{index + 1:05d}",
+                      'bus_name': f"EthioBus {index + 1}", 'type': bus_type, 'capacity': capacity,
+                      'amenities': amenities, 'status': 'active', 'is_active': True,
+                      'created_at': now - timedelta(days=rng.randint(90, 720)), 'updated_at': now})
+    return buses
+
+def make_booking(rng, ids, schedule, seats, customer, ticketers, phase, departure, now, pnr):
+    """One booking on `seats` of a schedule and, if it was paid, its payment (or None)"""
+    status = rng.choices(*BOOKING_STATUSES[phase])[0]
+    if status == 'pending':
+        method = rng.choice(['telebirr', 'chapa'])
+    else:
+        method = rng.choices(list(PAYMENT_METHODS), weights=[weight for weight, _ in PAYMENT_METHODS.values()])[0]
+    source = PAYMENT_METHODS[method][1]
+    created_at = departure - timedelta(hours=rng.randint(2, 24 * 21))
+    if created_at > now:
+        created_at = now - timedelta(minutes=rng.randint(1, 600))
+    fare = schedule['fare_birr']
+    weight = rng.choice([0, 0, 0, rng.randint(5, 40)])
+    fee = baggage_fee(weight)
+    total = fare * len(seats) + fee
+    booking = {
+        '_id': ids(created_at),
+        'pnr_number': pnr,
+        'schedule_id': str(schedule['_id']),
+        'user_id': customer['_id'],
+        'passenger_name': customer['name'],
+        'passenger_phone': customer['phone'],
+        'passenger_email': customer['email'],
+        'seat_numbers': seats,
+        'status': status,
+        'departure_city': schedule['origin_city'],
+        'arrival_city': schedule['destination_city'],
+        'travel_date': schedule['departure_date'],
+        'departure_time': schedule['departure_time'],
+        'arrival_time': schedule['arrival_time'],
+        'total_amount': total,
+        'base_fare': fare,
+        'payment_status': 'pending' if status == 'pending' else 'paid',
+        'payment_method': method,
+        'booking_source': source,
+        'bus_company': 'EthioBus',
+        'bus_type': schedule['bus_type'],
+        'bus_number': schedule['bus_number'],
+        'has_baggage': weight > 0,
+        'baggage_weight': weight,
+        'baggage_fee': fee,
+        'checked_in': status in ('checked_in', 'completed'),
+        'user': {'name': customer['name'], 'email': customer['email'], 'phone': customer['phone']},
+        'created_at': created_at,
+        'updated_at': created_at
+    }
+    if source == 'counter':
+        booking['booked_by'] = str(rng.choice(ticketers)['_id'])
+    if fee:
+        booking['baggage_tag'] = f"BT{pnr[-6:]}"
+    if booking['checked_in']:
+        booking['checked_in_at'] = departure - timedelta(minutes=rng.randint(10, 90))
+        booking['checked_in_by'] = str(rng.choice(ticketers)['_id'])
+    if status == 'cancelled':
+        requested_at = created_at + (min(departure, now) - created_at) * rng.random()
+        refund_percentage = rng.choices(*REFUND_PERCENTAGES)[0]
+        refund_amount = round(total * refund_percentage / 100, 2)
+        booking.update({
+            'cancellation_requested': True,
+            'cancellation_request_date': requested_at,
+            'cancellation_reason': rng.choice(CANCELLATION_REASONS),
+            'cancellation_status': 'approved',
+            'cancellation_approved': True,
+            'cancellation_approved_at': requested_at + timedelta(hours=rng.randint(1, 12)),
+            'refund_percentage': refund_percentage,
+            'refund_amount': refund_amount,
+            'cancellation_fee': round(total - refund_amount, 2),
+            'refund_method': 'original_payment_method',
+            'refund_status': 'processed',
+            'updated_at': requested_at
+        })
+
+    payment = None
+    if booking['payment_status'] == 'paid':
+        payment = {
+            '_id': ids(created_at),
+            'user_id': customer['_id'],
+            'booking_id': str(booking['_id']),
+            'schedule_id': booking['schedule_id'],
+            'tx_ref': f"ethiobus-{pnr}",
+            'amount': total,
+            'currency': 'ETB',
+            'status': 'success',
+            'payment_method': method,
+            'booking_source': source,
+            'booking_created': True,
+            'created_at': created_at,
+            'updated_at': created_at
+        }
+    return booking, payment
+
+def generate(writer, rng, ids, scale=1, past_days=30, future_days=14, occupancy=0.6):
+    """Write the whole data set through `writer`; returns {'schedules', 'bookings'} counts"""
+    from app import bcrypt
+    now = datetime.utcnow()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    password = bcrypt.generate_password_hash('password123').decode('utf-8')
+
+    staff, customers = make_users(rng, ids, scale, password, now)
+    routes = make_routes(rng, ids, scale, now)
+    buses = make_buses(rng, ids, scale, now)
+    for role_users in staff.values():
+        for user in role_users:
+            writer.add('users', user)
+    for document in customers:
+        writer.add('users', document)
+    for route in routes:
+        writer.add('routes', route)
+    for bus in buses:
+        writer.add('buses', bus)
+
+    drivers, ticketers = staff['driver'], staff['ticketer']
+    booking_counter = 0
+    schedule_counter = 0
+    for day_offset in range(-past_days, future_days + 1):
+        day = today + timedelta(days=day_offset)
+        day_text = day.strftime('%Y-%m-%d')
+        phase = 'past' if day_offset < 0 else 'today' if day_offset == 0 else 'future'
+        # Bookings for later departures have not all been made yet
+        fill = occupancy if day_offset <= 0 else occupancy * max(0.15, 1 - day_offset / 21)
+        for route in routes:
+            departures = rng.choices(*DEPARTURES_PER_DAY)[0]
+            for departure_time in sorted(rng.sample(DEPARTURE_TIMES, departures)):
+                bus = rng.choice(buses)
+                driver = rng.choice(drivers)
+                capacity, multiplier, amenities = BUS_TYPES[bus['type']]
+                created_at = day - timedelta(days=rng.randint(20, 40))
+                schedule = {
+                    '_id': ids(created_at),
+                    'route_id': str(route['_id']),
+                    'bus_id': str(bus['_id']),
+                    'bus_type': bus['type'],
+                    'bus_number': bus['bus_number'],
+                    'plate_number': bus['plate_number'],
+                    'route_name': route['name'],
+                    'origin_city': route['origin_city'],
+                    'destination_city': route['destination_city'],
+                    'departure_date': day_text,
+                    'departure_time': departure_time,
+                    'arrival_time': arrival_time(departure_time, route['estimated_duration_hours']),
+                    'total_seats': capacity,
+                    'fare_birr': int(route['base_fare_birr'] * multiplier),
+                    'status': rng.choices(*SCHEDULE_STATUSES[phase])[0],
+                    'amenities': amenities,
+                    'driver_id': str(driver['_id']),
+                    'driver_name': driver['name'],
+                    'created_at': created_at,
+                    'updated_at': now
+                }
+                schedule_counter += 1
+                hours, minutes = map(int, departure_time.split(':'))
+                departure = day + timedelta(hours=hours, minutes=minutes)
+
+                booked = 0
+                if schedule['status'] != 'cancelled':
+                    seat_pool = list(range(1, capacity + 1))
+                    rng.shuffle(seat_pool)
+                    target = int(capacity * min(1.0, max(0.0, rng.gauss(fill, 0.2))))
+                    position = 0
+                    while position < target:
+                        count = min(rng.choices(*SEATS_PER_BOOKING)[0], target - position)
+                        seats = sorted(seat_pool[position:position + count])
+                        position += count
+                        booking_counter += 1
+                        # Skewed towards the first customers, so customer1 is a frequent traveller
+                        customer = customers[int(len(customers) * rng.random() ** 2)]
+                        booking, payment = make_booking(
+                            rng, ids, schedule, seats, customer, ticketers, phase, departure, now,
+                            f"ETB{day.strftime('%y%m%d')}{booking_counter:08d}"
+                        )
+                        if booking['status'] != 'cancelled':
+                            booked += count
+                        writer.add('bookings', booking)
+                        if payment:
+                            writer.add('payments', payment)
+                schedule['booked_seats'] = booked
+                schedule['available_seats'] = capacity - booked
+                writer.add('busschedules', schedule)
+    return {'schedules': schedule_counter, 'bookings': booking_counter}
+
+def mark_migrated(counts):
+    """The data set is written in canonical types, so record the field migration as done"""
+    now = datetime.utcnow()
+    collection_counts = {'bookings': counts.get('bookings', 0), 'busschedules': counts.get('busschedules', 0),
+                         'payments': counts.get('payments', 0), 'seat_locks': 0}
+    for collection in CANONICAL_FIELDS:
+        mongo.db[MIGRATIONS_COLLECTION].replace_one(
+            {'_id': f"{MIGRATION_NAME}:{collection}"},
+            {'_id': f"{MIGRATION_NAME}:{collection}", 'migration': MIGRATION_NAME, 'collection': collection,
+             'last_id': None, 'scanned': collection_counts[collection], 'modified': 0, 'completed': True,
+             'started_at': now, 'completed_at': now, 'updated_at': now, 'source': 'benchmarks.dataset'},
+            upsert=True
+        )
+
+def build_dataset(scale=1, past_days=30, future_days=14, seed=42, batch_size=10000, workers=4,
+                  occupancy=0.6, wipe=False, read_models=True, mongo_uri=None):
+    """Generate the data set into the benchmark (or given) database; returns the summary rows"""
+    uri = use_bench_database(mongo_uri)
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_app()
+
+    with app.app_context():
+        db = mongo.db
+        existing = [name for name in DATASET_COLLECTIONS if db[name].estimated_document_count()]
+        if existing and not wipe:
+            print(f"❌ {uri} already has data in {', '.join(existing)}; pass --wipe to replace it")
+            return None
+        if wipe:
+            print(f"🗑️ Clearing {', '.join(DATASET_COLLECTIONS)} in {uri}...")
+            for name in DATASET_COLLECTIONS:
+                db[name].delete_many({})
+
+        expected = dataset_size(scale, past_days, future_days)
+        print(f"🏗️ Generating scale {scale} (~{expected['bookings']:,} bookings) into {uri}...")
+        started = time.perf_counter()
+        writer = BatchWriter(db, batch_size, workers)
+        generate(writer, random.Random(seed), ObjectIds(seed), scale, past_days, future_days, occupancy)
+        counts = writer.close()
+        elapsed = time.perf_counter() - started
+        mark_migrated(counts)
+
+        rows = [(name, count, None) for name, count in counts.items()]
+        if read_models:
+            from app.utils.schedule_search import rebuild_schedule_search
+            from app.utils.rollups import rebuild_rollups
+            for name, rebuild in (('schedule_search', rebuild_schedule_search), ('daily_rollups', rebuild_rollups)):
+                rebuild_started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    written = rebuild()
+                rows.append((name, written, time.perf_counter() - rebuild_started))
+
+    print("=" * 60)
+    print(f"{'collection':<20}{'documents':>14}{'rebuilt in':>14}")
+    for name, count, seconds in rows:
+        print(f"{name:<20}{count:>14,}{'' if seconds is None else f'{seconds:.1f}s':>14}")
+    total = sum(counts.values())
+    print("=" * 60)
+    print(f"✅ {total:,} documents in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} docs/s), seed {seed}")
+    print("   Staff and customers log in with password123 (admin1@ethiobus.com, customer1@example.com, ...)")
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a seeded, scalable benchmark data set')
+    parser.add_argument('--scale', type=int, default=1, help='Scale factor (1 = 20 routes, 2,000 customers, ~34k bookings)')
+    parser.add_argument('--past-days', type=int, default=30, help='Days of completed departures before today')
+    parser.add_argument('--future-days', type=int, default=14, help='Days of scheduled departures after today')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data')
+    parser.add_argument('--batch-size', type=int, default=10000, help='Documents per insert_many')
+    parser.add_argument('--workers', type=int, default=4, help='Batches inserted concurrently')
+    parser.add_argument('--occupancy', type=float, default=0.6, help='Mean share of seats booked on departed trips')
+    parser.add_argument('--wipe', action='store_true', help='Clear the data set collections first')
+    parser.add_argument('--skip-read-models', action='store_true', help='Do not rebuild schedule_search and daily_rollups')
+    parser.add_argument('--mongo-uri', help='MongoDB URI (default: BENCH_MONGO_URI or local ethiobus_bench)')
+    args = parser.parse_args()
+
+    rows = build_dataset(args.scale, args.past_days, args.future_days, args.seed, args.batch_size, args.workers,
+                         args.occupancy, args.wipe, not args.skip_read_models, args.mongo_uri)
+    sys.exit(0 if rows is not None else 1)
@@ -0,0 +1,90 @@
+"""
+Index registry check against a local mongod
+Seeds a few documents into the benchmark database, explains the filter shapes
+the hot endpoints issue, applies the index registry and explains them again.
+Exits non-zero if any hot query still falls back to a COLLSCAN.
+
+Usage:
+    python -m benchmarks.index_audit
+    python -m benchmarks.index_audit --keep-indexes   # skip dropping indexes first
+"""
+import argparse
+import contextlib
+import io
+import sys
+from datetime import datetime
+from bson import ObjectId
+from benchmarks.common import use_bench_database
+from app import create_app, mongo
+from app.utils.indexes import INDEXES, apply_indexes
+from app.utils.query_audit import QueryPlanAuditor
+
+SCHEDULE_ID = str(ObjectId())
+USER_ID = ObjectId()
+TODAY = datetime.utcnow().strftime('%Y-%m-%d')
+
+# (endpoint, collection, filter) as issued by the routes
+HOT_QUERIES = [
+    ('bookings.get_occupied_seats', 'bookings', {'schedule_id': SCHEDULE_ID, 'status': {'$in': ['confirmed', 'checked_in']}}),
+    ('bookings.get_booking_by_pnr', 'bookings', {'pnr_number': 'ETB000000'}),
+    ('bookings.get_user_bookings', 'bookings', {'user_id': USER_ID}),
+    ('operator.get_pending_checkins_list', 'bookings', {'travel_date': {'$in': [TODAY]}, 'status': {'$in': ['confirmed']}}),
+    ('driver_app.get_active_trip', 'busschedules', {'driver_id': str(ObjectId()), 'departure_date': TODAY}),
+    ('routes.get_route_schedules', 'busschedules', {'route_id': str(ObjectId()), 'departure_date': {'$gte': TODAY}}),
+    ('buses.get_bus_schedules', 'busschedules', {'bus_id': str(ObjectId())}),
+    ('payments.verify_payment', 'payments', {'tx_ref': 'tx-000'}),
+    ('tracking.get_bus_location', 'bus_locations', {'schedule_id': SCHEDULE_ID}),
+    ('auth.login', 'users', {'email': 'nobody@example.com'})
+]
+
+def seed():
+    db = mongo.db
+    for collection_name in {collection for _, collection, _ in HOT_QUERIES}:
+        db[collection_name].insert_one({'_bench': True, 'created_at': datetime.utcnow()})
+
+def drop_registry_indexes():
+    db = mongo.db
+    for collection_name in INDEXES:
+        for name in db[collection_name].index_information():
+            if name != '_id_':
+                db[collection_name].drop_index(name)
+
+def audit(auditor):
+    """Explain every hot query; returns the endpoints that COLLSCAN"""
+    scans = []
+    for endpoint, collection, query in HOT_QUERIES:
+        stages = auditor.explain(endpoint, mongo.db.name, collection, query)
+        if 'COLLSCAN' in stages:
+            scans.append(endpoint)
+    return scans
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the index registry covers the hot queries')
+    parser.add_argument('--keep-indexes', action='store_true', help='Do not drop existing indexes first')
+    args = parser.parse_args(argv)
+
+    use_bench_database()
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_app()
+
+    with app.app_context():
+        auditor = QueryPlanAuditor()
+        auditor.client = mongo.cx
+        seed()
+        if not args.keep_indexes:
+            drop_registry_indexes()
+            before = audit(auditor)
+            print(f"Before registry: {len(before)} of {len(HOT_QUERIES)} hot queries COLLSCAN")
+
+        apply_indexes()
+        after = audit(auditor)
+        print(f"After registry:  {len(after)} of {len(HOT_QUERIES)} hot queries COLLSCAN")
+        for endpoint in after:
+            print(f"   🐢 {endpoint}")
+
+        for collection_name in {collection for _, collection, _ in HOT_QUERIES}:
+            mongo.db[collection_name].delete_many({'_bench': True})
+    return 1 if after else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
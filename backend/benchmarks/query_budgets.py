@@ -0,0 +1,238 @@
+"""
+Query budget check
+Seeds the same customer/operator data set at two sizes (--small and
+--large: that many routes with a bus each, and more schedules per route and
+bookings per schedule as the size grows), calls the 21 busiest customer and
+operator endpoints against both, and compares the MongoDB operations each
+request issued with the budget declared on the view (@query_budget in
+app/utils/query_budget.py). Each endpoint is called once before it is
+measured, so per-process caches are warm, as in a running server.
+
+An endpoint fails when it goes over its budget at either size; one whose
+count grows with the data set is flagged as N+1 even inside the budget.
+Exits non-zero on any failure, so it can gate a deploy.
+
+Usage:
+    python -m benchmarks.query_budgets
+    python -m benchmarks.query_budgets --small 3 --large 30 --verbose
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask_jwt_extended import create_access_token
+from pymongo import monitoring
+from benchmarks.common import use_bench_database
+from app import create_app, mongo
+from app.utils.authz import token_claims
+from app.utils.query_budget import check_query_budget, query_counter
+
+CITIES = ['Bench Addis', 'Bench Adama', 'Bench Bahir Dar', 'Bench Hawassa', 'Bench Gondar', 'Bench Mekelle']
+SEEDED_COLLECTIONS = ('users', 'routes', 'buses', 'busschedules', 'bookings', 'seat_locks', 'payments',
+                      'busstops', 'bus_locations')
+
+# (label, method, url, who) - url may use {schedule_id}, {booking_id}, {origin}, {destination}, {date}
+ENDPOINTS = [
+    ('login', 'POST', '/auth/login', None),
+    ('me', 'GET', '/auth/me', 'customer'),
+    ('schedule cities', 'GET', '/schedules/cities', None),
+    ('schedule dates', 'GET', '/schedules/dates?origin_city={origin}&destination_city={destination}', None),
+    ('schedule search', 'GET', '/schedules/?origin_city={origin}&destination_city={destination}&date={date}', None),
+    ('schedule details', 'GET', '/schedules/{schedule_id}', None),
+    ('occupied seats', 'GET', '/bookings/occupied-seats/{schedule_id}', 'customer'),
+    ('my bookings', 'GET', '/bookings/user', 'customer'),
+    ('booking details', 'GET', '/bookings/{booking_id}', 'customer'),
+    ('routes', 'GET', '/routes/', None),
+    ('route schedules', 'GET', '/routes/{route_id}/schedules', None),
+    ('loyalty benefits', 'GET', '/api/loyalty/benefits', 'customer'),
+    ('active buses', 'GET', '/buses/active', 'operator'),
+    ('operator stats', 'GET', '/operator/dashboard/stats', 'operator'),
+    ('operator charts', 'GET', '/operator/dashboard/charts', 'operator'),
+    ('operator recent trips', 'GET', '/operator/dashboard/recent-trips', 'operator'),
+    ('operator schedules', 'GET', '/operator/schedules', 'operator'),
+    ('operator bookings', 'GET', '/operator/bookings', 'operator'),
+    ('operator buses', 'GET', '/operator/buses', 'operator'),
+    ('operator pending check-ins', 'GET', '/operator/checkin/pending', 'operator'),
+    ('tracking active buses', 'GET', '/tracking/active-buses', 'operator'),
+]
+
+def seed(size, seed=42):
+    """Users, `size` routes with a bus and stops each, their schedules over the next days (with drivers
+    and stop check-ins) and bookings on them"""
+    routes = size
+    schedules_per_route = max(2, size // 3)
+    bookings_per_schedule = max(3, size // 3)
+    from app import bcrypt
+    rng = random.Random(seed)
+    db = mongo.db
+    now = datetime.utcnow()
+    password = bcrypt.generate_password_hash('bench-password').decode('utf-8')
+
+    users = {}
+    for role in ('customer', 'operator', 'admin', 'driver'):
+        user = {'name': f"Bench {role.title()}", 'full_name': f"Bench {role.title()}",
+                'email': f"bench-{role}@example.com", 'password': password, 'phone': '0911000000',
+                'birthday': '', 'role': role, 'is_active': True, 'loyalty_points': 120,
+                'loyalty_tier': 'member', 'total_bookings': 0, 'created_at': now, 'updated_at': now,
+                'bench': True}
+        user['_id'] = db.users.insert_one(user).inserted_id
+        users[role] = user
+
+    route_docs, bus_docs, schedule_docs, booking_docs = [], [], [], []
+    stop_docs, location_docs = [], []
+    for index in range(routes):
+        origin, destination = CITIES[index % len(CITIES)], CITIES[(index + 1 + index // len(CITIES)) % len(CITIES)]
+        route = {'_id': ObjectId(), 'name': f"{origin} - {destination} {index}", 'origin_city': origin,
+                 'destination_city': destination, 'distance_km': rng.randint(80, 700),
+                 'estimated_duration_hours': rng.randint(2, 12), 'base_fare_birr': rng.randint(200, 900),
+                 'is_active': True, 'stops': [], 'created_at': now, 'bench': True}
+        bus = {'_id': ObjectId(), 'bus_number': f"BENCH-{index:04d}", 'plate_number': f"BN-{index:05d}",
+               'bus_name': f"Bench Bus {index}", 'type': 'standard', 'capacity': 45, 'status': 'active',
+               'is_active': True, 'amenities': ['wifi'], 'created_at': now, 'bench': True}
+        route_docs.append(route)
+        bus_docs.append(bus)
+        route_stops = [{'_id': ObjectId(), 'route_id': str(route['_id']), 'stop_name': f"{city} Stop",
+                        'stop_order': order, 'created_at': now, 'bench': True}
+                       for order, city in enumerate((origin, destination), start=1)]
+        stop_docs.extend(route_stops)
+        for day_offset in range(schedules_per_route):
+            departure = now + timedelta(days=day_offset + 1)
+            schedule = {'_id': ObjectId(), 'route_id': str(route['_id']), 'bus_id': str(bus['_id']),
+                        'route_name': route['name'], 'origin_city': origin, 'destination_city': destination,
+                        'bus_number': bus['bus_number'], 'bus_type': 'standard',
+                        'departure_date': departure.strftime('%Y-%m-%d'), 'departure_time': '08:00',
+                        'arrival_time': '14:00', 'status': 'scheduled', 'total_seats': 45,
+                        'available_seats': 45 - bookings_per_schedule, 'booked_seats': bookings_per_schedule,
+                        'fare_birr': route['base_fare_birr'], 'driver_id': str(users['driver']['_id']),
+                        'checked_stops': [], 'created_at': now, 'bench': True}
+            if day_offset == 0:
+                first_stop = route_stops[0]
+                checked_at = now - timedelta(minutes=rng.randint(5, 90))
+                schedule['checked_stops'] = [{'stop_id': str(first_stop['_id']), 'stop_name': first_stop['stop_name'],
+                                              'stop_order': first_stop['stop_order'], 'checked_at': checked_at}]
+                location_docs.append({
+                    'schedule_id': str(schedule['_id']), 'location_type': 'bus_stop',
+                    'bus_stop_id': str(first_stop['_id']), 'bus_stop_name': first_stop['stop_name'],
+                    'stop_order': first_stop['stop_order'], 'timestamp': checked_at, 'bench': True
+                })
+            schedule_docs.append(schedule)
+            for seat in range(1, bookings_per_schedule + 1):
+                booking_docs.append({
+                    'user_id': users['customer']['_id'], 'schedule_id': str(schedule['_id']),
+                    'seat_numbers': [seat], 'status': rng.choice(['confirmed', 'confirmed', 'checked_in', 'pending']),
+                    'payment_status': 'paid', 'total_amount': schedule['fare_birr'],
+                    'pnr_number': f"BN{len(booking_docs):07d}", 'passenger_name': 'Bench Passenger',
+                    'passenger_phone': '0911000000', 'departure_city': origin, 'arrival_city': destination,
+                    'travel_date': schedule['departure_date'], 'departure_time': '08:00', 'bus_type': 'standard',
+                    'bus_number': bus['bus_number'], 'created_at': now - timedelta(hours=rng.randint(1, 72)),
+                    'bench': True
+                })
+
+    db.routes.insert_many(route_docs, ordered=False)
+    db.buses.insert_many(bus_docs, ordered=False)
+    db.busschedules.insert_many(schedule_docs, ordered=False)
+    db.bookings.insert_many(booking_docs, ordered=False)
+    db.busstops.insert_many(stop_docs, ordered=False)
+    db.bus_locations.insert_many(location_docs, ordered=False)
+
+    from app.utils.schedule_search import rebuild_schedule_search
+    from app.utils.rollups import rebuild_rollups
+    with contextlib.redirect_stdout(io.StringIO()):
+        rebuild_schedule_search()
+        rebuild_rollups()
+
+    tokens = {role: create_access_token(identity=str(user['_id']), additional_claims=token_claims(user))
+              for role, user in users.items()}
+    first_schedule = schedule_docs[0]
+    values = {
+        'schedule_id': str(first_schedule['_id']),
+        'route_id': first_schedule['route_id'],
+        'booking_id': str(db.bookings.find_one({'schedule_id': str(first_schedule['_id'])}, {'_id': 1})['_id']),
+        'origin': first_schedule['origin_city'],
+        'destination': first_schedule['destination_city'],
+        'date': first_schedule['departure_date']
+    }
+    return tokens, values
+
+def clear_seed():
+    db = mongo.db
+    schedule_ids = [str(schedule['_id']) for schedule in db.busschedules.find({'bench': True}, {'_id': 1})]
+    db.schedule_search.delete_many({'_id': {'$in': schedule_ids}})
+    for collection in SEEDED_COLLECTIONS:
+        db[collection].delete_many({'bench': True})
+    db.daily_rollups.delete_many({})
+
+def measure(client, tokens, values):
+    """{label: check_query_budget result} for every endpoint"""
+    results = {}
+    for label, method, url, who in ENDPOINTS:
+        kwargs = {}
+        if who:
+            kwargs['headers'] = {'Authorization': f"Bearer {tokens[who]}"}
+        if label == 'login':
+            kwargs['json'] = {'email': 'bench-customer@example.com', 'password': 'bench-password'}
+        with contextlib.redirect_stdout(io.StringIO()):
+            client.open(url.format(**values), method=method, **kwargs)
+            results[label] = check_query_budget(client, method, url.format(**values), **kwargs)
+    return results
+
+def run_check(small=3, large=30, verbose=False, seed_value=42, keep=False, mongo_uri=None):
+    """Measure every endpoint at both sizes; returns True when all are within budget"""
+    use_bench_database(mongo_uri)
+    # No periodic settings version checks in the middle of a measured request
+    os.environ.setdefault('CONFIG_CACHE_CHECK_SECONDS', '3600')
+    monitoring.register(query_counter)
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_app()
+    client = app.test_client()
+
+    runs = {}
+    with app.app_context():
+        for size in (small, large):
+            clear_seed()
+            try:
+                tokens, values = seed(size, seed=seed_value)
+                runs[size] = measure(client, tokens, values)
+            finally:
+                if not keep or size != large:
+                    clear_seed()
+
+    failures = 0
+    print("=" * 78)
+    print(f"{'endpoint':<28}{'status':>8}{f'@{small}':>8}{f'@{large}':>8}{'budget':>8}  result")
+    for label, _method, _url, _who in ENDPOINTS:
+        low, high = runs[small][label], runs[large][label]
+        if low['budget'] is None:
+            verdict = 'no budget'
+        elif not (low['ok'] and high['ok']):
+            verdict = '❌ over budget'
+        elif high['queries'] > low['queries']:
+            verdict = '⚠️ grows with data (N+1)'
+        else:
+            verdict = '✅'
+        failures += verdict in ('❌ over budget', 'no budget')
+        status = f"{low['status']}/{high['status']}"
+        print(f"{label:<28}{status:>8}{low['queries']:>8}{high['queries']:>8}{str(low['budget']):>8}  {verdict}")
+        if verbose or verdict != '✅':
+            print(f"{'':<28}{high['commands']}")
+    print("=" * 78)
+    if failures:
+        print(f"❌ {failures} endpoint(s) over budget or without one")
+    return failures == 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MongoDB query budget check for the busiest endpoints')
+    parser.add_argument('--small', type=int, default=3, help='Routes in the small data set')
+    parser.add_argument('--large', type=int, default=30, help='Routes in the large data set')
+    parser.add_argument('--verbose', action='store_true', help='Show the commands of every endpoint')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--keep', action='store_true', help='Leave the large data set in the database')
+    parser.add_argument('--mongo-uri', help='MongoDB URI (default: BENCH_MONGO_URI or local ethiobus_bench)')
+    args = parser.parse_args()
+
+    ok = run_check(args.small, args.large, args.verbose, args.seed, args.keep, args.mongo_uri)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,136 @@
+"""
+Schedule search load test
+Seeds one busy route (D days x N departures a day, with bookings) and reports
+searches/sec for GET /schedules/ and GET /schedules/dates, first with the old
+per-schedule count_documents occupancy lookup and then with the batched
+booked_seat_counts() aggregation.
+
+Usage:
+    python -m benchmarks.schedule_search_load --departures 40 --days 14 --searches 500
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from benchmarks.common import latency_summary, use_bench_database
+from app import create_app, mongo
+from app.routes import schedules as schedules_routes
+from app.utils.schedule_occupancy import SEARCH_OCCUPANCY_STATUSES, booked_seat_counts
+
+ORIGIN_CITY = 'Bench Origin'
+DESTINATION_CITY = 'Bench Destination'
+
+def per_schedule_counts(schedule_ids, statuses=None):
+    """The lookup the endpoints used before: one count_documents per schedule"""
+    counts = {}
+    for schedule_id in schedule_ids:
+        counts[str(schedule_id)] = mongo.db.bookings.count_documents({
+            'schedule_id': str(schedule_id),
+            'status': {'$in': statuses or SEARCH_OCCUPANCY_STATUSES}
+        })
+    return counts
+
+def seed_route(departures=40, days=14, seats=45, occupancy=0.5, seed=42):
+    """Insert the route's schedules and bookings; returns the searchable dates"""
+    rng = random.Random(seed)
+    db = mongo.db
+    first_day = datetime.utcnow() + timedelta(days=1)
+    dates = [(first_day + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(days)]
+
+    schedules, bookings = [], []
+    for departure_date in dates:
+        for index in range(departures):
+            schedule_id = ObjectId()
+            schedules.append({
+                '_id': schedule_id,
+                'origin_city': ORIGIN_CITY,
+                'destination_city': DESTINATION_CITY,
+                'departure_date': departure_date,
+                'departure_time': f"{5 + index * 16 // departures:02d}:{(index * 17) % 60:02d}",
+                'total_seats': seats,
+                'status': 'scheduled',
+                'fare_birr': 450,
+                'bench': True
+            })
+            for seat in rng.sample(range(1, seats + 1), int(seats * occupancy)):
+                bookings.append({
+                    'schedule_id': str(schedule_id),
+                    'seat_numbers': [seat],
+                    'status': rng.choice(['confirmed', 'confirmed', 'checked_in']),
+                    'bench': True
+                })
+
+    db.busschedules.insert_many(schedules, ordered=False)
+    db.bookings.insert_many(bookings, ordered=False)
+    print(f"🌱 Seeded {len(schedules)} schedules and {len(bookings)} bookings on {ORIGIN_CITY} → {DESTINATION_CITY}")
+    return dates
+
+def clear_seed():
+    db = mongo.db
+    for collection in (db.busschedules, db.bookings):
+        collection.delete_many({'bench': True})
+
+def measure(client, dates, searches, rng):
+    """Throughput and latency of each search endpoint"""
+    endpoints = {
+        'schedules_search': lambda: f"/schedules/?origin_city={ORIGIN_CITY}&destination_city={DESTINATION_CITY}&date={rng.choice(dates)}",
+        'schedules_dates': lambda: f"/schedules/dates?origin_city={ORIGIN_CITY}&destination_city={DESTINATION_CITY}"
+    }
+    results = {}
+    for name, make_url in endpoints.items():
+        latencies = []
+        # The endpoints print per schedule; keep that out of the timing
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            for _ in range(searches):
+                url = make_url()
+                request_started = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - request_started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+            elapsed = time.perf_counter() - started
+        stats = latency_summary(latencies)
+        stats['searches_per_sec'] = round(searches / elapsed, 1) if elapsed else 0.0
+        results[name] = stats
+    return results
+
+def run_benchmark(departures=40, days=14, searches=500, seed=42, mongo_uri=None):
+    use_bench_database(mongo_uri)
+    app = create_app()
+    client = app.test_client()
+
+    with app.app_context():
+        clear_seed()
+        dates = seed_route(departures, days, seed=seed)
+        try:
+            summary = {}
+            for label, counter in (('per_schedule', per_schedule_counts), ('batched', booked_seat_counts)):
+                schedules_routes.booked_seat_counts = counter
+                summary[label] = measure(client, dates, searches, random.Random(seed))
+        finally:
+            schedules_routes.booked_seat_counts = booked_seat_counts
+            clear_seed()
+
+    print("=" * 76)
+    print(f"{'endpoint':<20}{'mode':<14}{'searches/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for name in summary['batched']:
+        for label in ('per_schedule', 'batched'):
+            stats = summary[label][name]
+            print(f"{name:<20}{label:<14}{stats['searches_per_sec']:>12}{stats['p50_ms']:>10}{stats['p99_ms']:>10}{stats['mean_ms']:>10}")
+    print("=" * 76)
+    return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Schedule search throughput, per-schedule counts vs batched')
+    parser.add_argument('--departures', type=int, default=40, help='Departures per day on the route')
+    parser.add_argument('--days', type=int, default=14, help='Days of schedules to seed')
+    parser.add_argument('--searches', type=int, default=500, help='Searches per endpoint per mode')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--mongo-uri', help='MongoDB URI (default: BENCH_MONGO_URI or local ethiobus_bench)')
+    args = parser.parse_args()
+
+    run_benchmark(args.departures, args.days, args.searches, args.seed, args.mongo_uri)
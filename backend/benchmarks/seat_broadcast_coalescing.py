@@ -0,0 +1,167 @@
+"""
+Seat broadcast coalescing benchmark
+Runs the same click storm twice against a server started here: once with
+one broadcast per seat change (SEAT_BROADCAST_WINDOW_MS=0) and once with
+coalescing (--window-ms). In each run --groups passengers pick
+--seats-per-group seats one click (lock_seats) at a time, then release
+them, while --viewers idle clients watch the schedule room. Reports seat
+messages sent to viewers (total and per second), server CPU seconds and
+CPU per click, and whether every viewer ended up with the same seat state.
+
+Needs the asyncio Socket.IO client: pip install "python-socketio[asyncio_client]"
+
+Usage:
+    python -m benchmarks.seat_broadcast_coalescing --viewers 500 --groups 7 --window-ms 50
+"""
+import argparse
+import asyncio
+import time
+from bson import ObjectId
+from benchmarks.common import use_bench_database
+from benchmarks.socket_fanout import cpu_seconds, raise_file_limit, start_servers
+
+SEAT_MESSAGES = ('seats_locked', 'seats_unlocked', 'seats_booked', 'seat_delta')
+
+class Viewer:
+    """A client in the room that counts seat messages and tracks locked seats"""
+
+    def __init__(self, url, room):
+        import socketio
+        self.url = url
+        self.room = room
+        self.messages = 0
+        self.locked = set()
+        self.joined = asyncio.Event()
+        self.client = socketio.AsyncClient(reconnection=False)
+        self.client.on('seat_status_update', self.on_snapshot)
+        for name in SEAT_MESSAGES:
+            self.client.on(name, self.handler(name))
+
+    async def on_snapshot(self, data):
+        self.locked = set(data.get('locked_seats', []))
+        self.joined.set()
+
+    def handler(self, name):
+        async def on_message(data):
+            self.messages += 1
+            if name == 'seat_delta':
+                for group in data['locked']:
+                    self.locked |= set(group['seat_numbers'])
+                self.locked -= set(data['unlocked']) | set(data['booked'])
+            elif name == 'seats_locked':
+                self.locked |= set(data['seat_numbers'])
+            else:
+                self.locked -= set(data['seat_numbers'])
+        return on_message
+
+    async def connect(self):
+        await self.client.connect(self.url, transports=['websocket'])
+        await self.client.emit('join_schedule', {'schedule_id': self.room, 'user_id': 'viewer'})
+        await asyncio.wait_for(self.joined.wait(), timeout=30)
+
+class Passenger:
+    """A client that locks its seats one click at a time"""
+
+    def __init__(self, url, room, user_id, seats):
+        import socketio
+        self.url = url
+        self.room = room
+        self.user_id = user_id
+        self.seats = seats
+        self.responses = asyncio.Queue()
+        self.client = socketio.AsyncClient(reconnection=False)
+        self.client.on('lock_response', self.responses.put)
+        self.client.on('unlock_response', self.responses.put)
+
+    async def click_through(self, click_interval):
+        for seat in self.seats:
+            await self.client.emit('lock_seats', {
+                'schedule_id': self.room, 'seat_numbers': [seat], 'user_id': self.user_id
+            })
+            await asyncio.wait_for(self.responses.get(), timeout=30)
+            await asyncio.sleep(click_interval)
+        await self.client.emit('unlock_seats', {
+            'schedule_id': self.room, 'seat_numbers': self.seats, 'user_id': self.user_id
+        })
+        await asyncio.wait_for(self.responses.get(), timeout=30)
+
+async def click_storm(url, pid, viewers, groups, seats_per_group, rounds, click_interval):
+    room = f"bench_schedule_{ObjectId()}"
+    watchers = [Viewer(url, room) for _ in range(viewers)]
+    for start in range(0, viewers, 200):
+        await asyncio.gather(*(viewer.connect() for viewer in watchers[start:start + 200]))
+
+    seats = list(range(1, groups * seats_per_group + 1))
+    passengers = [
+        Passenger(url, room, f"bench_user_{index}", seats[index * seats_per_group:(index + 1) * seats_per_group])
+        for index in range(groups)
+    ]
+    await asyncio.gather(*(passenger.client.connect(url, transports=['websocket']) for passenger in passengers))
+
+    cpu_before = cpu_seconds(pid)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(passenger.click_through(click_interval) for passenger in passengers))
+    elapsed = time.perf_counter() - started
+    # Let the last window flush and reach everyone
+    await asyncio.sleep(1.0)
+    cpu_used = cpu_seconds(pid) - cpu_before
+
+    clicks = rounds * groups * (seats_per_group + 1)
+    messages = sum(viewer.messages for viewer in watchers)
+    states = {frozenset(viewer.locked) for viewer in watchers}
+    await asyncio.gather(*(client.disconnect() for client in
+                           [viewer.client for viewer in watchers] + [p.client for p in passengers]))
+    return {
+        'seat_changes': clicks,
+        'messages_to_viewers': messages,
+        'messages_per_viewer': round(messages / viewers, 1) if viewers else 0,
+        'messages_per_s': round(messages / elapsed, 1) if elapsed else 0.0,
+        'elapsed_s': round(elapsed, 2),
+        'server_cpu_s': round(cpu_used, 2),
+        'server_cpu_ms_per_change': round(cpu_used * 1000 / clicks, 3) if clicks else 0.0,
+        'viewers_agree': len(states) == 1
+    }
+
+def run_benchmark(viewers=500, groups=7, seats_per_group=6, rounds=5, window_ms=50, click_interval_ms=20,
+                  async_mode='eventlet', base_port=5650, mongo_uri=None):
+    """Run the click storm without and with coalescing and return both summaries"""
+    mongo_uri = use_bench_database(mongo_uri)
+    raise_file_limit(viewers + groups + 1024)
+
+    results = {}
+    for label, window in (('per_change', 0), (f"coalesced_{window_ms}ms", window_ms)):
+        print(f"🚀 {label}: {viewers} viewers, {groups} groups x {seats_per_group} clicks x {rounds} rounds")
+        [(url, process)] = start_servers(1, base_port, async_mode, None, mongo_uri,
+                                         {'SEAT_BROADCAST_WINDOW_MS': str(window)})
+        try:
+            results[label] = asyncio.run(click_storm(url, process.pid, viewers, groups, seats_per_group,
+                                                     rounds, click_interval_ms / 1000.0))
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print("=" * 60)
+    for label, summary in results.items():
+        print(label)
+        for key, value in summary.items():
+            print(f"{key:>28}: {value}")
+    print("=" * 60)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seat broadcast coalescing benchmark')
+    parser.add_argument('--viewers', type=int, default=500, help='Idle clients watching the room')
+    parser.add_argument('--groups', type=int, default=7, help='Passengers picking seats at once')
+    parser.add_argument('--seats-per-group', type=int, default=6, help='Seats each passenger clicks')
+    parser.add_argument('--rounds', type=int, default=5, help='Times each passenger picks and releases')
+    parser.add_argument('--window-ms', type=int, default=50, help='Coalescing window to compare against')
+    parser.add_argument('--click-interval-ms', type=int, default=20, help='Pause between clicks')
+    parser.add_argument('--async-mode', default='eventlet', choices=['threading', 'eventlet', 'gevent'],
+                        help='SOCKETIO_ASYNC_MODE for the server')
+    parser.add_argument('--base-port', type=int, default=5650, help='Server port')
+    parser.add_argument('--mongo-uri', help='MongoDB URI (default: BENCH_MONGO_URI or local ethiobus_bench)')
+    args = parser.parse_args()
+
+    run_benchmark(args.viewers, args.groups, args.seats_per_group, args.rounds, args.window_ms,
+                  args.click_interval_ms, args.async_mode, args.base_port, args.mongo_uri)
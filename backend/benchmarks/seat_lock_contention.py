@@ -0,0 +1,109 @@
+"""
+Seat lock contention benchmark
+Runs N concurrent lockers against one schedule and reports lock throughput
+and how many seats ended up granted to more than one user (double locks).
+
+Usage:
+    python -m benchmarks.seat_lock_contention --lockers 50 --seats 45 --seats-per-locker 2
+"""
+import argparse
+import random
+import threading
+import time
+from collections import defaultdict
+from bson import ObjectId
+from benchmarks.common import percentile, use_bench_database
+from app import create_app, mongo
+from app.utils.seat_lock import lock_seats
+
+def run_benchmark(lockers=50, seats=45, seats_per_locker=2, rounds=5, seed=42, mongo_uri=None):
+    """Run the contention benchmark and return a summary dict"""
+    use_bench_database(mongo_uri)
+    app = create_app()
+    schedule_id = f"bench_schedule_{ObjectId()}"
+    rng = random.Random(seed)
+    
+    # Each locker gets its own pre-drawn seat requests so runs are repeatable
+    plans = [
+        [rng.sample(range(1, seats + 1), seats_per_locker) for _ in range(rounds)]
+        for _ in range(lockers)
+    ]
+    
+    granted = defaultdict(set)  # seat -> users that were told they hold it
+    latencies = []
+    results_lock = threading.Lock()
+    start_barrier = threading.Barrier(lockers)
+    counters = {'attempts': 0, 'successes': 0, 'errors': 0}
+    
+    def locker(index):
+        user_id = f"bench_user_{index}"
+        with app.app_context():
+            start_barrier.wait()
+            for requested in plans[index]:
+                started = time.perf_counter()
+                try:
+                    success, _message, locked = lock_seats(schedule_id, requested, user_id)
+                except Exception:
+                    success, locked = False, []
+                    with results_lock:
+                        counters['errors'] += 1
+                elapsed = time.perf_counter() - started
+                with results_lock:
+                    counters['attempts'] += 1
+                    latencies.append(elapsed)
+                    if success:
+                        counters['successes'] += 1
+                        for seat in locked:
+                            granted[seat].add(user_id)
+    
+    threads = [threading.Thread(target=locker, args=(i,)) for i in range(lockers)]
+    
+    print(f"🏁 {lockers} lockers x {rounds} rounds on a {seats}-seat bus ({schedule_id})")
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - wall_start
+    
+    with app.app_context():
+        # Cross-check the collection itself: a seat must never have two live owners
+        db_double_locks = len(list(mongo.db.seat_locks.aggregate([
+            {'$match': {'schedule_id': schedule_id, 'status': 'locked'}},
+            {'$group': {'_id': '$seat_number', 'owners': {'$addToSet': '$user_id'}}},
+            {'$match': {'owners.1': {'$exists': True}}}
+        ])))
+        mongo.db.seat_locks.delete_many({'schedule_id': schedule_id})
+    
+    summary = {
+        'lockers': lockers,
+        'rounds': rounds,
+        'attempts': counters['attempts'],
+        'successful_locks': counters['successes'],
+        'errors': counters['errors'],
+        'wall_time_s': round(wall_time, 3),
+        'throughput_per_s': round(counters['attempts'] / wall_time, 1) if wall_time else 0.0,
+        'latency_p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'latency_p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'double_locks_reported': sum(1 for users in granted.values() if len(users) > 1),
+        'double_locks_in_db': db_double_locks
+    }
+    
+    print("=" * 60)
+    for key, value in summary.items():
+        print(f"{key:>24}: {value}")
+    print("=" * 60)
+    return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seat lock contention benchmark')
+    parser.add_argument('--lockers', type=int, default=50, help='Concurrent lockers')
+    parser.add_argument('--seats', type=int, default=45, help='Seats on the bus')
+    parser.add_argument('--seats-per-locker', type=int, default=2, help='Seats per lock request')
+    parser.add_argument('--rounds', type=int, default=5, help='Lock requests per locker')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--mongo-uri', help='MongoDB URI (default: BENCH_MONGO_URI or local ethiobus_bench)')
+    args = parser.parse_args()
+    
+    summary = run_benchmark(args.lockers, args.seats, args.seats_per_locker, args.rounds, args.seed, args.mongo_uri)
+    exit(1 if summary['double_locks_reported'] or summary['double_locks_in_db'] else 0)
@@ -0,0 +1,132 @@
+"""
+Seat map latency benchmark
+Seeds N schedules x S seats into the benchmark database and compares p50/p99
+latency of the seat-map endpoints with the seat map cache on and off.
+
+Usage:
+    python -m benchmarks.seat_map_latency --schedules 500 --seats 50 --requests 5000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from benchmarks.common import latency_summary, use_bench_database
+from app import create_app, mongo
+from app.utils.seat_map_cache import seat_map_cache
+
+ENDPOINTS = {
+    'bookings_occupied_seats': '/bookings/occupied-seats/{schedule_id}',
+    'ticketer_occupied_seats': '/api/ticketer/schedules/{schedule_id}/occupied-seats'
+}
+
+def seed_schedules(schedules=500, seats=50, occupancy=0.6, seed=42):
+    """Insert schedules, bookings and a few live locks; returns schedule ids"""
+    rng = random.Random(seed)
+    db = mongo.db
+    departure_date = (datetime.utcnow() + timedelta(days=7)).strftime('%Y-%m-%d')
+    now = datetime.utcnow()
+
+    schedule_docs = [{
+        '_id': ObjectId(),
+        'departure_date': departure_date,
+        'departure_time': '08:00',
+        'total_seats': seats,
+        'status': 'scheduled',
+        'bench': True
+    } for _ in range(schedules)]
+    db.busschedules.insert_many(schedule_docs)
+
+    bookings, locks = [], []
+    for schedule in schedule_docs:
+        schedule_id = str(schedule['_id'])
+        seat_pool = list(range(1, seats + 1))
+        rng.shuffle(seat_pool)
+        booked_count = int(seats * occupancy)
+        taken, free = seat_pool[:booked_count], seat_pool[booked_count:]
+        while taken:
+            group_size = rng.randint(1, 3)
+            group, taken = taken[:group_size], taken[group_size:]
+            bookings.append({
+                'schedule_id': schedule_id,
+                'seat_numbers': group,
+                'status': rng.choice(['confirmed', 'confirmed', 'checked_in', 'pending']),
+                'bench': True
+            })
+        for seat in free[:2]:
+            locks.append({
+                'schedule_id': schedule_id,
+                'seat_number': seat,
+                'user_id': f"bench_user_{rng.randint(1, 1000)}",
+                'locked_at': now,
+                'expires_at': now + timedelta(minutes=10),
+                'status': 'locked',
+                'bench': True
+            })
+
+    db.bookings.insert_many(bookings, ordered=False)
+    db.seat_locks.insert_many(locks, ordered=False)
+    print(f"🌱 Seeded {schedules} schedules, {len(bookings)} bookings, {len(locks)} locks")
+    return [str(doc['_id']) for doc in schedule_docs]
+
+def clear_seed():
+    db = mongo.db
+    for collection in (db.busschedules, db.bookings, db.seat_locks):
+        collection.delete_many({'bench': True})
+
+def measure(client, schedule_ids, requests_per_endpoint, rng):
+    """Latency per endpoint for randomly chosen schedules"""
+    results = {}
+    for name, template in ENDPOINTS.items():
+        latencies = []
+        for _ in range(requests_per_endpoint):
+            url = template.format(schedule_id=rng.choice(schedule_ids))
+            started = time.perf_counter()
+            response = client.get(url)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        results[name] = latency_summary(latencies)
+    return results
+
+def run_benchmark(schedules=500, seats=50, requests_per_endpoint=5000, seed=42, mongo_uri=None):
+    use_bench_database(mongo_uri)
+    app = create_app()
+    client = app.test_client()
+    rng = random.Random(seed)
+
+    with app.app_context():
+        clear_seed()
+        schedule_ids = seed_schedules(schedules, seats, seed=seed)
+        try:
+            summary = {}
+            for label, enabled in (('cache_off', False), ('cache_on', True)):
+                seat_map_cache.configure(enabled=enabled, max_age_seconds=3600)
+                if enabled:
+                    # Warm every schedule once so the run measures hits, not first loads
+                    for schedule_id in schedule_ids:
+                        seat_map_cache.get(schedule_id)
+                summary[label] = measure(client, schedule_ids, requests_per_endpoint, rng)
+        finally:
+            clear_seed()
+            seat_map_cache.configure(app.config['SEAT_MAP_CACHE_ENABLED'], app.config['SEAT_MAP_CACHE_MAX_AGE'])
+
+    print("=" * 72)
+    print(f"{'endpoint':<26}{'mode':<11}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for name in ENDPOINTS:
+        for label in ('cache_off', 'cache_on'):
+            stats = summary[label][name]
+            print(f"{name:<26}{label:<11}{stats['p50_ms']:>10}{stats['p99_ms']:>10}{stats['mean_ms']:>10}")
+    print("=" * 72)
+    return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seat map endpoint latency, cache on vs off')
+    parser.add_argument('--schedules', type=int, default=500, help='Schedules to seed')
+    parser.add_argument('--seats', type=int, default=50, help='Seats per schedule')
+    parser.add_argument('--requests', type=int, default=5000, help='Requests per endpoint per mode')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--mongo-uri', help='MongoDB URI (default: BENCH_MONGO_URI or local ethiobus_bench)')
+    args = parser.parse_args()
+
+    run_benchmark(args.schedules, args.seats, args.requests, args.seed, args.mongo_uri)
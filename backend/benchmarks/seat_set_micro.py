@@ -0,0 +1,117 @@
+"""
+SeatSet microbenchmark
+Compares the old list-of-ints seat handling with SeatSet on a 60-seat sleeper
+bus: building the occupied set from bookings, checking a 6-seat request
+against cached occupancy, peak allocations, memory held and BSON size. No database needed.
+
+Usage:
+    python -m benchmarks.seat_set_micro --seats 60 --iterations 20000
+"""
+import argparse
+import random
+import sys
+import timeit
+import tracemalloc
+import bson
+from app.utils.seat_set import SeatSet
+
+def build_fixture(seats=60, occupancy=0.7, seed=42):
+    """Bookings as lists of seat numbers, a lock list and a 6-seat request"""
+    rng = random.Random(seed)
+    pool = list(range(1, seats + 1))
+    rng.shuffle(pool)
+    booked_count = int(seats * occupancy)
+    booked, rest = pool[:booked_count], pool[booked_count:]
+    bookings = []
+    while booked:
+        size = rng.randint(1, 4)
+        bookings.append(booked[:size])
+        booked = booked[size:]
+    locks = rest[:4]
+    request = rng.sample(range(1, seats + 1), 6)
+    return bookings, locks, request
+
+def list_path(bookings, locks, request):
+    """What the routes did before: extend, list(set()), list scans"""
+    occupied = []
+    for seat_numbers in bookings:
+        occupied.extend(seat_numbers)
+    occupied = list(set(occupied))
+    unavailable = [seat for seat in request if seat in occupied or seat in locks]
+    return occupied, unavailable
+
+def seat_set_path(bookings, locks, request):
+    """Same work with SeatSet bit operations"""
+    occupied = SeatSet(seat for seat_numbers in bookings for seat in seat_numbers)
+    unavailable = SeatSet(request) & (occupied | SeatSet(locks))
+    return occupied, unavailable
+
+def list_check(occupied, locks, request):
+    """Request check against an already built occupied list"""
+    return [seat for seat in request if seat in occupied or seat in locks]
+
+def seat_set_check(occupied, locks, request):
+    """Request check against a cached SeatSet, as the seat map cache serves it"""
+    return request & (occupied | locks)
+
+def peak_allocation(func, args, repeat=1000):
+    """Peak traced bytes while running func repeat times"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    for _ in range(repeat):
+        func(*args)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def run_benchmark(seats=60, iterations=20000, seed=42):
+    bookings, locks, request = build_fixture(seats, seed=seed)
+    args = (bookings, locks, request)
+
+    # Both paths must agree before timing them
+    list_occupied, list_unavailable = list_path(*args)
+    set_occupied, set_unavailable = seat_set_path(*args)
+    assert sorted(list_occupied) == set_occupied.to_list()
+    assert sorted(list_unavailable) == set_unavailable.to_list()
+
+    list_seconds = timeit.timeit(lambda: list_path(*args), number=iterations)
+    set_seconds = timeit.timeit(lambda: seat_set_path(*args), number=iterations)
+
+    # Steady state: occupancy already cached, only the request is checked
+    check_list_args = (list_occupied, locks, request)
+    check_set_args = (set_occupied, SeatSet(locks), SeatSet(request))
+    list_check_seconds = timeit.timeit(lambda: list_check(*check_list_args), number=iterations)
+    set_check_seconds = timeit.timeit(lambda: seat_set_check(*check_set_args), number=iterations)
+
+    summary = {
+        'seats': seats,
+        'bookings': len(bookings),
+        'iterations': iterations,
+        'list_us_per_op': round(list_seconds / iterations * 1e6, 3),
+        'seat_set_us_per_op': round(set_seconds / iterations * 1e6, 3),
+        'build_speedup': round(list_seconds / set_seconds, 2) if set_seconds else 0.0,
+        'list_check_us_per_op': round(list_check_seconds / iterations * 1e6, 3),
+        'seat_set_check_us_per_op': round(set_check_seconds / iterations * 1e6, 3),
+        'check_speedup': round(list_check_seconds / set_check_seconds, 2) if set_check_seconds else 0.0,
+        'list_peak_alloc_bytes': peak_allocation(list_path, args),
+        'seat_set_peak_alloc_bytes': peak_allocation(seat_set_path, args),
+        'list_held_bytes': sys.getsizeof(list_occupied) + sum(sys.getsizeof(s) for s in list_occupied),
+        'seat_set_held_bytes': sys.getsizeof(set_occupied) + sys.getsizeof(set_occupied.mask),
+        'list_bson_bytes': len(bson.encode({'seats': sorted(list_occupied)})),
+        'seat_set_bson_bytes': len(bson.encode({'seats': set_occupied.to_bson()}))
+    }
+
+    print("=" * 60)
+    for key, value in summary.items():
+        print(f"{key:>28}: {value}")
+    print("=" * 60)
+    return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SeatSet vs list microbenchmark')
+    parser.add_argument('--seats', type=int, default=60, help='Seats on the bus (sleeper default 60)')
+    parser.add_argument('--iterations', type=int, default=20000, help='Timed iterations per path')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    run_benchmark(args.seats, args.iterations, args.seed)
@@ -0,0 +1,238 @@
+"""
+Socket.IO connection scaling benchmark
+Starts one or more servers (python run.py) in the chosen async mode, opens
+many idle websocket clients in one schedule room and reports
+  - server memory per idle socket, and how many idle sockets fit in 1 GB
+  - broadcast latency: one client asks for refresh_seats and every client in
+    the room receives seat_status_update; reported per delivery and per round
+    (time until the last subscriber has it)
+With --workers > 1 clients are spread over the servers round-robin, so every
+broadcast has to cross the message queue to reach most of the room.
+
+Needs the asyncio Socket.IO client: pip install "python-socketio[asyncio_client]"
+and, for the servers, the async mode's package (requirements-production.txt).
+
+Usage:
+    python -m benchmarks.socket_fanout --clients 5000 --async-mode eventlet
+    python -m benchmarks.socket_fanout --clients 5000 --workers 2 --message-queue redis://localhost:6379/0
+    python -m benchmarks.socket_fanout --url http://localhost:5000 --server-pid 1234   # an already running server
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import time
+import urllib.request
+from bson import ObjectId
+from benchmarks.common import latency_summary, use_bench_database
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def cpu_seconds(pid):
+    """User + system CPU time a process has used (Linux /proc)"""
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+def rss_bytes(pid):
+    """Resident set size of a process (Linux /proc)"""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+def raise_file_limit(wanted):
+    """Allow enough open sockets for the clients (and servers started from here)"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+    if soft < target:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+def start_servers(workers, base_port, async_mode, message_queue, mongo_uri, extra_env=None):
+    """Start `workers` servers on consecutive ports; returns [(url, process)] once they answer"""
+    env = dict(os.environ)
+    env.update({
+        'MONGO_URI': mongo_uri,
+        'SOCKETIO_ASYNC_MODE': async_mode,
+        'SOCKETIO_LOGGER': 'false',
+        'OUTBOX_DISPATCHER_ENABLED': 'false',
+        'APPLY_INDEXES_ON_STARTUP': 'false',
+        'DEBUG': 'False'
+    })
+    if message_queue:
+        env['SOCKETIO_MESSAGE_QUEUE'] = message_queue
+    env.update(extra_env or {})
+    servers = []
+    for index in range(workers):
+        env['PORT'] = str(base_port + index)
+        process = subprocess.Popen([sys.executable, 'run.py'], cwd=BACKEND_DIR, env=dict(env),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        servers.append((f"http://127.0.0.1:{base_port + index}", process))
+    for url, process in servers:
+        wait_until_ready(url, process)
+    return servers
+
+def wait_until_ready(url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server for {url} exited with code {process.returncode}")
+        try:
+            urllib.request.urlopen(url + '/', timeout=2)
+            return
+        except Exception:
+            time.sleep(0.5)
+    raise RuntimeError(f"server at {url} did not start within {timeout}s")
+
+class Subscriber:
+    """One websocket client joined to the benchmark room"""
+
+    def __init__(self, url, room, broadcast):
+        import socketio
+        self.url = url
+        self.room = room
+        self.broadcast = broadcast
+        self.joined = asyncio.Event()
+        self.client = socketio.AsyncClient(reconnection=False)
+        self.client.on('seat_status_update', self.on_update)
+
+    async def on_update(self, data):
+        if not self.joined.is_set():
+            # join_schedule answers with the room's current seats
+            self.joined.set()
+            return
+        self.broadcast.received(time.perf_counter())
+
+    async def connect(self):
+        await self.client.connect(self.url, transports=['websocket'])
+        await self.client.emit('join_schedule', {'schedule_id': self.room, 'user_id': 'bench'})
+        await asyncio.wait_for(self.joined.wait(), timeout=30)
+
+class Broadcast:
+    """Delivery times of the round in flight"""
+
+    def __init__(self):
+        self.sent_at = None
+        self.expected = 0
+        self.latencies = []
+        self.done = asyncio.Event()
+
+    def start(self, expected):
+        self.sent_at = time.perf_counter()
+        self.expected = expected
+        self.latencies = []
+        self.done = asyncio.Event()
+
+    def received(self, at):
+        if self.sent_at is None:
+            return
+        self.latencies.append(at - self.sent_at)
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+async def measure(urls, clients, rounds, connect_batch, settle_seconds, server_pids):
+    room = f"bench_room_{ObjectId()}"
+    broadcast = Broadcast()
+    subscribers = [Subscriber(urls[index % len(urls)], room, broadcast) for index in range(clients)]
+
+    memory_before = sum(rss_bytes(pid) for pid in server_pids)
+    connect_started = time.perf_counter()
+    connected = []
+    for start in range(0, clients, connect_batch):
+        batch = subscribers[start:start + connect_batch]
+        results = await asyncio.gather(*(subscriber.connect() for subscriber in batch), return_exceptions=True)
+        connected.extend(subscriber for subscriber, result in zip(batch, results) if result is None)
+    connect_time = time.perf_counter() - connect_started
+    print(f"🔌 {len(connected)}/{clients} clients joined {room} in {connect_time:.1f}s")
+
+    await asyncio.sleep(settle_seconds)
+    memory_after = sum(rss_bytes(pid) for pid in server_pids)
+    per_socket = (memory_after - memory_before) / len(connected) if connected and server_pids else 0
+
+    delivery_latencies = []
+    round_latencies = []
+    missed = 0
+    sender = connected[0].client if connected else None
+    for _ in range(rounds if sender else 0):
+        broadcast.start(len(connected))
+        await sender.emit('refresh_seats', {'schedule_id': room})
+        try:
+            await asyncio.wait_for(broadcast.done.wait(), timeout=30)
+        except asyncio.TimeoutError:
+            pass
+        missed += len(connected) - len(broadcast.latencies)
+        delivery_latencies.extend(broadcast.latencies)
+        if broadcast.latencies:
+            round_latencies.append(max(broadcast.latencies))
+        await asyncio.sleep(0.2)
+
+    await asyncio.gather(*(subscriber.client.disconnect() for subscriber in connected), return_exceptions=True)
+    return {
+        'clients_connected': len(connected),
+        'connect_time_s': round(connect_time, 2),
+        'server_rss_before_mb': round(memory_before / 2 ** 20, 1),
+        'server_rss_after_mb': round(memory_after / 2 ** 20, 1),
+        'bytes_per_idle_socket': int(per_socket),
+        'idle_sockets_per_gb': int(2 ** 30 / per_socket) if per_socket > 0 else None,
+        'deliveries_missed': missed,
+        'delivery': latency_summary(delivery_latencies),
+        'round_until_last': latency_summary(round_latencies)
+    }
+
+def run_benchmark(clients=5000, rounds=20, async_mode='eventlet', workers=1, base_port=5600,
+                  message_queue=None, url=None, server_pid=None, connect_batch=200,
+                  settle_seconds=2.0, mongo_uri=None):
+    """Run the fan-out benchmark and return a summary dict"""
+    if workers > 1 and not message_queue and not url:
+        raise SystemExit('--workers > 1 needs --message-queue, or broadcasts stay inside one worker')
+    mongo_uri = use_bench_database(mongo_uri)
+    raise_file_limit(clients + 1024)
+
+    servers = []
+    if url:
+        urls = [url]
+        server_pids = [server_pid] if server_pid else []
+    else:
+        print(f"🚀 Starting {workers} {async_mode} server(s) on port {base_port}+")
+        servers = start_servers(workers, base_port, async_mode, message_queue, mongo_uri)
+        urls = [server_url for server_url, _process in servers]
+        server_pids = [process.pid for _url, process in servers]
+
+    try:
+        summary = asyncio.run(measure(urls, clients, rounds, connect_batch, settle_seconds, server_pids))
+    finally:
+        for _url, process in servers:
+            process.terminate()
+            process.wait(timeout=10)
+
+    summary = {'async_mode': async_mode if not url else 'external', 'workers': len(urls),
+               'message_queue': bool(message_queue), **summary}
+    print("=" * 60)
+    for key, value in summary.items():
+        print(f"{key:>24}: {value}")
+    print("=" * 60)
+    return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Socket.IO connection scaling benchmark')
+    parser.add_argument('--clients', type=int, default=5000, help='Idle websocket clients in the room')
+    parser.add_argument('--rounds', type=int, default=20, help='Broadcasts to time')
+    parser.add_argument('--async-mode', default='eventlet', choices=['threading', 'eventlet', 'gevent'],
+                        help='SOCKETIO_ASYNC_MODE for the servers started here')
+    parser.add_argument('--workers', type=int, default=1, help='Servers to start (needs --message-queue above 1)')
+    parser.add_argument('--base-port', type=int, default=5600, help='Port of the first server')
+    parser.add_argument('--message-queue', help='SOCKETIO_MESSAGE_QUEUE for the servers, e.g. redis://localhost:6379/0')
+    parser.add_argument('--url', help='Use this running server instead of starting one')
+    parser.add_argument('--server-pid', type=int, help='PID of the --url server, for memory figures')
+    parser.add_argument('--connect-batch', type=int, default=200, help='Clients connecting at once')
+    parser.add_argument('--settle-seconds', type=float, default=2.0, help='Wait before measuring memory')
+    parser.add_argument('--mongo-uri', help='MongoDB URI (default: BENCH_MONGO_URI or local ethiobus_bench)')
+    args = parser.parse_args()
+
+    run_benchmark(args.clients, args.rounds, args.async_mode, args.workers, args.base_port,
+                  args.message_queue, args.url, args.server_pid, args.connect_batch,
+                  args.settle_seconds, args.mongo_uri)
@@ -10,6 +10,10 @@ class SocketService {
     this.socket = null
     this.connected = false
     this.listeners = new Map()
+    // Seat events carry a per-schedule seq; these track what was applied
+    this.seatSeq = new Map()
+    this.replayPending = new Set()
+    this.seatHandlers = {}
   }
 
   /**
@@ -49,9 +53,85 @@ class SocketService {
       console.log('📡 Connection response:', data)
     })
 
+    this.socket.on('seat_events_replay', (data) => {
+      console.log(`⏪ Replaying ${data.events.length} missed seat events for`, data.schedule_id)
+      this.replayPending.delete(data.schedule_id)
+      data.events.forEach((event) => this.applySeatEvent(event.event, event))
+    })
+
+    this.socket.on('seat_delta', (data) => this.applySeatEvent('seat_delta', data))
+
     return this.socket
   }
 
+  /**
+   * Apply a numbered seat event in order
+   * An event already applied is ignored; one after a gap asks the server for
+   * the missed events (which include it) instead of applying it early.
+   */
+  applySeatEvent(type, data) {
+    const handler = this.seatHandlers[type]
+    const lastSeq = this.seatSeq.get(data.schedule_id)
+
+    if (typeof data.seq === 'number' && lastSeq !== undefined) {
+      if (data.seq <= lastSeq) return
+      if (data.seq > lastSeq + 1) {
+        this.requestReplay(data.schedule_id, lastSeq)
+        return
+      }
+    }
+    if (typeof data.seq === 'number') {
+      this.seatSeq.set(data.schedule_id, data.seq)
+    }
+    if (type === 'seat_delta') {
+      this.applySeatDelta(data)
+    } else if (handler) {
+      handler(data)
+    }
+  }
+
+  /**
+   * Hand a merged seat_delta to the seats_booked / seats_locked / seats_unlocked listeners
+   */
+  applySeatDelta(data) {
+    const { schedule_id, seq, timestamp } = data
+    const handlers = this.seatHandlers
+
+    if (data.unlocked.length && handlers.seats_unlocked) {
+      handlers.seats_unlocked({ schedule_id, seq, timestamp, seat_numbers: data.unlocked })
+    }
+    if (handlers.seats_locked) {
+      data.locked.forEach(({ user_id, seat_numbers }) => {
+        handlers.seats_locked({ schedule_id, seq, timestamp, user_id, seat_numbers })
+      })
+    }
+    if (data.booked.length && handlers.seats_booked) {
+      handlers.seats_booked({ schedule_id, seq, timestamp, seat_numbers: data.booked })
+    }
+  }
+
+  /**
+   * Ask for the seat events after lastSeq (once until they arrive)
+   */
+  requestReplay(scheduleId, lastSeq) {
+    if (!this.socket?.connected || this.replayPending.has(scheduleId)) return
+
+    console.log(`⏪ Missed seat events after ${lastSeq} for`, scheduleId)
+    this.replayPending.add(scheduleId)
+    this.socket.emit('replay_seat_events', { schedule_id: scheduleId, since_seq: lastSeq })
+  }
+
+  /**
+   * Listen for one kind of numbered seat event
+   */
+  onSeatEvent(type, callback) {
+    if (!this.socket) return
+
+    this.seatHandlers[type] = callback
+    this.socket.off(type)
+    this.socket.on(type, (data) => this.applySeatEvent(type, data))
+  }
+
   /**
    * Disconnect from WebSocket server
    */
@@ -179,6 +259,11 @@ class SocketService {
 
     this.socket.on('seat_status_update', (data) => {
       console.log('📊 Seat status update:', data)
+      // A snapshot is current to its seq; later events apply on top of it
+      if (typeof data.seq === 'number') {
+        this.seatSeq.set(data.schedule_id, data.seq)
+        this.replayPending.delete(data.schedule_id)
+      }
       callback(data)
     })
   }
@@ -189,7 +274,7 @@ class SocketService {
   onSeatsLocked(callback) {
     if (!this.socket) return
 
-    this.socket.on('seats_locked', (data) => {
+    this.onSeatEvent('seats_locked', (data) => {
       console.log('🔒 Seats locked by another user:', data)
       callback(data)
     })
@@ -201,7 +286,7 @@ class SocketService {
   onSeatsUnlocked(callback) {
     if (!this.socket) return
 
-    this.socket.on('seats_unlocked', (data) => {
+    this.onSeatEvent('seats_unlocked', (data) => {
       console.log('🔓 Seats unlocked by another user:', data)
       callback(data)
     })
@@ -213,7 +298,7 @@ class SocketService {
   onSeatsBooked(callback) {
     if (!this.socket) return
 
-    this.socket.on('seats_booked', (data) => {
+    this.onSeatEvent('seats_booked', (data) => {
       console.log('✅ Seats booked:', data)
       callback(data)
     })
@@ -229,6 +314,9 @@ class SocketService {
     this.socket.off('seats_locked')
     this.socket.off('seats_unlocked')
     this.socket.off('seats_booked')
+    this.seatHandlers = {}
+    this.seatSeq.clear()
+    this.replayPending.clear()
   }
 
   /**